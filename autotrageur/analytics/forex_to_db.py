@@ -9,10 +9,13 @@ from time import time
 
 import yaml
 
-import fp_libs.db.maria_db_handler as db_handler
+from autotrageur.bot.common.db_pool import DBPool
 from fp_libs.constants.decimal_constants import ONE
 from fp_libs.forex.currency_converter import convert_currencies_primary
 
+# Maximum number of pairs fetched and inserted at once.
+MAX_WORKERS = 30
+
 
 def _get_conversion(pair):
     """Fetches forex conversion for pair.
@@ -29,6 +32,39 @@ def _get_conversion(pair):
     return convert_currencies_primary(base, quote, ONE)
 
 
+def _persist_conversion(db_pool, pair, current_time):
+    """Fetches forex conversion for pair and inserts it.
+
+    NOTE: For use with a multithreading executor.
+
+    Args:
+        db_pool (DBPool): The pool to take a connection from.
+        pair (tuple(str, str)): The forex pair to fetch data for.
+        current_time (int): The timestamp of the row.
+    """
+    price = _get_conversion(pair)
+    base, quote = pair
+    table_name = ''.join([base, quote, 'minute'])
+    row = {
+        'time': current_time,
+        'price': price,
+        'base': base,
+        'quote': quote
+    }
+
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO " + table_name + " (time, price, base, quote)\n"
+                "VALUES (%(time)s, %(price)s, %(base)s, %(quote)s) "
+                "ON DUPLICATE KEY UPDATE time=time",
+                row)
+        finally:
+            cursor.close()
+        conn.commit()
+
+
 def get_pairs(config_file):
     """Retrieves list of pairs from the given file.
 
@@ -45,72 +81,72 @@ def get_pairs(config_file):
         return [tuple(pair) for pair in config['pairs']]
 
 
-def prepare_tables(currency_pairs):
+def prepare_tables(db_pool, currency_pairs):
     """Creates the tables for the data if they do not exist.
 
     Args:
+        db_pool (DBPool): The pool to take a connection from.
         currency_pairs (list[(str, str)]): List of base/quote pairs.
     """
-    for base, quote in currency_pairs:
-        # Create table if needed.
-        table_name = ''.join([base, quote, 'minute'])
-        db_handler.execute_ddl(
-            "CREATE TABLE IF NOT EXISTS " + table_name +
-                "(time INT(11) UNSIGNED NOT NULL,\n"
-                "price DECIMAL(18,9) UNSIGNED NOT NULL,\n"
-                "base VARCHAR(10) NOT NULL,\n"
-                "quote VARCHAR(10) NOT NULL,\n"
-                "PRIMARY KEY (time))")
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for base, quote in currency_pairs:
+                # Create table if needed.
+                table_name = ''.join([base, quote, 'minute'])
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS " + table_name +
+                        "(time INT(11) UNSIGNED NOT NULL,\n"
+                        "price DECIMAL(18,9) UNSIGNED NOT NULL,\n"
+                        "base VARCHAR(10) NOT NULL,\n"
+                        "quote VARCHAR(10) NOT NULL,\n"
+                        "PRIMARY KEY (time))")
+        finally:
+            cursor.close()
     logging.info('Tables prepared.')
 
 
-def persist_to_db(currency_pairs):
-    """Connects to DB and inserts data.
+def persist_to_db(db_pool, currency_pairs):
+    """Fetches and inserts current data.
 
-    Given the given credentials, connects to a database, creates a table (if
-    necessary), and inserts current data.
+    Each pair is fetched and inserted by a worker thread with its own
+    connection from the pool, so inserts overlap with the remaining fetches.
 
     Args:
+        db_pool (DBPool): The pool to take connections from.
         currency_pairs (list[(str, str)]): A list of tuples containing
             base/quote pairs.
     """
     logging.info('Running persist_to_db...')
-    with ThreadPoolExecutor(max_workers=30) as executor:
+    current_time = int(time())
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         future_to_pair = {
-            executor.submit(_get_conversion, pair): pair for pair in currency_pairs
+            executor.submit(_persist_conversion, db_pool, pair, current_time):
+                pair for pair in currency_pairs
         }
-        current_time = int(time())
         for future in as_completed(future_to_pair):
-            pair = future_to_pair[future]
+            base, quote = future_to_pair[future]
             try:
-                price = future.result()
+                future.result()
             except Exception as exc:
-                logging.info("Fetching {} failed: {}".format(
-                    pair, exc))
+                logging.info("Persisting {}/{} failed: {}".format(
+                    base, quote, exc))
             else:
-                base, quote = pair
-                table_name = ''.join([base, quote, 'minute'])
-                row = {
-                    'time': current_time,
-                    'price': price,
-                    'base': base,
-                    'quote': quote
-                }
-
-                insert_obj = db_handler.InsertRowObject(table_name, row, ('time',))
-                db_handler.insert_row(insert_obj)
                 logging.info('{}/{} fetch complete.'.format(base, quote))
-    db_handler.commit_all()
-    logging.info('Committed.')
+    db_pool.log_stats()
+    logging.info('persist_to_db complete.')
 
 
-def start_db(db_user, db_password, db_name):
-    """Proxy to maria_db_handler.start_db.
+def start_db_pool(db_user, db_password, db_name):
+    """Creates the pool of database connections.
 
     Args:
         db_user (str): The database user.
         db_password (str): The database password.
         db_name (str): The database name.
+
+    Returns:
+        DBPool: The pool, sized for the worker threads.
     """
     logging.info('DB started.')
-    db_handler.start_db(db_user, db_password, db_name)
+    return DBPool(db_user, db_password, db_name, max_size=MAX_WORKERS)
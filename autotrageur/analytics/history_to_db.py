@@ -4,18 +4,20 @@ Updates database with historical prices of a trading pair.
 """
 import logging
 from collections import namedtuple
-from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from warnings import filterwarnings
 
 import MySQLdb
 import yaml
 
-import fp_libs.db.maria_db_handler as db_handler
 from fp_libs.fiat_symbols import FIAT_SYMBOLS
 from fp_libs.time_utils import TimeInterval, get_most_recent_rounded_timestamp
 from fp_libs.trade.fetcher.history_fetcher import (HistoryFetcher,
                                                    HistoryQueryParams)
 
+# Maximum number of histories fetched and inserted at once.
+MAX_WORKERS = 30
+
 
 class IncompatibleTimeIntervalError(Exception):
         """Raised when a value does not belong within the TimeInterval Enum."""
@@ -73,6 +75,45 @@ def fetch_history(fetcher):
     return fetcher.get_token_history(fetcher.interval)
 
 
+def persist_history(db_pool, fetcher):
+    """Fetches token history and inserts it.
+
+    NOTE: For use with a multithreading executor.
+
+    Args:
+        db_pool (DBPool): The pool to take a connection from.
+        fetcher (HistoryFetcher): The fetcher used to interface with and
+            retrieve historical data.
+    """
+    price_history = fetch_history(fetcher)
+
+    base = fetcher.base
+    quote = fetcher.quote
+    exchange = fetcher.exchange
+    interval = fetcher.interval
+    tablename = ''.join([exchange, base, quote, interval])
+
+    # Add the extra columns.
+    for row in price_history:
+        row_add_info(row, base, quote, exchange)
+
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("INSERT IGNORE INTO "
+                + tablename
+                + "(time, close, high, low, open, volumefrom, volumeto, vwap, base,"
+                + " quote, exchange)\n"
+                + "VALUES (%(time)s, %(close)s, %(high)s, %(low)s, %(open)s,"
+                + " %(volumefrom)s, %(volumeto)s, %(vwap)s, %(base)s, %(quote)s,"
+                + " %(exchange)s) "
+                + "ON DUPLICATE KEY UPDATE time=time",
+                price_history)
+        finally:
+            cursor.close()
+        conn.commit()
+
+
 def make_fetchers(cfg_filepaths):
     """Creates a list of HistoryFetchers.
 
@@ -115,82 +156,64 @@ def make_fetchers(cfg_filepaths):
     return hist_fetchers
 
 
-def prepare_tables(table_metadata_list):
+def prepare_tables(db_pool, table_metadata_list):
     """Creates the tables for historical data if they don't exist.
 
     Args:
+        db_pool (DBPool): The pool to take a connection from.
         table_metadata_list (list[HistoryTableMetadata]): List of
             HistoryTableMetadata for determining what tables to create.
     """
-    for table_metadata in table_metadata_list:
-        # Create table if needed.
-        dec_prec = '(11,2)' if table_metadata.quote.upper() in FIAT_SYMBOLS else '(18,9)'
-        db_handler.execute_ddl(
-            "CREATE TABLE IF NOT EXISTS " + table_metadata.tablename +
-            "(time INT(11) UNSIGNED NOT NULL,\n"
-            "close DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
-            "high DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
-            "low DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
-            "open DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
-            "volumefrom DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
-            "volumeto DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
-            "vwap DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
-            "base VARCHAR(10) NOT NULL,\n"
-            "quote VARCHAR(10) NOT NULL,\n"
-            "exchange VARCHAR(28) NOT NULL,\n"
-            "PRIMARY KEY (time));")
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for table_metadata in table_metadata_list:
+                # Create table if needed.
+                dec_prec = '(11,2)' if table_metadata.quote.upper() in FIAT_SYMBOLS else '(18,9)'
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS " + table_metadata.tablename +
+                    "(time INT(11) UNSIGNED NOT NULL,\n"
+                    "close DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
+                    "high DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
+                    "low DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
+                    "open DECIMAL" + dec_prec + " UNSIGNED NOT NULL,\n"
+                    "volumefrom DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
+                    "volumeto DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
+                    "vwap DECIMAL(13, 4) UNSIGNED NOT NULL,\n"
+                    "base VARCHAR(10) NOT NULL,\n"
+                    "quote VARCHAR(10) NOT NULL,\n"
+                    "exchange VARCHAR(28) NOT NULL,\n"
+                    "PRIMARY KEY (time));")
+        finally:
+            cursor.close()
     logging.info('Tables prepared.')
 
 
-def persist_to_db(hist_fetchers):
+def persist_to_db(db_pool, hist_fetchers):
     """Inserts minute data.
 
-    Creates a table (if necessary), and inserts historical data.  Requires
-    an open DB connection.
+    Each history is fetched and inserted by a worker thread with its own
+    connection from the pool, so inserts overlap with the remaining fetches.
+    The tables must exist; see `prepare_tables`.
 
     Args:
+        db_pool (DBPool): The pool to take connections from.
         hist_fetchers (list[HistoryFetcher]): A list of fetchers containing
             metadata, and used for fetching historical data through an API.
     """
-    cached_exceptions = []
-    with ThreadPoolExecutor(max_workers=30) as executor:
+    if logging.getLogger().getEffectiveLevel() < logging.INFO:
+        filterwarnings('ignore', category=MySQLdb.Warning)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         future_to_fetcher = {
-            executor.submit(fetch_history, fetcher): fetcher for fetcher in hist_fetchers
+            executor.submit(persist_history, db_pool, fetcher): fetcher
+                for fetcher in hist_fetchers
         }
         for future in as_completed(future_to_fetcher):
             fetcher = future_to_fetcher[future]
             try:
-                price_history = future.result()
+                future.result()
             except Exception as exc:
-                cached_exceptions.append(exc)
-            else:
-                if logging.getLogger().getEffectiveLevel() < logging.INFO:
-                    filterwarnings('ignore', category=MySQLdb.Warning)
-
-                base = fetcher.base
-                quote = fetcher.quote
-                exchange = fetcher.exchange
-                interval = fetcher.interval
-                tablename = ''.join([exchange, base, quote, interval])
-
-                # Add the extra columns.
-                for row in price_history:
-                    row_add_info(row, base, quote, exchange)
-
-                cursor = db_handler.db.cursor()
-                cursor.executemany("INSERT IGNORE INTO "
-                    + tablename
-                    + "(time, close, high, low, open, volumefrom, volumeto, vwap, base,"
-                    + " quote, exchange)\n"
-                    + "VALUES (%(time)s, %(close)s, %(high)s, %(low)s, %(open)s,"
-                    + " %(volumefrom)s, %(volumeto)s, %(vwap)s, %(base)s, %(quote)s,"
-                    + " %(exchange)s) "
-                    + "ON DUPLICATE KEY UPDATE time=time",
-                    price_history)
-                db_handler.db.commit()
-                cursor.close()
-
-        wait(future_to_fetcher)
-        for exc in cached_exceptions:
-            logging.info("{} fetching generated an exception: {}".format(
-                fetcher.exchange, exc))
+                logging.info("{} fetching generated an exception: {}".format(
+                    fetcher.exchange, exc))
+    db_pool.log_stats()
@@ -0,0 +1,140 @@
+"""Benchmark the checkpoint codec against pickle.
+
+Builds a checkpoint of a dry run bot with the given number of targets per
+side, and reports the encoded size and the median encode and decode times
+of the codec and of pickle, as exported before the codec.
+
+Usage:
+    benchmark_checkpoint.py [options]
+
+Options:
+    -t TARGETS --targets=TARGETS    Targets per side [default: 100].
+    -r REPEAT --repeat=REPEAT       Timed runs of each operation
+                                    [default: 1000].
+"""
+import copyreg
+import pickle
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from docopt import docopt
+
+from autotrageur.bot.arbitrage.autotrageur import Configuration
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import (decode_checkpoint,
+                                                                encode_checkpoint)
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_utils import \
+    pickle_fcf_checkpoint
+from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
+from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
+from autotrageur.bot.common.enums import Momentum
+from autotrageur.bot.trader.dry_run import DryRunExchange
+from autotrageur.version import VERSION
+
+
+class _DryRunTrader():
+    """Stands in for a Trader when building the StatTracker."""
+
+    def __init__(self, dry_run_exchange):
+        """Constructor.
+
+        Args:
+            dry_run_exchange (DryRunExchange): The trader's exchange.
+        """
+        self.dry_run_exchange = dry_run_exchange
+
+
+def _make_checkpoint(num_targets):
+    """Builds the checkpoint of a dry run bot mid-run.
+
+    Args:
+        num_targets (int): The number of targets per side.
+
+    Returns:
+        FCFCheckpoint: The checkpoint.
+    """
+    config = Configuration(
+        dryrun=True, dryrun_e1_base='1', dryrun_e1_quote='10000',
+        dryrun_e2_base='1', dryrun_e2_quote='12000000',
+        email_cfg_path='configs/email_info.yaml', exchange1='binance',
+        exchange1_pair='BTC/USDT', exchange2='bithumb',
+        exchange2_pair='BTC/KRW', use_test_api=False, h_to_e1_max=3,
+        h_to_e2_max=3, id=str(uuid.uuid4()), max_trade_size=1000,
+        poll_wait_default=30, poll_wait_short=5, slippage=0.3, spread_min=1,
+        start_timestamp=int(time.time()),
+        twilio_cfg_path='configs/twilio/twilio_sample.yaml', vol_min=1000)
+
+    state = FCFStrategyState(True, Decimal('3.41'), Decimal('2.87'))
+    state.momentum = Momentum.TO_E2
+    state.e1_targets = [
+        (Decimal('0.5') + Decimal(i) / 7, Decimal('1000') + Decimal(i) / 3)
+        for i in range(num_targets)]
+    state.e2_targets = [
+        (Decimal('-1.25') + Decimal(i) / 9, Decimal('1000') + Decimal(i) / 3)
+        for i in range(num_targets)]
+    state.target_tracker = FCFTargetTracker()
+    state.target_tracker._target_index = num_targets // 2
+    state.target_tracker._last_target_index = num_targets // 2 - 1
+    state.trade_chunker = FCFTradeChunker(Decimal('1000'))
+    state.trade_chunker._target = state.e2_targets[num_targets // 2][1]
+    state.trade_chunker._current_trade_size = Decimal('333.3333333')
+
+    stat_tracker = FCFStatTracker(
+        str(uuid.uuid4()),
+        _DryRunTrader(DryRunExchange(
+            'binance', 'BTC', 'USDT', Decimal('0.95123456'),
+            Decimal('10432.12345678'))),
+        _DryRunTrader(DryRunExchange(
+            'bithumb', 'BTC', 'KRW', Decimal('1.04876544'),
+            Decimal('11512345.6789'))))
+    stat_tracker.trade_count = 120
+    stat_tracker.detach_traders()
+    return FCFCheckpoint(config, state, stat_tracker)
+
+
+def _time(func, arg, repeat):
+    """Times a function.
+
+    Args:
+        func (func): The function to time.
+        arg: The function's argument.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        float: The median time of a run, in seconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def main():
+    """Installed entry point."""
+    args = docopt(__doc__, version=VERSION)
+    repeat = int(args['--repeat'])
+    checkpoint = _make_checkpoint(int(args['--targets']))
+
+    copyreg.pickle(FCFCheckpoint, pickle_fcf_checkpoint)
+    codecs = [
+        ('pickle', pickle.dumps, pickle.loads),
+        ('codec', encode_checkpoint, decode_checkpoint),
+    ]
+
+    print("{:<8} {:>10} {:>12} {:>12}".format(
+        'format', 'bytes', 'encode (us)', 'decode (us)'))
+    for name, encode, decode in codecs:
+        data = encode(checkpoint)
+        print("{:<8} {:>10} {:>12.1f} {:>12.1f}".format(
+            name, len(data), _time(encode, checkpoint, repeat) * 1e6,
+            _time(decode, data, repeat) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
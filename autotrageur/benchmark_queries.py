@@ -0,0 +1,349 @@
+"""Benchmark the analytical queries before and after the schema migrations.
+
+Seeds a synthetic trade history, times the report and slippage history
+queries on the baseline schema, applies the migrations and times them
+again.
+
+Usage:
+    benchmark_queries.py [options]
+    benchmark_queries.py [options] DBINFOFILE
+
+Options:
+    -n TRADES --trades=TRADES   Number of trades to seed [default: 1000000].
+    -r REPEAT --repeat=REPEAT   Timed runs of each query [default: 5].
+    -p PATH --path=PATH         SQLite database file; a temporary file by
+                                default.
+
+Description:
+    DBINFOFILE          Database details, including database name and user.
+                        Benchmarks this MariaDB database instead of SQLite.
+                        It must be a scratch database at schema version 0,
+                        created from scripts/sql/dml_fcf.sql; the seeded
+                        rows are left in place.
+"""
+import getpass
+import os
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+import yaml
+from docopt import docopt
+
+from autotrageur.bot.common.db_constants import (FCF_AUTOTRAGEUR_CONFIG_TABLE,
+                                                 FOREX_RATE_TABLE,
+                                                 TRADE_OPPORTUNITY_TABLE,
+                                                 TRADES_TABLE)
+from autotrageur.bot.common.migrations import (SchemaVersionError,
+                                               get_schema_version, migrate)
+from autotrageur.bot.common.storage import MariaDBBackend, SQLiteBackend
+from autotrageur.version import VERSION
+
+# Number of seeded bot runs; the trades are spread evenly across them.
+NUM_CONFIGS = 100
+
+# Exchange pairs of the seeded runs.
+EXCHANGE_PAIRS = [
+    ('binance', 'bithumb'),
+    ('gemini', 'bithumb'),
+    ('kraken', 'bithumb'),
+    ('binance', 'gemini'),
+]
+
+# Quotes of the seeded forex rates.
+FOREX_QUOTES = ['KRW', 'EUR', 'JPY', 'CAD']
+
+# Rows per executemany batch while seeding.
+SEED_BATCH_SIZE = 10000
+
+# Start of the seeded history, one trade opportunity per minute.
+SEED_START_TIMESTAMP = 1500000000
+
+# The queries of report.py and CCXTTrader's slippage history.
+QUERIES = [
+    ('trade_count',
+     'SELECT COUNT(*) '
+     'FROM trades '
+     'WHERE autotrageur_config_id=%s'),
+    ('exchange_volume',
+     'SELECT SUM(pre_fee_base), SUM(post_fee_quote) '
+     'FROM trades '
+     'WHERE autotrageur_config_id=%s AND exchange=%s'),
+    ('fees',
+     'SELECT fee_asset, SUM(fees) '
+     'FROM trades '
+     'WHERE autotrageur_config_id=%s '
+     'GROUP BY fee_asset'),
+    ('start_forex_rate',
+     'SELECT f.rate '
+     'FROM fcf_autotrageur_config c, forex_rate f '
+     'WHERE f.local_timestamp >= c.start_timestamp AND c.id=%s AND f.quote=%s '
+     'ORDER BY f.local_timestamp '
+     'LIMIT 1'),
+    ('slippage_history',
+     'SELECT t.side, t_o.e1_buy, t_o.e1_sell, t.true_price '
+     'FROM fcf_autotrageur_config AS c, trade_opportunity AS t_o, trades AS t '
+     'WHERE c.dryrun = %s '
+     'AND c.id = t.autotrageur_config_id '
+     'AND c.start_timestamp = t.autotrageur_config_start_timestamp '
+     'AND t.trade_opportunity_id = t_o.id '
+     'AND t.exchange = %s'),
+]
+
+
+def _config_id(index):
+    """Gets the id of a seeded run.
+
+    Args:
+        index (int): The run index.
+
+    Returns:
+        str: The config id.
+    """
+    return 'benchmark-{}'.format(index)
+
+
+def _insert_batches(backend, table, rows):
+    """Inserts rows in batches, committing each batch.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        table (str): The table name.
+        rows (iterable[dict]): The rows, all with the same columns.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == SEED_BATCH_SIZE:
+            _insert_batch(backend, table, batch)
+            batch = []
+    if batch:
+        _insert_batch(backend, table, batch)
+
+
+def _insert_batch(backend, table, batch):
+    """Inserts a batch of rows and commits.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        table (str): The table name.
+        batch (list[dict]): The rows, all with the same columns.
+    """
+    columns = list(batch[0])
+    backend.execute_many(
+        "INSERT INTO {} ({}) VALUES ({});".format(
+            table,
+            ", ".join(columns),
+            ", ".join("%({})s".format(column) for column in columns)),
+        batch)
+    backend.commit()
+
+
+def _config_rows():
+    """Generates the seeded fcf_autotrageur_config rows."""
+    for index in range(NUM_CONFIGS):
+        exchange1, exchange2 = EXCHANGE_PAIRS[index % len(EXCHANGE_PAIRS)]
+        yield {
+            'id': _config_id(index),
+            'start_timestamp': SEED_START_TIMESTAMP + index,
+            'dryrun': index % 2,
+            'dryrun_e1_base': Decimal('1'),
+            'dryrun_e1_quote': Decimal('10000'),
+            'dryrun_e2_base': Decimal('1'),
+            'dryrun_e2_quote': Decimal('10000000'),
+            'exchange1': exchange1,
+            'exchange1_pair': 'BTC/USD',
+            'exchange2': exchange2,
+            'exchange2_pair': 'BTC/KRW',
+            'use_test_api': 0,
+            'h_to_e1_max': Decimal('3'),
+            'h_to_e2_max': Decimal('3'),
+            'max_trade_size': Decimal('1000'),
+            'spread_min': Decimal('1'),
+            'vol_min': Decimal('1000'),
+            'slippage': Decimal('0.3'),
+        }
+
+
+def _forex_rows(num_rates):
+    """Generates the seeded forex_rate rows.
+
+    Args:
+        num_rates (int): The number of rates.
+    """
+    for index in range(num_rates):
+        yield {
+            'id': 'forex-{}'.format(index),
+            'quote': FOREX_QUOTES[index % len(FOREX_QUOTES)],
+            'rate': Decimal('1100') + Decimal(index % 1000) / 100,
+            'local_timestamp': SEED_START_TIMESTAMP + 60 * index,
+        }
+
+
+def _opportunity_rows(num_opportunities):
+    """Generates the seeded trade_opportunity rows.
+
+    Args:
+        num_opportunities (int): The number of opportunities.
+    """
+    for index in range(num_opportunities):
+        yield {
+            'id': 'opportunity-{}'.format(index),
+            'e1_spread': Decimal('1.5'),
+            'e2_spread': Decimal('-2.5'),
+            'e1_buy': Decimal('7000') + index % 100,
+            'e1_sell': Decimal('6990') + index % 100,
+            'e2_buy': Decimal('7100') + index % 100,
+            'e2_sell': Decimal('7090') + index % 100,
+            'e1_forex_rate_id': None,
+            'e2_forex_rate_id': None,
+        }
+
+
+def _trade_rows(num_opportunities):
+    """Generates the seeded trades rows, a buy and a sell per opportunity.
+
+    Args:
+        num_opportunities (int): The number of opportunities.
+    """
+    for index in range(num_opportunities):
+        config_index = index % NUM_CONFIGS
+        exchange1, exchange2 = EXCHANGE_PAIRS[
+            config_index % len(EXCHANGE_PAIRS)]
+        timestamp = SEED_START_TIMESTAMP + 60 * index
+        for side, exchange, quote in (('buy', exchange1, 'USD'),
+                                      ('sell', exchange2, 'KRW')):
+            yield {
+                'trade_opportunity_id': 'opportunity-{}'.format(index),
+                'side': side,
+                'autotrageur_config_id': _config_id(config_index),
+                'autotrageur_config_start_timestamp':
+                    SEED_START_TIMESTAMP + config_index,
+                'exchange': exchange,
+                'base': 'BTC',
+                'quote': quote,
+                'pre_fee_base': Decimal('0.01'),
+                'pre_fee_quote': Decimal('70.5'),
+                'post_fee_base': Decimal('0.00999'),
+                'post_fee_quote': Decimal('70.4'),
+                'fees': Decimal('0.07'),
+                'fee_asset': quote,
+                'price': Decimal('7050'),
+                'true_price': Decimal('7051.5'),
+                'type': 'limit',
+                'order_id': 'order-{}-{}'.format(index, side),
+                'exchange_timestamp': timestamp,
+                'local_timestamp': timestamp,
+                'extra_info': None,
+            }
+
+
+def _seed(backend, num_trades):
+    """Seeds the synthetic trade history.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        num_trades (int): The number of trades; half as many opportunities
+            and forex rates are seeded.
+    """
+    num_opportunities = num_trades // 2
+    _insert_batches(backend, FCF_AUTOTRAGEUR_CONFIG_TABLE, _config_rows())
+    _insert_batches(backend, FOREX_RATE_TABLE, _forex_rows(num_opportunities))
+    _insert_batches(
+        backend, TRADE_OPPORTUNITY_TABLE, _opportunity_rows(num_opportunities))
+    _insert_batches(backend, TRADES_TABLE, _trade_rows(num_opportunities))
+
+
+def _time_queries(backend, repeat):
+    """Times each query against the first seeded run.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        repeat (int): The number of timed runs of each query.
+
+    Returns:
+        dict: The median latency of each query, in seconds, by name.
+    """
+    exchange1, _ = EXCHANGE_PAIRS[0]
+    params = {
+        'trade_count': (_config_id(0),),
+        'exchange_volume': (_config_id(0), exchange1),
+        'fees': (_config_id(0),),
+        'start_forex_rate': (_config_id(0), 'KRW'),
+        'slippage_history': (0, exchange1),
+    }
+    latencies = {}
+    for name, query in QUERIES:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            backend.execute_parametrized_query(query, params[name])
+            runs.append(time.perf_counter() - start)
+        latencies[name] = statistics.median(runs)
+    return latencies
+
+
+def _benchmark(backend, num_trades, repeat):
+    """Seeds the backend and prints the query latencies before and after
+    migrating.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        num_trades (int): The number of trades to seed.
+        repeat (int): The number of timed runs of each query.
+
+    Raises:
+        SchemaVersionError: If the schema is already migrated.
+    """
+    version = get_schema_version(backend)
+    if version != 0:
+        raise SchemaVersionError(
+            "The benchmark needs the baseline schema, found version "
+            "{}.".format(version))
+
+    start = time.perf_counter()
+    _seed(backend, num_trades)
+    print("Seeded {} trades in {:.1f}s".format(
+        num_trades, time.perf_counter() - start))
+
+    before = _time_queries(backend, repeat)
+    start = time.perf_counter()
+    version = migrate(backend)
+    print("Migrated to version {} in {:.1f}s".format(
+        version, time.perf_counter() - start))
+    after = _time_queries(backend, repeat)
+
+    print("{:<20} {:>12} {:>12} {:>9}".format(
+        'query', 'before (ms)', 'after (ms)', 'speedup'))
+    for name, _ in QUERIES:
+        print("{:<20} {:>12.3f} {:>12.3f} {:>8.1f}x".format(
+            name, before[name] * 1000, after[name] * 1000,
+            before[name] / after[name]))
+
+
+def main():
+    """Installed entry point."""
+    args = docopt(__doc__, version=VERSION)
+    num_trades = int(args['--trades'])
+    repeat = int(args['--repeat'])
+
+    if args['DBINFOFILE']:
+        with open(args['DBINFOFILE'], 'r') as db_info:
+            db_info = yaml.safe_load(db_info)
+        db_password = getpass.getpass('DB password:')
+        backend = MariaDBBackend(
+            db_info['db_user'], db_password, db_info['db_name'])
+        _benchmark(backend, num_trades, repeat)
+        backend.close()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backend = SQLiteBackend(
+            args['--path'] or os.path.join(tmp_dir, 'benchmark.db'))
+        _benchmark(backend, num_trades, repeat)
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
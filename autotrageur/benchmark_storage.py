@@ -0,0 +1,183 @@
+"""Benchmark per-trade persistence latency of the storage backends.
+
+Each trade writes what the bot persists for an executed arbitrage: the
+trade_opportunity row, both trades rows and both slippage_stats rows,
+followed by a commit.
+
+Usage:
+    benchmark_storage.py [options]
+    benchmark_storage.py [options] DBINFOFILE
+
+Options:
+    -n TRADES --trades=TRADES   Number of trades to persist [default: 1000].
+    -p PATH --path=PATH         SQLite database file; a temporary file by
+                                default.
+
+Description:
+    DBINFOFILE          Database details, including database name and user.
+                        Also benchmarks MariaDB against this database; its
+                        rows are deleted afterwards.
+"""
+import getpass
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+
+import yaml
+from docopt import docopt
+
+from autotrageur.bot.common.db_constants import (SLIPPAGE_STATS_TABLE,
+                                                 TRADE_OPPORTUNITY_TABLE,
+                                                 TRADES_TABLE)
+from autotrageur.bot.common.storage import MariaDBBackend, SQLiteBackend
+from autotrageur.version import VERSION
+
+# Placeholder config id of the benchmark's trades.
+BENCHMARK_CONFIG_ID = 'benchmark'
+
+
+def _make_trade_rows(trade_opportunity_id, now):
+    """Builds the rows persisted for one executed trade.
+
+    Args:
+        trade_opportunity_id (str): The trade opportunity id.
+        now (int): The local timestamp.
+
+    Returns:
+        list[tuple]: The (table, row, primary keys) of each row.
+    """
+    rows = [(TRADE_OPPORTUNITY_TABLE, {
+        'id': trade_opportunity_id,
+        'e1_spread': Decimal('1.23456789'),
+        'e2_spread': Decimal('-2.3456789'),
+        'e1_buy': Decimal('7123.45'),
+        'e1_sell': Decimal('7120.12'),
+        'e2_buy': Decimal('7301.99'),
+        'e2_sell': Decimal('7299.01'),
+        'e1_forex_rate_id': None,
+        'e2_forex_rate_id': None
+    }, ('id',))]
+    for side, exchange in (('buy', 'binance'), ('sell', 'gemini')):
+        rows.append((TRADES_TABLE, {
+            'trade_opportunity_id': trade_opportunity_id,
+            'side': side,
+            'autotrageur_config_id': BENCHMARK_CONFIG_ID,
+            'autotrageur_config_start_timestamp': now,
+            'exchange': exchange,
+            'base': 'BTC',
+            'quote': 'USD',
+            'pre_fee_base': Decimal('0.01234567'),
+            'pre_fee_quote': Decimal('88.12345678'),
+            'post_fee_base': Decimal('0.01233333'),
+            'post_fee_quote': Decimal('88.03533333'),
+            'fees': Decimal('0.08812345'),
+            'fee_asset': 'USD',
+            'price': Decimal('7138.12'),
+            'true_price': Decimal('7145.26'),
+            'type': 'limit',
+            'order_id': str(uuid.uuid4()),
+            'exchange_timestamp': now,
+            'local_timestamp': now,
+            'extra_info': None
+        }, ('trade_opportunity_id', 'side')))
+        rows.append((SLIPPAGE_STATS_TABLE, {
+            'trade_opportunity_id': trade_opportunity_id,
+            'side': side,
+            'exchange': exchange,
+            'dryrun': True,
+            'trade_count': 100,
+            'mean': Decimal('0.0123456789'),
+            'm2': Decimal('0.000123456789'),
+            'local_timestamp': now
+        }, ('trade_opportunity_id', 'side')))
+    return rows
+
+
+def _benchmark(backend, num_trades):
+    """Times the persistence of trades on a backend.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        num_trades (int): The number of trades to persist.
+
+    Returns:
+        tuple(list[float], list[str]): The latency of each trade, in
+            seconds, and the persisted trade opportunity ids.
+    """
+    latencies = []
+    ids = []
+    now = int(time.time())
+    for _ in range(num_trades):
+        trade_opportunity_id = str(uuid.uuid4())
+        rows = _make_trade_rows(trade_opportunity_id, now)
+        start = time.perf_counter()
+        for table, row, prim_keys in rows:
+            backend.insert_row(table, row, prim_keys)
+        backend.commit()
+        latencies.append(time.perf_counter() - start)
+        ids.append(trade_opportunity_id)
+    return latencies, ids
+
+
+def _delete_trades(backend, ids):
+    """Deletes the benchmark's rows.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        ids (list[str]): The persisted trade opportunity ids.
+    """
+    for table, column in ((SLIPPAGE_STATS_TABLE, 'trade_opportunity_id'),
+                          (TRADES_TABLE, 'trade_opportunity_id'),
+                          (TRADE_OPPORTUNITY_TABLE, 'id')):
+        for trade_opportunity_id in ids:
+            backend.execute_parametrized_query(
+                "DELETE FROM {} WHERE {} = %s;".format(table, column),
+                (trade_opportunity_id,))
+    backend.commit()
+
+
+def _report(name, latencies):
+    """Prints the latency summary of a backend.
+
+    Args:
+        name (str): The backend name.
+        latencies (list[float]): The latency of each trade, in seconds.
+    """
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print("{:<8} trades={:<6} mean={:.3f}ms p50={:.3f}ms p99={:.3f}ms".format(
+        name, len(ordered), statistics.mean(ordered) * 1000, p50 * 1000,
+        p99 * 1000))
+
+
+def main():
+    """Installed entry point."""
+    args = docopt(__doc__, version=VERSION)
+    num_trades = int(args['--trades'])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args['--path'] or os.path.join(tmp_dir, 'benchmark.db')
+        backend = SQLiteBackend(path)
+        latencies, ids = _benchmark(backend, num_trades)
+        _delete_trades(backend, ids)
+        backend.close()
+        _report('sqlite', latencies)
+
+    if args['DBINFOFILE']:
+        with open(args['DBINFOFILE'], 'r') as db_info:
+            db_info = yaml.safe_load(db_info)
+        db_password = getpass.getpass('DB password:')
+        backend = MariaDBBackend(
+            db_info['db_user'], db_password, db_info['db_name'])
+        latencies, ids = _benchmark(backend, num_trades)
+        _delete_trades(backend, ids)
+        backend.close()
+        _report('mariadb', latencies)
+
+
+if __name__ == "__main__":
+    main()
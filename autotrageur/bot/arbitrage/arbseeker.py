@@ -3,6 +3,7 @@ import uuid
 from collections import namedtuple
 
 import autotrageur.bot.arbitrage.spreadcalculator as spreadcalculator
+from autotrageur.bot.trader.ccxt_trader import OrderbookException
 from fp_libs.constants.ccxt_constants import BUY_SIDE, SELL_SIDE
 from fp_libs.utils.ccxt_utils import wrap_ccxt_retry
 
@@ -14,18 +15,96 @@ E2_BUY = 2
 E2_SELL = 3
 
 
-# Structure for data required to retrieve price data for one side on one
-# exchange.
+# Structure for data required to log the price of one side on one exchange.
 PriceEntry = namedtuple(
-    'PriceEntry', ['price_type', 'side', 'trader', 'bids_or_asks'])
+    'PriceEntry', ['price_type', 'side', 'trader'])
 # Structure containing spread and price info for an arbitrage opportunity.
 SpreadOpportunity = namedtuple(
     'SpreadOpportunity',
     ['id', 'e1_spread', 'e2_spread', 'e1_buy', 'e2_buy', 'e1_sell', 'e2_sell',
         'e1_forex_rate_id', 'e2_forex_rate_id'])
+# Structure for a route across two of the traders of a SpreadMatrix.
+SpreadRoute = namedtuple(
+    'SpreadRoute', ['buy_trader', 'sell_trader', 'spread'])
+# Structure containing the spreads and prices of every route across N
+# traders.  `spreads[i][j]` is the spread of buying on `traders[i]` and
+# selling on `traders[j]`, and `best_routes[j]` is the SpreadRoute with the
+# highest spread selling on `traders[j]`, or None if it has no valid route.
+SpreadMatrix = namedtuple(
+    'SpreadMatrix',
+    ['id', 'traders', 'spreads', 'buy_prices', 'sell_prices', 'best_routes'])
 
 
-def get_spreads_by_ob(trader1, trader2):
+def _get_price_or_none(trader, side, bids_or_asks):
+    """Obtains the PricePair of one side of a trader's orderbook.
+
+    Args:
+        trader (CCXTTrader): The trading client.
+        side (str): Either BUY_SIDE or SELL_SIDE.
+        bids_or_asks (list): The asks for BUY_SIDE, the bids for SELL_SIDE.
+
+    Returns:
+        PricePair: The prices, or None if the orderbook is not deep enough.
+    """
+    try:
+        return trader.get_prices_from_orderbook(side, bids_or_asks)
+    except OrderbookException as e:
+        logging.warning("No %s price on %s: %s", side, trader.exchange_name, e)
+        return None
+
+
+def _get_book_prices(trader, orderbook):
+    """Obtains the buy and sell PricePairs of a trader's orderbook.
+
+    Args:
+        trader (CCXTTrader): The trading client.
+        orderbook (dict): The trader's orderbook.
+
+    Returns:
+        tuple(PricePair, PricePair): The buy and sell prices, each None if
+            its side is not deep enough.
+    """
+    try:
+        return trader.get_prices_from_book(orderbook)
+    except OrderbookException:
+        # The orderbook is already as deep as it gets; keep the side which
+        # fills.
+        return (_get_price_or_none(trader, BUY_SIDE, orderbook[ASKS]),
+                _get_price_or_none(trader, SELL_SIDE, orderbook[BIDS]))
+
+
+def fetch_orderbooks(trader1, trader2, book_fetcher=None):
+    """Fetches the orderbooks of a poll of two exchanges.
+
+    Args:
+        trader1 (CCXTTrader): The trading client for exchange 1.
+        trader2 (CCXTTrader): The trading client for exchange 2.
+        book_fetcher (ConcurrentBookFetcher, optional): Defaults to None.
+            If given, both orderbooks are requested concurrently under the
+            fetcher's deadline.  Otherwise they are fetched one after the
+            other with retries.
+
+    Raises:
+        OrderbookTimeoutException: If the book_fetcher is given and an
+            orderbook does not arrive before its deadline.
+
+    Returns:
+        tuple(dict, dict): The orderbooks of exchange 1 and 2.
+    """
+    if book_fetcher is not None:
+        ex1_fetched, ex2_fetched = book_fetcher.fetch(trader1, trader2)
+        logging.debug("Orderbooks received at %s: %f, %s: %f",
+                      trader1.exchange_name, ex1_fetched.receive_timestamp,
+                      trader2.exchange_name, ex2_fetched.receive_timestamp)
+        return ex1_fetched.orderbook, ex2_fetched.orderbook
+    else:
+        ex1_orderbook, ex2_orderbook = wrap_ccxt_retry(  #pylint: disable=E0632
+            [trader1.get_orderbook, trader2.get_orderbook])
+        return ex1_orderbook, ex2_orderbook
+
+
+def get_spreads_by_ob(trader1, trader2, book_fetcher=None, verbose=True,
+                      orderbooks=None):
     """Obtains spreads across two exchanges based on orderbook.
 
     Uses two real-time api clients to obtain orderbook information, calculate
@@ -35,39 +114,53 @@ def get_spreads_by_ob(trader1, trader2):
     Args:
         trader1 (CCXTTrader): The trading client for exchange 1.
         trader2 (CCXTTrader): The trading client for exchange 2.
+        book_fetcher (ConcurrentBookFetcher, optional): Defaults to None.
+            If given, both orderbooks are requested concurrently under the
+            fetcher's deadline.  Otherwise they are fetched one after the
+            other with retries.
+        verbose (bool, optional): Defaults to True. Whether the prices and
+            spreads are logged at INFO; otherwise they are left to the poll
+            telemetry.
+        orderbooks (tuple(dict, dict), optional): Defaults to None. The
+            orderbooks of exchange 1 and 2, if already fetched by
+            `fetch_orderbooks`.
 
     Raises:
         OrderbookException: If the orderbook is not deep enough.
+        OrderbookTimeoutException: If the book_fetcher is given and an
+            orderbook does not arrive before its deadline.
 
     Returns:
         SpreadOpportunity: Returns an object containing the spreads and prices
             pertaining to the current spread opportunity.
     """
-    ex1_orderbook, ex2_orderbook = wrap_ccxt_retry(      #pylint: disable=E0632
-        [trader1.get_full_orderbook, trader2.get_full_orderbook])
+    if orderbooks is None:
+        orderbooks = fetch_orderbooks(trader1, trader2, book_fetcher)
+    ex1_orderbook, ex2_orderbook = orderbooks
 
     prices = [None] * 4
-    price_data = [
-        PriceEntry(E1_BUY, BUY_SIDE, trader1, ex1_orderbook[ASKS]),
-        PriceEntry(E1_SELL, SELL_SIDE, trader1, ex1_orderbook[BIDS]),
-        PriceEntry(E2_BUY, BUY_SIDE, trader2, ex2_orderbook[ASKS]),
-        PriceEntry(E2_SELL, SELL_SIDE, trader2, ex2_orderbook[BIDS])
-    ]
-
-    for item in price_data:
-        prices[item.price_type] = item.trader.get_prices_from_orderbook(
-            item.side,
-            item.bids_or_asks)
-
-        logging.info("Price - %10s %4s of %30s %s of %s: %30s USD",
-                        item.trader.exchange_name,
-                        item.side,
-                        item.trader.quote_target_amount
-                            if item.side is BUY_SIDE
-                            else item.trader.quote_rough_sell_amount,
-                        item.trader.quote,
-                        item.trader.base,
-                        prices[item.price_type].usd_price)
+    prices[E1_BUY], prices[E1_SELL] = trader1.get_prices_from_book(
+        ex1_orderbook)
+    prices[E2_BUY], prices[E2_SELL] = trader2.get_prices_from_book(
+        ex2_orderbook)
+
+    if verbose:
+        price_data = [
+            PriceEntry(E1_BUY, BUY_SIDE, trader1),
+            PriceEntry(E1_SELL, SELL_SIDE, trader1),
+            PriceEntry(E2_BUY, BUY_SIDE, trader2),
+            PriceEntry(E2_SELL, SELL_SIDE, trader2)
+        ]
+        for item in price_data:
+            logging.info("Price - %10s %4s of %30s %s of %s: %30s USD",
+                            item.trader.exchange_name,
+                            item.side,
+                            item.trader.quote_target_amount
+                                if item.side is BUY_SIDE
+                                else item.trader.quote_rough_sell_amount,
+                            item.trader.quote,
+                            item.trader.base,
+                            prices[item.price_type].usd_price)
 
     # Calculate the spreads between exchange 1 and 2, including taker fees.
     e1_spread = spreadcalculator.calc_fixed_spread(
@@ -79,14 +172,15 @@ def get_spreads_by_ob(trader1, trader2):
         trader1.get_taker_fee(), trader2.get_taker_fee(),
         trader1.get_buy_target_includes_fee())
 
-    logging.info(
-        'Spread - {:^60} {:>30} %'.format(
-            '{} -> {}:'.format(trader2.exchange_name, trader1.exchange_name),
-            e1_spread))
-    logging.info(
-        'Spread - {:^60} {:>30} %'.format(
-            '{} -> {}:'.format(trader1.exchange_name, trader2.exchange_name),
-            e2_spread))
+    if verbose:
+        logging.info(
+            'Spread - {:^60} {:>30} %'.format(
+                '{} -> {}:'.format(trader2.exchange_name, trader1.exchange_name),
+                e1_spread))
+        logging.info(
+            'Spread - {:^60} {:>30} %'.format(
+                '{} -> {}:'.format(trader1.exchange_name, trader2.exchange_name),
+                e2_spread))
 
     return SpreadOpportunity(
         str(uuid.uuid4()), e1_spread, e2_spread, prices[E1_BUY].quote_price,
@@ -94,6 +188,89 @@ def get_spreads_by_ob(trader1, trader2):
         prices[E2_SELL].quote_price, trader1.forex_id, trader2.forex_id)
 
 
+def get_spread_matrix(traders, book_fetcher=None, verbose=True):
+    """Obtains the spreads of every route across N exchanges by orderbook.
+
+    Generalizes `get_spreads_by_ob` to N traders of the same base asset.
+    The orderbooks are fetched in one round, the USD prices of both sides
+    are calculated once per trader, and `spreadcalculator` computes the N x N
+    fee-adjusted spreads at once.  A trader whose orderbook is not deep
+    enough on one side only drops out of the routes using that side.
+
+    Args:
+        traders (list[CCXTTrader]): The trading clients, at least two.
+        book_fetcher (ConcurrentBookFetcher, optional): Defaults to None.
+            If given, the orderbooks are requested concurrently under the
+            fetcher's deadline.  Otherwise they are fetched one after the
+            other with retries.
+        verbose (bool, optional): Defaults to True. Whether the prices and
+            best routes are logged at INFO.
+
+    Raises:
+        ValueError: If fewer than two traders are given, or they do not
+            trade the same base asset.
+        OrderbookTimeoutException: If the book_fetcher is given and an
+            orderbook does not arrive before its deadline.
+
+    Returns:
+        SpreadMatrix: The spreads, prices and best routes across the traders.
+    """
+    if len(traders) < 2:
+        raise ValueError("A spread matrix needs at least two traders.")
+    if len({trader.base for trader in traders}) > 1:
+        raise ValueError("The traders do not trade the same base asset: {}"
+                         .format([trader.base for trader in traders]))
+
+    if book_fetcher is not None:
+        orderbooks = [
+            fetched.orderbook for fetched in book_fetcher.fetch(*traders)]
+    else:
+        orderbooks = wrap_ccxt_retry(
+            [trader.get_orderbook for trader in traders])
+
+    buy_prices = []
+    sell_prices = []
+    for trader, orderbook in zip(traders, orderbooks):
+        buy_price, sell_price = _get_book_prices(trader, orderbook)
+        buy_prices.append(buy_price)
+        sell_prices.append(sell_price)
+
+    spreads = spreadcalculator.calc_fixed_spread_matrix(
+        [price and price.usd_price for price in buy_prices],
+        [price and price.usd_price for price in sell_prices],
+        [trader.get_taker_fee() for trader in traders],
+        [trader.get_taker_fee() for trader in traders],
+        [trader.get_buy_target_includes_fee() for trader in traders])
+
+    best_routes = []
+    for sell_index, sell_trader in enumerate(traders):
+        routes = [
+            SpreadRoute(buy_trader, sell_trader, spreads[buy_index][sell_index])
+            for buy_index, buy_trader in enumerate(traders)
+            if spreads[buy_index][sell_index] is not None]
+        best_routes.append(
+            max(routes, key=lambda route: route.spread) if routes else None)
+
+    if verbose:
+        for trader, buy_price, sell_price in zip(
+                traders, buy_prices, sell_prices):
+            logging.info("Price - %10s buy: %30s USD, sell: %30s USD",
+                         trader.exchange_name,
+                         buy_price and buy_price.usd_price,
+                         sell_price and sell_price.usd_price)
+        for route in best_routes:
+            if route is not None:
+                logging.info(
+                    'Spread - {:^60} {:>30} %'.format(
+                        '{} -> {}:'.format(route.buy_trader.exchange_name,
+                                           route.sell_trader.exchange_name),
+                        route.spread))
+
+    return SpreadMatrix(
+        str(uuid.uuid4()), list(traders), spreads, buy_prices, sell_prices,
+        best_routes)
+
+
 def execute_buy(trader, price):
     """Execute buy trade for arbitrage opportunity.
 
@@ -11,11 +11,16 @@ import schedule
 import yaml
 from dotenv import load_dotenv
 
-import fp_libs.db.maria_db_handler as db_handler
-from autotrageur.bot.common.config_constants import DB_NAME, DB_USER
+import autotrageur.bot.common.storage as storage
+from autotrageur.bot.common.config_constants import (DB_BACKEND, DB_NAME,
+                                                     DB_PATH, DB_USER)
 from autotrageur.bot.common.env_var_constants import ENV_VAR_NAMES
+from autotrageur.bot.common.migrations import check_schema_version, migrate
 from autotrageur.bot.common.notification_constants import (SUBJECT_DRY_RUN_FAILURE,
                                                            SUBJECT_LIVE_FAILURE)
+from autotrageur.bot.common.storage import (MARIADB_BACKEND, SQLITE_BACKEND,
+                                            MariaDBBackend, SQLiteBackend,
+                                            UnknownStorageBackendError)
 from fp_libs.logging import bot_logging
 from fp_libs.logging.logging_utils import fancy_log
 from fp_libs.utils.ccxt_utils import RetryableError, RetryCounter
@@ -74,6 +79,28 @@ class Configuration(namedtuple('Configuration', [
     __slots__ = ()
 
 
+class SharedResources(namedtuple('SharedResources', [
+        'book_fetcher', 'db_writer', 'exchange_key_map', 'exchange_pool',
+        'logger', 'twilio_client', 'twilio_config'])):
+    """Holds the components shared by the bots hosted in one process.
+
+    Args:
+        book_fetcher (SharedBookFetcher): Fetches each orderbook polled by
+            the bots once per round.
+        db_writer (DBWriter): Writes the rows of the bots on the process'
+            database connection.
+        exchange_key_map (dict): A map containing authentication information
+            necessary to connect with the exchange APIs, or None if dryrun
+            and unavailable.
+        exchange_pool (ExchangePool): The ccxt exchange objects shared by
+            the bots' traders.
+        logger (logging.Logger): The started background logger.
+        twilio_client (TwilioClient): The connected Twilio client.
+        twilio_config (dict): The Twilio configuration.
+    """
+    __slots__ = ()
+
+
 class Autotrageur(ABC):
     """Base class for running Autotrageur, the algorithmic trading bot.
 
@@ -84,8 +111,22 @@ class Autotrageur(ABC):
     trading algorithm. Subclasses should override the protected methods
     to alter behaviour and run different algorithms with different
     configurations.
+
+    A bot hosted in a process with other bots is given their
+    SharedResources; the process then owns the logger, environment
+    variables and database connection, and the bot does not set them up.
     """
 
+    def __init__(self, shared=None):
+        """Constructor.
+
+        Args:
+            shared (SharedResources, optional): Defaults to None. The
+                components shared with the other bots of the process, or
+                None if the bot runs alone.
+        """
+        self._shared = shared
+
     def __parse_config_file(self, file_name):
         """Parses the given config file into a dict.
 
@@ -101,20 +142,40 @@ class Autotrageur(ABC):
     def __init_db(self, db_config_path):
         """Initializes and connects to the database.
 
+        The storage backend is chosen by the configuration's `db_backend`,
+        MariaDB by default.  The embedded SQLite schema is migrated to the
+        latest version; MariaDB is migrated with `migrate_db`, and must be up
+        to date.
+
         Args:
             db_config_path (str): Path to the database configuration file.
-        """
-        db_password = getpass.getpass(
-            prompt="Enter database password:")
 
+        Raises:
+            SchemaVersionError: If the MariaDB schema has pending
+                migrations.
+            UnknownStorageBackendError: If the configured backend is not
+                supported.
+        """
         with open(db_config_path, 'r') as db_file:
             db_info = yaml.safe_load(db_file)
 
-        db_handler.start_db(
-            db_info[DB_USER],
-            db_password,
-            db_info[DB_NAME])
-        schedule.every(7).hours.do(db_handler.ping_db)
+        backend = db_info.get(DB_BACKEND) or MARIADB_BACKEND
+        if backend == SQLITE_BACKEND:
+            backend = SQLiteBackend(db_info[DB_PATH])
+            migrate(backend)
+            storage.start_storage(backend)
+        elif backend == MARIADB_BACKEND:
+            db_password = getpass.getpass(
+                prompt="Enter database password:")
+            backend = MariaDBBackend(
+                db_info[DB_USER],
+                db_password,
+                db_info[DB_NAME])
+            check_schema_version(backend)
+            storage.start_storage(backend)
+        else:
+            raise UnknownStorageBackendError(
+                "Unknown db_backend: {}".format(backend))
 
     def __init_temp_logger(self):
         """Starts the temporary in-memory logger."""
@@ -180,12 +241,18 @@ class Autotrageur(ABC):
         - loading environment variables
         - initializing and connecting to the DB
 
+        A hosted bot uses the shared logger instead.
+
         * Override this method to set up any additional core components for the
         bot's implementation.
 
         Args:
             arguments (dict): Map of the arguments passed to the program.
         """
+        if self._shared is not None:
+            self.logger = self._shared.logger
+            return
+
         self.__init_temp_logger()
 
         # Load environment variables.
@@ -238,6 +305,14 @@ class Autotrageur(ABC):
         """
         pass
 
+    def _is_poll_logged(self):
+        """Starts a poll, deciding whether it is logged in full.
+
+        Returns:
+            bool: Whether the poll's banners and details are logged.
+        """
+        return True
+
     @abstractmethod
     def _poll_opportunity(self):
         """Poll exchanges for arbitrage opportunity.
@@ -257,7 +332,8 @@ class Autotrageur(ABC):
         Args:
             arguments (dict): Map of the arguments passed to the program.
         """
-        self.__init_complete_logger()
+        if self._shared is None:
+            self.__init_complete_logger()
 
     def _wait(self):
         """Wait for the specified polling interval."""
@@ -282,7 +358,7 @@ class Autotrageur(ABC):
                 the call requires the config file to be loaded.
         """
         # If not resuming a run, must load configs first.
-        if requires_configs and not arguments['--resume_id']:
+        if requires_configs and not arguments.get('--resume_id'):
             self._load_configs(arguments[CONFIGFILE])
 
         # Initialize core components of the bot.
@@ -298,14 +374,16 @@ class Autotrageur(ABC):
                 try:
                     schedule.run_pending()
                     self._clean_up()
-                    fancy_log("Start Poll")
-                    if self._poll_opportunity():
+                    is_poll_logged = self._is_poll_logged()
+                    if is_poll_logged:
+                        fancy_log("Start Poll")
+                    is_opportunity = self._poll_opportunity()
+                    if is_poll_logged:
                         fancy_log("End Poll")
+                    if is_opportunity:
                         fancy_log("Start Trade")
                         self._execute_trade()
                         fancy_log("End Trade")
-                    else:
-                        fancy_log("End Poll")
                     retry_counter.increment()
                     self._wait()
                 except RetryableError as e:
@@ -0,0 +1,265 @@
+"""Concurrent orderbook fetching for arbitrage polls.
+
+Requests the orderbooks of every leg of a poll at the same time, under one
+shared deadline, so that a poll costs roughly the slowest round trip instead
+of the sum of all of them.
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import ccxt
+
+# Default deadline (in seconds) shared by all legs of a fetch round.
+DEFAULT_FETCH_DEADLINE = 5
+
+
+# Structure containing a fetched orderbook and the local unix timestamp at
+# which it was received.
+FetchedBook = namedtuple(
+    'FetchedBook', ['trader', 'orderbook', 'receive_timestamp'])
+
+
+class OrderbookTimeoutException(ccxt.RequestTimeout):
+    """Exception when one or more legs of a fetch round miss the deadline.
+
+    Subclasses `ccxt.RequestTimeout` so that callers already handling
+    `ccxt.NetworkError` treat a missed deadline like any other timeout.
+    """
+
+    def __init__(self, message, timed_out, fetched):
+        """Constructor.
+
+        Args:
+            message (str): The exception message.
+            timed_out (list[CCXTTrader]): The traders whose orderbooks did
+                not arrive before the deadline.
+            fetched (list[FetchedBook]): The orderbooks which did arrive in
+                time.
+        """
+        super().__init__(message)
+        self.timed_out = timed_out
+        self.fetched = fetched
+
+
+def _timed_fetch(trader):
+    """Fetches the trader's orderbook and stamps the time it was received.
+
+    NOTE: For use with a multithreading executor.
+
+    Args:
+        trader (CCXTTrader): The trader to fetch the orderbook with.
+
+    Returns:
+        FetchedBook: The orderbook with its receive timestamp.
+    """
+    orderbook = trader.get_orderbook()
+    return FetchedBook(trader, orderbook, time.time())
+
+
+class ConcurrentBookFetcher():
+    """Fetches the orderbooks of several traders at once.
+
+    The ccxt clients are synchronous, so each leg is run on a worker thread
+    and awaited on a private event loop.  A leg which misses the deadline is
+    abandoned rather than waited on; its worker finishes in the background
+    and the result is discarded.
+    """
+
+    def __init__(self, deadline=DEFAULT_FETCH_DEADLINE, max_workers=None):
+        """Constructor.
+
+        Args:
+            deadline (float): The number of seconds that all legs of a
+                fetch round share before the round is abandoned.
+            max_workers (int, optional): Defaults to None. The maximum
+                number of worker threads; see `ThreadPoolExecutor`.
+        """
+        self.deadline = deadline
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __fetch_round(self, traders):
+        """Requests all orderbooks at once and waits up to the deadline.
+
+        Args:
+            traders (tuple(CCXTTrader)): The traders to fetch with.
+
+        Returns:
+            list[asyncio.Future]: The futures of each leg, in the order of
+                the given traders.
+        """
+        futures = [
+            self._loop.run_in_executor(self._executor, _timed_fetch, trader)
+            for trader in traders
+        ]
+        await asyncio.wait(futures, timeout=self.deadline)
+        return futures
+
+    def close(self):
+        """Releases the event loop and worker threads."""
+        self._executor.shutdown(wait=False)
+        self._loop.close()
+
+    def fetch(self, *traders):
+        """Fetches the full orderbook of each trader concurrently.
+
+        Args:
+            *traders (CCXTTrader): The traders to fetch orderbooks with.
+
+        Raises:
+            OrderbookTimeoutException: If any leg misses the deadline.
+            Exception: Any error raised by a leg's fetch is re-raised, such
+                as a ccxt.NetworkError.
+
+        Returns:
+            list[FetchedBook]: The fetched orderbooks, in the order of the
+                given traders.
+        """
+        start = time.time()
+        futures = self._loop.run_until_complete(self.__fetch_round(traders))
+
+        timed_out = []
+        fetched = []
+        for trader, future in zip(traders, futures):
+            if future.done():
+                # Re-raises the leg's exception, if any.
+                fetched.append(future.result())
+            else:
+                future.cancel()
+                timed_out.append(trader)
+
+        if timed_out:
+            # Let the loop process the cancellations before leaving it idle.
+            self._loop.run_until_complete(asyncio.sleep(0))
+            raise OrderbookTimeoutException(
+                "Orderbook fetch from {} exceeded the {}s deadline.".format(
+                    ', '.join(t.exchange_name for t in timed_out),
+                    self.deadline),
+                timed_out,
+                fetched)
+
+        logging.debug("Fetched %d orderbooks in %.3fs, receive skew %.3fs",
+                      len(fetched),
+                      time.time() - start,
+                      max(f.receive_timestamp for f in fetched) -
+                          min(f.receive_timestamp for f in fetched))
+        return fetched
+
+
+def _book_key(trader):
+    """Identifies the orderbook a trader fetches.
+
+    Args:
+        trader (CCXTTrader): The trader.
+
+    Returns:
+        tuple(str, str): The exchange name and symbol.
+    """
+    return (trader.exchange_name, trader.symbol)
+
+
+def _depth_need(trader):
+    """Orders traders by the depth of orderbook they need.
+
+    Args:
+        trader (CCXTTrader): The trader.
+
+    Returns:
+        float: The number of levels the trader fetches, infinite for the
+            full orderbook.
+    """
+    depth = trader.depth_tracker.get_depth()
+    return float('inf') if depth is None else depth
+
+
+class SharedBookFetcher(ConcurrentBookFetcher):
+    """Fetches the orderbooks of several pairs' polls once per round.
+
+    `prefetch` requests each distinct orderbook of a round of polls once,
+    through the trader needing the deepest book.  `fetch` then serves each
+    poll from the round, and only requests the orderbooks the round lacks.
+    A served orderbook is stamped with the polling trader, and keeps the
+    time it was received.
+    """
+
+    def __init__(self, deadline=DEFAULT_FETCH_DEADLINE, max_workers=None):
+        """Constructor.
+
+        Args:
+            deadline (float): The number of seconds that all legs of a
+                fetch round share before the round is abandoned.
+            max_workers (int, optional): Defaults to None. The maximum
+                number of worker threads; see `ThreadPoolExecutor`.
+        """
+        super().__init__(deadline, max_workers)
+        self._round = {}
+        self.fetch_count = 0
+        self.shared_count = 0
+
+    def fetch(self, *traders):
+        """Fetches the orderbook of each trader, serving those of the
+        current round without a request.
+
+        Args:
+            *traders (CCXTTrader): The traders to fetch orderbooks with.
+
+        Raises:
+            OrderbookTimeoutException: If any requested leg misses the
+                deadline.
+            Exception: Any error raised by a requested leg's fetch is
+                re-raised, such as a ccxt.NetworkError.
+
+        Returns:
+            list[FetchedBook]: The fetched orderbooks, in the order of the
+                given traders.
+        """
+        missing = [trader for trader in traders
+                   if _book_key(trader) not in self._round]
+        if missing:
+            self.fetch_count += len(missing)
+            for book in super().fetch(*missing):
+                self._round[_book_key(book.trader)] = book
+
+        books = []
+        for trader in traders:
+            book = self._round[_book_key(trader)]
+            if book.trader is not trader:
+                self.shared_count += 1
+                book = book._replace(trader=trader)
+            books.append(book)
+        return books
+
+    def prefetch(self, traders):
+        """Starts a round, fetching each distinct orderbook of the traders
+        once.
+
+        Orderbooks that fail or miss the deadline are left out of the
+        round, to be requested by the polls that need them.
+
+        Args:
+            traders (list[CCXTTrader]): The traders of the round's polls.
+        """
+        leads = {}
+        for trader in traders:
+            key = _book_key(trader)
+            if (key not in leads
+                    or _depth_need(trader) > _depth_need(leads[key])):
+                leads[key] = trader
+
+        self._round = {}
+        if not leads:
+            return
+        self.fetch_count += len(leads)
+        try:
+            fetched = ConcurrentBookFetcher.fetch(self, *leads.values())
+        except OrderbookTimeoutException as exc:
+            logging.warning(exc)
+            fetched = exc.fetched
+        except ccxt.NetworkError as exc:
+            logging.warning("Orderbook prefetch failed: %r", exc)
+            fetched = []
+        for book in fetched:
+            self._round[_book_key(book.trader)] = book
@@ -0,0 +1,323 @@
+"""Write-behind persistence of database rows.
+
+Rows are queued by the trading thread and inserted by a background thread,
+which groups consecutive rows of the same table into multi-row statements and
+commits each batch once.  The rows of one write are always committed in the
+same transaction; an isolated write, e.g. of a trade, in a transaction of its
+own.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import groupby
+
+import autotrageur.bot.common.storage as storage
+
+# Default number of writes which may wait in the queue before inserts block.
+DEFAULT_WRITE_QUEUE_SIZE = 1000
+
+# Default maximum number of writes committed together.
+DEFAULT_WRITE_BATCH = 100
+
+# Seconds the writer waits for more rows before committing a batch.
+DEFAULT_WRITE_LINGER = 0.05
+
+# Idle seconds after which the writer pings the connection to keep it alive.
+DEFAULT_PING_INTERVAL = 3600
+
+# Marks the end of the queue.
+_CLOSE = object()
+
+# A row to write.  Without primary keys the row is inserted; with them, its
+# values are added to the existing row with the same primary key.
+WriteOp = namedtuple('WriteOp', ['table', 'row', 'prim_keys'])
+
+
+class DBWriteError(Exception):
+    """Exception when queued rows could not be committed."""
+    pass
+
+
+class WriteTicket():
+    """The outcome of a queued write, waited on by `DBWriter.barrier`."""
+
+    def __init__(self, ops, isolated):
+        """Constructor.
+
+        Args:
+            ops (tuple(WriteOp)): The rows of the write.
+            isolated (bool): Whether the write is committed in a transaction
+                of its own.
+        """
+        self.ops = ops
+        self.isolated = isolated
+        self.done = False
+        self.error = None
+
+
+def _build_insert(table, columns):
+    """Builds the insert statement of rows with the given columns.
+
+    Args:
+        table (str): The table name.
+        columns (tuple[str]): The column names.
+
+    Returns:
+        str: The statement, with named placeholders for `executemany`.
+    """
+    return "INSERT INTO {} ({}) VALUES ({})".format(
+        table,
+        ", ".join(columns),
+        ", ".join("%({})s".format(column) for column in columns))
+
+
+class DBWriter():
+    """Inserts rows into the database on a background thread.
+
+    Row order is preserved.  Each batch is committed in a
+    `storage.transaction`; other threads using the connection directly while
+    the writer runs do so through `exclusive`, or at least in a transaction
+    of their own.  Rows which fail to commit are dropped, logged and counted,
+    and the failure is kept on the tickets of their writes.
+    """
+
+    def __init__(self, max_queue=DEFAULT_WRITE_QUEUE_SIZE,
+                 max_batch=DEFAULT_WRITE_BATCH, linger=DEFAULT_WRITE_LINGER,
+                 ping_interval=DEFAULT_PING_INTERVAL, clock=time.monotonic):
+        """Constructor.
+
+        Args:
+            max_queue (int, optional): Defaults to DEFAULT_WRITE_QUEUE_SIZE.
+                The number of writes which may be queued before `write`
+                blocks.
+            max_batch (int, optional): Defaults to DEFAULT_WRITE_BATCH. The
+                maximum number of writes committed together.
+            linger (float, optional): Defaults to DEFAULT_WRITE_LINGER. The
+                seconds waited for more rows before a batch is committed.
+            ping_interval (float, optional): Defaults to
+                DEFAULT_PING_INTERVAL. The idle seconds after which the
+                connection is pinged.
+            clock (func, optional): Defaults to time.monotonic. Returns the
+                current time in seconds.
+        """
+        self.max_batch = max_batch
+        self.linger = linger
+        self.ping_interval = ping_interval
+        self.clock = clock
+        self.ping_count = 0
+        self.dropped_count = 0
+        self.max_queue_depth = 0
+        self.commit_count = 0
+        self.total_commit_latency = 0
+        self.max_commit_latency = 0
+        self._queue = queue.Queue(max_queue)
+        self._cond = threading.Condition()
+        self._queued_count = 0
+        self._committed_count = 0
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def __commit(self, batch):
+        """Writes and commits a batch of writes.
+
+        Consecutive rows of the same table, columns and kind share one
+        statement.
+
+        Args:
+            batch (list[WriteTicket]): The writes.
+        """
+        start = self.clock()
+        ops = [op for ticket in batch for op in ticket.ops]
+        with storage.transaction():
+            try:
+                for (table, columns, prim_keys), group in groupby(
+                        ops, key=lambda op: (op.table, tuple(op.row),
+                                             op.prim_keys)):
+                    rows = [op.row for op in group]
+                    if prim_keys is None:
+                        storage.execute_many(
+                            _build_insert(table, columns), rows)
+                    else:
+                        storage.accumulate_rows(table, rows, prim_keys)
+                storage.commit_all()
+            except Exception as exc:
+                logging.error(
+                    "Failed to write %d rows; dropped rows of: %s.",
+                    len(ops), ", ".join(sorted({op.table for op in ops})),
+                    exc_info=True)
+                error = exc
+                try:
+                    storage.rollback()
+                except Exception:
+                    logging.error("Rollback failed.", exc_info=True)
+            else:
+                error = None
+
+        latency = self.clock() - start
+        with self._cond:
+            self.commit_count += 1
+            self.total_commit_latency += latency
+            self.max_commit_latency = max(self.max_commit_latency, latency)
+            if error is not None:
+                self.dropped_count += len(ops)
+            for ticket in batch:
+                ticket.error = error
+                ticket.done = True
+            self._committed_count += len(batch)
+            self._cond.notify_all()
+
+    def __ping(self):
+        """Pings the idle connection, so the server does not drop it."""
+        try:
+            with storage.transaction():
+                storage.ping_db()
+            self.ping_count += 1
+        except Exception:
+            logging.error("Failed to ping the database.", exc_info=True)
+
+    def __run(self):
+        """Commits queued rows until the writer is closed.
+
+        The writer is the only thread using the connection, so it also keeps
+        the connection alive while idle.  An isolated write ends the batch
+        before it, and is committed alone.
+        """
+        closed = False
+        pending = None
+        while not closed:
+            if pending is not None:
+                item, pending = pending, None
+            else:
+                try:
+                    item = self._queue.get(timeout=self.ping_interval)
+                except queue.Empty:
+                    self.__ping()
+                    continue
+            if item is _CLOSE:
+                break
+            batch = [item]
+            deadline = self.clock() + self.linger
+            while not item.isolated and len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(
+                        timeout=max(deadline - self.clock(), 0))
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    closed = True
+                    break
+                if item.isolated:
+                    pending = item
+                    break
+                batch.append(item)
+            self.__commit(batch)
+
+    def barrier(self, *tickets, timeout=None):
+        """Waits until the given writes are committed.
+
+        Only the given writes are checked; failures of other writes are left
+        logged and counted.
+
+        Args:
+            *tickets (WriteTicket): The writes to wait on.
+            timeout (float, optional): Defaults to None. The maximum seconds
+                to wait; None waits indefinitely.
+
+        Raises:
+            DBWriteError: If the writes are not committed within the timeout,
+                or any of them failed to commit.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: all(ticket.done for ticket in tickets), timeout):
+                raise DBWriteError(
+                    "Timed out waiting for rows to be committed.")
+        for ticket in tickets:
+            if ticket.error is not None:
+                raise DBWriteError("Rows failed to commit.") from ticket.error
+
+    @contextmanager
+    def exclusive(self):
+        """Uses the connection directly, after the queued rows.
+
+        Waits until every row inserted so far is committed, then holds the
+        connection in a `storage.transaction` for the block.  Failed rows
+        are left on the tickets of their writes.
+        """
+        self.flush()
+        with storage.transaction():
+            yield
+
+    def flush(self, timeout=None):
+        """Waits until every row inserted so far is committed or dropped.
+
+        Args:
+            timeout (float, optional): Defaults to None. The maximum seconds
+                to wait; None waits indefinitely.
+
+        Returns:
+            bool: Whether the rows were written within the timeout.
+        """
+        with self._cond:
+            target = self._queued_count
+            return self._cond.wait_for(
+                lambda: self._committed_count >= target, timeout)
+
+    def close(self, timeout=None):
+        """Commits the queued rows and stops the writer.
+
+        Args:
+            timeout (float, optional): Defaults to None. The maximum seconds
+                to wait for the queued rows.
+        """
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+    def insert(self, table, row):
+        """Queues a row for insertion.
+
+        Blocks while the queue is full.
+
+        Args:
+            table (str): The table name.
+            row (dict): The row, keyed by column name.
+
+        Returns:
+            WriteTicket: The ticket of the write.
+        """
+        return self.write(WriteOp(table, row, None))
+
+    def log_stats(self):
+        """Logs the queue depth and commit latency."""
+        average = (self.total_commit_latency / self.commit_count
+                   if self.commit_count else 0)
+        logging.info(
+            "DB writer: %d commits, %.3fs average and %.3fs max latency, "
+            "%d max queue depth.", self.commit_count, average,
+            self.max_commit_latency, self.max_queue_depth)
+        if self.dropped_count:
+            logging.error("DB writer: %d rows dropped.", self.dropped_count)
+
+    def write(self, *ops, isolated=False):
+        """Queues rows to be written in the same transaction, in order.
+
+        Blocks while the queue is full.
+
+        Args:
+            *ops (WriteOp): The rows to write.
+            isolated (bool, optional): Defaults to False. Whether the rows
+                are committed in a transaction of their own, so that the
+                failure of other rows does not roll them back.
+
+        Returns:
+            WriteTicket: The ticket of the write.
+        """
+        ticket = WriteTicket(ops, isolated)
+        with self._cond:
+            self._queued_count += 1
+        self._queue.put(ticket)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return ticket
@@ -0,0 +1,233 @@
+"""Catalog of the checkpoints exported to fcf_state.
+
+Each exported checkpoint is stored with metadata columns, extracted on
+export, so checkpoints are listed and thinned out by reading the covering
+catalog index only.  Checkpoints exported before the catalog are filled in
+by `backfill_catalog`.
+"""
+import logging
+from collections import defaultdict, namedtuple
+
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import \
+    decode_checkpoint
+from autotrageur.bot.common.db_constants import (FCF_STATE_CATALOG_COLUMNS,
+                                                 FCF_STATE_TABLE)
+
+# Default number of most recent checkpoints kept per config.
+DEFAULT_KEEP_LATEST = 10
+
+# Default number of days for which the last checkpoint of each day is kept.
+DEFAULT_KEEP_DAYS = 30
+
+# Rows per batch of decoded checkpoints or deleted ids.
+BATCH_SIZE = 100
+
+# Seconds in a day, for bucketing checkpoints by day.
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# A cataloged checkpoint.
+CatalogEntry = namedtuple(
+    'CatalogEntry',
+    ['id', 'autotrageur_config_id'] + FCF_STATE_CATALOG_COLUMNS)
+
+
+def _select_entries(backend, where, params, limit):
+    """Selects catalog entries, newest first.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        where (str): The WHERE clause, or an empty string.
+        params (tuple): The parameters of the clause.
+        limit (int): The maximum number of entries, or None.
+
+    Returns:
+        list[CatalogEntry]: The entries.
+    """
+    query = "SELECT {} FROM {} {} ORDER BY export_timestamp DESC".format(
+        ", ".join(CatalogEntry._fields), FCF_STATE_TABLE, where)
+    if limit is not None:
+        query += " LIMIT {:d}".format(limit)
+    rows = backend.execute_parametrized_query(query + ";", params)
+    return [CatalogEntry(*row) for row in rows]
+
+
+def backfill_catalog(backend):
+    """Fills in the catalog columns of checkpoints exported before the
+    catalog.
+
+    The export time of these checkpoints is unknown, and stays NULL.
+
+    Args:
+        backend (StorageBackend): The started backend.
+
+    Returns:
+        int: The number of checkpoints filled in.
+    """
+    ids = [row_id for (row_id,) in backend.execute_parametrized_query(
+        "SELECT id FROM {} WHERE trade_count IS NULL;".format(
+            FCF_STATE_TABLE), ())]
+    filled = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        rows = backend.execute_parametrized_query(
+            "SELECT id, state FROM {} WHERE id IN ({});".format(
+                FCF_STATE_TABLE, ", ".join(["%s"] * len(batch))),
+            tuple(batch))
+        for row_id, state in rows:
+            try:
+                checkpoint = decode_checkpoint(state)
+            except Exception as exc:
+                logging.warning("Skipping checkpoint %s: %r", row_id, exc)
+                continue
+            metadata = catalog_metadata(checkpoint, None)
+            backend.execute_parametrized_query(
+                "UPDATE {} SET {} WHERE id = %s;".format(
+                    FCF_STATE_TABLE,
+                    ", ".join("{} = %s".format(column)
+                              for column in FCF_STATE_CATALOG_COLUMNS)),
+                tuple(metadata[column] for column in FCF_STATE_CATALOG_COLUMNS)
+                + (row_id,))
+            filled += 1
+        backend.commit()
+    return filled
+
+
+def catalog_metadata(checkpoint, export_timestamp):
+    """Extracts the catalog columns of a checkpoint.
+
+    Balances are those of the StatTracker's Traders, if attached, or else
+    of its dry run exchanges.  Without a StatTracker the trade count is 0,
+    so the checkpoint is not selected by `backfill_catalog` again.
+
+    Args:
+        checkpoint (FCFCheckpoint): The checkpoint.
+        export_timestamp (int): The time of export, or None if unknown.
+
+    Returns:
+        dict: The value of each of FCF_STATE_CATALOG_COLUMNS.
+    """
+    metadata = dict.fromkeys(FCF_STATE_CATALOG_COLUMNS)
+    metadata['export_timestamp'] = export_timestamp
+    metadata['trade_count'] = 0
+
+    state = checkpoint.strategy_state
+    if state is not None:
+        if state.momentum is not None:
+            metadata['momentum'] = state.momentum.value
+        if state.target_tracker is not None:
+            metadata['target_index'] = state.target_tracker._target_index
+            metadata['last_target_index'] = (
+                state.target_tracker._last_target_index)
+
+    stat_tracker = checkpoint.stat_tracker
+    if stat_tracker is not None:
+        metadata['trade_count'] = stat_tracker.trade_count
+        for prefix in ('e1', 'e2'):
+            trader = getattr(stat_tracker, prefix, None)
+            dry_run = getattr(stat_tracker, 'dry_run_' + prefix, None)
+            if trader is not None:
+                base_bal, quote_bal = trader.base_bal, trader.quote_bal
+            elif dry_run is not None:
+                base_bal = dry_run.base_balance
+                quote_bal = dry_run.quote_balance
+            else:
+                continue
+            metadata[prefix + '_bal_base'] = base_bal
+            metadata[prefix + '_bal_quote'] = quote_bal
+    return metadata
+
+
+def compact_catalog(backend, now, keep_latest=DEFAULT_KEEP_LATEST,
+                    keep_days=DEFAULT_KEEP_DAYS, dry_run=False):
+    """Deletes the checkpoints expired by the retention policy.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        now (int): The current time.
+        keep_latest (int, optional): Defaults to DEFAULT_KEEP_LATEST. The
+            number of most recent checkpoints kept per config.
+        keep_days (int, optional): Defaults to DEFAULT_KEEP_DAYS. The
+            number of days for which the last checkpoint of each day is
+            kept.
+        dry_run (bool, optional): Defaults to False. Whether to only
+            return the expired checkpoints, without deleting them.
+
+    Returns:
+        list[CatalogEntry]: The expired checkpoints.
+    """
+    expired = select_expired(
+        list_checkpoints(backend), now, keep_latest, keep_days)
+    if dry_run:
+        return expired
+
+    for start in range(0, len(expired), BATCH_SIZE):
+        batch = [entry.id for entry in expired[start:start + BATCH_SIZE]]
+        backend.execute_parametrized_query(
+            "DELETE FROM {} WHERE id IN ({});".format(
+                FCF_STATE_TABLE, ", ".join(["%s"] * len(batch))),
+            tuple(batch))
+        backend.commit()
+    return expired
+
+
+def list_checkpoints(backend, config_id=None, limit=None):
+    """Lists the cataloged checkpoints, newest first.
+
+    Checkpoints of unknown export time are listed last.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        config_id (str, optional): Only list the checkpoints of this
+            config.
+        limit (int, optional): The maximum number of checkpoints.
+
+    Returns:
+        list[CatalogEntry]: The checkpoints.
+    """
+    if config_id is None:
+        return _select_entries(backend, "", (), limit)
+    return _select_entries(
+        backend, "WHERE autotrageur_config_id = %s", (config_id,), limit)
+
+
+def select_expired(entries, now, keep_latest=DEFAULT_KEEP_LATEST,
+                   keep_days=DEFAULT_KEEP_DAYS):
+    """Selects the checkpoints expired by the retention policy.
+
+    Per config, the `keep_latest` most recent checkpoints are kept, along
+    with the last checkpoint of each of the past `keep_days` days.  Older
+    checkpoints, and those of unknown export time beyond the most recent,
+    expire.
+
+    Args:
+        entries (list[CatalogEntry]): The checkpoints.
+        now (int): The current time.
+        keep_latest (int, optional): Defaults to DEFAULT_KEEP_LATEST.
+        keep_days (int, optional): Defaults to DEFAULT_KEEP_DAYS.
+
+    Returns:
+        list[CatalogEntry]: The expired checkpoints.
+    """
+    by_config = defaultdict(list)
+    for entry in entries:
+        by_config[entry.autotrageur_config_id].append(entry)
+
+    cutoff = now - keep_days * SECONDS_PER_DAY
+    expired = []
+    for config_entries in by_config.values():
+        config_entries.sort(
+            key=lambda entry: entry.export_timestamp or 0, reverse=True)
+        kept_days = set()
+        for index, entry in enumerate(config_entries):
+            timestamp = entry.export_timestamp
+            if index < keep_latest:
+                kept = True
+            elif timestamp is None or timestamp < cutoff:
+                kept = False
+            else:
+                kept = timestamp // SECONDS_PER_DAY not in kept_days
+            if kept and timestamp is not None:
+                kept_days.add(timestamp // SECONDS_PER_DAY)
+            if not kept:
+                expired.append(entry)
+    return expired
@@ -0,0 +1,445 @@
+"""Compact, schema-versioned encoding of the FCFCheckpoint.
+
+A checkpoint is encoded as a magic number and schema version, followed by
+the checkpoint's values in a msgpack-style binary format.  Objects are
+encoded as arrays of their fields, in the order given by the schema
+version, so no class or field names are stored and decoding imports
+nothing beyond the classes being restored.
+
+Value tags:
+    0x00 - 0x7f     positive fixint
+    0x90 - 0x9f     array of up to 15 values
+    0xa0 - 0xbf     UTF-8 string of up to 31 bytes
+    0xc0            None
+    0xc2, 0xc3      False, True
+    0xcb            float64
+    0xd3            int64
+    0xd4            Decimal, as its string, of up to 255 bytes
+    0xd9, 0xda      UTF-8 string, with a uint8 or uint16 length
+    0xdc            array, with a uint16 length
+    0xe0 - 0xff     negative fixint
+
+When the encoded fields change, bump CHECKPOINT_SCHEMA_VERSION and register
+a migration from the previous version with `migration`; migrations operate
+on the decoded arrays, before any object is constructed.  Checkpoints
+exported before this codec are pickles, and are still decoded as such.
+"""
+import pickle
+import struct
+from decimal import Decimal
+
+from autotrageur.bot.arbitrage.autotrageur import Configuration
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
+from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_ladder import TargetLadder
+from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
+from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
+from autotrageur.bot.common.enums import Momentum
+from autotrageur.bot.trader.dry_run import DryRunExchange
+
+# Leading bytes of an encoded checkpoint.
+CHECKPOINT_MAGIC = b'FCFC'
+
+# The schema version written by `encode_checkpoint`.
+CHECKPOINT_SCHEMA_VERSION = 1
+
+# Header: magic and schema version.
+_HEADER = struct.Struct('>4sH')
+
+# Fixed-width values following their tag.
+_FLOAT64 = struct.Struct('>d')
+_INT64 = struct.Struct('>q')
+_UINT16 = struct.Struct('>H')
+
+# Bounds of the fixed-width values.
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_UINT16_MAX = 0xffff
+
+# Tags of the non-fixed types.
+_NONE = 0xc0
+_FALSE = 0xc2
+_TRUE = 0xc3
+_FLOAT = 0xcb
+_INT = 0xd3
+_DECIMAL = 0xd4
+_STR8 = 0xd9
+_STR16 = 0xda
+_ARRAY16 = 0xdc
+
+# Migrations of the decoded checkpoint, by the version they migrate from.
+_MIGRATIONS = {}
+
+
+class CheckpointCodecError(Exception):
+    """Exception when a checkpoint cannot be encoded or decoded."""
+    pass
+
+
+def migration(from_version):
+    """Registers a migration of decoded checkpoints.
+
+    The decorated function takes the decoded arrays of a checkpoint at
+    `from_version` and returns them at the next version.
+
+    Args:
+        from_version (int): The schema version migrated from.
+
+    Returns:
+        func: The decorator.
+    """
+    def register(func):
+        _MIGRATIONS[from_version] = func
+        return func
+    return register
+
+
+def _pack(value, out):
+    """Appends the encoding of a value.
+
+    Args:
+        value: A None, bool, int, float, Decimal, str, list or tuple.
+        out (bytearray): The encoded bytes.
+
+    Raises:
+        CheckpointCodecError: If the value cannot be encoded.
+    """
+    value_type = type(value)
+    if value_type is Decimal:
+        text = str(value).encode('ascii')
+        if len(text) > 0xff:
+            raise CheckpointCodecError(
+                "Cannot encode Decimal {} of over 255 characters.".format(
+                    value))
+        out.append(_DECIMAL)
+        out.append(len(text))
+        out += text
+    elif value is None:
+        out.append(_NONE)
+    elif value_type is bool:
+        out.append(_TRUE if value else _FALSE)
+    elif value_type is int:
+        if 0 <= value <= 0x7f:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xff)
+        elif _INT64_MIN <= value <= _INT64_MAX:
+            out.append(_INT)
+            out += _INT64.pack(value)
+        else:
+            raise CheckpointCodecError(
+                "Cannot encode int {} outside of 64 bits.".format(value))
+    elif value_type is str:
+        text = value.encode('utf-8')
+        if len(text) < 32:
+            out.append(0xa0 | len(text))
+        elif len(text) <= 0xff:
+            out.append(_STR8)
+            out.append(len(text))
+        elif len(text) <= _UINT16_MAX:
+            out.append(_STR16)
+            out += _UINT16.pack(len(text))
+        else:
+            raise CheckpointCodecError(
+                "Cannot encode str of over {} bytes.".format(_UINT16_MAX))
+        out += text
+    elif value_type is list or value_type is tuple:
+        if len(value) < 16:
+            out.append(0x90 | len(value))
+        elif len(value) <= _UINT16_MAX:
+            out.append(_ARRAY16)
+            out += _UINT16.pack(len(value))
+        else:
+            raise CheckpointCodecError(
+                "Cannot encode array of over {} items.".format(_UINT16_MAX))
+        for item in value:
+            _pack(item, out)
+    elif value_type is float:
+        out.append(_FLOAT)
+        out += _FLOAT64.pack(value)
+    else:
+        raise CheckpointCodecError(
+            "Cannot encode {!r} of type {}.".format(value, value_type))
+
+
+def _unpack(data, offset):
+    """Decodes the value at an offset.
+
+    Arrays are decoded as lists.
+
+    Args:
+        data (bytes): The encoded bytes.
+        offset (int): The offset of the value's tag.
+
+    Returns:
+        tuple: The value, and the offset following it.
+
+    Raises:
+        CheckpointCodecError: If the tag is unknown.
+    """
+    tag = data[offset]
+    offset += 1
+    if tag <= 0x7f:
+        return tag, offset
+    if tag == _DECIMAL:
+        end = offset + 1 + data[offset]
+        return Decimal(data[offset + 1:end].decode('ascii')), end
+    if 0x90 <= tag <= 0x9f or tag == _ARRAY16:
+        if tag == _ARRAY16:
+            (length,) = _UINT16.unpack_from(data, offset)
+            offset += _UINT16.size
+        else:
+            length = tag & 0x0f
+        items = []
+        for _ in range(length):
+            # Decimals make up most of a checkpoint, so skip the call.
+            if data[offset] == _DECIMAL:
+                end = offset + 2 + data[offset + 1]
+                items.append(Decimal(data[offset + 2:end].decode('ascii')))
+                offset = end
+            else:
+                item, offset = _unpack(data, offset)
+                items.append(item)
+        return items, offset
+    if 0xa0 <= tag <= 0xbf or tag in (_STR8, _STR16):
+        if tag == _STR8:
+            length = data[offset]
+            offset += 1
+        elif tag == _STR16:
+            (length,) = _UINT16.unpack_from(data, offset)
+            offset += _UINT16.size
+        else:
+            length = tag & 0x1f
+        end = offset + length
+        return data[offset:end].decode('utf-8'), end
+    if tag == _NONE:
+        return None, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag >= 0xe0:
+        return tag - 0x100, offset
+    if tag == _INT:
+        return _INT64.unpack_from(data, offset)[0], offset + _INT64.size
+    if tag == _FLOAT:
+        return _FLOAT64.unpack_from(data, offset)[0], offset + _FLOAT64.size
+    raise CheckpointCodecError(
+        "Unknown tag {:#x} at byte {}.".format(tag, offset - 1))
+
+
+def _encode_dry_run_exchange(exchange):
+    """Gets the fields of a DryRunExchange.
+
+    Args:
+        exchange (DryRunExchange): The exchange, or None.
+
+    Returns:
+        list: The fields, or None.
+    """
+    if exchange is None:
+        return None
+    return [exchange.name, exchange.base, exchange.quote,
+            exchange.base_balance, exchange.quote_balance,
+            exchange.base_fees, exchange.quote_fees, exchange.trade_count]
+
+
+def _decode_dry_run_exchange(fields):
+    """Restores a DryRunExchange.
+
+    Args:
+        fields (list): The fields, or None.
+
+    Returns:
+        DryRunExchange: The exchange, or None.
+    """
+    if fields is None:
+        return None
+    (name, base, quote, base_balance, quote_balance, base_fees, quote_fees,
+     trade_count) = fields
+    exchange = DryRunExchange(name, base, quote, base_balance, quote_balance)
+    exchange.base_fees = base_fees
+    exchange.quote_fees = quote_fees
+    exchange.trade_count = trade_count
+    return exchange
+
+
+def _encode_strategy_state(state):
+    """Gets the fields of an FCFStrategyState.
+
+    Args:
+        state (FCFStrategyState): The strategy state, or None.
+
+    Returns:
+        list: The fields, or None.
+    """
+    if state is None:
+        return None
+    tracker = state.target_tracker
+    chunker = state.trade_chunker
+    return [
+        state.has_started, state.h_to_e1_max, state.h_to_e2_max,
+        None if state.momentum is None else state.momentum.value,
+        _encode_targets(state.e1_targets), _encode_targets(state.e2_targets),
+        [tracker._target_index, tracker._last_target_index],
+        [chunker._max_trade_size, chunker._target,
+         chunker._current_trade_size, chunker.trade_completed]
+    ]
+
+
+def _encode_targets(targets):
+    """Flattens targets into one array.
+
+    Args:
+        targets (TargetLadder): The targets, or None.
+
+    Returns:
+        list: The spreads and volumes of the targets, alternating, or None.
+    """
+    if targets is None:
+        return None
+    return [value for target in targets for value in target]
+
+
+def _decode_targets(values):
+    """Restores targets.
+
+    Args:
+        values (list): The output of `_encode_targets`.
+
+    Returns:
+        TargetLadder: The targets, or None.
+    """
+    if values is None:
+        return None
+    return TargetLadder(values[0::2], values[1::2])
+
+
+def _decode_strategy_state(fields):
+    """Restores an FCFStrategyState.
+
+    Args:
+        fields (list): The fields, or None.
+
+    Returns:
+        FCFStrategyState: The strategy state, or None.
+    """
+    if fields is None:
+        return None
+    (has_started, h_to_e1_max, h_to_e2_max, momentum, e1_targets, e2_targets,
+     tracker_fields, chunker_fields) = fields
+    state = FCFStrategyState(has_started, h_to_e1_max, h_to_e2_max)
+    state.momentum = None if momentum is None else Momentum(momentum)
+    state.e1_targets = _decode_targets(e1_targets)
+    state.e2_targets = _decode_targets(e2_targets)
+
+    state.target_tracker = FCFTargetTracker()
+    (state.target_tracker._target_index,
+     state.target_tracker._last_target_index) = tracker_fields
+
+    max_trade_size, target, current_trade_size, trade_completed = (
+        chunker_fields)
+    state.trade_chunker = FCFTradeChunker(max_trade_size)
+    state.trade_chunker._target = target
+    state.trade_chunker._current_trade_size = current_trade_size
+    state.trade_chunker.trade_completed = trade_completed
+    return state
+
+
+def _encode_stat_tracker(stat_tracker):
+    """Gets the fields of an FCFStatTracker.
+
+    The attached Traders are not encoded.
+
+    Args:
+        stat_tracker (FCFStatTracker): The stat tracker, or None.
+
+    Returns:
+        list: The fields, or None.
+    """
+    if stat_tracker is None:
+        return None
+    return [stat_tracker.id, stat_tracker.trade_count,
+            _encode_dry_run_exchange(stat_tracker.dry_run_e1),
+            _encode_dry_run_exchange(stat_tracker.dry_run_e2)]
+
+
+def _decode_stat_tracker(fields):
+    """Restores an FCFStatTracker, without Traders.
+
+    Args:
+        fields (list): The fields, or None.
+
+    Returns:
+        FCFStatTracker: The stat tracker, or None.
+    """
+    if fields is None:
+        return None
+    stat_tracker_id, trade_count, dry_run_e1, dry_run_e2 = fields
+    # As when unpickling, the Traders are attached after restoring.
+    stat_tracker = FCFStatTracker.__new__(FCFStatTracker)
+    stat_tracker.id = stat_tracker_id
+    stat_tracker.trade_count = trade_count
+    stat_tracker.dry_run_e1 = _decode_dry_run_exchange(dry_run_e1)
+    stat_tracker.dry_run_e2 = _decode_dry_run_exchange(dry_run_e2)
+    return stat_tracker
+
+
+def decode_checkpoint(data):
+    """Decodes a checkpoint.
+
+    Args:
+        data (bytes): The output of `encode_checkpoint`, or a pickled
+            FCFCheckpoint from before the codec.
+
+    Returns:
+        FCFCheckpoint: The restored checkpoint, with the StatTracker's
+            Traders detached.
+
+    Raises:
+        CheckpointCodecError: If the schema version is newer than
+            CHECKPOINT_SCHEMA_VERSION, or has no migration.
+    """
+    data = bytes(data)
+    if not data.startswith(CHECKPOINT_MAGIC):
+        return pickle.loads(data)
+
+    _, version = _HEADER.unpack_from(data)
+    if version > CHECKPOINT_SCHEMA_VERSION:
+        raise CheckpointCodecError(
+            "Checkpoint schema version {} is newer than {}.".format(
+                version, CHECKPOINT_SCHEMA_VERSION))
+    fields, _ = _unpack(data, _HEADER.size)
+    while version < CHECKPOINT_SCHEMA_VERSION:
+        if version not in _MIGRATIONS:
+            raise CheckpointCodecError(
+                "No migration from checkpoint schema version {}.".format(
+                    version))
+        fields = _MIGRATIONS[version](fields)
+        version += 1
+
+    config, strategy_state, stat_tracker = fields
+    return FCFCheckpoint(
+        config=None if config is None else Configuration(*config),
+        strategy_state=_decode_strategy_state(strategy_state),
+        stat_tracker=_decode_stat_tracker(stat_tracker))
+
+
+def encode_checkpoint(checkpoint):
+    """Encodes a checkpoint.
+
+    Args:
+        checkpoint (FCFCheckpoint): The checkpoint.
+
+    Returns:
+        bytes: The encoded checkpoint.
+    """
+    out = bytearray(
+        _HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_SCHEMA_VERSION))
+    _pack([
+        None if checkpoint.config is None else list(checkpoint.config),
+        _encode_strategy_state(checkpoint.strategy_state),
+        _encode_stat_tracker(checkpoint.stat_tracker)
+    ], out)
+    return bytes(out)
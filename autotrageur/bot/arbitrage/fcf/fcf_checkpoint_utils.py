@@ -6,6 +6,9 @@ Responsibilities:
 Please read the `pickle_fcf_checkpoint` and `unpickle_fcf_checkpoint` functions
 carefully.  The two functions are both responsible for pickling/exporting and
 restoring an FCFCheckpoint object in a way that is backwards-compatible.
+
+NOTE: Checkpoints are now exported with `fcf_checkpoint_codec`.  These
+functions remain to restore the checkpoints exported as pickles.
 """
 from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import (CURRENT_FCF_CHECKPOINT_VERSION,
                                                           FCFCheckpoint)
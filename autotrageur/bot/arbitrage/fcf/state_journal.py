@@ -0,0 +1,381 @@
+"""Crash-consistent journal of the bot's state.
+
+The journal is a directory holding a full snapshot of the FCFCheckpoint and
+an append-only write-ahead log of the strategy state fields changed since.
+Each poll appends only the fields which changed, a few bytes, instead of
+pickling the whole checkpoint.  The log is compacted into a new snapshot
+periodically and after each trade.
+
+Records are framed with their length and CRC, so a record torn by a crash is
+detected and dropped on load.  Each append is a single write to the file,
+which survives the process being killed; the log is fsynced at most once per
+interval, bounding what a power loss can lose.  Snapshots carry the sequence
+number of the last record they include, so records left over from an
+interrupted compaction are skipped.
+
+Journals of runs idle for longer than the retention period are pruned by
+`prune_journals` when a bot starts.  An open journal holds a shared lock on
+its log, so the journal of a running bot is never pruned.
+"""
+import fcntl
+import logging
+import os
+import pickle
+import shutil
+import struct
+import time
+import zlib
+
+# Directory holding one journal per bot run.
+STATE_JOURNAL_DIR = os.path.join('data', 'state')
+
+# Default number of records after which the log should be compacted.
+DEFAULT_COMPACT_EVERY = 1000
+
+# Default minimum seconds between fsyncs of the log.
+DEFAULT_FSYNC_INTERVAL = 1.0
+
+# Default seconds a journal is kept after its last write; a week.
+DEFAULT_JOURNAL_RETENTION = 7 * 24 * 60 * 60
+
+# File names within a journal directory.
+SNAPSHOT_FILE = 'snapshot'
+WAL_FILE = 'wal'
+
+# Record header: payload length and CRC32.
+_RECORD_HEADER = struct.Struct('<II')
+
+# Snapshot header: sequence number of the last included record.
+_SNAPSHOT_HEADER = struct.Struct('<Q')
+
+# Strategy state attributes journaled through their own fields.
+_NESTED_STATE = ('target_tracker', 'trade_chunker')
+
+
+def _read_records(path):
+    """Reads the intact records of a log.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        list[tuple(int, dict)]: The sequence numbers and fields of the
+            records, up to the first torn or corrupt one.
+    """
+    try:
+        with open(path, 'rb') as wal:
+            data = wal.read()
+    except FileNotFoundError:
+        return []
+
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logging.warning("Dropping torn state journal record at byte %d "
+                            "of %s.", offset, path)
+            break
+        records.append(pickle.loads(payload))
+        offset = start + length
+    return records
+
+
+def _write_durably(path, data):
+    """Atomically replaces a file, syncing it to disk.
+
+    Args:
+        path (str): The file.
+        data (bytes): The new contents.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def apply_strategy_fields(state, fields):
+    """Sets journaled fields on a strategy state.
+
+    Args:
+        state (FCFStrategyState): The strategy state.
+        fields (dict): The fields, as given by `capture_strategy_state`.
+    """
+    for name, value in fields.items():
+        owner, _, attr = name.rpartition('.')
+        setattr(getattr(state, owner) if owner else state, attr, value)
+
+
+def capture_strategy_state(state):
+    """Captures the fields of a strategy state.
+
+    The target tracker and trade chunker are flattened into fields named
+    `<attribute>.<field>`, so a change to either journals only that field.
+
+    Args:
+        state (FCFStrategyState): The strategy state.
+
+    Returns:
+        dict: The fields, by name.
+    """
+    fields = {
+        name: value for name, value in vars(state).items()
+        if name not in _NESTED_STATE
+    }
+    for nested in _NESTED_STATE:
+        for name, value in vars(getattr(state, nested)).items():
+            fields['{}.{}'.format(nested, name)] = value
+    return fields
+
+
+def journal_exists(directory):
+    """Checks whether a journal with a snapshot exists.
+
+    Args:
+        directory (str): The journal directory.
+
+    Returns:
+        bool: Whether the journal can be loaded.
+    """
+    return os.path.isfile(os.path.join(directory, SNAPSHOT_FILE))
+
+
+def _is_open(directory):
+    """Checks whether a journal is open by a StateJournal.
+
+    Args:
+        directory (str): The journal directory.
+
+    Returns:
+        bool: Whether the log is locked by an open journal.
+    """
+    try:
+        fd = os.open(os.path.join(directory, WAL_FILE), os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def prune_journals(root=STATE_JOURNAL_DIR,
+                   retention=DEFAULT_JOURNAL_RETENTION, clock=time.time):
+    """Removes the closed journals not written to within the retention
+    period.
+
+    Args:
+        root (str, optional): Defaults to STATE_JOURNAL_DIR. The directory
+            holding the journals.
+        retention (float, optional): Defaults to DEFAULT_JOURNAL_RETENTION.
+            The seconds a journal is kept after its last write.
+        clock (func, optional): Defaults to time.time. Returns the current
+            time in seconds since the epoch.
+
+    Returns:
+        int: The number of journals removed.
+    """
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    cutoff = clock() - retention
+    for name in names:
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory):
+            continue
+        paths = [directory] + [os.path.join(directory, file_name)
+                               for file_name in (SNAPSHOT_FILE, WAL_FILE)]
+        last_write = max(os.path.getmtime(path) for path in paths
+                         if os.path.exists(path))
+        if last_write < cutoff and not _is_open(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+    if removed:
+        logging.info("Pruned %d state journals.", removed)
+    return removed
+
+
+def _read_snapshot(directory):
+    """Reads the snapshot of a journal.
+
+    Args:
+        directory (str): The journal directory.
+
+    Returns:
+        tuple(int, bytes): The sequence number of the last record included
+            in the snapshot, and the snapshot.
+    """
+    with open(os.path.join(directory, SNAPSHOT_FILE), 'rb') as snapshot_file:
+        data = snapshot_file.read()
+    (snapshot_seq,) = _SNAPSHOT_HEADER.unpack_from(data)
+    return snapshot_seq, data[_SNAPSHOT_HEADER.size:]
+
+
+def load_journal(directory):
+    """Loads a journal.
+
+    Args:
+        directory (str): The journal directory.
+
+    Returns:
+        tuple(bytes, list[dict]): The snapshot, and the fields of the
+            records written after it, in order.
+    """
+    snapshot_seq, snapshot = _read_snapshot(directory)
+    records = _read_records(os.path.join(directory, WAL_FILE))
+    return snapshot, [fields for seq, fields in records if seq > snapshot_seq]
+
+
+class StateJournal():
+    """Writes the journal of one bot run.
+
+    A single process is expected to write to a journal at a time.
+    """
+
+    def __init__(self, directory, compact_every=DEFAULT_COMPACT_EVERY,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, clock=time.monotonic):
+        """Constructor.
+
+        Creates the directory, continuing an existing journal.
+
+        Args:
+            directory (str): The journal directory.
+            compact_every (int, optional): Defaults to
+                DEFAULT_COMPACT_EVERY. The number of records after which
+                `needs_compaction` is True.
+            fsync_interval (float, optional): Defaults to
+                DEFAULT_FSYNC_INTERVAL. The minimum seconds between fsyncs
+                of the log.
+            clock (func, optional): Defaults to time.monotonic. Returns the
+                current time in seconds.
+        """
+        self.directory = directory
+        self.compact_every = compact_every
+        self.fsync_interval = fsync_interval
+        self.clock = clock
+        self.record_count = 0
+        self.snapshot_count = 0
+        self.fsync_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue the sequence past both the snapshot and the log.
+        records = _read_records(os.path.join(directory, WAL_FILE))
+        self._has_snapshot = journal_exists(directory)
+        snapshot_seq = (
+            _read_snapshot(directory)[0] if self._has_snapshot else 0)
+        self._seq = max([snapshot_seq] + [seq for seq, _ in records])
+        self._pending = len(records)
+        self._fields = None
+        self._last_sync = clock()
+        self._unsynced = False
+        self._fd = os.open(os.path.join(directory, WAL_FILE),
+                           os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        # Marks the journal as open, see `prune_journals`.
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def __fsync_directory(self):
+        """Syncs the directory entries, making renames durable."""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """Syncs and closes the log.  Closing again has no effect."""
+        if self._fd is None:
+            return
+        self.sync()
+        os.close(self._fd)
+        self._fd = None
+
+    def compact(self, snapshot, fields):
+        """Replaces the snapshot and empties the log.
+
+        Args:
+            snapshot (bytes): The full state.
+            fields (dict): The captured fields of the state in the
+                snapshot; later records are relative to them.
+        """
+        _write_durably(
+            os.path.join(self.directory, SNAPSHOT_FILE),
+            _SNAPSHOT_HEADER.pack(self._seq) + snapshot)
+        self.__fsync_directory()
+        os.ftruncate(self._fd, 0)
+        os.fsync(self._fd)
+        self._fields = dict(fields)
+        self._has_snapshot = True
+        self._pending = 0
+        self._unsynced = False
+        self._last_sync = self.clock()
+        self.snapshot_count += 1
+
+    def log_stats(self):
+        """Logs the journal activity."""
+        logging.info(
+            "State journal: %d records, %d snapshots, %d fsyncs.",
+            self.record_count, self.snapshot_count, self.fsync_count)
+
+    def needs_compaction(self):
+        """Whether a snapshot should be written.
+
+        Returns:
+            bool: True if there is no snapshot yet, or enough records
+                accumulated since the last one.
+        """
+        return not self._has_snapshot or self._pending >= self.compact_every
+
+    def record(self, fields):
+        """Appends the fields which changed since the last record or
+        snapshot.
+
+        Args:
+            fields (dict): The captured fields of the current state.
+
+        Records appended earlier are synced once the fsync interval has
+        passed, whether or not the fields changed.
+
+        Returns:
+            bool: Whether a record was appended.
+        """
+        if self._fields is None:
+            changed = dict(fields)
+        else:
+            changed = {
+                name: value for name, value in fields.items()
+                if name not in self._fields or self._fields[name] != value
+            }
+        if changed:
+            self._seq += 1
+            payload = pickle.dumps(
+                (self._seq, changed), pickle.HIGHEST_PROTOCOL)
+            os.write(self._fd, _RECORD_HEADER.pack(
+                len(payload), zlib.crc32(payload)) + payload)
+            self._fields = dict(fields)
+            self._pending += 1
+            self._unsynced = True
+            self.record_count += 1
+        if (self._unsynced
+                and self.clock() - self._last_sync >= self.fsync_interval):
+            self.sync()
+        return bool(changed)
+
+    def sync(self):
+        """Syncs the appended records to disk."""
+        if self._unsynced:
+            os.fsync(self._fd)
+            self.fsync_count += 1
+            self._unsynced = False
+        self._last_sync = self.clock()
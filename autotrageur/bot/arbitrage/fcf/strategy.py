@@ -4,13 +4,20 @@ from collections import namedtuple
 import ccxt
 
 import autotrageur.bot.arbitrage.arbseeker as arbseeker
+import autotrageur.bot.arbitrage.spreadcalculator as spreadcalculator
+from autotrageur.bot.arbitrage.fcf.target_ladder import TargetLadder
 from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
 from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
 from autotrageur.bot.common.enums import Momentum
 from autotrageur.bot.trader.ccxt_trader import OrderbookException
-from fp_libs.constants.decimal_constants import ONE
+from fp_libs.constants.ccxt_constants import BUY_SIDE
+from fp_libs.constants.decimal_constants import ONE, ZERO
 from fp_libs.utilities import num_to_decimal
 
+# Relative slack given to the trigger ratios of the poll screen, so that
+# rounding never screens out a poll whose spread reaches its trigger.
+SCREEN_MARGIN = num_to_decimal('0.000000001')
+
 
 # See https://stackoverflow.com/questions/1606436/adding-docstrings-to-namedtuples
 class TradeMetadata(namedtuple('TradeMetadata', [
@@ -28,6 +35,22 @@ class TradeMetadata(namedtuple('TradeMetadata', [
     __slots__ = ()
 
 
+class PollTriggers(namedtuple('PollTriggers', [
+        'to_e1_ratio', 'to_e2_ratio', 'price_basis'])):
+    """The top-of-book prices at which a poll can change the strategy.
+
+    Args:
+        to_e1_ratio (float): The ratio of the best e1 bid to the best e2 ask,
+            in quote currency, below which the poll can neither hit a TO_E1
+            target nor raise h_to_e1_max.
+        to_e2_ratio (float): The ratio of the best e2 bid to the best e1 ask
+            below which the same holds TO_E2.
+        price_basis (tuple(Decimal)): The taker fees and quote USD values the
+            ratios were calculated with.
+    """
+    __slots__ = ()
+
+
 class InsufficientCryptoBalance(Exception):
     """Thrown when there is not enough crypto balance to fulfill the matching
     sell order."""
@@ -202,6 +225,12 @@ class FCFStrategy():
 
         self.target_tracker = FCFTargetTracker()
         self.trade_chunker = FCFTradeChunker(max_trade_size)
+        self._last_spread_opp = None
+
+        # If set, polls are screened by `_triggers` before the spreads are
+        # calculated.
+        self.screen_polls = False
+        self._triggers = None
 
         # Save any stateful objects to the Strategy State.
         self.state.target_tracker = self.target_tracker
@@ -266,31 +295,52 @@ class FCFStrategy():
             from_balance (Decimal): The balance on the buy exchange.
 
         Returns:
-            list: The list of (spread, cash position) tuple targets.
+            TargetLadder: The (spread, cash position) targets.
         """
         t_num = int((h_max - spread) / self.spread_min)
 
         if t_num <= 1:
             # Volume should be calculated with leftover wallet balance at this
             # point as we've reached the h_to_e1_max.
-            targets = [(
-                max(h_max, spread + self.spread_min),
-                from_balance
-            )]
-            return targets
+            return TargetLadder(
+                [max(h_max, spread + self.spread_min)], [from_balance])
 
         inc = (h_max - spread) / num_to_decimal(t_num)
-        x = (from_balance / self.vol_min) ** (ONE / (t_num - ONE))
-        targets = []
-        for i in range(1, t_num + 1):
-            if self.vol_min >= from_balance:
-                # Min vol will empty from_balance on buying exchange.
-                position = from_balance
-            else:
-                position = self.vol_min * (x ** (num_to_decimal(i) - ONE))
-            targets.append((spread + num_to_decimal(i) * inc, position))
-
-        return targets
+        return TargetLadder.geometric(
+            spread, inc, t_num, self.vol_min, from_balance)
+
+    def __calc_trigger_ratio(self, targets, h_max, is_momentum_change,
+                             buy_trader, buy_fee, sell_fee, usd_ratio):
+        """Calculates the trigger ratio of one direction.
+
+        The poll changes the strategy if the spread reaches the next target,
+        or the historical max.  The lower of the two is inverted into the
+        lowest ratio of the sell to the buy price at which it can happen.
+
+        Args:
+            targets (TargetLadder): The targets of the direction.
+            h_max (Decimal): The historical max spread of the direction.
+            is_momentum_change (bool): Whether the next trade of the
+                direction would be a momentum change.
+            buy_trader (CCXTTrader): The trader to buy with.
+            buy_fee (Decimal): The taker fee of the buy exchange.
+            sell_fee (Decimal): The taker fee of the sell exchange.
+            usd_ratio (Decimal): The USD value of one unit of the buy quote
+                currency over that of the sell quote currency.
+
+        Returns:
+            float: The ratio of the sell to the buy price in quote currency,
+                less SCREEN_MARGIN.
+        """
+        spread = h_max
+        target_spread = self.target_tracker.get_next_target_spread(
+            targets, is_momentum_change)
+        if target_spread is not None:
+            spread = min(spread, target_spread)
+
+        ratio = spreadcalculator.calc_trigger_ratio(
+            spread, buy_fee, sell_fee, buy_trader.get_buy_target_includes_fee())
+        return float(ratio * usd_ratio * (ONE - SCREEN_MARGIN))
 
     def __check_within_limits(self):
         """Check whether potential trade meets minimum volume limits.
@@ -338,6 +388,19 @@ class FCFStrategy():
             self.state.e2_targets,
             spread_opp)
 
+    def __get_price_basis(self):
+        """Gets the fees and forex ratios the trigger ratios depend on.
+
+        Returns:
+            tuple(Decimal): The taker fees of e1 and e2, and the USD values of
+                one unit of their quote currencies.
+        """
+        trader1 = self._manager.trader1
+        trader2 = self._manager.trader2
+        return (trader1.get_taker_fee(), trader2.get_taker_fee(),
+                trader1.get_usd_from_quote(ONE),
+                trader2.get_usd_from_quote(ONE))
+
     def __get_min_target_amount(self):
         """Fetch the minimum target amount that the exchanges support.
 
@@ -410,6 +473,73 @@ class FCFStrategy():
 
         return False
 
+    def __is_screened_out(self, orderbooks):
+        """Screens the orderbooks of a poll against the trigger ratios.
+
+        A market buy costs at least the best ask, and a market sell returns
+        at most the best bid, so neither spread of the poll is above the
+        spread of the best prices.
+
+        Args:
+            orderbooks (tuple(dict, dict)): The orderbooks of e1 and e2.
+
+        Returns:
+            bool: Whether neither spread can reach its trigger, so that the
+                poll can be skipped.
+        """
+        triggers = self._triggers
+        if triggers is None or triggers.price_basis != self.__get_price_basis():
+            return False
+
+        ex1_orderbook, ex2_orderbook = orderbooks
+        try:
+            e1_bid, e1_ask = (ex1_orderbook[arbseeker.BIDS][0][0],
+                              ex1_orderbook[arbseeker.ASKS][0][0])
+            e2_bid, e2_ask = (ex2_orderbook[arbseeker.BIDS][0][0],
+                              ex2_orderbook[arbseeker.ASKS][0][0])
+        except IndexError:
+            return False
+
+        return (e1_bid < e2_ask * triggers.to_e1_ratio and
+                e2_bid < e1_ask * triggers.to_e2_ratio)
+
+    def __get_screened_spread_opp(self, orderbooks):
+        """Bounds the spreads of a screened out poll by its best prices.
+
+        The spreads are not calculated for a screened out poll, but no
+        spread of the poll is above the spread of its best prices, which
+        then paces the polls, and checks the balances, in their place.
+
+        Args:
+            orderbooks (tuple(dict, dict)): The orderbooks of e1 and e2,
+                with at least one bid and ask each.
+
+        Returns:
+            SpreadOpportunity: The spreads of the best prices, with the best
+                asks as buy prices and the best bids as sell prices.
+        """
+        trader1 = self._manager.trader1
+        trader2 = self._manager.trader2
+        ex1_orderbook, ex2_orderbook = orderbooks
+        e1_bid, e1_ask = (num_to_decimal(ex1_orderbook[arbseeker.BIDS][0][0]),
+                          num_to_decimal(ex1_orderbook[arbseeker.ASKS][0][0]))
+        e2_bid, e2_ask = (num_to_decimal(ex2_orderbook[arbseeker.BIDS][0][0]),
+                          num_to_decimal(ex2_orderbook[arbseeker.ASKS][0][0]))
+
+        e1_spread = spreadcalculator.calc_fixed_spread(
+            trader2.get_usd_from_quote(e2_ask),
+            trader1.get_usd_from_quote(e1_bid),
+            trader2.get_taker_fee(), trader1.get_taker_fee(),
+            trader2.get_buy_target_includes_fee())
+        e2_spread = spreadcalculator.calc_fixed_spread(
+            trader1.get_usd_from_quote(e1_ask),
+            trader2.get_usd_from_quote(e2_bid),
+            trader1.get_taker_fee(), trader2.get_taker_fee(),
+            trader1.get_buy_target_includes_fee())
+        return arbseeker.SpreadOpportunity(
+            None, e1_spread, e2_spread, e1_ask, e2_ask, e1_bid, e2_bid,
+            trader1.forex_id, trader2.forex_id)
+
     def __prepare_trade(self, is_momentum_change, buy_trader, sell_trader,
                         targets, spread_opp):
         """Set up trade metadata and update target indices.
@@ -458,8 +588,16 @@ class FCFStrategy():
             sell_trader=sell_trader
         )
 
-        required_base = (
-            buy_trader.quote_target_amount / self.trade_metadata.buy_price)
+        # Price the chunk on the polled orderbook; the buy price was quoted
+        # for the full target, which may be larger.
+        try:
+            required_base = buy_trader.get_base_from_orderbook(
+                BUY_SIDE, buy_trader.quote_target_amount)
+        except OrderbookException:
+            required_base = None
+        if required_base is None:
+            required_base = (
+                buy_trader.quote_target_amount / self.trade_metadata.buy_price)
         base = buy_trader.base
 
         if required_base > sell_trader.base_bal:
@@ -486,15 +624,43 @@ class FCFStrategy():
                 self.trade_metadata.spread_opp.e2_spread,
                 self.state.h_to_e2_max,
                 self._manager.trader1.get_adjusted_usd_balance())
-            logging.debug("#### New calculated e2_targets: {}".format(
-                list(enumerate(self.state.e2_targets))))
+            logging.debug("#### New calculated e2_targets: %s",
+                          self.state.e2_targets)
         else:
             self.state.e1_targets = self.__calc_targets(
                 self.trade_metadata.spread_opp.e1_spread,
                 self.state.h_to_e1_max,
                 self._manager.trader2.get_adjusted_usd_balance())
-            logging.debug("#### New calculated e1_targets: {}".format(
-                list(enumerate(self.state.e1_targets))))
+            logging.debug("#### New calculated e1_targets: %s",
+                          self.state.e1_targets)
+
+    def __update_triggers(self):
+        """Updates the trigger ratios of the poll screen.
+
+        Called whenever the targets, target index, momentum or historical
+        maxes may have changed.  The ratios are in quote currency, so they
+        are recalculated if the fees or forex ratios change.
+        """
+        if not (self.screen_polls and self.state.has_started):
+            self._triggers = None
+            return
+
+        trader1 = self._manager.trader1
+        trader2 = self._manager.trader2
+        price_basis = self.__get_price_basis()
+        e1_fee, e2_fee, e1_usd, e2_usd = price_basis
+        momentum = self.state.momentum
+        self._triggers = PollTriggers(
+            to_e1_ratio=self.__calc_trigger_ratio(
+                self.state.e1_targets, self.state.h_to_e1_max,
+                momentum is not Momentum.TO_E1, trader2, e2_fee, e1_fee,
+                e2_usd / e1_usd),
+            to_e2_ratio=self.__calc_trigger_ratio(
+                self.state.e2_targets, self.state.h_to_e2_max,
+                momentum is not Momentum.TO_E2, trader1, e1_fee, e2_fee,
+                e1_usd / e2_usd),
+            price_basis=price_basis)
+        logging.debug("#### Poll trigger ratios: %s", self._triggers)
 
     def clean_up(self):
         """Clean up any state information before the next poll."""
@@ -535,6 +701,35 @@ class FCFStrategy():
         # Calculate the targets after the potential trade so that the wallet
         # balances are the most up to date for the target amounts.
         self.__update_trade_targets()
+        self.__update_triggers()
+
+    def get_target_distance(self):
+        """Get the distance of the last polled spreads to their next targets.
+
+        Returns:
+            Decimal: The smallest distance, as a spread percentage, between a
+                spread and the next target in its direction.  Zero if a
+                target has been reached.  None if there was no successful
+                poll or no target remains.
+        """
+        spread_opp = self._last_spread_opp
+        if spread_opp is None or not self.state.has_started:
+            return None
+
+        momentum = self.state.momentum
+        next_targets = [
+            (spread_opp.e1_spread, self.target_tracker.get_next_target_spread(
+                self.state.e1_targets, momentum is not Momentum.TO_E1)),
+            (spread_opp.e2_spread, self.target_tracker.get_next_target_spread(
+                self.state.e2_targets, momentum is not Momentum.TO_E2))
+        ]
+        distances = [
+            target - spread for spread, target in next_targets
+            if spread is not None and target is not None
+        ]
+        if not distances:
+            return None
+        return max(min(distances), ZERO)
 
     def get_trade_data(self):
         """Get trade metadata.
@@ -547,6 +742,13 @@ class FCFStrategy():
     def poll_opportunity(self):
         """Poll exchanges for arbitrage opportunity.
 
+        If `screen_polls` is set, the best prices of the orderbooks are
+        first compared against the trigger ratios.  A poll which cannot hit
+        a target, nor raise a historical max, is skipped before its spreads
+        are calculated; it is not recorded in the poll telemetry or the
+        spread store.  The spreads of its best prices, an upper bound of
+        its spreads, pace the polls and check the balances instead.
+
         Returns:
             bool: Whether there is an opportunity.
         """
@@ -567,12 +769,36 @@ class FCFStrategy():
         self._manager.trader2.set_rough_sell_amount(trader1_buy_target_amount)
 
         try:
+            orderbooks = None
+            if self.screen_polls:
+                orderbooks = arbseeker.fetch_orderbooks(
+                    self._manager.trader1,
+                    self._manager.trader2,
+                    self._manager.book_fetcher)
+                if self.__is_screened_out(orderbooks):
+                    logging.debug('#### Poll screened out by trigger ratios')
+                    spread_opp = self.__get_screened_spread_opp(orderbooks)
+                    self._last_spread_opp = spread_opp
+                    self._manager.balance_checker.check_crypto_balances(
+                        spread_opp)
+                    return False
+
             spread_opp = arbseeker.get_spreads_by_ob(
-                self._manager.trader1, self._manager.trader2)
+                self._manager.trader1,
+                self._manager.trader2,
+                self._manager.book_fetcher,
+                self._manager.poll_telemetry.sampled,
+                orderbooks=orderbooks)
         except (ccxt.NetworkError, OrderbookException) as exc:
             logging.error(exc, exc_info=True)
+            self._last_spread_opp = None
             return False
 
+        self._last_spread_opp = spread_opp
+        self._manager.poll_telemetry.record(
+            spread_opp, self.target_tracker.get_target_index())
+        self._manager.spread_store.append(spread_opp)
+
         self._manager.balance_checker.check_crypto_balances(spread_opp)
 
         is_opportunity = False
@@ -583,13 +809,13 @@ class FCFStrategy():
             self.state.e1_targets = self.__calc_targets(
                 spread_opp.e1_spread, self.state.h_to_e1_max,
                 self._manager.trader2.get_adjusted_usd_balance())
-            logging.debug('#### Initial e1_targets: {}'.format(
-                list(enumerate(self.state.e1_targets))))
+            logging.debug('#### Initial e1_targets: %s',
+                          self.state.e1_targets)
             self.state.e2_targets = self.__calc_targets(
                 spread_opp.e2_spread, self.state.h_to_e2_max,
                 self._manager.trader1.get_adjusted_usd_balance())
-            logging.debug('#### Initial e2_targets: {}'.format(
-                list(enumerate(self.state.e2_targets))))
+            logging.debug('#### Initial e2_targets: %s',
+                          self.state.e2_targets)
 
             self.state.has_started = True
 
@@ -620,5 +846,6 @@ class FCFStrategy():
             self.state.h_to_e1_max, spread_opp.e1_spread)
         self.state.h_to_e2_max = max(
             self.state.h_to_e2_max, spread_opp.e2_spread)
+        self.__update_triggers()
 
         return is_opportunity
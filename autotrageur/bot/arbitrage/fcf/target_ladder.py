@@ -0,0 +1,194 @@
+import bisect
+from decimal import Decimal
+
+from fp_libs.constants.decimal_constants import ONE
+
+
+class _SpreadView():
+    """Sequence of the target spreads of a TargetLadder, for bisect."""
+
+    def __init__(self, ladder):
+        """Constructor.
+
+        Args:
+            ladder (TargetLadder): The ladder.
+        """
+        self._ladder = ladder
+
+    def __getitem__(self, index):
+        return self._ladder.spread(index)
+
+    def __len__(self):
+        return len(self._ladder)
+
+
+class TargetLadder():
+    """The (spread, cash position) targets of one side of FCFStrategy.
+
+    Spreads are in increasing order.  A geometric ladder is defined in
+    closed form, its spreads and positions filled in on first access, so
+    it is rebuilt in constant time and a lookup only computes the targets
+    it visits.
+
+    A TargetLadder is a sequence of (spread, position) tuples, equal to the
+    list of the same targets.
+    """
+
+    def __init__(self, spreads, positions):
+        """Constructor.
+
+        Args:
+            spreads (list[Decimal]): The target spreads, increasing.
+            positions (list[Decimal]): The cash position of each target.
+        """
+        self._spreads = spreads
+        self._positions = positions
+        self._geometry = None
+        self._growth = None
+        self._spread_view = _SpreadView(self)
+
+    @classmethod
+    def geometric(cls, start, increment, count, vol_min, balance):
+        """Builds a ladder of evenly spaced spreads and geometrically
+        growing positions.
+
+        The target at index i has spread `start + (i + 1) * increment` and
+        position `vol_min * growth ** i`, where growth takes the last
+        position to `balance`.  If `vol_min` is at least `balance`, every
+        position is `balance`.
+
+        Args:
+            start (Decimal): The spread the targets start from.
+            increment (Decimal): The spread between targets.
+            count (int): The number of targets, at least 2.
+            vol_min (Decimal): The position of the first target.
+            balance (Decimal): The balance on the buy exchange.
+
+        Returns:
+            TargetLadder: The ladder.
+        """
+        ladder = cls([None] * count, [None] * count)
+        ladder._geometry = (start, increment, count, vol_min, balance)
+        return ladder
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if isinstance(other, TargetLadder):
+            if (self._geometry is not None
+                    and self._geometry == other._geometry):
+                return True
+        elif not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    # Defining __eq__ makes the class unhashable, as is list.
+    __hash__ = None
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('target index out of range')
+        return (self.spread(index), self.position(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield (self.spread(index), self.position(index))
+
+    def __len__(self):
+        return len(self._spreads)
+
+    def __reduce__(self):
+        # Persist the closed form, not the filled in targets.
+        if self._geometry is not None:
+            return (TargetLadder.geometric, self._geometry)
+        return (TargetLadder, (list(self._spreads), list(self._positions)))
+
+    def __repr__(self):
+        if not self:
+            return 'TargetLadder([])'
+        return 'TargetLadder({} targets: first {}, last {})'.format(
+            len(self), self[0], self[-1])
+
+    def advance_to(self, index, spread):
+        """Finds the last target from an index on that the spread hits.
+
+        Args:
+            index (int): The index of the current target.
+            spread (Decimal): The spread to evaluate.
+
+        Returns:
+            int: The index of the last target after `index` with a spread
+                at most `spread`, or `index` if there is none.
+        """
+        hit = bisect.bisect_right(self._spread_view, spread, index + 1) - 1
+        return max(index, hit)
+
+    def has_hit(self, index, spread):
+        """Indicates whether a spread hits a target.
+
+        Args:
+            index (int): The index of the target.
+            spread (Decimal): The spread to evaluate.
+
+        Returns:
+            bool: Whether the target exists and `spread` is at least its
+                spread.
+        """
+        return index < len(self) and spread >= self.spread(index)
+
+    def position(self, index):
+        """Retrieve the cash position of a target.
+
+        Args:
+            index (int): The index of the target.
+
+        Returns:
+            Decimal: The cash position.
+        """
+        position = self._positions[index]
+        if position is None:
+            _, _, count, vol_min, balance = self._geometry
+            if vol_min >= balance:
+                # Min vol will empty the balance on the buy exchange.
+                position = balance
+            else:
+                if self._growth is None:
+                    self._growth = (balance / vol_min) ** (
+                        ONE / (count - ONE))
+                position = vol_min * (self._growth ** Decimal(index))
+            self._positions[index] = position
+        return position
+
+    def spread(self, index):
+        """Retrieve the spread of a target.
+
+        Args:
+            index (int): The index of the target.
+
+        Returns:
+            Decimal: The target spread.
+        """
+        spread = self._spreads[index]
+        if spread is None:
+            start, increment = self._geometry[:2]
+            spread = start + Decimal(index + 1) * increment
+            self._spreads[index] = spread
+        return spread
+
+
+def as_target_ladder(targets):
+    """Converts a list of targets, as resumed from a legacy checkpoint, to
+    a TargetLadder.
+
+    Args:
+        targets (list): The (spread, position) targets, or a TargetLadder.
+
+    Returns:
+        TargetLadder: The ladder of the targets.
+    """
+    if isinstance(targets, TargetLadder):
+        return targets
+    return TargetLadder(
+        [target[0] for target in targets], [target[1] for target in targets])
@@ -1,5 +1,7 @@
 import logging
 
+from autotrageur.bot.arbitrage.fcf.target_ladder import as_target_ladder
+
 
 class FCFTargetTracker():
     """Class to encapsulate target tracking logic for FCFStrategy."""
@@ -15,15 +17,14 @@ class FCFTargetTracker():
 
         Args:
             spread (Decimal): The calculated spread.
-            targets (list): The list of targets.
+            targets (TargetLadder): The targets.
         """
         logging.debug(
                 '#### target_index before: {}'.format(self._target_index))
-        while (self._target_index + 1 < len(targets) and
-                spread >= targets[self._target_index + 1][0]):
-            self._target_index += 1
-            logging.debug(
-                '#### target_index after: {}'.format(self._target_index))
+        self._target_index = as_target_ladder(targets).advance_to(
+            self._target_index, spread)
+        logging.debug(
+            '#### target_index after: {}'.format(self._target_index))
 
     def reset_target_index(self):
         """Signal a momentum change, resets target_index and last_target_index.
@@ -31,38 +32,65 @@ class FCFTargetTracker():
         self._target_index = 0
         self._last_target_index = 0
 
+    def get_target_index(self):
+        """Retrieve the current target index.
+
+        Returns:
+            int: The index of the current target.
+        """
+        return self._target_index
+
     def get_trade_volume(self, targets, is_momentum_change):
         """Retrieve the target trade volume for the current target.
 
         Args:
-            targets (list): The list of targets.
+            targets (TargetLadder): The targets.
             is_momentum_change (bool): The momentum change indicator.
 
         Returns:
             Decimal: The target trade volume in USD.
         """
+        targets = as_target_ladder(targets)
         if self._target_index >= 1 and not is_momentum_change:
-            return targets[self._target_index][1] - \
-                targets[self._last_target_index][1]
+            return targets.position(self._target_index) - \
+                targets.position(self._last_target_index)
+        else:
+            return targets.position(self._target_index)
+
+    def get_next_target_spread(self, targets, is_momentum_change):
+        """Retrieve the spread of the next target that can be hit.
+
+        Args:
+            targets (TargetLadder): The targets.
+            is_momentum_change (bool): The momentum change indicator.
+
+        Returns:
+            Decimal: The target spread, or None if all targets are hit.
+        """
+        targets = as_target_ladder(targets)
+        if is_momentum_change:
+            return targets.spread(0)
+        elif self._target_index < len(targets):
+            return targets.spread(self._target_index)
         else:
-            return targets[self._target_index][1]
+            return None
 
     def has_hit_targets(self, spread, targets, is_momentum_change):
         """Indicates whether a target was hit.
 
         Args:
             spread (Decimal): The spread to evaluate.
-            targets (list): The list of targets.
+            targets (TargetLadder): The targets.
             is_momentum_change (bool): The momentum change indicator.
 
         Returns:
             bool: Whether a target was hit.
         """
+        targets = as_target_ladder(targets)
         if is_momentum_change:
-            return spread >= targets[0][0]
+            return targets.has_hit(0, spread)
         else:
-            within_len = self._target_index < len(targets)
-            return within_len and spread >= targets[self._target_index][0]
+            return targets.has_hit(self._target_index, spread)
 
     def increment(self):
         """Increment the internal target index and save the current index."""
@@ -1,8 +1,6 @@
-import copyreg
 import getpass
 import logging
 import os
-import pickle
 import pprint
 import time
 import traceback
@@ -13,14 +11,31 @@ import schedule
 import yaml
 
 import autotrageur.bot.arbitrage.arbseeker as arbseeker
+import autotrageur.bot.common.storage as storage
 import fp_libs.db.maria_db_handler as db_handler
 from autotrageur.bot.arbitrage.autotrageur import Autotrageur
+from autotrageur.bot.arbitrage.book_fetcher import ConcurrentBookFetcher
+from autotrageur.bot.arbitrage.db_writer import (DBWriteError, DBWriter,
+                                                 WriteOp)
 from autotrageur.bot.arbitrage.fcf.balance_checker import FCFBalanceChecker
+from autotrageur.bot.arbitrage.fcf.checkpoint_catalog import catalog_metadata
 from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
-from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_utils import \
-    pickle_fcf_checkpoint
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import (decode_checkpoint,
+                                                                encode_checkpoint)
 from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.state_journal import (STATE_JOURNAL_DIR,
+                                                         StateJournal,
+                                                         apply_strategy_fields,
+                                                         capture_strategy_state,
+                                                         journal_exists,
+                                                         load_journal,
+                                                         prune_journals)
 from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyBuilder
+from autotrageur.bot.arbitrage.poll_scheduler import PollScheduler
+from autotrageur.bot.arbitrage.poll_telemetry import (POLL_TELEMETRY_DIR,
+                                                      PollTelemetry)
+from autotrageur.bot.arbitrage.spread_store import (SPREAD_STORE_DIR,
+                                                    SpreadStore)
 from autotrageur.bot.common.config_constants import (TWILIO_RECIPIENT_NUMBERS,
                                                      TWILIO_SENDER_NUMBER)
 from autotrageur.bot.common.db_constants import (FCF_AUTOTRAGEUR_CONFIG_COLUMNS,
@@ -31,18 +46,19 @@ from autotrageur.bot.common.db_constants import (FCF_AUTOTRAGEUR_CONFIG_COLUMNS,
                                                  FCF_MEASURES_TABLE,
                                                  FCF_STATE_PRIM_KEY_ID,
                                                  FCF_STATE_TABLE,
-                                                 FOREX_RATE_PRIM_KEY_ID,
                                                  FOREX_RATE_TABLE,
-                                                 TRADE_OPPORTUNITY_PRIM_KEY_ID,
+                                                 RUN_ROLLUP_PRIM_KEYS,
+                                                 RUN_ROLLUP_TABLE,
+                                                 SLIPPAGE_STATS_TABLE,
                                                  TRADE_OPPORTUNITY_TABLE,
-                                                 TRADES_PRIM_KEY_SIDE,
-                                                 TRADES_PRIM_KEY_TRADE_OPP_ID,
                                                  TRADES_TABLE)
+from autotrageur.bot.trader.book_feed import BookFeedClient, parse_book_feed
 from autotrageur.bot.trader.ccxt_trader import CCXTTrader
 from autotrageur.bot.trader.dry_run import DryRunExchange
+from autotrageur.bot.trader.exchange_pool import ExchangePool
+from autotrageur.bot.trader.markets_cache import MarketsCache
 from fp_libs.constants.ccxt_constants import API_KEY, API_SECRET, PASSWORD
 from fp_libs.constants.decimal_constants import TEN, ZERO
-from fp_libs.db.maria_db_handler import InsertRowObject
 from fp_libs.email_client.simple_email_client import send_all_emails
 from fp_libs.fiat_symbols import FIAT_SYMBOLS
 from fp_libs.logging.logging_utils import fancy_log
@@ -54,6 +70,14 @@ from fp_libs.utilities import (keyfile_to_map, num_to_decimal, split_symbol,
 # Default error message for phone call.
 DEFAULT_PHONE_MESSAGE = "Please check logs and e-mail for full stack trace."
 
+# Interval (in hours) at which cached taker fees are refetched.
+TAKER_FEE_REFRESH_HOURS = 1
+
+# Schedule tags of the forex and taker fee refresh jobs.  A bot's jobs are
+# tagged with the pair of the tag and the bot's id; see `__schedule_tag`.
+FOREX_SCHEDULE_TAG = 'FOREX_REFRESH'
+TAKER_FEE_SCHEDULE_TAG = 'TAKER_FEE_REFRESH'
+
 
 class AutotrageurAuthenticationError(Exception):
     """Incorrect credentials or exchange unavailable when attempting to
@@ -85,6 +109,116 @@ class IncorrectStateObjectTypeError(Exception):
     pass
 
 
+def load_twilio(twilio_cfg_path, logger):
+    """Loads the Twilio configuration file and tests the connection to
+    Twilio APIs.
+
+    Args:
+        twilio_cfg_path (str): Path to the Twilio configuration file.
+        logger (logging.Logger): The logger of the Twilio client.
+
+    Returns:
+        tuple(dict, TwilioClient): The Twilio configuration and the
+            connected client.
+    """
+    with open(twilio_cfg_path, 'r') as ymlfile:
+        twilio_config = yaml.safe_load(ymlfile)
+
+    twilio_client = TwilioClient(
+        os.getenv('ACCOUNT_SID'), os.getenv('AUTH_TOKEN'), logger)
+
+    # Make sure there is a valid connection as notifications are a critical
+    # service to the bot.
+    twilio_client.test_connection()
+    return twilio_config, twilio_client
+
+
+def parse_keyfile(keyfile_path, pi_mode, dryrun):
+    """Parses the keyfile given in the arguments.
+
+    Prompts user for a passphrase to decrypt the encrypted keyfile.
+
+    Args:
+        keyfile_path (str): The path to the keyfile.
+        pi_mode (bool): Whether to decrypt with memory limitations to
+            accommodate raspberry pi.
+        dryrun (bool): Whether the bot is in dryrun mode.
+
+    Raises:
+        IOError: If the encrypted keyfile does not open, and not in
+            dryrun mode.
+
+    Returns:
+        dict: Map of the keyfile contents, or None if dryrun and
+            unavailable.
+    """
+    try:
+        pw = getpass.getpass(prompt="Enter keyfile password:")
+        with open(keyfile_path, "rb") as in_file:
+            keys = decrypt(
+                in_file.read(),
+                to_bytes(pw),
+                pi_mode=pi_mode)
+
+        str_keys = to_str(keys)
+        return keyfile_to_map(str_keys)
+    except Exception:
+        logging.error("Unable to load keyfile.", exc_info=True)
+        if not dryrun:
+            raise IOError("Unable to open file: %s" % keyfile_path)
+        else:
+            logging.info("**Dry run: continuing with program")
+            return None
+
+
+def persist_forex(db_writer, traders):
+    """Persists the current forex data of traders with the same quote.
+
+    NOTE: The traders' forex_id is updated here and is cached until the
+    next update.
+
+    Args:
+        db_writer (DBWriter): The writer of the row.
+        traders (list[CCXTTrader]): The traders, sharing the forex ratio
+            of the first.
+    """
+    forex_id = str(uuid.uuid4())
+    for trader in traders:
+        trader.forex_id = forex_id
+    row_data = {
+        'id': forex_id,
+        'quote': traders[0].quote,
+        'rate': traders[0].forex_ratio,
+        'local_timestamp': int(time.time())
+    }
+    db_writer.insert(FOREX_RATE_TABLE, row_data)
+
+
+def refresh_taker_fee(trader):
+    """Logs the trader's taker fee cache statistics and invalidates the
+    cache, so that fee changes by the exchange are picked up.
+
+    Args:
+        trader (CCXTTrader): The CCXTTrader to use.
+    """
+    trader.fee_cache.log_stats(trader.exchange_name)
+    trader.fee_cache.invalidate()
+
+
+def update_forex(db_writer, traders):
+    """Updates the forex ratio of traders with the same quote, fetching it
+    once, and stores it in db.
+
+    Args:
+        db_writer (DBWriter): The writer of the forex row.
+        traders (list[CCXTTrader]): The traders.
+    """
+    traders[0].set_forex_ratio()
+    for trader in traders[1:]:
+        trader.forex_ratio = traders[0].forex_ratio
+    persist_forex(db_writer, traders)
+
+
 class FCFAutotrageur(Autotrageur):
     """The fiat-crypto-fiat Autotrageur.
 
@@ -96,6 +230,19 @@ class FCFAutotrageur(Autotrageur):
     specified target high; vice versa if the calculated spread is less
     than the specified target low.
     """
+    def __init__(self, shared=None):
+        """Constructor.
+
+        Args:
+            shared (SharedResources, optional): Defaults to None. The
+                components shared with the other bots of the process, or
+                None if the bot runs alone.
+        """
+        super().__init__(shared)
+        self.book_feeds = []
+        self.db_writer = None
+        self.state_journal = None
+
     def __load_twilio(self, twilio_cfg_path):
         """Loads the Twilio configuration file and tests the connection to
         Twilio APIs.
@@ -103,64 +250,76 @@ class FCFAutotrageur(Autotrageur):
         Args:
             twilio_cfg_path (str): Path to the Twilio configuration file.
         """
-        with open(twilio_cfg_path, 'r') as ymlfile:
-            self.twilio_config = yaml.safe_load(ymlfile)
-
-        self.twilio_client = TwilioClient(
-            os.getenv('ACCOUNT_SID'), os.getenv('AUTH_TOKEN'), self.logger)
-
-        # Make sure there is a valid connection as notifications are a critical
-        # service to the bot.
-        self.twilio_client.test_connection()
+        self.twilio_config, self.twilio_client = load_twilio(
+            twilio_cfg_path, self.logger)
 
     def __parse_keyfile(self, keyfile_path, pi_mode=False):
         """Parses the keyfile given in the arguments.
 
-        Prompts user for a passphrase to decrypt the encrypted keyfile.
+        See `parse_keyfile`.
 
         Args:
             keyfile_path (str): The path to the keyfile.
             pi_mode (bool): Whether to decrypt with memory limitations to
                 accommodate raspberry pi.  Default is False.
 
-        Raises:
-            IOError: If the encrypted keyfile does not open, and not in
-                dryrun mode.
-
         Returns:
             dict: Map of the keyfile contents, or None if dryrun and
                 unavailable.
         """
-        try:
-            pw = getpass.getpass(prompt="Enter keyfile password:")
-            with open(keyfile_path, "rb") as in_file:
-                keys = decrypt(
-                    in_file.read(),
-                    to_bytes(pw),
-                    pi_mode=pi_mode)
-
-            str_keys = to_str(keys)
-            return keyfile_to_map(str_keys)
-        except Exception:
-            logging.error("Unable to load keyfile.", exc_info=True)
-            if not self._config.dryrun:
-                raise IOError("Unable to open file: %s" % keyfile_path)
-            else:
-                logging.info("**Dry run: continuing with program")
-                return None
+        return parse_keyfile(keyfile_path, pi_mode, self._config.dryrun)
+
+    def __attach_book_feeds(self, feeds):
+        """Streams the orderbooks of the traders' markets which have a feed.
+
+        Every update of a feed wakes the PollScheduler, so the next poll
+        reads it without waiting out the poll wait.  Unless both legs are
+        streamed, woken polls are kept `poll_wait_short` apart, so the leg
+        without a feed is not fetched continuously.  The feeds of a previous
+        setup are stopped first.
+
+        Args:
+            feeds (list[str]): The `--book_feed` options of the program, see
+                `parse_book_feed`.
+        """
+        for book_feed in self.book_feeds:
+            book_feed.stop()
+        self.book_feeds = []
+
+        specs = [parse_book_feed(feed) for feed in feeds]
+        streamed = 0
+        for trader in (self.trader1, self.trader2):
+            for spec in specs:
+                if (spec.exchange_name == trader.exchange_name
+                        and spec.symbol == trader.symbol):
+                    book_feed = BookFeedClient(
+                        spec.host, spec.port,
+                        on_update=self.poll_scheduler.wake)
+                    book_feed.start()
+                    trader.attach_book_feed(book_feed)
+                    self.book_feeds.append(book_feed)
+                    logging.info("Streaming the %s %s orderbook from %s:%d.",
+                                 trader.exchange_name, trader.symbol,
+                                 spec.host, spec.port)
+                    streamed += 1
+                    break
+
+        if streamed == 2:
+            self.poll_scheduler.wake_interval = 0
+        else:
+            self.poll_scheduler.wake_interval = self._config.poll_wait_short
 
     def __persist_config(self):
         """Persists the configuration for this `fcf_autotrageur` run."""
         fcf_autotrageur_config_row = db_handler.build_row(
             FCF_AUTOTRAGEUR_CONFIG_COLUMNS, self._config._asdict())
-        config_row_obj = InsertRowObject(
-            FCF_AUTOTRAGEUR_CONFIG_TABLE,
-            fcf_autotrageur_config_row,
-            (FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_ID,
-            FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_START_TS))
-
-        db_handler.insert_row(config_row_obj)
-        db_handler.commit_all()
+        with self.db_writer.exclusive():
+            storage.insert_row(
+                FCF_AUTOTRAGEUR_CONFIG_TABLE,
+                fcf_autotrageur_config_row,
+                (FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_ID,
+                FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_START_TS))
+            storage.commit_all()
 
     def __persist_forex(self, trader):
         """Persists the current forex data.
@@ -171,19 +330,7 @@ class FCFAutotrageur(Autotrageur):
         Args:
             trader (CCXTTrader): The CCXTTrader to use.
         """
-        trader.forex_id = str(uuid.uuid4())
-        row_data = {
-            'id': trader.forex_id,
-            'quote': trader.quote,
-            'rate': trader.forex_ratio,
-            'local_timestamp': int(time.time())
-        }
-        forex_row_obj = InsertRowObject(
-            FOREX_RATE_TABLE,
-            row_data,
-            (FOREX_RATE_PRIM_KEY_ID,))
-        db_handler.insert_row(forex_row_obj)
-        db_handler.commit_all()
+        persist_forex(self.db_writer, (trader,))
 
     def __update_forex(self, trader):
         """Update the internally stored forex ratio and store in db.
@@ -194,12 +341,48 @@ class FCFAutotrageur(Autotrageur):
         trader.set_forex_ratio()
         self.__persist_forex(trader)
 
-    def __persist_trade_data(self, buy_response, sell_response, trade_metadata):
+    def __record_slippage_stats(self, trader, response, spread_opp):
+        """Adds an executed trade to the trader's slippage statistics.
+
+        Args:
+            trader (CCXTTrader): The trader which executed the trade.
+            response (dict): The autotrageur unified response from the
+                executed trade.
+            spread_opp (dict): The spread opportunity of the trade.
+
+        Returns:
+            WriteOp: The write of the statistics' snapshot.
+        """
+        side = response['side']
+        slippage_stats = trader.record_slippage(
+            side,
+            spread_opp['{}_{}'.format(trader.exchange_id, side)],
+            response['true_price'])
+        return WriteOp(SLIPPAGE_STATS_TABLE, {
+            'trade_opportunity_id': spread_opp['id'],
+            'side': side,
+            'autotrageur_config_id': self._config.id,
+            'exchange': trader.exchange_name,
+            'dryrun': self._config.dryrun,
+            'trade_count': slippage_stats.count,
+            'mean': slippage_stats.mean,
+            'm2': slippage_stats.m2,
+            'local_timestamp': int(time.time())
+        }, None)
+
+    def __persist_trade_data(self, buy_response, sell_response, trade_metadata,
+                             with_opportunity=True):
         """Persists data regarding the current trade into the database.
 
         If a trade has been executed, we add any necessary information (such as
         foreign key IDs) to the trade responses before saving to the database.
 
+        Each executed trade also updates the slippage statistics of its
+        exchange and the rollup of the run.  The rows are written in the
+        background, in a transaction of their own.  For live trades, this
+        waits until they are committed.  Live legs are persisted one at a
+        time, so the spread opportunity is only written with the first.
+
         Args:
             buy_response (dict): The autotrageur unified response from the
                 executed buy trade.  If a buy trade was unsuccessful, then
@@ -209,15 +392,20 @@ class FCFAutotrageur(Autotrageur):
                 sell_response is None.
             trade_metadata (TradeMetadata): The trade metadata prepared by the
                 autotrageur strategy.
+            with_opportunity (bool, optional): Whether to persist the spread
+                opportunity as well. Defaults to True.
+
+        Raises:
+            DBWriteError: If the rows of a live trade failed to commit.
         """
         # Persist the spread_opp.
         trade_opportunity_id = trade_metadata.spread_opp.id
         spread_opp = trade_metadata.spread_opp._asdict()
-        trade_opp_row_obj = InsertRowObject(
-            TRADE_OPPORTUNITY_TABLE,
-            spread_opp,
-            (TRADE_OPPORTUNITY_PRIM_KEY_ID, ))
-        db_handler.insert_row(trade_opp_row_obj)
+        trade_ops = []
+        if with_opportunity:
+            trade_ops.append(WriteOp(TRADE_OPPORTUNITY_TABLE, spread_opp, None))
+        slippage_ops = []
+        rollup_ops = []
 
         # Persist the executed buy order, if available.
         if buy_response is not None:
@@ -225,11 +413,10 @@ class FCFAutotrageur(Autotrageur):
             buy_response['autotrageur_config_id'] = self._config.id
             buy_response['autotrageur_config_start_timestamp'] = (
                 self._config.start_timestamp)
-            buy_trade_row_obj = InsertRowObject(
-                TRADES_TABLE,
-                buy_response,
-                (TRADES_PRIM_KEY_TRADE_OPP_ID, TRADES_PRIM_KEY_SIDE))
-            db_handler.insert_row(buy_trade_row_obj)
+            trade_ops.append(WriteOp(TRADES_TABLE, buy_response, None))
+            slippage_ops.append(self.__record_slippage_stats(
+                trade_metadata.buy_trader, buy_response, spread_opp))
+            rollup_ops.append(self.__rollup_trade(buy_response))
 
         # Persist the executed sell order, if available.
         if sell_response is not None:
@@ -237,13 +424,21 @@ class FCFAutotrageur(Autotrageur):
             sell_response['autotrageur_config_id'] = self._config.id
             sell_response['autotrageur_config_start_timestamp'] = (
                 self._config.start_timestamp)
-            sell_trade_row_obj = InsertRowObject(
-                TRADES_TABLE,
-                sell_response,
-                (TRADES_PRIM_KEY_TRADE_OPP_ID, TRADES_PRIM_KEY_SIDE))
-            db_handler.insert_row(sell_trade_row_obj)
+            trade_ops.append(WriteOp(TRADES_TABLE, sell_response, None))
+            slippage_ops.append(self.__record_slippage_stats(
+                trade_metadata.sell_trader, sell_response, spread_opp))
+            rollup_ops.append(self.__rollup_trade(sell_response))
+
+        if not trade_ops:
+            return
+
+        # Rows of a table are kept together, to share statements.
+        ticket = self.db_writer.write(
+            *trade_ops, *slippage_ops, *rollup_ops, isolated=True)
 
-        db_handler.commit_all()
+        # Real trades must be on record before the bot continues.
+        if not self._config.dryrun:
+            self.db_writer.barrier(ticket)
 
     def __construct_strategy(self):
         """Initializes the Algorithm component."""
@@ -259,6 +454,72 @@ class FCFAutotrageur(Autotrageur):
             .build()
         )
 
+    def __journal_state(self, snapshot=False):
+        """Journals the strategy state of the current poll.
+
+        Appends the changed fields to the StateJournal, or writes a new
+        snapshot of the whole checkpoint when requested or due.
+
+        Args:
+            snapshot (bool, optional): Whether to write a snapshot. Defaults
+                to False.
+        """
+        # The checkpoint holds the strategy state from the first poll on.
+        if self.checkpoint.strategy_state is None:
+            return
+
+        fields = capture_strategy_state(self.checkpoint.strategy_state)
+        if snapshot or self.state_journal.needs_compaction():
+            self.state_journal.compact(self.__encode_checkpoint(), fields)
+        else:
+            self.state_journal.record(fields)
+
+    def __encode_checkpoint(self):
+        """Encodes the checkpoint, along with the StatTracker.
+
+        The StatTracker's Traders are not encoded.
+
+        Returns:
+            bytes: The encoded FCFCheckpoint.
+        """
+        self.checkpoint.stat_tracker = self._stat_tracker
+        return encode_checkpoint(self.checkpoint)
+
+    def __rollup_trade(self, response):
+        """Builds the addition of an executed trade to the run's rollup.
+
+        Args:
+            response (dict): The autotrageur unified response from the
+                executed trade.
+
+        Returns:
+            WriteOp: The write adding the trade to the rollup.
+        """
+        return WriteOp(RUN_ROLLUP_TABLE, {
+            'autotrageur_config_id': self._config.id,
+            'exchange': response['exchange'],
+            'fee_asset': response['fee_asset'],
+            'trade_count': 1,
+            'base_volume': response['pre_fee_base'],
+            'quote_volume': response['post_fee_quote'],
+            'fees': response['fees']
+        }, RUN_ROLLUP_PRIM_KEYS)
+
+    def __schedule_tag(self, tag):
+        """Tags a job scheduled by this bot.
+
+        The jobs of a bot are cleared by their tag before being scheduled
+        again, as on a fallback re-setup, without touching the jobs of other
+        bots in the process.
+
+        Args:
+            tag (str): The kind of job, e.g. FOREX_SCHEDULE_TAG.
+
+        Returns:
+            tuple(str, int): The tag of the bot's jobs of the kind.
+        """
+        return (tag, id(self))
+
     def __setup_dry_run_exchanges(self, resume_id):
         """Sets up DryRunExchanges which emulate Exchanges.  Trades, wallet
         balances, other exchange-related state is then recorded.
@@ -291,7 +552,14 @@ class FCFAutotrageur(Autotrageur):
 
 
     def __setup_forex(self):
-        """Sets up any forex services for fiat conversion, if necessary."""
+        """Sets up any forex services for fiat conversion, if necessary.
+
+        The forex of a hosted bot is updated and refreshed by its host,
+        once per quote currency.
+        """
+        forex_tag = self.__schedule_tag(FOREX_SCHEDULE_TAG)
+        schedule.clear(forex_tag)
+
         # Bot considers stablecoin (USDT - Tether) prices as roughly equivalent
         # to USD fiat.
         for trader in (self.trader1, self.trader2):
@@ -302,9 +570,12 @@ class FCFAutotrageur(Autotrageur):
                              " with quote: {}".format(trader.exchange_name,
                                                       trader.quote))
                 trader.conversion_needed = True
+                if self._shared is not None:
+                    continue
                 self.__update_forex(trader)
                 # TODO: Adjust interval once real-time forex implemented.
-                schedule.every().hour.do(self.__update_forex, trader)
+                schedule.every().hour.do(
+                    self.__update_forex, trader).tag(forex_tag)
 
     def __setup_stat_tracker(self, resume_id=None):
         """Sets up the bot's StatTracker.
@@ -358,12 +629,12 @@ class FCFAutotrageur(Autotrageur):
             'num_fatal_errors': 0,
             'trade_count': 0
         }
-        stat_tracker_row_obj = InsertRowObject(
-            FCF_MEASURES_TABLE,
-            row_data,
-            (FCF_MEASURES_PRIM_KEY_ID,))
-        db_handler.insert_row(stat_tracker_row_obj)
-        db_handler.commit_all()
+        with self.db_writer.exclusive():
+            storage.insert_row(
+                FCF_MEASURES_TABLE,
+                row_data,
+                (FCF_MEASURES_PRIM_KEY_ID,))
+            storage.commit_all()
 
     def __setup_traders(self, exchange_key_map, resume_id):
         """Sets up the Traders to interface with exchanges.
@@ -425,7 +696,9 @@ class FCFAutotrageur(Autotrageur):
             'e1',
             num_to_decimal(self._config.slippage),
             exchange1_configs,
-            dry_e1)
+            dry_e1,
+            ccxt_exchange=self.exchange_pool.get(exchange1),
+            autotrageur_config_id=self._config.id)
         self.trader2 = CCXTTrader(
             e2_base,
             e2_quote,
@@ -433,7 +706,9 @@ class FCFAutotrageur(Autotrageur):
             'e2',
             num_to_decimal(self._config.slippage),
             exchange2_configs,
-            dry_e2)
+            dry_e2,
+            ccxt_exchange=self.exchange_pool.get(exchange2),
+            autotrageur_config_id=self._config.id)
 
         # Set to run against test API, if applicable.
         if not self._config.use_test_api:
@@ -445,9 +720,11 @@ class FCFAutotrageur(Autotrageur):
             self.trader2.connect_test_api()
             self.is_test_run = True
 
-        # Load the available markets for the exchange.
-        self.trader1.load_markets()
-        self.trader2.load_markets()
+        # Load the available markets for the exchange, from the markets cache
+        # when fresh.  Markets already loaded by another pair are shared.
+        markets_cache = MarketsCache()
+        self.exchange_pool.register(self.trader1, markets_cache)
+        self.exchange_pool.register(self.trader2, markets_cache)
 
         try:
             # Dry run uses balances set in the configuration files.
@@ -569,9 +846,21 @@ class FCFAutotrageur(Autotrageur):
                 self._send_email("BUY ERROR ALERT - CONTINUING", repr(exc))
                 logging.error(exc, exc_info=True)
                 self._strategy.strategy_state = self.checkpoint.strategy_state
+                self.__persist_trade_data(None, None, trade_metadata)
             else:
                 self._stat_tracker.trade_count += 1
 
+                # The buy is on record before the sell is placed.  If the
+                # record fails, the sell still hedges the bought amount, and
+                # the failure is raised once the sell is persisted.
+                buy_record_error = None
+                try:
+                    self.__persist_trade_data(
+                        buy_response, None, trade_metadata)
+                except DBWriteError as exc:
+                    logging.error(exc, exc_info=True)
+                    buy_record_error = exc
+
                 # If an exception is thrown, we want the program to stop on the
                 # second trade.
                 try:
@@ -596,9 +885,16 @@ class FCFAutotrageur(Autotrageur):
                         "Buy results:\n\n{}\n\nSell results:\n\n{}\n".format(
                             pprint.pformat(buy_response),
                             pprint.pformat(sell_response)))
-            finally:
-                self.__persist_trade_data(
-                    buy_response, sell_response, trade_metadata)
+                finally:
+                    self.__persist_trade_data(
+                        None, sell_response, trade_metadata,
+                        with_opportunity=False)
+
+                if buy_record_error is not None:
+                    raise buy_record_error
+
+        # Trades change the balances and stats outside the strategy state.
+        self.__journal_state(snapshot=True)
 
     # @Override
     def _export_state(self):
@@ -608,36 +904,17 @@ class FCFAutotrageur(Autotrageur):
         fatal error or if it is killed manually."""
         logging.debug("#### Exporting bot's current state")
 
-        # UPDATE the fcf_measures table with updated stats.
-        raw_update_result = db_handler.execute_parametrized_query(
-                "UPDATE fcf_measures SET "
-                "autotrageur_stop_timestamp = %s, "
-                "e1_close_bal_base = %s, "
-                "e2_close_bal_base = %s, "
-                "e1_close_bal_quote = %s, "
-                "e2_close_bal_quote = %s, "
-                "num_fatal_errors = num_fatal_errors + 1, "
-                "trade_count = %s "
-                "WHERE id = %s;",
-                (int(time.time()),
-                self._stat_tracker.e1.base_bal,
-                self._stat_tracker.e2.base_bal,
-                self._stat_tracker.e1.quote_bal,
-                self._stat_tracker.e2.quote_bal,
-                self._stat_tracker.trade_count,
-                self._stat_tracker.id))
-
-        logging.debug("UPDATE fcf_measures affected rows: {}".format(
-            raw_update_result))
-
-        # Register copyreg.pickle with Checkpoint object and helper function
-        # for better backwards-compatibility in pickling.
-        # (See 'fcf_checkpoint_utils' module for more details)
-        copyreg.pickle(FCFCheckpoint, pickle_fcf_checkpoint)
-
-        # Detach the Traders from StatTracker and attach it to the Checkpoint.
-        self._stat_tracker.detach_traders()
-        self.checkpoint.stat_tracker = self._stat_tracker
+        # Commit the queued rows, and release the connection.  The writer
+        # shared by hosted bots is closed by their host.
+        if self._shared is None:
+            self.db_writer.close()
+        export_timestamp = int(time.time())
+        state = self.__encode_checkpoint()
+
+        # Leave the journal at the exported state as well.
+        if self.checkpoint.strategy_state is not None:
+            self.state_journal.compact(
+                state, capture_strategy_state(self.checkpoint.strategy_state))
 
         # The generated ID can be used as the `resume_id` to resume the bot
         # from the saved state.
@@ -645,27 +922,56 @@ class FCFAutotrageur(Autotrageur):
             'id': str(uuid.uuid4()),
             'autotrageur_config_id': self._config.id,
             'autotrageur_config_start_timestamp': self._config.start_timestamp,
-            'state': pickle.dumps(self.checkpoint)
+            'state': state
         }
+        # Catalog the checkpoint, for listing and compaction without
+        # decoding it.
+        fcf_state_map.update(
+            catalog_metadata(self.checkpoint, export_timestamp))
         logging.debug(
             "#### The exported checkpoint object is: {0!r}".format(
                 self.checkpoint))
-        logging.info("Exported with resume id: {}".format(
-            fcf_state_map[FCF_STATE_PRIM_KEY_ID]))
-        fcf_state_row_obj = InsertRowObject(
-            FCF_STATE_TABLE,
-            fcf_state_map,
-            (FCF_STATE_PRIM_KEY_ID,))
-        db_handler.insert_row(fcf_state_row_obj)
-        db_handler.commit_all()
-
-        # Reattach the Traders for further use in current bot run.
-        self._stat_tracker.attach_traders(self.trader1, self.trader2)
+
+        with self.db_writer.exclusive():
+            # UPDATE the fcf_measures table with updated stats.
+            raw_update_result = storage.execute_parametrized_query(
+                    "UPDATE fcf_measures SET "
+                    "autotrageur_stop_timestamp = %s, "
+                    "e1_close_bal_base = %s, "
+                    "e2_close_bal_base = %s, "
+                    "e1_close_bal_quote = %s, "
+                    "e2_close_bal_quote = %s, "
+                    "num_fatal_errors = num_fatal_errors + 1, "
+                    "trade_count = %s "
+                    "WHERE id = %s;",
+                    (export_timestamp,
+                    self._stat_tracker.e1.base_bal,
+                    self._stat_tracker.e2.base_bal,
+                    self._stat_tracker.e1.quote_bal,
+                    self._stat_tracker.e2.quote_bal,
+                    self._stat_tracker.trade_count,
+                    self._stat_tracker.id))
+
+            logging.debug("UPDATE fcf_measures affected rows: {}".format(
+                raw_update_result))
+
+            logging.info("Exported with resume id: {}".format(
+                fcf_state_map[FCF_STATE_PRIM_KEY_ID]))
+            storage.insert_row(
+                FCF_STATE_TABLE,
+                fcf_state_map,
+                (FCF_STATE_PRIM_KEY_ID,))
+            storage.commit_all()
 
     # @Override
     def _final_log(self):
         """Produces a final log and console output during the finality of the
         bot."""
+        self.poll_telemetry.flush()
+        self.spread_store.flush()
+        if self._shared is None:
+            self.db_writer.log_stats()
+        self.state_journal.log_stats()
         self._stat_tracker.log_all()
 
     # @Override
@@ -673,21 +979,34 @@ class FCFAutotrageur(Autotrageur):
         """Imports the state of a previous autotrageur run.
 
         Sets the FCFCheckpoint to be a snapshot of the previous autotrageur's
-        state.
+        state.  A journal id resumes from the StateJournal of the run,
+        replaying its records onto its snapshot; any other id resumes from
+        an exported state in the database.
 
         Args:
             resume_id (str): The unique ID used to resume the bot from a
                 previous run.
         """
         logging.debug("#### Importing bot's previous state")
-        raw_result = db_handler.execute_parametrized_query(
-                "SELECT state FROM fcf_state where id = %s;",
-                (resume_id,))
+        journal_dir = os.path.join(STATE_JOURNAL_DIR, resume_id)
+        if journal_exists(journal_dir):
+            snapshot, records = load_journal(journal_dir)
+            previous_checkpoint = decode_checkpoint(snapshot)
+            for fields in records:
+                apply_strategy_fields(
+                    previous_checkpoint.strategy_state, fields)
+            logging.info("Replayed {} state journal records.".format(
+                len(records)))
+        else:
+            with storage.transaction():
+                raw_result = storage.execute_parametrized_query(
+                        "SELECT state FROM fcf_state where id = %s;",
+                        (resume_id,))
 
-        # The raw result comes back as a list of tuples.  We expect only
-        # one result as the `autotrageur_resume_id` is unique per
-        # export.
-        previous_checkpoint = pickle.loads(raw_result[0][0])
+            # The raw result comes back as a list of tuples.  We expect only
+            # one result as the `autotrageur_resume_id` is unique per
+            # export.
+            previous_checkpoint = decode_checkpoint(raw_result[0][0])
 
         if not isinstance(previous_checkpoint, FCFCheckpoint):
             raise IncorrectStateObjectTypeError(
@@ -696,14 +1015,27 @@ class FCFAutotrageur(Autotrageur):
 
         self.checkpoint = previous_checkpoint
 
+    # @Override
+    def _is_poll_logged(self):
+        """Starts a poll, deciding whether it is logged in full.
+
+        Returns:
+            bool: Whether the poll is sampled by the PollTelemetry.
+        """
+        return self.poll_telemetry.sample()
+
     # @Override
     def _poll_opportunity(self):
         """Poll exchanges for arbitrage opportunity.
 
+        The resulting strategy state is journaled.
+
         Returns:
             bool: Whether there is an opportunity.
         """
-        return self._strategy.poll_opportunity()
+        is_opportunity = self._strategy.poll_opportunity()
+        self.__journal_state()
+        return is_opportunity
 
     # @Override
     def _post_setup(self, arguments):
@@ -711,9 +1043,17 @@ class FCFAutotrageur(Autotrageur):
         components.
 
         Components initialized:
+        - DBWriter
         - Traders to interface with exchange APIs (parses the keyfile for
-            relevant authentication first)
+            relevant authentication first), through an ExchangePool
         - BalanceChecker
+        - ConcurrentBookFetcher
+        - Taker fee refresh schedule
+        - PollScheduler
+        - Book feeds of the markets given by `--book_feed`
+        - PollTelemetry
+        - SpreadStore
+        - StateJournal
         - Twilio Client
         - Forex Client
 
@@ -723,21 +1063,44 @@ class FCFAutotrageur(Autotrageur):
         NOTE: The order of these calls matters.  For example, the StatTracker
         relies on instantiated Traders, and a persisted Configuration entry.
 
+        A hosted bot takes the DBWriter, keyfile contents, ExchangePool,
+        book fetcher and Twilio Client from its SharedResources, and leaves
+        the taker fee and forex refreshes to its host.
+
         Args:
             arguments (dict): Map of the arguments passed to the program.
         """
         super()._post_setup(arguments)
 
+        # Write rows in the background from here on.  The writer of a
+        # fallback dry run is the writer still running from the live run,
+        # and a hosted bot shares the writer of its host.
+        if self._shared is not None:
+            self.db_writer = self._shared.db_writer
+        elif self.db_writer is None:
+            self.db_writer = DBWriter()
+
         # Persist the configuration.
         self.__persist_config()
 
-        # Parse keyfile into a dict.
-        exchange_key_map = self.__parse_keyfile(
-            arguments['KEYFILE'], arguments['--pi_mode'])
+        if self._shared is None:
+            # Parse keyfile into a dict.
+            exchange_key_map = self.__parse_keyfile(
+                arguments['KEYFILE'], arguments['--pi_mode'])
+            self.exchange_pool = ExchangePool()
+        else:
+            exchange_key_map = self._shared.exchange_key_map
+            self.exchange_pool = self._shared.exchange_pool
 
         # Set up the Traders for interfacing with exchange APIs.
         self.__setup_traders(exchange_key_map, arguments['--resume_id'])
 
+        # Walk the orderbooks in scaled integers, and cross-check the walks
+        # in Decimal, if requested.
+        for trader in (self.trader1, self.trader2):
+            trader.fixed_point = bool(arguments['--fixed_point'])
+            trader.verify_book_walk = bool(arguments['--verify_book_walk'])
+
         # Initialize StatTracker component and attach it to the Checkpoint.
         self.__setup_stat_tracker(arguments['--resume_id'])
         if arguments['--resume_id']:
@@ -747,8 +1110,64 @@ class FCFAutotrageur(Autotrageur):
         self.balance_checker = FCFBalanceChecker(
             self.trader1, self.trader2, self._send_email)
 
+        # Fetch both orderbooks of a poll concurrently.
+        if self._shared is None:
+            self.book_fetcher = ConcurrentBookFetcher()
+        else:
+            self.book_fetcher = self._shared.book_fetcher
+
+        # Refetch the cached taker fees periodically.  A host refetches
+        # those of its bots once per exchange.
+        taker_fee_tag = self.__schedule_tag(TAKER_FEE_SCHEDULE_TAG)
+        schedule.clear(taker_fee_tag)
+        if self._shared is None:
+            for trader in (self.trader1, self.trader2):
+                schedule.every(TAKER_FEE_REFRESH_HOURS).hours.do(
+                    refresh_taker_fee, trader).tag(taker_fee_tag)
+
+        # Pace polls by how close the spreads are to their targets.
+        self.poll_scheduler = PollScheduler(
+            self._config.poll_wait_short, self._config.poll_wait_default)
+
+        # Stream the orderbooks of the markets with a feed, polling on their
+        # updates.
+        self.__attach_book_feeds(arguments['--book_feed'])
+
+        # Record every poll compactly, logging only a sample in full.  One
+        # file per run, continued on resume.
+        self.poll_telemetry = PollTelemetry(
+            os.path.join(POLL_TELEMETRY_DIR,
+                         '{}.bin'.format(self._stat_tracker.id)),
+            log_sample_rate=int(arguments['--log_sample']))
+
+        # Screen polls by their best prices, if requested.
+        self._strategy.screen_polls = bool(arguments['--screen_polls'])
+
+        # Keep every polled spread opportunity, across runs of the same
+        # exchanges and pairs.
+        self.spread_store = SpreadStore(os.path.join(
+            SPREAD_STORE_DIR,
+            '{}_{}_{}_{}'.format(
+                self._config.exchange1, self._config.exchange1_pair,
+                self._config.exchange2, self._config.exchange2_pair
+            ).replace('/', '-')))
+
+        # Journal the state of every poll, for resuming after a crash.  The
+        # journal of the live run is closed on the fallback to a dry run.
+        if self.state_journal is not None:
+            self.state_journal.close()
+        prune_journals()
+        journal_id = str(uuid.uuid4())
+        self.state_journal = StateJournal(
+            os.path.join(STATE_JOURNAL_DIR, journal_id))
+        logging.info("Journaling state with resume id: {}".format(journal_id))
+
         # Set up Twilio Client.
-        self.__load_twilio(self._config.twilio_cfg_path)
+        if self._shared is None:
+            self.__load_twilio(self._config.twilio_cfg_path)
+        else:
+            self.twilio_config = self._shared.twilio_config
+            self.twilio_client = self._shared.twilio_client
 
         # Set up Forex client.
         self.__setup_forex()
@@ -805,14 +1224,28 @@ class FCFAutotrageur(Autotrageur):
             # Set up the Algorithm.
             self._strategy = self.__construct_strategy()
 
-    # @Override
-    def _wait(self):
-        """Wait for the specified polling interval.
+    def _get_poll_wait(self):
+        """Gets the number of seconds until the next poll.
 
-        We use the Autotrageur default unless a chunked trade is in
-        progress.
+        A chunked trade in progress is polled at the short interval.
+        Otherwise the interval is set by the PollScheduler from the distance
+        of the spreads to their next targets.
+
+        Returns:
+            float: The number of seconds to wait.
         """
         if self._strategy.trade_chunker.trade_completed:
-            super()._wait()
+            return self.poll_scheduler.get_wait(
+                self._strategy.get_target_distance(),
+                self._strategy.spread_min)
         else:
-            time.sleep(self._config.poll_wait_short)
+            return self._config.poll_wait_short
+
+    # @Override
+    def _wait(self):
+        """Wait for the next poll.
+
+        The wait ends early if the PollScheduler is woken, e.g. by an
+        orderbook update.
+        """
+        self.poll_scheduler.wait(self._get_poll_wait())
@@ -0,0 +1,354 @@
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import schedule
+import yaml
+
+from autotrageur.bot.arbitrage.autotrageur import (KEYFILE, Autotrageur,
+                                                   SharedResources)
+from autotrageur.bot.arbitrage.book_fetcher import SharedBookFetcher
+from autotrageur.bot.arbitrage.db_writer import DBWriter
+from autotrageur.bot.arbitrage.fcf_autotrageur import (FOREX_SCHEDULE_TAG,
+                                                       TAKER_FEE_REFRESH_HOURS,
+                                                       TAKER_FEE_SCHEDULE_TAG,
+                                                       FCFAutotrageur,
+                                                       load_twilio,
+                                                       parse_keyfile,
+                                                       refresh_taker_fee,
+                                                       update_forex)
+from autotrageur.bot.trader.exchange_pool import ExchangePool
+from fp_libs.logging.logging_utils import fancy_log
+
+# Key of a pair's config file path, in the pairs of the configuration.
+PAIR_CONFIG = 'config'
+
+# Key of the id of a pair's exported state to resume from, in the pairs of
+# the configuration.
+PAIR_RESUME_ID = 'resume_id'
+
+
+class MultiPairConfigurationError(Exception):
+    """Raised when the pairs of a multi-pair run are misconfigured."""
+    pass
+
+
+class MultiPairConfiguration(namedtuple('MultiPairConfiguration', [
+        'dryrun', 'id', 'pairs', 'start_timestamp', 'twilio_cfg_path',
+        'use_test_api'])):
+    """Holds the configuration of a multi-pair run.
+
+    Args:
+        dryrun (bool): If True, every pair is run as a dry run.  Must match
+            the configuration of each pair.
+        id (str): The unique id tagged to the current run.  This is not
+            provided from the config file and set during initialization.
+        pairs (list[dict]): The pairs to run, each given either by the path
+            of its config file, under PAIR_CONFIG, or by the id of an
+            exported state to resume from, under PAIR_RESUME_ID.
+        start_timestamp (float): The unix timestamp tagged against the
+            current run.  This is not provided from the config file and set
+            during initialization.
+        twilio_cfg_path (str): Path for the twilio config file, used for
+            sending notifications of every pair.
+        use_test_api (bool): If True, will use the test APIs of every
+            exchange.  Must match the configuration of each pair.
+    """
+    __slots__ = ()
+
+
+def _pair_name(pair):
+    """Names a pair for logging.
+
+    Args:
+        pair (FCFAutotrageur): The pair.
+
+    Returns:
+        str: The exchanges and symbols of the pair.
+    """
+    return '{} {} - {} {}'.format(
+        pair._config.exchange1, pair._config.exchange1_pair,
+        pair._config.exchange2, pair._config.exchange2_pair)
+
+
+class MultiPairAutotrageur(Autotrageur):
+    """Runs several fiat-crypto-fiat Autotrageurs in one process.
+
+    Each pair is an FCFAutotrageur with its own strategy, checkpoint,
+    StatTracker and state journal, polled on its own schedule.  The pairs
+    share the logger, DBWriter, keyfile contents and Twilio client of the
+    process, and a ccxt exchange object and taker fee cache per exchange.
+    Slippage statistics are kept per pair, as they are snapshotted per
+    configuration.  The taker fees are refreshed once per exchange, and the
+    forex once per quote currency.
+    Each round of polls fetches every distinct orderbook once.  A wakeup of a
+    pair's PollScheduler, e.g. by a book feed, makes the pair due once its
+    wake interval has passed since its last poll.
+
+    NOTE: The wallet balances of pairs trading the same currency on the
+    same exchange are not apportioned; each pair sizes its trades by the
+    whole balance.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        super().__init__()
+        self.pairs = []
+        self.resources = None
+        self._due = []
+        self._next_poll = {}
+        self._opportunities = []
+        self._wakeup = threading.Event()
+
+    def __setup_pair(self, entry, arguments):
+        """Sets up the FCFAutotrageur of a pair.
+
+        Args:
+            entry (dict): The pair's entry in the configuration.
+            arguments (dict): Map of the arguments passed to the program.
+
+        Raises:
+            MultiPairConfigurationError: If the pair's dryrun or test API
+                settings differ from those of the run.
+
+        Returns:
+            FCFAutotrageur: The set up pair.
+        """
+        pair = FCFAutotrageur(self.resources)
+        pair_arguments = dict(arguments)
+        pair_arguments['--resume_id'] = entry.get(PAIR_RESUME_ID)
+        if not pair_arguments['--resume_id']:
+            pair._load_configs(entry[PAIR_CONFIG])
+
+        pair._setup(pair_arguments)
+        if (pair._config.dryrun != self._config.dryrun
+                or pair._config.use_test_api != self._config.use_test_api):
+            raise MultiPairConfigurationError(
+                "{} does not match the dryrun and use_test_api settings of "
+                "the run.".format(_pair_name(pair)))
+
+        pair._post_setup(pair_arguments)
+        pair.poll_scheduler.on_wake = self._wakeup.set
+        return pair
+
+    def __setup_refreshes(self):
+        """Schedules the taker fee and forex refreshes of the pairs.
+
+        The taker fee cache of an exchange is shared by its traders, and
+        refreshed once; the forex of a quote currency is fetched once for
+        the traders converting it.
+        """
+        traders = [
+            trader for pair in self.pairs
+            for trader in (pair.trader1, pair.trader2)]
+
+        taker_fee_tag = (TAKER_FEE_SCHEDULE_TAG, id(self))
+        schedule.clear(taker_fee_tag)
+        exchange_traders = {}
+        for trader in traders:
+            exchange_traders.setdefault(trader.exchange_name, trader)
+        for trader in exchange_traders.values():
+            schedule.every(TAKER_FEE_REFRESH_HOURS).hours.do(
+                refresh_taker_fee, trader).tag(taker_fee_tag)
+
+        forex_tag = (FOREX_SCHEDULE_TAG, id(self))
+        schedule.clear(forex_tag)
+        quote_traders = {}
+        for trader in traders:
+            if trader.conversion_needed:
+                quote_traders.setdefault(trader.quote, []).append(trader)
+        for quote_group in quote_traders.values():
+            update_forex(self.resources.db_writer, quote_group)
+            # TODO: Adjust interval once real-time forex implemented.
+            schedule.every().hour.do(
+                update_forex, self.resources.db_writer, quote_group
+            ).tag(forex_tag)
+
+    # @Override
+    def _alert(self, subject):
+        """Last ditch effort to alert user on operation failure.
+
+        The pairs share their notifications, so the first pair alerts.
+
+        Args:
+            subject (str): The subject/topic for the alert.
+        """
+        self.pairs[0]._alert(subject)
+
+    # @Override
+    def _clean_up(self):
+        """Cleans up the state of the pairs due for a poll."""
+        for pair in self._due:
+            pair._clean_up()
+
+    # @Override
+    def _execute_trade(self):
+        """Executes the arbitrage of each pair with an opportunity."""
+        for pair in self._opportunities:
+            logging.info("Trading %s", _pair_name(pair))
+            pair._execute_trade()
+
+    # @Override
+    def _export_state(self):
+        """Exports the state of each pair to the database, then commits
+        the rows queued by the pairs and stops the shared DBWriter."""
+        for pair in self.pairs:
+            pair._export_state()
+        self.resources.db_writer.close()
+
+    # @Override
+    def _final_log(self):
+        """Produces the final log of each pair."""
+        for pair in self.pairs:
+            fancy_log(_pair_name(pair))
+            pair._final_log()
+        self.resources.db_writer.log_stats()
+
+    # @Override
+    def _import_state(self, *args):
+        """Pairs import their own states, by their PAIR_RESUME_ID entries.
+
+        Raises:
+            NotImplementedError: A multi-pair run is not resumed as a whole.
+        """
+        raise NotImplementedError(
+            "Resume the pairs by their {} entries.".format(PAIR_RESUME_ID))
+
+    # @Override
+    def _is_poll_logged(self):
+        """Starts the polls of the due pairs, deciding whether the round is
+        logged in full.
+
+        Returns:
+            bool: Whether the poll of any due pair is sampled.
+        """
+        return any([pair._is_poll_logged() for pair in self._due])
+
+    # @Override
+    def _load_configs(self, config_file_path):
+        """Load the configurations of the multi-pair run.
+
+        Args:
+            config_file_path (str): Path to the configuration file used for the
+                current run.
+
+        Raises:
+            MultiPairConfigurationError: If no pairs are configured, or an
+                entry names neither a config file nor a resume id.
+        """
+        with open(config_file_path, 'r') as ymlfile:
+            config_map = yaml.safe_load(ymlfile)
+        self._config = MultiPairConfiguration(
+            id=str(uuid.uuid4()),
+            start_timestamp=int(time.time()),
+            **config_map)
+
+        if not self._config.pairs:
+            raise MultiPairConfigurationError("No pairs are configured.")
+        for entry in self._config.pairs:
+            if not (entry.get(PAIR_CONFIG) or entry.get(PAIR_RESUME_ID)):
+                raise MultiPairConfigurationError(
+                    "Pair entry {} has neither a {} nor a {}.".format(
+                        entry, PAIR_CONFIG, PAIR_RESUME_ID))
+
+    # @Override
+    def _poll_opportunity(self):
+        """Polls the due pairs for arbitrage opportunities.
+
+        The orderbooks of the round are fetched at once, each distinct
+        orderbook once, before the pairs are polled.
+
+        Returns:
+            bool: Whether any pair has an opportunity.
+        """
+        self.resources.book_fetcher.prefetch([
+            trader for pair in self._due
+            for trader in (pair.trader1, pair.trader2)])
+        self._opportunities = [
+            pair for pair in self._due if pair._poll_opportunity()]
+        return bool(self._opportunities)
+
+    # @Override
+    def _post_setup(self, arguments):
+        """Initializes the shared components, then sets up the pairs.
+
+        Components initialized:
+        - SharedResources (starts the DBWriter, parses the keyfile, connects
+            the Twilio Client)
+        - Pairs, in order of configuration
+        - Taker fee and forex refresh schedules
+
+        Args:
+            arguments (dict): Map of the arguments passed to the program.
+
+        Raises:
+            MultiPairConfigurationError: If two pairs trade the same
+                exchanges and symbols, or a pair's settings differ from
+                those of the run.
+        """
+        super()._post_setup(arguments)
+
+        # The writer of a fallback dry run is the writer still running from
+        # the live run.
+        if self.resources is None:
+            db_writer = DBWriter()
+        else:
+            db_writer = self.resources.db_writer
+
+        twilio_config, twilio_client = load_twilio(
+            self._config.twilio_cfg_path, self.logger)
+        self.resources = SharedResources(
+            book_fetcher=SharedBookFetcher(),
+            db_writer=db_writer,
+            exchange_key_map=parse_keyfile(
+                arguments[KEYFILE], arguments['--pi_mode'],
+                self._config.dryrun),
+            exchange_pool=ExchangePool(),
+            logger=self.logger,
+            twilio_client=twilio_client,
+            twilio_config=twilio_config)
+
+        names = set()
+        for entry in self._config.pairs:
+            pair = self.__setup_pair(entry, arguments)
+            name = _pair_name(pair)
+            if name in names:
+                raise MultiPairConfigurationError(
+                    "{} is configured more than once.".format(name))
+            names.add(name)
+            self.pairs.append(pair)
+        self.__setup_refreshes()
+
+        # Every pair is polled in the first round.
+        self._due = list(self.pairs)
+        logging.info("Running %d pairs on %d exchanges.", len(self.pairs),
+                     len(self.resources.exchange_pool))
+
+    # @Override
+    def _wait(self):
+        """Wait until the next poll of any pair is due, or a pair is woken.
+
+        The pairs polled in the round schedule their next polls, and the
+        pairs due or woken when the wait ends are polled in the next round.
+        """
+        now = time.time()
+        for pair in self._due:
+            self._next_poll[pair] = now + pair._get_poll_wait()
+
+        # Woken pairs are due no sooner than their PollScheduler allows.
+        wake_times = [pair.poll_scheduler.get_wake_time()
+                      for pair in self.pairs]
+        next_poll = min(list(self._next_poll.values()) + [
+            wake_time for wake_time in wake_times if wake_time is not None])
+        self._wakeup.wait(max(0, next_poll - time.time()))
+        self._wakeup.clear()
+
+        now = time.time()
+        self._due = [
+            pair for pair in self.pairs
+            if pair.poll_scheduler.consume_wake()
+            or self._next_poll[pair] <= now]
+        for pair in self._due:
+            pair.poll_scheduler.start_poll()
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+# Distances to the next target, in multiples of spread_min, within which
+# polling is fastest and beyond which polling is slowest.
+NEAR_TARGET_SPREAD_MINS = 1
+FAR_TARGET_SPREAD_MINS = 5
+
+
+class PollScheduler():
+    """Decides how long to wait between polls.
+
+    Polls aggressively when the spreads are close to the next target and
+    backs off when they are far away.  A wait can be cut short with `wake`,
+    e.g. when a streamed orderbook is updated, though not to less than
+    `wake_interval` after the previous poll; a feed may update far more
+    often than the legs without one can be fetched.
+
+    A scheduler whose waits are made by another, e.g. the host of several
+    bots, forwards its wakeups through `on_wake`, checks for them with
+    `consume_wake` and records its polls with `start_poll`.
+    """
+
+    def __init__(self, min_wait, max_wait, on_wake=None, wake_interval=0):
+        """Constructor.
+
+        Args:
+            min_wait (float): The wait (in seconds) when a spread is within
+                NEAR_TARGET_SPREAD_MINS of its next target.
+            max_wait (float): The wait (in seconds) when the spreads are at
+                least FAR_TARGET_SPREAD_MINS from their next targets, or
+                their distance is unknown.
+            on_wake (func, optional): Defaults to None. Called with no
+                arguments after every `wake`.
+            wake_interval (float, optional): Defaults to 0. The minimum
+                number of seconds between a poll and the next woken one.
+        """
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.on_wake = on_wake
+        self.wake_interval = wake_interval
+        self._wakeup = threading.Event()
+        self._last_poll = 0
+
+    def consume_wake(self):
+        """Checks whether a woken poll is due, without waiting.
+
+        Returns:
+            bool: True if woken and `wake_interval` has passed since the
+                last poll, in which case the wakeup is consumed.
+        """
+        wake_time = self.get_wake_time()
+        if wake_time is None or wake_time > time.time():
+            return False
+        self._wakeup.clear()
+        return True
+
+    def get_wake_time(self):
+        """Gets the earliest time of a woken poll.
+
+        Returns:
+            float: The time since the epoch, in seconds; None if not woken.
+        """
+        if not self._wakeup.is_set():
+            return None
+        return self._last_poll + self.wake_interval
+
+    def get_wait(self, target_distance, spread_min):
+        """Gets the wait before the next poll.
+
+        The wait is interpolated linearly between `min_wait` and
+        `max_wait` for distances between the near and far thresholds.
+
+        Args:
+            target_distance (Decimal): The smallest distance of a spread to
+                its next target, as a spread percentage.  None if unknown.
+            spread_min (Decimal): The minimum spread increment between
+                targets.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        if target_distance is None:
+            return self.max_wait
+
+        steps = float(target_distance / spread_min)
+        if steps <= NEAR_TARGET_SPREAD_MINS:
+            return self.min_wait
+        elif steps >= FAR_TARGET_SPREAD_MINS:
+            return self.max_wait
+        else:
+            ratio = ((steps - NEAR_TARGET_SPREAD_MINS) /
+                     (FAR_TARGET_SPREAD_MINS - NEAR_TARGET_SPREAD_MINS))
+            return self.min_wait + ratio * (self.max_wait - self.min_wait)
+
+    def start_poll(self):
+        """Records the start of a poll, which covers any pending wakeup."""
+        self._wakeup.clear()
+        self._last_poll = time.time()
+
+    def wait(self, timeout):
+        """Blocks until the timeout elapses or `wake` is called, and then
+        starts the next poll.
+
+        A woken wait lasts until `wake_interval` after the previous poll.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait.
+
+        Returns:
+            bool: True if woken early, False if the full timeout elapsed.
+        """
+        logging.debug("Waiting up to %.2fs for next poll.", timeout)
+        deadline = time.time() + timeout
+        woken = self._wakeup.wait(timeout)
+        if woken:
+            delay = min(self.get_wake_time(), deadline) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self.start_poll()
+        return woken
+
+    def wake(self):
+        """Ends the current wait, or the next one, immediately.
+
+        Safe to call from any thread.
+        """
+        self._wakeup.set()
+        if self.on_wake is not None:
+            self.on_wake()
@@ -0,0 +1,170 @@
+"""Compact per-poll telemetry.
+
+Every poll is recorded into a fixed-size ring buffer of typed records, which
+is appended to a binary file in batches.  Human-readable poll logging is
+reserved for a sample of the polls.
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+# Default number of records held in memory.
+DEFAULT_TELEMETRY_CAPACITY = 1024
+
+# Default number of records written to the file at once.
+DEFAULT_TELEMETRY_BATCH = 256
+
+# Default sampling rate of the human-readable poll logs; one poll in this
+# many is logged in full.
+DEFAULT_LOG_SAMPLE_RATE = 10
+
+# Directory holding one telemetry file per run.
+POLL_TELEMETRY_DIR = os.path.join('data', 'telemetry')
+
+# Layout of a poll record, and of the telemetry file.
+POLL_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('e1_buy', '<f8'),
+    ('e2_buy', '<f8'),
+    ('e1_sell', '<f8'),
+    ('e2_sell', '<f8'),
+    ('e1_spread', '<f8'),
+    ('e2_spread', '<f8'),
+    ('target_index', '<i4')
+])
+
+
+def read_poll_records(path):
+    """Reads the poll records of a telemetry file.
+
+    Args:
+        path (str): The path of the telemetry file.
+
+    Returns:
+        numpy.ndarray: The records, in the order they were polled.
+    """
+    return np.fromfile(path, dtype=POLL_RECORD_DTYPE)
+
+
+class PollTelemetry():
+    """Records every poll at a low, fixed cost.
+
+    Prices and spreads are stored as floating point; the records are for
+    analysis, and the exact Decimal values of traded polls are persisted
+    with the trades.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_TELEMETRY_CAPACITY,
+                 batch_size=DEFAULT_TELEMETRY_BATCH,
+                 log_sample_rate=DEFAULT_LOG_SAMPLE_RATE):
+        """Constructor.
+
+        Args:
+            path (str): The path of the telemetry file, appended to if it
+                exists, e.g. on resume.
+            capacity (int, optional): Defaults to DEFAULT_TELEMETRY_CAPACITY.
+                The number of most recent records held in memory.
+            batch_size (int, optional): Defaults to DEFAULT_TELEMETRY_BATCH.
+                The number of records written to the file at once; at most
+                `capacity`.
+            log_sample_rate (int, optional): Defaults to
+                DEFAULT_LOG_SAMPLE_RATE. One poll in this many is logged in
+                full; 1 logs every poll.
+
+        Raises:
+            ValueError: If the sizes or the sampling rate are not positive,
+                or the batch does not fit in memory.
+        """
+        if capacity < 1 or log_sample_rate < 1:
+            raise ValueError(
+                "Telemetry capacity and log sample rate must be positive.")
+        if not 1 <= batch_size <= capacity:
+            raise ValueError(
+                "Telemetry batch size must be between 1 and the capacity.")
+
+        self.path = path
+        self.batch_size = batch_size
+        self.log_sample_rate = log_sample_rate
+        self.sampled = True
+        self.poll_count = 0
+        self.record_count = 0
+        self._records = np.zeros(capacity, dtype=POLL_RECORD_DTYPE)
+        self._flushed_count = 0
+
+    def __write(self, records):
+        """Appends records to the telemetry file.
+
+        Args:
+            records (numpy.ndarray): The records to append.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as telemetry_file:
+                telemetry_file.write(records.tobytes())
+        except OSError as exc:
+            logging.warning("Could not write poll telemetry: %s", exc)
+
+    def flush(self):
+        """Writes the records not yet in the file."""
+        if self.record_count == self._flushed_count:
+            return
+
+        capacity = len(self._records)
+        start = self._flushed_count % capacity
+        end = self.record_count % capacity
+        if start < end:
+            self.__write(self._records[start:end])
+        else:
+            self.__write(np.concatenate(
+                (self._records[start:], self._records[:end])))
+        self._flushed_count = self.record_count
+
+    def get_recent(self):
+        """Gets the records held in memory.
+
+        Returns:
+            numpy.ndarray: A copy of up to `capacity` most recent records,
+                oldest first.
+        """
+        capacity = len(self._records)
+        if self.record_count <= capacity:
+            return self._records[:self.record_count].copy()
+        return np.roll(self._records, -(self.record_count % capacity))
+
+    def record(self, spread_opp, target_index, timestamp=None):
+        """Records a poll.
+
+        Args:
+            spread_opp (SpreadOpportunity): The polled spread opportunity.
+            target_index (int): The current target index of the strategy.
+            timestamp (float, optional): Defaults to the current time. The
+                unix timestamp of the poll.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        self._records[self.record_count % len(self._records)] = (
+            timestamp,
+            spread_opp.e1_buy,
+            spread_opp.e2_buy,
+            spread_opp.e1_sell,
+            spread_opp.e2_sell,
+            spread_opp.e1_spread,
+            spread_opp.e2_spread,
+            target_index)
+        self.record_count += 1
+
+        if self.record_count - self._flushed_count >= self.batch_size:
+            self.flush()
+
+    def sample(self):
+        """Starts a poll, deciding whether it is logged in full.
+
+        Returns:
+            bool: Whether the poll is sampled for human-readable logging.
+        """
+        self.sampled = self.poll_count % self.log_sample_rate == 0
+        self.poll_count += 1
+        return self.sampled
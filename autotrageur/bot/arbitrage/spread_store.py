@@ -0,0 +1,231 @@
+"""Append-only columnar store of polled spread opportunities.
+
+Every poll's SpreadOpportunity is kept, not only the ones traded on.  The
+store is a directory of segments, each named by the timestamp of its first
+record in milliseconds, and holding one file of fixed-width values per
+column.  Segments are rotated after a fixed number of records, and records
+within a segment are in time order, so a time range is found with a binary
+search over segment names followed by one within the segment.
+"""
+import bisect
+import logging
+import os
+import time
+
+import numpy as np
+
+# Default number of records per segment; about a week of 2 second polls.
+DEFAULT_SEGMENT_SIZE = 300000
+
+# Default number of records buffered before they are written.
+DEFAULT_SPREAD_BATCH = 256
+
+# Directory holding one store per market pairing.
+SPREAD_STORE_DIR = os.path.join('data', 'spreads')
+
+# Width of the string ids, e.g. str(uuid.uuid4()).
+_ID_WIDTH = 36
+
+# Columns of the store, in the order of the record.
+SPREAD_COLUMNS_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('id', 'S{}'.format(_ID_WIDTH)),
+    ('e1_spread', '<f8'),
+    ('e2_spread', '<f8'),
+    ('e1_buy', '<f8'),
+    ('e2_buy', '<f8'),
+    ('e1_sell', '<f8'),
+    ('e2_sell', '<f8'),
+    ('e1_forex_rate_id', 'S{}'.format(_ID_WIDTH)),
+    ('e2_forex_rate_id', 'S{}'.format(_ID_WIDTH))
+])
+
+
+def _encode_id(value):
+    """Encodes a string id for a fixed-width column.
+
+    Args:
+        value (str): The id, or None.
+
+    Returns:
+        bytes: The encoded id; empty for None.
+    """
+    return b'' if value is None else value.encode('ascii')
+
+
+class SpreadStore():
+    """Writes and reads the spread opportunities of one market pairing.
+
+    A single process is expected to append to a store at a time.
+    """
+
+    def __init__(self, root, segment_size=DEFAULT_SEGMENT_SIZE,
+                 batch_size=DEFAULT_SPREAD_BATCH, clock=time.time):
+        """Constructor.
+
+        Args:
+            root (str): The directory of the store.
+            segment_size (int, optional): Defaults to DEFAULT_SEGMENT_SIZE.
+                The number of records after which a new segment is started.
+            batch_size (int, optional): Defaults to DEFAULT_SPREAD_BATCH. The
+                number of records buffered before they are written.
+            clock (func, optional): Defaults to time.time. Returns the
+                current unix timestamp.
+        """
+        self.root = root
+        self.segment_size = segment_size
+        self.clock = clock
+        self._buffer = np.zeros(batch_size, dtype=SPREAD_COLUMNS_DTYPE)
+        self._buffered_count = 0
+        self._segment = None
+        self._segment_count = 0
+
+    def __get_segment_names(self):
+        """Gets the names of the store's segments.
+
+        Returns:
+            list[str]: The segment names, in time order.
+        """
+        try:
+            return sorted(name for name in os.listdir(self.root)
+                          if name.isdigit())
+        except FileNotFoundError:
+            return []
+
+    def __read_segment(self, name, columns):
+        """Reads the given columns of a segment.
+
+        Columns left uneven by an interrupted write are cut to the records
+        present in all of them.
+
+        Args:
+            name (str): The segment name.
+            columns (list[str]): The columns to read, including 'timestamp'.
+
+        Returns:
+            dict: The column arrays, keyed by column name.
+        """
+        segment_dir = os.path.join(self.root, name)
+        data = {
+            column: np.fromfile(
+                os.path.join(segment_dir, column + '.bin'),
+                dtype=SPREAD_COLUMNS_DTYPE[column])
+            for column in columns
+        }
+        length = min(len(values) for values in data.values())
+        return {column: values[:length] for column, values in data.items()}
+
+    def __write(self, records):
+        """Appends records to the current segment, rotating as needed.
+
+        Args:
+            records (numpy.ndarray): The records to append.
+        """
+        while len(records):
+            if (self._segment is None
+                    or self._segment_count >= self.segment_size):
+                self._segment = os.path.join(
+                    self.root, '{:015d}'.format(
+                        int(records[0]['timestamp'] * 1000)))
+                self._segment_count = 0
+                os.makedirs(self._segment, exist_ok=True)
+
+            chunk = records[:self.segment_size - self._segment_count]
+            for column in SPREAD_COLUMNS_DTYPE.names:
+                with open(os.path.join(self._segment, column + '.bin'),
+                          'ab') as column_file:
+                    column_file.write(
+                        np.ascontiguousarray(chunk[column]).tobytes())
+            self._segment_count += len(chunk)
+            records = records[len(chunk):]
+
+    def append(self, spread_opp, timestamp=None):
+        """Appends a polled spread opportunity.
+
+        Args:
+            spread_opp (SpreadOpportunity): The spread opportunity.
+            timestamp (float, optional): Defaults to the current time. The
+                unix timestamp of the poll.
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+
+        self._buffer[self._buffered_count] = (
+            timestamp,
+            _encode_id(spread_opp.id),
+            spread_opp.e1_spread,
+            spread_opp.e2_spread,
+            spread_opp.e1_buy,
+            spread_opp.e2_buy,
+            spread_opp.e1_sell,
+            spread_opp.e2_sell,
+            _encode_id(spread_opp.e1_forex_rate_id),
+            _encode_id(spread_opp.e2_forex_rate_id))
+        self._buffered_count += 1
+
+        if self._buffered_count == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records."""
+        if not self._buffered_count:
+            return
+
+        try:
+            self.__write(self._buffer[:self._buffered_count])
+        except OSError as exc:
+            logging.warning("Could not write spread store: %s", exc)
+        self._buffered_count = 0
+
+    def read(self, start=None, end=None, columns=None):
+        """Reads the records polled within a time range.
+
+        Buffered records are not read; see `flush`.
+
+        Args:
+            start (float, optional): Defaults to None. The earliest unix
+                timestamp to include; None reads from the first record.
+            end (float, optional): Defaults to None. The unix timestamp to
+                read up to, exclusive; None reads to the last record.
+            columns (list[str], optional): Defaults to all columns. The
+                columns to read.
+
+        Returns:
+            dict: The column arrays, keyed by column name, in time order.
+                String ids are bytes, empty where the id was None.
+        """
+        if columns is None:
+            columns = list(SPREAD_COLUMNS_DTYPE.names)
+        read_columns = list(columns)
+        if 'timestamp' not in read_columns:
+            read_columns.append('timestamp')
+
+        names = self.__get_segment_names()
+        first = 0
+        last = len(names)
+        if start is not None:
+            key = '{:015d}'.format(int(start * 1000))
+            # The segment containing start begins at or before it.
+            first = max(bisect.bisect_right(names, key) - 1, 0)
+        if end is not None:
+            key = '{:015d}'.format(int(end * 1000))
+            last = bisect.bisect_right(names, key)
+
+        parts = []
+        for name in names[first:last]:
+            data = self.__read_segment(name, read_columns)
+            timestamps = data['timestamp']
+            lo = (0 if start is None
+                  else np.searchsorted(timestamps, start, 'left'))
+            hi = (len(timestamps) if end is None
+                  else np.searchsorted(timestamps, end, 'left'))
+            if lo < hi:
+                parts.append(
+                    {column: data[column][lo:hi] for column in columns})
+
+        return {
+            column: (np.concatenate([part[column] for part in parts])
+                     if parts
+                     else np.empty(0, dtype=SPREAD_COLUMNS_DTYPE[column]))
+            for column in columns
+        }
@@ -1,5 +1,7 @@
 import logging
 
+import numpy as np
+
 from fp_libs.constants.decimal_constants import ZERO, ONE, HUNDRED
 
 
@@ -30,6 +32,24 @@ def _is_invalid_price(exc2_num_price, exc1_denom_price):
     else:
         return False
 
+def _valid_indexes(prices):
+    """Finds the prices which are neither None, zero nor negative.
+
+    Args:
+        prices (list[Decimal]): The prices, one per exchange.
+
+    Returns:
+        numpy.ndarray: The indexes of the valid prices.
+    """
+    valid = []
+    for index, price in enumerate(prices):
+        if price is None or price <= ZERO:
+            logging.warning(
+                "None, zero or negative price of exchange %d: %s", index, price)
+        else:
+            valid.append(index)
+    return np.array(valid, dtype=int)
+
 def calc_fixed_spread(buy_price, sell_price, buy_fee, sell_fee, buy_incl_fee):
     """Calculates the fixed spread between two prices.  Will not change the
     denominator and calculates a more absolute spread between two prices.
@@ -95,3 +115,90 @@ def calc_fixed_spread(buy_price, sell_price, buy_fee, sell_fee, buy_incl_fee):
                                                     buy_fee, sell_price,
                                                     sell_fee))
         return spread
+
+def calc_fixed_spread_matrix(buy_prices, sell_prices, buy_fees, sell_fees,
+                             buy_incl_fees):
+    """Calculates the fixed spread of every route between N exchanges.
+
+    The spread of buying on exchange i and selling on exchange j is that of
+    `calc_fixed_spread(buy_prices[i], sell_prices[j], buy_fees[i],
+    sell_fees[j], buy_incl_fees[i])`, to the last digit.  The fee terms of
+    each exchange are calculated once, as the buy factor `1/bp * (1 - bf)`
+    or `1/bp / (1 + bf)` and the sell factor `1 - sf`, and the routes are
+    calculated at once as their outer product.
+
+    Args:
+        buy_prices (list[Decimal]): The buy price of each exchange.
+        sell_prices (list[Decimal]): The sell price of each exchange.
+        buy_fees (list[Decimal]): The trading fee of each exchange, when
+            buying.  Expected as a percentage in ratio form (e.g. 0.01 for
+            1%).
+        sell_fees (list[Decimal]): The trading fee of each exchange, when
+            selling.
+        buy_incl_fees (list[bool]): Whether each exchange's buy price has
+            fees factored into the price.  See `calc_fixed_spread`.
+
+    Returns:
+        numpy.ndarray: The N x N spreads as percentages, indexed by buy then
+            sell exchange.  The diagonal, and the routes with a None, zero
+            or negative price, are None.
+    """
+    size = len(buy_prices)
+    spreads = np.full((size, size), None, dtype=object)
+    buy_indexes = _valid_indexes(buy_prices)
+    sell_indexes = _valid_indexes(sell_prices)
+
+    if buy_indexes.size and sell_indexes.size:
+        buy_factors = np.empty(buy_indexes.size, dtype=object)
+        for position, index in enumerate(buy_indexes):
+            if buy_incl_fees[index]:
+                buy_factors[position] = (
+                    (ONE / buy_prices[index]) * (ONE - buy_fees[index]))
+            else:
+                buy_factors[position] = (
+                    (ONE / buy_prices[index]) / (ONE + buy_fees[index]))
+        sell_factors = np.array(
+            [sell_prices[index] for index in sell_indexes], dtype=object)
+        sell_keeps = np.array(
+            [ONE - sell_fees[index] for index in sell_indexes], dtype=object)
+
+        # Same order of operations as `calc_fixed_spread`.
+        spreads[np.ix_(buy_indexes, sell_indexes)] = (
+            np.multiply.outer(buy_factors, sell_factors) * sell_keeps
+            - ONE) * HUNDRED
+
+    np.fill_diagonal(spreads, None)
+    return spreads
+
+
+def calc_trigger_ratio(spread, buy_fee, sell_fee, buy_incl_fee):
+    """Inverts `calc_fixed_spread` for the price ratio reaching a spread.
+
+    Solving the equations of `calc_fixed_spread` for the prices, a spread of
+    at least `spread` is reached exactly when:
+
+    sp / bp >= (1 + spread/100) / ((1 - bf) * (1 - sf))
+
+    in Scenario 1, and in Scenario 2:
+
+    sp / bp >= (1 + spread/100) / (1/(1 + bf) * (1 - sf))
+
+    Args:
+        spread (Decimal): The spread to reach, as a percentage.
+        buy_fee (Decimal): The trading fee from the buy exchange.  Expected
+            as a percentage in ratio form (e.g. 0.01 for 1%).
+        sell_fee (Decimal): The trading fee from the sell exchange.  Expected
+            as a percentage in ratio form (e.g. 0.01 for 1%).
+        buy_incl_fee (bool): True if an exchange's buy price will have fees
+            factored into the price.  See `calc_fixed_spread`.
+
+    Returns:
+        Decimal: The lowest ratio of the sell price to the buy price at which
+            the spread is reached, or zero or less if any positive prices
+            reach it.
+    """
+    if buy_incl_fee:
+        buy_keep = ONE - buy_fee
+    else:
+        buy_keep = ONE / (ONE + buy_fee)
+    return (ONE + spread / HUNDRED) / (buy_keep * (ONE - sell_fee))
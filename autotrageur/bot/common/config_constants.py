@@ -1,7 +1,9 @@
 """Configuration file constants."""
 
 # Database config constants.
+DB_BACKEND = 'db_backend'
 DB_NAME = 'db_name'
+DB_PATH = 'db_path'
 DB_USER = 'db_user'
 
 # Email config file path.
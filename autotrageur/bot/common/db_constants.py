@@ -5,6 +5,9 @@ FCF_AUTOTRAGEUR_CONFIG_TABLE = 'fcf_autotrageur_config'
 FCF_MEASURES_TABLE = 'fcf_measures'
 FCF_STATE_TABLE = 'fcf_state'
 FOREX_RATE_TABLE = 'forex_rate'
+RUN_ROLLUP_TABLE = 'run_rollup'
+SCHEMA_VERSION_TABLE = 'schema_version'
+SLIPPAGE_STATS_TABLE = 'slippage_stats'
 TRADES_TABLE = 'trades'
 TRADE_OPPORTUNITY_TABLE = 'trade_opportunity'
 
@@ -30,12 +33,26 @@ FCF_AUTOTRAGEUR_CONFIG_COLUMNS = [
     'vol_min'
 ]
 
+# Metadata of each checkpoint in fcf_state, for listing without decoding.
+FCF_STATE_CATALOG_COLUMNS = [
+    'export_timestamp',
+    'momentum',
+    'target_index',
+    'last_target_index',
+    'trade_count',
+    'e1_bal_base',
+    'e1_bal_quote',
+    'e2_bal_base',
+    'e2_bal_quote'
+]
+
 # Table primary keys.
 FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_ID = 'id'
 FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_START_TS = 'start_timestamp'
 FCF_MEASURES_PRIM_KEY_ID = 'id'
 FCF_STATE_PRIM_KEY_ID = 'id'
 FOREX_RATE_PRIM_KEY_ID = 'id'
+RUN_ROLLUP_PRIM_KEYS = ('autotrageur_config_id', 'exchange', 'fee_asset')
 TRADES_PRIM_KEY_TRADE_OPP_ID = 'trade_opportunity_id'
 TRADES_PRIM_KEY_SIDE = 'side'
 TRADE_OPPORTUNITY_PRIM_KEY_ID = 'id'
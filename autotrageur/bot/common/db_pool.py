@@ -0,0 +1,245 @@
+"""Pool of database connections for multithreaded database work.
+
+A MySQL connection must not be used by two threads at once.  Each thread
+checks a connection out of the pool for the duration of its work, so inserts
+from several threads run in parallel instead of through a single shared
+connection.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import MySQLdb
+
+# Default maximum number of open connections.
+DEFAULT_POOL_SIZE = 8
+
+# Seconds a connection may sit idle before it is pinged on checkout; well
+# below the server's wait_timeout.
+DEFAULT_PING_INTERVAL = 600
+
+
+class DBPoolTimeoutError(Exception):
+    """Exception when no connection became available in time."""
+    pass
+
+
+class DBPool():
+    """A thread-safe pool of database connections.
+
+    Connections are opened lazily, up to `max_size`, and reused most
+    recently released first.  A connection idle for longer than the ping
+    interval is health checked before it is handed out, and replaced if the
+    check fails.
+    """
+
+    def __init__(self, db_user, db_password, db_name,
+                 max_size=DEFAULT_POOL_SIZE,
+                 ping_interval=DEFAULT_PING_INTERVAL,
+                 connect=MySQLdb.connect, clock=time.monotonic):
+        """Constructor.
+
+        Args:
+            db_user (str): The database user.
+            db_password (str): The database password.
+            db_name (str): The database name.
+            max_size (int, optional): Defaults to DEFAULT_POOL_SIZE. The
+                maximum number of open connections.
+            ping_interval (float, optional): Defaults to
+                DEFAULT_PING_INTERVAL. The idle seconds after which a
+                connection is pinged on checkout.
+            connect (func, optional): Defaults to MySQLdb.connect. Opens a
+                connection.
+            clock (func, optional): Defaults to time.monotonic. Returns the
+                current time in seconds.
+
+        Raises:
+            ValueError: If max_size is not positive.
+        """
+        if max_size < 1:
+            raise ValueError("Pool size must be positive.")
+
+        self.max_size = max_size
+        self.ping_interval = ping_interval
+        self.clock = clock
+        self.created_count = 0
+        self.checkout_count = 0
+        self.wait_count = 0
+        self.total_wait_time = 0
+        self.failed_check_count = 0
+        self.max_in_use = 0
+        self._connect_args = {
+            'user': db_user,
+            'passwd': db_password,
+            'db': db_name
+        }
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open_count = 0
+        self._in_use = 0
+        # Incremented by `close`; connections checked out before are closed
+        # on release.
+        self._generation = 0
+
+    def __acquire(self, timeout):
+        """Takes an idle connection, or a free slot for a new one.
+
+        Args:
+            timeout (float): The maximum seconds to wait; None waits
+                indefinitely.
+
+        Returns:
+            tuple(Connection, float, int): The idle connection and the time
+                it was released, or (None, None) for a free slot, and the
+                generation of the pool.
+
+        Raises:
+            DBPoolTimeoutError: If no connection became available in time.
+        """
+        with self._cond:
+            if not self._idle and self._open_count >= self.max_size:
+                self.wait_count += 1
+                start = self.clock()
+                available = self._cond.wait_for(
+                    lambda: self._idle or self._open_count < self.max_size,
+                    timeout)
+                self.total_wait_time += self.clock() - start
+                if not available:
+                    raise DBPoolTimeoutError(
+                        "No database connection available.")
+
+            self.checkout_count += 1
+            self._in_use += 1
+            self.max_in_use = max(self.max_in_use, self._in_use)
+            if self._idle:
+                return self._idle.pop() + (self._generation,)
+            self._open_count += 1
+            return None, None, self._generation
+
+    def __check(self, conn, released):
+        """Health checks a connection idle for longer than the ping
+        interval.
+
+        Args:
+            conn (Connection): The connection.
+            released (float): The time the connection was released.
+
+        Returns:
+            Connection: The connection, or a new one if the check failed.
+        """
+        if self.clock() - released < self.ping_interval:
+            return conn
+
+        try:
+            conn.ping()
+            return conn
+        except MySQLdb.Error as exc:
+            logging.warning("Replacing stale database connection: %s", exc)
+            self.failed_check_count += 1
+            self.__close(conn)
+            return self.__open()
+
+    def __close(self, conn):
+        """Closes a connection, ignoring errors.
+
+        Args:
+            conn (Connection): The connection.
+        """
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+
+    def __open(self):
+        """Opens a new connection.
+
+        Returns:
+            Connection: The connection.
+        """
+        conn = self._connect(**self._connect_args)
+        with self._cond:
+            self.created_count += 1
+        return conn
+
+    def __release(self, conn, broken, generation):
+        """Returns a connection to the pool.
+
+        Args:
+            conn (Connection): The connection, or None if it failed to open.
+            broken (bool): Whether the connection must be discarded.
+            generation (int): The generation of the pool the connection was
+                checked out in.
+        """
+        with self._cond:
+            discard = broken or generation != self._generation
+            self._in_use -= 1
+            if conn is None or discard:
+                self._open_count -= 1
+            else:
+                self._idle.append((conn, self.clock()))
+            self._cond.notify()
+        if conn is not None and discard:
+            self.__close(conn)
+
+    def close(self):
+        """Closes the idle connections.
+
+        Connections in use are closed when they are released afterwards.
+        The pool stays usable, with new connections.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._generation += 1
+        for conn, _ in idle:
+            self.__close(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Checks out a connection for the calling thread.
+
+        The connection is rolled back if the block raises; committing is up
+        to the caller.
+
+        Args:
+            timeout (float, optional): Defaults to None. The maximum seconds
+                to wait for a connection; None waits indefinitely.
+
+        Yields:
+            Connection: The connection.
+
+        Raises:
+            DBPoolTimeoutError: If no connection became available in time.
+        """
+        conn, released, generation = self.__acquire(timeout)
+        # Until proven otherwise, the connection is not reused.
+        broken = True
+        try:
+            if conn is None:
+                conn = self.__open()
+            else:
+                conn = self.__check(conn, released)
+            try:
+                yield conn
+            except MySQLdb.OperationalError:
+                # The connection may have been lost.
+                raise
+            except Exception:
+                conn.rollback()
+                broken = False
+                raise
+            broken = False
+        finally:
+            self.__release(conn, broken, generation)
+
+    def log_stats(self):
+        """Logs the pool usage."""
+        average = (self.total_wait_time / self.wait_count
+                   if self.wait_count else 0)
+        logging.info(
+            "DB pool: %d connections opened, %d checkouts, %d max in use, "
+            "%d waits of %.3fs average, %d failed health checks.",
+            self.created_count, self.checkout_count, self.max_in_use,
+            self.wait_count, average, self.failed_check_count)
@@ -0,0 +1,237 @@
+"""Versioned schema migrations.
+
+scripts/sql/dml_fcf.sql creates the baseline schema, version 0.  Each
+migration below moves the schema up one version; the applied versions are
+recorded in the schema_version table, so `migrate` only applies the pending
+ones.  Statements use the SQL shared by MariaDB and SQLite, with `{decimal}`
+and `{fine_decimal}` standing for the backend's exact decimal types.
+"""
+import logging
+import time
+from collections import namedtuple
+
+from autotrageur.bot.common.db_constants import (RUN_ROLLUP_PRIM_KEYS,
+                                                 RUN_ROLLUP_TABLE,
+                                                 SCHEMA_VERSION_TABLE,
+                                                 SLIPPAGE_STATS_TABLE)
+
+# A schema change; `statements` are executed in order.  A statement is SQL, or
+# a function taking the backend for changes to existing data.
+Migration = namedtuple('Migration', ['version', 'description', 'statements'])
+
+
+def _backfill_run_rollup(backend):
+    """Rolls up the existing trades into the run_rollup table.
+
+    The sums are taken in Python, since SQLite would sum the decimals as
+    floats.
+
+    Args:
+        backend (StorageBackend): The started backend.
+    """
+    rollups = {}
+    trades = backend.execute_parametrized_query(
+        "SELECT autotrageur_config_id, exchange, fee_asset, pre_fee_base, "
+        "post_fee_quote, fees FROM trades;", ())
+    for config_id, exchange, fee_asset, base, quote, fees in trades:
+        key = (config_id, exchange, fee_asset)
+        if key not in rollups:
+            rollups[key] = dict(zip(RUN_ROLLUP_PRIM_KEYS, key),
+                                trade_count=0, base_volume=0, quote_volume=0,
+                                fees=0)
+        rollup = rollups[key]
+        rollup['trade_count'] += 1
+        rollup['base_volume'] += base
+        rollup['quote_volume'] += quote
+        rollup['fees'] += fees
+    if rollups:
+        backend.accumulate_rows(
+            RUN_ROLLUP_TABLE, list(rollups.values()), RUN_ROLLUP_PRIM_KEYS)
+
+
+# The schema migrations, by increasing version.
+MIGRATIONS = [
+    Migration(1, 'Add covering indexes for the report queries', [
+        # report.py: trade count, volumes and fees of a run, per exchange.
+        # Covers the summed columns, so the rows are not read.
+        "CREATE INDEX idx_trades_config_exchange ON trades "
+        "(autotrageur_config_id, exchange, pre_fee_base, post_fee_quote, "
+        "fee_asset, fees);",
+        # report.py: the first forex rate of a quote after a run started.
+        "CREATE INDEX idx_forex_rate_quote_timestamp ON forex_rate "
+        "(quote, local_timestamp, rate);",
+    ]),
+    Migration(2, 'Add run rollups of the trades', [
+        # Kept up to date with each trade insert, for report.py.
+        "CREATE TABLE {} ("
+        "autotrageur_config_id VARCHAR(36) NOT NULL, "
+        "exchange VARCHAR(28) NOT NULL, "
+        "fee_asset VARCHAR(10) NOT NULL, "
+        "trade_count INT NOT NULL, "
+        "base_volume {{decimal}} NOT NULL, "
+        "quote_volume {{decimal}} NOT NULL, "
+        "fees {{decimal}} NOT NULL, "
+        "PRIMARY KEY (autotrageur_config_id, exchange, fee_asset));".format(
+            RUN_ROLLUP_TABLE),
+        _backfill_run_rollup,
+    ]),
+    Migration(3, 'Add checkpoint catalog columns to fcf_state', [
+        # Filled on export; existing rows are filled by `checkpoints
+        # backfill`.
+        "ALTER TABLE fcf_state ADD COLUMN export_timestamp INT NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN momentum INT NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN target_index INT NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN last_target_index INT NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN trade_count INT NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN e1_bal_base {decimal} NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN e1_bal_quote {decimal} NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN e2_bal_base {decimal} NULL;",
+        "ALTER TABLE fcf_state ADD COLUMN e2_bal_quote {decimal} NULL;",
+        # checkpoints.py: a config's checkpoints by export time.  Covers the
+        # catalog columns, so the state blobs are not read.
+        "CREATE INDEX idx_fcf_state_catalog ON fcf_state "
+        "(autotrageur_config_id, export_timestamp, id, momentum, "
+        "target_index, last_target_index, trade_count, e1_bal_base, "
+        "e1_bal_quote, e2_bal_base, e2_bal_quote);",
+    ]),
+    Migration(4, 'Add slippage stats snapshots', [
+        # Written after each executed trade, for ccxt_trader.py.  Databases
+        # created from dml_fcf.sql since, or migrated by the former
+        # add_slippage_stats_fcf.sql, already have the table.
+        "CREATE TABLE IF NOT EXISTS {} ("
+        "trade_opportunity_id VARCHAR(36) NOT NULL, "
+        "side VARCHAR(4) NOT NULL, "
+        "exchange VARCHAR(28) NOT NULL, "
+        "dryrun BIT NOT NULL, "
+        "trade_count INT UNSIGNED NOT NULL, "
+        "mean {{fine_decimal}} NOT NULL, "
+        "m2 {{fine_decimal}} NOT NULL, "
+        "local_timestamp INT UNSIGNED NOT NULL, "
+        "PRIMARY KEY (trade_opportunity_id, side), "
+        "CONSTRAINT fk_slippage_stats_trades "
+        "FOREIGN KEY (trade_opportunity_id, side) "
+        "REFERENCES trades (trade_opportunity_id, side) "
+        "ON DELETE CASCADE ON UPDATE CASCADE);".format(SLIPPAGE_STATS_TABLE),
+        "CREATE INDEX IF NOT EXISTS idx_slippage_stats_exchange ON {} "
+        "(exchange, dryrun, trade_count);".format(SLIPPAGE_STATS_TABLE),
+    ]),
+    Migration(5, 'Key slippage stats by configuration', [
+        # Each bot continues its own statistics; snapshots of other bots of
+        # the exchange would otherwise be picked by their trade count.
+        "ALTER TABLE slippage_stats ADD COLUMN "
+        "autotrageur_config_id VARCHAR(36) NULL;",
+        "UPDATE slippage_stats SET autotrageur_config_id = ("
+        "SELECT MAX(t.autotrageur_config_id) FROM trades AS t "
+        "WHERE t.trade_opportunity_id = slippage_stats.trade_opportunity_id "
+        "AND t.side = slippage_stats.side);",
+        # ccxt_trader.py: the latest snapshot of a bot on an exchange.
+        "CREATE INDEX idx_slippage_stats_config ON slippage_stats "
+        "(autotrageur_config_id, exchange, dryrun, trade_count);",
+    ]),
+]
+
+
+class SchemaVersionError(Exception):
+    """Exception when the schema cannot be migrated to a version."""
+    pass
+
+
+def _prepare_version_table(backend):
+    """Creates the schema_version table, if needed.
+
+    Args:
+        backend (StorageBackend): The started backend.
+    """
+    backend.execute_parametrized_query(
+        "CREATE TABLE IF NOT EXISTS {} ("
+        "version INT NOT NULL, "
+        "description VARCHAR(128) NOT NULL, "
+        "applied_timestamp INT NOT NULL, "
+        "PRIMARY KEY (version));".format(SCHEMA_VERSION_TABLE), ())
+    backend.commit()
+
+
+def check_schema_version(backend):
+    """Checks that every migration is applied.
+
+    Args:
+        backend (StorageBackend): The started backend.
+
+    Raises:
+        SchemaVersionError: If migrations are pending.
+    """
+    version = get_schema_version(backend)
+    latest = MIGRATIONS[-1].version
+    if version < latest:
+        raise SchemaVersionError(
+            "Schema is at version {}, run migrate_db to migrate to "
+            "{}.".format(version, latest))
+
+
+def get_schema_version(backend):
+    """Gets the applied schema version.
+
+    Args:
+        backend (StorageBackend): The started backend.
+
+    Returns:
+        int: The latest applied version; 0 for the baseline schema.
+    """
+    _prepare_version_table(backend)
+    result = backend.execute_parametrized_query(
+        "SELECT MAX(version) FROM {};".format(SCHEMA_VERSION_TABLE), ())
+    return result[0][0] or 0
+
+
+def migrate(backend, target=None):
+    """Applies the pending migrations.
+
+    Each migration is committed with its schema_version row.
+
+    Args:
+        backend (StorageBackend): The started backend.
+        target (int, optional): The version to migrate to. Defaults to
+            the latest.
+
+    Returns:
+        int: The schema version after migrating.
+
+    Raises:
+        SchemaVersionError: If the target is unknown, or older than the
+            applied version; migrations are not reversible.
+    """
+    latest = MIGRATIONS[-1].version
+    if target is None:
+        target = latest
+    if not 0 <= target <= latest:
+        raise SchemaVersionError(
+            "Unknown schema version {}, the latest is {}.".format(
+                target, latest))
+
+    version = get_schema_version(backend)
+    if target < version:
+        raise SchemaVersionError(
+            "Schema is at version {}, cannot migrate back to {}.".format(
+                version, target))
+
+    for migration in MIGRATIONS:
+        if not version < migration.version <= target:
+            continue
+        logging.info("Migrating schema to version %d: %s",
+                     migration.version, migration.description)
+        for statement in migration.statements:
+            if callable(statement):
+                statement(backend)
+            else:
+                backend.execute_parametrized_query(
+                    statement.format(
+                        decimal=backend.DECIMAL_TYPE,
+                        fine_decimal=backend.FINE_DECIMAL_TYPE), ())
+        backend.execute_parametrized_query(
+            "INSERT INTO {} (version, description, applied_timestamp) "
+            "VALUES (%s, %s, %s);".format(SCHEMA_VERSION_TABLE),
+            (migration.version, migration.description, int(time.time())))
+        backend.commit()
+        version = migration.version
+
+    return version
@@ -0,0 +1,116 @@
+"""Schema of the embedded SQLite storage.
+
+Mirrors scripts/sql/dml_fcf.sql.  Decimal columns are declared DECTEXT, which
+SQLite stores as text and the storage module converts back to Decimal.
+Foreign keys are left out; SQLite does not enforce them by default.
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fcf_autotrageur_config (
+    id VARCHAR(36) NOT NULL,
+    start_timestamp INTEGER NOT NULL,
+    dryrun INTEGER NOT NULL,
+    dryrun_e1_base DECTEXT NOT NULL,
+    dryrun_e1_quote DECTEXT NOT NULL,
+    dryrun_e2_base DECTEXT NOT NULL,
+    dryrun_e2_quote DECTEXT NOT NULL,
+    exchange1 VARCHAR(28) NOT NULL,
+    exchange1_pair VARCHAR(21) NOT NULL,
+    exchange2 VARCHAR(28) NOT NULL,
+    exchange2_pair VARCHAR(21) NOT NULL,
+    use_test_api INTEGER,
+    h_to_e1_max DECTEXT NOT NULL,
+    h_to_e2_max DECTEXT NOT NULL,
+    max_trade_size DECTEXT NOT NULL,
+    spread_min DECTEXT NOT NULL,
+    vol_min DECTEXT NOT NULL,
+    slippage DECTEXT NOT NULL,
+    PRIMARY KEY (id, start_timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS fcf_measures (
+    id VARCHAR(36) NOT NULL,
+    autotrageur_config_id VARCHAR(36) NOT NULL,
+    autotrageur_config_start_timestamp INTEGER NOT NULL,
+    autotrageur_stop_timestamp INTEGER,
+    e1_start_bal_base DECTEXT NOT NULL,
+    e1_close_bal_base DECTEXT NOT NULL,
+    e2_start_bal_base DECTEXT NOT NULL,
+    e2_close_bal_base DECTEXT NOT NULL,
+    e1_start_bal_quote DECTEXT NOT NULL,
+    e1_close_bal_quote DECTEXT NOT NULL,
+    e2_start_bal_quote DECTEXT NOT NULL,
+    e2_close_bal_quote DECTEXT NOT NULL,
+    num_fatal_errors INTEGER NOT NULL,
+    trade_count INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS forex_rate (
+    id VARCHAR(36) NOT NULL,
+    quote VARCHAR(10) NOT NULL,
+    rate DECTEXT NOT NULL,
+    local_timestamp INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS trade_opportunity (
+    id VARCHAR(36) NOT NULL,
+    e1_spread DECTEXT NOT NULL,
+    e2_spread DECTEXT NOT NULL,
+    e1_buy DECTEXT NOT NULL,
+    e1_sell DECTEXT NOT NULL,
+    e2_buy DECTEXT NOT NULL,
+    e2_sell DECTEXT NOT NULL,
+    e1_forex_rate_id VARCHAR(36),
+    e2_forex_rate_id VARCHAR(36),
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS trades (
+    trade_opportunity_id VARCHAR(36) NOT NULL,
+    side VARCHAR(4) NOT NULL,
+    autotrageur_config_id VARCHAR(36) NOT NULL,
+    autotrageur_config_start_timestamp INTEGER NOT NULL,
+    exchange VARCHAR(28) NOT NULL,
+    base VARCHAR(10) NOT NULL,
+    quote VARCHAR(10) NOT NULL,
+    pre_fee_base DECTEXT NOT NULL,
+    pre_fee_quote DECTEXT NOT NULL,
+    post_fee_base DECTEXT NOT NULL,
+    post_fee_quote DECTEXT NOT NULL,
+    fees DECTEXT NOT NULL,
+    fee_asset VARCHAR(10) NOT NULL,
+    price DECTEXT NOT NULL,
+    true_price DECTEXT NOT NULL,
+    type VARCHAR(6) NOT NULL,
+    order_id VARCHAR(64) NOT NULL,
+    exchange_timestamp INTEGER NOT NULL,
+    local_timestamp INTEGER NOT NULL,
+    extra_info VARCHAR(256),
+    PRIMARY KEY (trade_opportunity_id, side)
+);
+
+CREATE TABLE IF NOT EXISTS fcf_state (
+    id VARCHAR(36) NOT NULL,
+    autotrageur_config_id VARCHAR(36) NOT NULL,
+    autotrageur_config_start_timestamp INTEGER NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS slippage_stats (
+    trade_opportunity_id VARCHAR(36) NOT NULL,
+    side VARCHAR(4) NOT NULL,
+    exchange VARCHAR(28) NOT NULL,
+    dryrun INTEGER NOT NULL,
+    trade_count INTEGER NOT NULL,
+    mean DECTEXT NOT NULL,
+    m2 DECTEXT NOT NULL,
+    local_timestamp INTEGER NOT NULL,
+    PRIMARY KEY (trade_opportunity_id, side)
+);
+
+CREATE INDEX IF NOT EXISTS idx_slippage_stats_exchange
+    ON slippage_stats (exchange, dryrun, trade_count);
+"""
@@ -0,0 +1,497 @@
+"""Storage backends for the bot's persistence.
+
+The bot persists its configuration, forex rates, trades, measures and state
+through the module level functions below, which delegate to the backend
+started with `start_storage`:
+
+- MariaDB, through fp_libs' maria_db_handler.
+- Embedded SQLite in WAL mode, which needs no database server; for dry runs
+  and backtests.
+
+Statements are written in the MySQL `%s` and `%(name)s` parameter styles,
+using the SQL subset shared by both databases.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from decimal import Decimal
+
+import fp_libs.db.maria_db_handler as db_handler
+from autotrageur.bot.common.sqlite_schema import SQLITE_SCHEMA
+from fp_libs.db.maria_db_handler import InsertRowObject
+
+# Backend names, for the `db_backend` key of the database configuration.
+MARIADB_BACKEND = 'mariadb'
+SQLITE_BACKEND = 'sqlite'
+
+# Declared type of SQLite columns holding Decimals exactly, as text.
+SQLITE_DECIMAL_TYPE = 'DECTEXT'
+
+# MySQL style parameter placeholders.
+_NAMED_PARAM = re.compile(r'%\((\w+)\)s')
+_POSITIONAL_PARAM = re.compile(r'%s')
+
+# The started backend.
+_backend = None
+
+# Held by the thread running a transaction on the shared connection.
+_transaction_lock = threading.RLock()
+
+
+class StorageNotStartedError(Exception):
+    """Exception when storage is used before `start_storage`."""
+    pass
+
+
+class UnknownStorageBackendError(Exception):
+    """Exception when the configured storage backend is not supported."""
+    pass
+
+
+def _to_sqlite_params(query):
+    """Converts MySQL style placeholders to SQLite's.
+
+    Args:
+        query (str): The query, with `%s` or `%(name)s` placeholders.
+
+    Returns:
+        str: The query, with `?` or `:name` placeholders.
+    """
+    return _POSITIONAL_PARAM.sub('?', _NAMED_PARAM.sub(r':\1', query))
+
+
+def _decimal_add(augend, addend):
+    """Adds two numbers exactly; SQLite's `decimal_add` function.
+
+    Args:
+        augend (str or int): The stored value.
+        addend (str or int): The value added.
+
+    Returns:
+        str: The sum.
+    """
+    return str(Decimal(augend) + Decimal(addend))
+
+
+def _get_backend():
+    """Gets the started backend.
+
+    Returns:
+        StorageBackend: The backend.
+
+    Raises:
+        StorageNotStartedError: If no backend is started.
+    """
+    if _backend is None:
+        raise StorageNotStartedError("Storage has not been started.")
+    return _backend
+
+
+class StorageBackend(ABC):
+    """The operations the bot needs from a database."""
+
+    # Column type of exact decimals, for schema migrations.
+    DECIMAL_TYPE = None
+
+    # Column type of exact decimals with more places, for statistics.
+    FINE_DECIMAL_TYPE = None
+
+    @abstractmethod
+    def accumulate_rows(self, table, rows, prim_keys):
+        """Inserts rows, or adds their values to the existing rows with the
+        same primary key, in the current transaction.
+
+        Args:
+            table (str): The table name.
+            rows (list[dict]): The rows, keyed by column name; the columns
+                other than the primary key are numbers.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        """Closes the connection."""
+        pass
+
+    @abstractmethod
+    def commit(self):
+        """Commits the current transaction."""
+        pass
+
+    @abstractmethod
+    def execute_many(self, statement, rows):
+        """Executes a statement once per row, in the current transaction.
+
+        Args:
+            statement (str): The statement, with `%(name)s` placeholders.
+            rows (list[dict]): The parameters of each execution.
+        """
+        pass
+
+    @abstractmethod
+    def execute_parametrized_query(self, query, params):
+        """Executes a query.
+
+        Args:
+            query (str): The query, with `%s` placeholders.
+            params (tuple): The query parameters.
+
+        Returns:
+            list[tuple] or int: The result rows of a SELECT, otherwise the
+                number of affected rows.
+        """
+        pass
+
+    @abstractmethod
+    def insert_row(self, table, row, prim_keys):
+        """Inserts a row, updating the existing row with the same primary
+        key.
+
+        Args:
+            table (str): The table name.
+            row (dict): The row, keyed by column name.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        pass
+
+    @abstractmethod
+    def ping(self):
+        """Keeps an idle connection alive."""
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        """Rolls back the current transaction."""
+        pass
+
+
+class MariaDBBackend(StorageBackend):
+    """Stores to a MariaDB server through maria_db_handler's connection.
+
+    The connection may be used from any thread, one at a time.
+    """
+
+    DECIMAL_TYPE = 'DECIMAL(36, 8)'
+    FINE_DECIMAL_TYPE = 'DECIMAL(36, 18)'
+
+    def __init__(self, db_user, db_password, db_name):
+        """Constructor.
+
+        Connects to the database.
+
+        Args:
+            db_user (str): The database user.
+            db_password (str): The database password.
+            db_name (str): The database name.
+        """
+        self._lock = threading.RLock()
+        db_handler.start_db(db_user, db_password, db_name)
+
+    def accumulate_rows(self, table, rows, prim_keys):
+        """Inserts rows, or adds their values to the existing rows with the
+        same primary key, in the current transaction.
+
+        Args:
+            table (str): The table name.
+            rows (list[dict]): The rows, keyed by column name; the columns
+                other than the primary key are numbers.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        columns = list(rows[0])
+        statement = (
+            "INSERT INTO {} ({}) VALUES ({}) ON DUPLICATE KEY UPDATE {}".format(
+                table,
+                ", ".join(columns),
+                ", ".join("%({})s".format(column) for column in columns),
+                ", ".join("{0} = {0} + VALUES({0})".format(column)
+                          for column in columns if column not in prim_keys)))
+        self.execute_many(statement, rows)
+
+    def close(self):
+        """Closes the connection."""
+        with self._lock:
+            db_handler.db.close()
+
+    def commit(self):
+        """Commits the current transaction."""
+        with self._lock:
+            db_handler.commit_all()
+
+    def execute_many(self, statement, rows):
+        """Executes a statement once per row, in the current transaction.
+
+        Args:
+            statement (str): The statement, with `%(name)s` placeholders.
+            rows (list[dict]): The parameters of each execution.
+        """
+        with self._lock:
+            cursor = db_handler.db.cursor()
+            try:
+                cursor.executemany(statement, rows)
+            finally:
+                cursor.close()
+
+    def execute_parametrized_query(self, query, params):
+        """Executes a query.
+
+        Args:
+            query (str): The query, with `%s` placeholders.
+            params (tuple): The query parameters.
+
+        Returns:
+            list[tuple] or int: The result rows of a SELECT, otherwise the
+                number of affected rows.
+        """
+        with self._lock:
+            return db_handler.execute_parametrized_query(query, params)
+
+    def insert_row(self, table, row, prim_keys):
+        """Inserts a row, updating the existing row with the same primary
+        key.
+
+        Args:
+            table (str): The table name.
+            row (dict): The row, keyed by column name.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        with self._lock:
+            db_handler.insert_row(InsertRowObject(table, row, prim_keys))
+
+    def ping(self):
+        """Keeps an idle connection alive."""
+        with self._lock:
+            db_handler.ping_db()
+
+    def rollback(self):
+        """Rolls back the current transaction."""
+        with self._lock:
+            db_handler.db.rollback()
+
+
+class SQLiteBackend(StorageBackend):
+    """Stores to an embedded SQLite database in WAL mode.
+
+    The schema is created on connection.  Decimals are stored as text, so
+    they are read back exactly.  The connection may be used from any thread,
+    one at a time.
+    """
+
+    DECIMAL_TYPE = SQLITE_DECIMAL_TYPE
+    FINE_DECIMAL_TYPE = SQLITE_DECIMAL_TYPE
+
+    def __init__(self, path):
+        """Constructor.
+
+        Args:
+            path (str): The database file; ':memory:' for a temporary
+                in-memory database.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False)
+        # Readers do not block the writer, and commits only wait for the
+        # WAL write, not a sync of the database file.
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # SQLite's own arithmetic would turn the decimal text into floats.
+        self._conn.create_function('decimal_add', 2, _decimal_add)
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def accumulate_rows(self, table, rows, prim_keys):
+        """Inserts rows, or adds their values to the existing rows with the
+        same primary key, in the current transaction.
+
+        Args:
+            table (str): The table name.
+            rows (list[dict]): The rows, keyed by column name; the columns
+                other than the primary key are numbers.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        columns = list(rows[0])
+        statement = (
+            "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) "
+            "DO UPDATE SET {}".format(
+                table,
+                ", ".join(columns),
+                ", ".join(":" + column for column in columns),
+                ", ".join(prim_keys),
+                ", ".join("{0} = decimal_add({0}, excluded.{0})".format(column)
+                          for column in columns if column not in prim_keys)))
+        with self._lock:
+            self._conn.executemany(statement, rows)
+
+    def close(self):
+        """Closes the connection."""
+        with self._lock:
+            self._conn.close()
+
+    def commit(self):
+        """Commits the current transaction."""
+        with self._lock:
+            self._conn.commit()
+
+    def execute_many(self, statement, rows):
+        """Executes a statement once per row, in the current transaction.
+
+        Args:
+            statement (str): The statement, with `%(name)s` placeholders.
+            rows (list[dict]): The parameters of each execution.
+        """
+        with self._lock:
+            self._conn.executemany(_to_sqlite_params(statement), rows)
+
+    def execute_parametrized_query(self, query, params):
+        """Executes a query.
+
+        Args:
+            query (str): The query, with `%s` placeholders.
+            params (tuple): The query parameters.
+
+        Returns:
+            list[tuple] or int: The result rows of a SELECT, otherwise the
+                number of affected rows.
+        """
+        with self._lock:
+            cursor = self._conn.execute(_to_sqlite_params(query), params)
+            try:
+                if cursor.description is None:
+                    return cursor.rowcount
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def insert_row(self, table, row, prim_keys):
+        """Inserts a row, updating the existing row with the same primary
+        key.
+
+        Args:
+            table (str): The table name.
+            row (dict): The row, keyed by column name.
+            prim_keys (tuple[str]): The primary key columns.
+        """
+        columns = list(row)
+        updates = [column for column in columns if column not in prim_keys]
+        if updates:
+            on_conflict = "DO UPDATE SET {}".format(", ".join(
+                "{0} = excluded.{0}".format(column) for column in updates))
+        else:
+            on_conflict = "DO NOTHING"
+        statement = (
+            "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) {}".format(
+                table,
+                ", ".join(columns),
+                ", ".join(":" + column for column in columns),
+                ", ".join(prim_keys),
+                on_conflict))
+        with self._lock:
+            self._conn.execute(statement, row)
+
+    def ping(self):
+        """Keeps an idle connection alive; embedded connections do not time
+        out."""
+        pass
+
+    def rollback(self):
+        """Rolls back the current transaction."""
+        with self._lock:
+            self._conn.rollback()
+
+
+def accumulate_rows(table, rows, prim_keys):
+    """Inserts rows, or adds their values to the existing rows with the same
+    primary key, in the current transaction.
+
+    Args:
+        table (str): The table name.
+        rows (list[dict]): The rows, keyed by column name; the columns other
+            than the primary key are numbers.
+        prim_keys (tuple[str]): The primary key columns.
+    """
+    _get_backend().accumulate_rows(table, rows, prim_keys)
+
+
+def commit_all():
+    """Commits the current transaction."""
+    _get_backend().commit()
+
+
+def execute_many(statement, rows):
+    """Executes a statement once per row, in the current transaction.
+
+    Args:
+        statement (str): The statement, with `%(name)s` placeholders.
+        rows (list[dict]): The parameters of each execution.
+    """
+    _get_backend().execute_many(statement, rows)
+
+
+def execute_parametrized_query(query, params):
+    """Executes a query.
+
+    Args:
+        query (str): The query, with `%s` placeholders.
+        params (tuple): The query parameters.
+
+    Returns:
+        list[tuple] or int: The result rows of a SELECT, otherwise the number
+            of affected rows.
+    """
+    return _get_backend().execute_parametrized_query(query, params)
+
+
+def insert_row(table, row, prim_keys):
+    """Inserts a row, updating the existing row with the same primary key.
+
+    Args:
+        table (str): The table name.
+        row (dict): The row, keyed by column name.
+        prim_keys (tuple[str]): The primary key columns.
+    """
+    _get_backend().insert_row(table, row, prim_keys)
+
+
+def ping_db():
+    """Keeps an idle connection alive."""
+    _get_backend().ping()
+
+
+def rollback():
+    """Rolls back the current transaction."""
+    _get_backend().rollback()
+
+
+def start_storage(backend):
+    """Sets the backend used by the module level functions.
+
+    Args:
+        backend (StorageBackend): The backend.
+    """
+    global _backend
+    _backend = backend
+    logging.info("Storage started: %s", type(backend).__name__)
+
+
+@contextmanager
+def transaction():
+    """Uses the connection without interleaving with other threads.
+
+    The backends share one connection, and so one transaction, between
+    threads; statements and the commit of a transaction are run in the
+    block, so another thread's commit does not commit half of them.
+    """
+    with _transaction_lock:
+        yield
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter(
+    SQLITE_DECIMAL_TYPE, lambda value: Decimal(value.decode('ascii')))
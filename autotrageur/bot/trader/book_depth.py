@@ -0,0 +1,66 @@
+import math
+from collections import deque
+
+# Orderbook depths to request, chosen to be accepted by exchanges with fixed
+# depth options (e.g. Binance).  Larger depths fetch the full orderbook.
+BOOK_DEPTH_LIMITS = [5, 10, 20, 50, 100, 500, 1000]
+
+# Number of recent orderbook walks used to size the next request.
+DEPTH_HISTORY = 50
+
+# Multiple of the deepest recently used level to request.
+DEPTH_SAFETY_FACTOR = 2
+
+
+class BookDepthTracker():
+    """Learns how deep an orderbook must be fetched to fill trade targets.
+
+    Records the number of levels walked for each side of each polled
+    orderbook, and sizes the next request to the deepest recent walk with a
+    safety margin.
+    """
+
+    def __init__(self, history=DEPTH_HISTORY,
+                 safety_factor=DEPTH_SAFETY_FACTOR):
+        """Constructor.
+
+        Args:
+            history (int, optional): Defaults to DEPTH_HISTORY. The number
+                of recent walks to remember.
+            safety_factor (float, optional): Defaults to
+                DEPTH_SAFETY_FACTOR. The multiple of the deepest recent walk
+                to request.
+        """
+        self.safety_factor = safety_factor
+        self._levels_used = deque(maxlen=history)
+
+    def get_depth(self):
+        """Gets the orderbook depth to request.
+
+        Returns:
+            int: The number of levels per side to request, or None to
+                request the full orderbook.  The full orderbook is requested
+                until a walk has been recorded, and whenever the required
+                depth is beyond the largest of BOOK_DEPTH_LIMITS.
+        """
+        if not self._levels_used:
+            return None
+
+        required = math.ceil(max(self._levels_used) * self.safety_factor)
+        for limit in BOOK_DEPTH_LIMITS:
+            if limit >= required:
+                return limit
+        return None
+
+    def record(self, levels):
+        """Records the number of levels walked to fill a target.
+
+        Args:
+            levels (int): The number of levels used.
+        """
+        self._levels_used.append(levels)
+
+    def reset(self):
+        """Forgets the recorded walks, so that the full orderbook is requested
+        next."""
+        self._levels_used.clear()
@@ -0,0 +1,323 @@
+"""Streaming orderbook feed with a locally maintained orderbook.
+
+Instead of downloading a full snapshot every poll, a `BookFeedClient` keeps a
+`LocalOrderbook` up to date from a stream of incremental diffs.  Each message
+carries a sequence number; on a gap the client discards its book and asks
+the feed for a fresh snapshot.
+
+Wire protocol: newline delimited JSON objects over TCP.
+
+    Server -> client:
+        {"type": "snapshot", "seq": 10, "bids": [[p, v], ...],
+         "asks": [[p, v], ...]}
+        {"type": "diff", "seq": 11, "bids": [[p, v], ...],
+         "asks": [[p, v], ...]}
+
+    Client -> server:
+        {"type": "resync"}
+
+A volume of 0 in a diff removes the price level.  Exchange specific
+WebSocket channels are adapted to this protocol outside of the bot; see
+`book_feed_server` for a local stand-in feed.
+
+A bot streams the markets given by its `--book_feed` options, each in the
+form EXCHANGE:BASE/QUOTE@HOST:PORT; see `parse_book_feed`.
+"""
+import json
+import logging
+import socket
+import threading
+import time
+from collections import namedtuple
+
+BIDS = 'bids'
+ASKS = 'asks'
+
+# Message types.
+MSG_DIFF = 'diff'
+MSG_RESYNC = 'resync'
+MSG_SNAPSHOT = 'snapshot'
+
+# Seconds to wait before reconnecting after the feed drops.
+RECONNECT_WAIT = 1
+
+
+# The feed of a market, as given by a `--book_feed` option.
+BookFeedSpec = namedtuple(
+    'BookFeedSpec', ['exchange_name', 'symbol', 'host', 'port'])
+
+
+class BookFeedSpecError(Exception):
+    """Exception when a `--book_feed` option is malformed."""
+    pass
+
+
+class OrderbookSequenceException(Exception):
+    """Exception when a diff does not follow the local book's sequence."""
+    pass
+
+
+def parse_book_feed(spec):
+    """Parses the feed of a market from a `--book_feed` option.
+
+    Args:
+        spec (str): The option, in the form EXCHANGE:BASE/QUOTE@HOST:PORT,
+            e.g. 'bithumb:ETH/KRW@127.0.0.1:9001'.
+
+    Raises:
+        BookFeedSpecError: If the option is malformed.
+
+    Returns:
+        BookFeedSpec: The market and the address of its feed.
+    """
+    try:
+        market, address = spec.rsplit('@', 1)
+        exchange_name, symbol = market.split(':', 1)
+        host, port = address.rsplit(':', 1)
+        port = int(port)
+    except ValueError:
+        raise BookFeedSpecError(
+            "Book feed {} is not of the form "
+            "EXCHANGE:BASE/QUOTE@HOST:PORT.".format(spec))
+
+    if not (exchange_name and host and symbol.count('/') == 1):
+        raise BookFeedSpecError(
+            "Book feed {} is not of the form "
+            "EXCHANGE:BASE/QUOTE@HOST:PORT.".format(spec))
+    return BookFeedSpec(exchange_name.lower(), symbol, host, port)
+
+
+class LocalOrderbook():
+    """An orderbook maintained from a snapshot and sequenced diffs."""
+
+    def __init__(self):
+        """Constructor."""
+        self.sequence = None
+        self.timestamp = None
+        self._bids = {}
+        self._asks = {}
+
+    @property
+    def is_synced(self):
+        """Whether the book holds a snapshot and all diffs since.
+
+        Returns:
+            bool: True if the book can be read.
+        """
+        return self.sequence is not None
+
+    def __apply_levels(self, book_side, levels):
+        """Applies price level updates to one side of the book.
+
+        Args:
+            book_side (dict): The side of the book, mapping price to
+                volume.
+            levels (list[list(float)]): The updates in the form of
+                (price, volume).  A volume of 0 removes the level.
+        """
+        for price, volume in levels:
+            if volume:
+                book_side[price] = volume
+            else:
+                book_side.pop(price, None)
+
+    def apply_diff(self, sequence, bids, asks):
+        """Applies an incremental update to the book.
+
+        Args:
+            sequence (int): The sequence number of the update.
+            bids (list[list(float)]): The bid level updates.
+            asks (list[list(float)]): The ask level updates.
+
+        Raises:
+            OrderbookSequenceException: If the book is not synced or the
+                update does not directly follow the last one applied.  The
+                book is invalidated and must be resynced from a snapshot.
+        """
+        if not self.is_synced or sequence != self.sequence + 1:
+            expected = None if self.sequence is None else self.sequence + 1
+            self.invalidate()
+            raise OrderbookSequenceException(
+                "Expected diff sequence {}, received {}.".format(
+                    expected, sequence))
+
+        self.__apply_levels(self._bids, bids)
+        self.__apply_levels(self._asks, asks)
+        self.sequence = sequence
+        self.timestamp = time.time()
+
+    def apply_snapshot(self, sequence, bids, asks):
+        """Replaces the book with a full snapshot.
+
+        Args:
+            sequence (int): The sequence number of the snapshot.
+            bids (list[list(float)]): All bids in the form of
+                (price, volume).
+            asks (list[list(float)]): All asks in the form of
+                (price, volume).
+        """
+        self._bids = {price: volume for price, volume in bids}
+        self._asks = {price: volume for price, volume in asks}
+        self.sequence = sequence
+        self.timestamp = time.time()
+
+    def invalidate(self):
+        """Marks the book as out of sync."""
+        self.sequence = None
+
+    def to_orderbook(self):
+        """Gets the book in the same form as a ccxt orderbook.
+
+        Returns:
+            dict: The orderbook, with bids sorted descending and asks sorted
+                ascending by price.
+        """
+        return {
+            BIDS: [[p, self._bids[p]] for p in sorted(self._bids, reverse=True)],
+            ASKS: [[p, self._asks[p]] for p in sorted(self._asks)],
+            'timestamp': self.timestamp,
+            'nonce': self.sequence
+        }
+
+
+class BookFeedClient():
+    """Keeps a `LocalOrderbook` current from a streaming feed.
+
+    The feed is read on a daemon thread.  Readers take a consistent copy of
+    the book with `get_orderbook`, and may block on `wait_for_update` to
+    react to every change instead of polling.
+    """
+
+    def __init__(self, host, port, on_update=None):
+        """Constructor.
+
+        Args:
+            host (str): The feed host.
+            port (int): The feed port.
+            on_update (func, optional): Defaults to None. Called with no
+                arguments from the feed thread after every book update,
+                e.g. `PollScheduler.wake`.
+        """
+        self.host = host
+        self.port = port
+        self.on_update = on_update
+        self.book = LocalOrderbook()
+        self.update_count = 0
+        self.resync_count = 0
+        self._lock = threading.Lock()
+        self._updated = threading.Event()
+        self._running = False
+        self._sock = None
+        self._thread = None
+
+    def __handle_message(self, message):
+        """Applies a single feed message to the local book.
+
+        Args:
+            message (dict): The decoded feed message.
+        """
+        with self._lock:
+            try:
+                if message['type'] == MSG_SNAPSHOT:
+                    self.book.apply_snapshot(
+                        message['seq'], message[BIDS], message[ASKS])
+                elif message['type'] == MSG_DIFF:
+                    if not self.book.is_synced:
+                        # Awaiting the snapshot requested on resync.
+                        return
+                    self.book.apply_diff(
+                        message['seq'], message[BIDS], message[ASKS])
+                else:
+                    return
+            except OrderbookSequenceException as exc:
+                logging.warning("%s:%s feed out of sequence, resyncing: %s",
+                                self.host, self.port, exc)
+                self.resync_count += 1
+                self.__send({'type': MSG_RESYNC})
+                return
+            self.update_count += 1
+        self._updated.set()
+        if self.on_update is not None:
+            self.on_update()
+
+    def __run(self):
+        """Reads the feed until stopped, reconnecting if it drops."""
+        while self._running:
+            try:
+                self._sock = socket.create_connection((self.host, self.port))
+                self.__send({'type': MSG_RESYNC})
+                with self._sock.makefile('r') as stream:
+                    for line in stream:
+                        self.__handle_message(json.loads(line))
+            except (OSError, ValueError) as exc:
+                if self._running:
+                    logging.warning("%s:%s feed dropped: %s",
+                                    self.host, self.port, exc)
+            finally:
+                with self._lock:
+                    self.book.invalidate()
+                if self._sock:
+                    self._sock.close()
+            if self._running:
+                time.sleep(RECONNECT_WAIT)
+
+    def __send(self, message):
+        """Sends a message to the feed.
+
+        Args:
+            message (dict): The message to send.
+        """
+        self._sock.sendall((json.dumps(message) + '\n').encode())
+
+    @property
+    def is_synced(self):
+        """Whether the local book is currently usable.
+
+        Returns:
+            bool: True if the local book is in sync with the feed.
+        """
+        with self._lock:
+            return self.book.is_synced
+
+    def get_orderbook(self):
+        """Gets a copy of the local book.
+
+        Returns:
+            dict: The orderbook in ccxt form, or None if the local book is
+                out of sync.
+        """
+        with self._lock:
+            if not self.book.is_synced:
+                return None
+            return self.book.to_orderbook()
+
+    def start(self):
+        """Connects to the feed and starts maintaining the local book."""
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Disconnects from the feed."""
+        self._running = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join()
+
+    def wait_for_update(self, timeout=None):
+        """Blocks until the local book changes.
+
+        Args:
+            timeout (float, optional): Defaults to None. The maximum number
+                of seconds to wait.
+
+        Returns:
+            bool: True if the book was updated, False on timeout.
+        """
+        updated = self._updated.wait(timeout)
+        self._updated.clear()
+        return updated
@@ -0,0 +1,150 @@
+"""Local stand-in for a streaming orderbook feed.
+
+Speaks the `book_feed` wire protocol so that `BookFeedClient` and the
+streaming mode of `CCXTTrader` can be exercised offline, in tests or dry
+runs, without an exchange connection.
+"""
+import json
+import logging
+import socketserver
+import threading
+
+from autotrageur.bot.trader.book_feed import (ASKS, BIDS, MSG_DIFF,
+                                              MSG_RESYNC, MSG_SNAPSHOT,
+                                              LocalOrderbook)
+
+
+class _FeedHandler(socketserver.StreamRequestHandler):
+    """Serves one feed subscriber."""
+
+    def handle(self):
+        """Registers the subscriber and answers its resync requests."""
+        self.server.feed.subscribe(self)
+        try:
+            for line in self.rfile:
+                if json.loads(line.decode()).get('type') == MSG_RESYNC:
+                    self.server.feed.send_snapshot(self)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.server.feed.unsubscribe(self)
+
+    def send(self, message):
+        """Sends a message to the subscriber.
+
+        Args:
+            message (dict): The message to send.
+        """
+        self.wfile.write((json.dumps(message) + '\n').encode())
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Threaded TCP server for the feed."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class LocalBookFeedServer():
+    """A local feed publishing diffs of an in-memory orderbook."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """Constructor.
+
+        Args:
+            host (str, optional): Defaults to '127.0.0.1'. The host to bind.
+            port (int, optional): Defaults to 0. The port to bind; 0 picks a
+                free port.
+        """
+        self.book = LocalOrderbook()
+        self.book.apply_snapshot(0, [], [])
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _FeedHandler)
+        self._server.feed = self
+        self._thread = None
+
+    @property
+    def address(self):
+        """The (host, port) the feed is bound to.
+
+        Returns:
+            tuple(str, int): The bound address.
+        """
+        return self._server.server_address
+
+    def __broadcast(self, message):
+        """Sends a message to every subscriber.
+
+        Args:
+            message (dict): The message to send.
+        """
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.send(message)
+            except OSError:
+                logging.debug("Dropping disconnected feed subscriber.")
+                self._subscribers.discard(subscriber)
+
+    def publish(self, bids, asks, skip_sequence=False):
+        """Applies an update to the book and sends it to subscribers.
+
+        Args:
+            bids (list[list(float)]): The bid level updates.
+            asks (list[list(float)]): The ask level updates.
+            skip_sequence (bool, optional): Defaults to False. Whether to
+                skip a sequence number, emulating a dropped message.
+        """
+        with self._lock:
+            sequence = self.book.sequence + (2 if skip_sequence else 1)
+            self.book.sequence = sequence - 1
+            self.book.apply_diff(sequence, bids, asks)
+            self.__broadcast({
+                'type': MSG_DIFF,
+                'seq': sequence,
+                BIDS: bids,
+                ASKS: asks
+            })
+
+    def send_snapshot(self, subscriber):
+        """Sends the full book to a subscriber.
+
+        Args:
+            subscriber (_FeedHandler): The subscriber to send to.
+        """
+        with self._lock:
+            book = self.book.to_orderbook()
+            subscriber.send({
+                'type': MSG_SNAPSHOT,
+                'seq': self.book.sequence,
+                BIDS: book[BIDS],
+                ASKS: book[ASKS]
+            })
+
+    def start(self):
+        """Starts serving on a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def subscribe(self, subscriber):
+        """Registers a subscriber for diffs.
+
+        Args:
+            subscriber (_FeedHandler): The subscriber to register.
+        """
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        """Removes a subscriber.
+
+        Args:
+            subscriber (_FeedHandler): The subscriber to remove.
+        """
+        with self._lock:
+            self._subscribers.discard(subscriber)
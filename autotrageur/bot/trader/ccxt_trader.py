@@ -1,28 +1,70 @@
 import logging
+import threading
+import weakref
 from collections import namedtuple
-from statistics import stdev
 
 import ccxt
 
 import fp_libs.forex.currency_converter as forex
 import fp_libs.ccxt_extensions as ccxt_extensions
-from fp_libs.constants.ccxt_constants import BUY_SIDE
+from autotrageur.bot.common.db_constants import SLIPPAGE_STATS_TABLE
+from autotrageur.bot.common.storage import (execute_parametrized_query,
+                                            transaction)
+from autotrageur.bot.trader.book_depth import BookDepthTracker
+from autotrageur.bot.trader.fee_cache import DEFAULT_FEE_TTL, TakerFeeCache
+from autotrageur.bot.trader.fixed_point import (FixedPointOrderbookIndex,
+                                                FixedPointScaleException)
+from autotrageur.bot.trader.market_spec import MarketSpec
+from autotrageur.bot.trader.orderbook_index import (OrderbookException,
+                                                    OrderbookIndex)
+from autotrageur.bot.trader.slippage_stats import SlippageStats
+from fp_libs.constants.ccxt_constants import BUY_SIDE, SELL_SIDE
 from fp_libs.constants.decimal_constants import HUNDRED, ONE, ZERO
-from fp_libs.db.maria_db_handler import execute_parametrized_query
 from fp_libs.trade.executor.ccxt_executor import CCXTExecutor
 from fp_libs.trade.executor.dryrun_executor import DryRunExecutor
 from fp_libs.trade.fetcher.ccxt_fetcher import CCXTFetcher
-from fp_libs.utilities import keys_exists, num_to_decimal
+from fp_libs.utilities import num_to_decimal
+from fp_libs.utils.ccxt_utils import wrap_ccxt_retry
 
 EXTENSION_PREFIX = "ext_"
+BIDS = "bids"
+ASKS = "asks"
+
+# Key of the number of levels per side an orderbook was fetched with, in the
+# orderbooks of `get_orderbook`.  None if the orderbook is complete.
+BOOK_DEPTH_LIMIT = "depth_limit"
+
+# The lock of each ccxt exchange object, shared by the traders using it.
+_exchange_locks = weakref.WeakKeyDictionary()
+
+# The ccxt exchange objects whose markets are revalidated in the background.
+_refreshed_exchanges = weakref.WeakSet()
+
+# Guards `_exchange_locks` and `_refreshed_exchanges`.
+_registry_lock = threading.Lock()
 
 
 PricePair = namedtuple('PricePair', ['usd_price', 'quote_price'])
 
 
-class OrderbookException(Exception):
-    """Exception for orderbook related errors."""
-    pass
+def _get_exchange_lock(ccxt_exchange):
+    """Gets the lock of a ccxt exchange object.
+
+    The synchronous ccxt exchange objects are not thread safe, and an
+    object shared through an `ExchangePool` is used by the book fetcher's
+    workers, the trading thread and the markets refresh.
+
+    Args:
+        ccxt_exchange (ccxt.Exchange): The exchange object.
+
+    Returns:
+        threading.RLock: The lock held while using the exchange object.
+    """
+    with _registry_lock:
+        lock = _exchange_locks.get(ccxt_exchange)
+        if lock is None:
+            lock = _exchange_locks[ccxt_exchange] = threading.RLock()
+        return lock
 
 
 class ExchangeLimitException(Exception):
@@ -43,7 +85,8 @@ class CCXTTrader():
     """CCXT Trader for performing trades."""
 
     def __init__(self, base, quote, exchange_name, exchange_id, slippage,
-        exchange_config={}, dry_run_exchange=None):
+        exchange_config={}, dry_run_exchange=None, fee_ttl=DEFAULT_FEE_TTL,
+        ccxt_exchange=None, autotrageur_config_id=None):
         """Constructor.
 
         The trading client for interacting with the CCXT library.
@@ -71,11 +114,22 @@ class CCXTTrader():
             dry_run_exchange (DryRunExchange): The object to hold the state of
                 the dry run for the associated exchange. Is None if not
                 a dry run.
+            fee_ttl (float, optional): Defaults to DEFAULT_FEE_TTL. The
+                number of seconds a fetched taker fee is reused for.
+            ccxt_exchange (ccxt.Exchange, optional): Defaults to None. An
+                exchange object shared with other traders of the exchange,
+                see `ExchangePool`.  If None, one is instantiated from the
+                `exchange_config`.
+            autotrageur_config_id (str, optional): Defaults to None. The id
+                of the bot's configuration, which keys the trader's slippage
+                statistics.
         """
         # Instantiate the CCXT Exchange object, or a custom extended CCXT
         # Exchange object.
         exchange_name = exchange_name.lower()
-        if EXTENSION_PREFIX + exchange_name in dir(ccxt_extensions):
+        if ccxt_exchange is not None:
+            self.ccxt_exchange = ccxt_exchange
+        elif EXTENSION_PREFIX + exchange_name in dir(ccxt_extensions):
             self.ccxt_exchange = getattr(
                 ccxt_extensions, EXTENSION_PREFIX + exchange_name)(exchange_config)
         else:
@@ -83,11 +137,13 @@ class CCXTTrader():
 
         self.base = base
         self.quote = quote
+        self.symbol = "%s/%s" % (base, quote)
         self.exchange_name = exchange_name
         self.exchange_id = exchange_id
         self.fetcher = CCXTFetcher(self.ccxt_exchange)
         self.slippage = slippage
         self.dry_run_exchange = dry_run_exchange
+        self.autotrageur_config_id = autotrageur_config_id
 
         if dry_run_exchange:
             self.executor = DryRunExecutor(
@@ -104,6 +160,47 @@ class CCXTTrader():
         self.base_bal = None
         self.quote_bal = None
         self.adjusted_quote_bal = None
+        self.book_feed = None
+        self.depth_tracker = BookDepthTracker()
+        self.verify_book_walk = False
+        self.fixed_point = False
+        self.orderbook_indexes = {}
+        self.fee_cache = TakerFeeCache(
+            lambda: self.fetcher.fetch_taker_fees(), fee_ttl)
+        self._market_spec = None
+        self._markets_refresh = None
+        self.slippage_stats = None
+        self._slippage_is_dry_run = None
+
+    @property
+    def exchange_lock(self):
+        """Property getter for the lock of the trader's exchange object.
+
+        Looked up rather than stored, so traders can still be copied.
+
+        Returns:
+            threading.RLock: The lock shared by the traders of the exchange
+                object.
+        """
+        return _get_exchange_lock(self.ccxt_exchange)
+
+    @property
+    def market_spec(self):
+        """Property getter for the ccxt_trader's market_spec.
+
+        The spec is rebuilt by `load_markets`, and otherwise built from the
+        exchange's loaded markets on first use.
+
+        Raises:
+            KeyError: If the trader's market is not loaded.
+
+        Returns:
+            MarketSpec: The limits and precision of the trader's market.
+        """
+        if self._market_spec is None:
+            self._market_spec = MarketSpec.from_market(
+                self.symbol, self.ccxt_exchange.markets[self.symbol])
+        return self._market_spec
 
     @property
     def forex_ratio(self):
@@ -133,12 +230,12 @@ class CCXTTrader():
     def __adjust_working_balance(self, is_dry_run):
         """Subtracts reasonable slippage from quote_bal.
 
-        Retrieves trade data and use slippage of executed trades to
-        calculate the desired working quote balance. We assume that the
-        slippage follows a normal distribution about mean 0 and we use
-        the sample standard deviation for our calculations. This should
-        be adjusted every time a trade is executed, since that gives us
-        an additional datapoint.
+        Uses the slippage of executed trades to calculate the desired
+        working quote balance. We assume that the slippage follows a
+        normal distribution about mean 0 and we use the sample standard
+        deviation for our calculations. The statistics are updated every
+        time a trade is executed, since that gives us an additional
+        datapoint; see `record_slippage`.
 
         This is a measure to reduce likelihood of failed buy executions
         when the quote_target_amount is equal to quote_bal. If there is
@@ -150,62 +247,95 @@ class CCXTTrader():
             is_dry_run (bool): Whether or not the current run is a dry
                 run.
         """
-        # See spreadcalculator.calc_fixed_spread for details.
-        if self.ccxt_exchange.buy_target_includes_fee:
-            buy_op = '/'
-            buy_fee_ratio = ONE - self.get_taker_fee()
-        else:
-            buy_op = '*'
-            buy_fee_ratio = ONE + self.get_taker_fee()
-
-        query = """
-            SELECT
-                IF(
-                    t.side = 'buy',
-                    t_o.{exchange_id}_buy {buy_op} CAST(%s AS DECIMAL(27,8)) / t.true_price,
-                    t_o.{exchange_id}_sell * CAST(%s AS DECIMAL(27,8)) / t.true_price) AS trade_predict_ratio
-            FROM
-                fcf_autotrageur_config AS c,
-                trade_opportunity AS t_o,
-                trades AS t
-            WHERE
-                c.dryrun = %s
-                AND c.id = t.autotrageur_config_id
-                AND c.start_timestamp = t.autotrageur_config_start_timestamp
-                AND t.trade_opportunity_id = t_o.id
-                AND t.exchange = %s
-        """.format(exchange_id=self.exchange_id, buy_op=buy_op)
-        sell_fee_ratio = ONE - self.get_taker_fee()
-        data = execute_parametrized_query(query, (
-            buy_fee_ratio,
-            sell_fee_ratio,
-            1 if is_dry_run else 0,
-            self.exchange_name))
-
-        # Turn ratios into percentages.
-        # TODO: Store fee data with executed trades to take into account
-        # dynamic fee structures and better post-trade analysis.
-        # NOTE: Eventually the number of trades processed should be
-        # limited for performance, but likely not until the hundreds or
-        # thousands.
-        data = [(x[0] - ONE) * HUNDRED for x in data]
+        if (self.slippage_stats is None
+                or self._slippage_is_dry_run != is_dry_run):
+            self.slippage_stats = self.__load_slippage_stats(is_dry_run)
+            self._slippage_is_dry_run = is_dry_run
 
         self.adjusted_quote_bal = self.quote_bal
 
-        # This requires existing trades; stdev will fail for < 2 trades.
-        if len(data) >= 2:
-            std_dev = stdev(data)
+        # This requires existing trades; stdev is None for < 2 trades.
+        std_dev = self.slippage_stats.get_stdev()
+        if std_dev is not None:
             # We use 1.96 standard deviations to make 97.5% of samples
             # be within the true balance, assuming a normal distribution.
             buffer_percentage = std_dev * num_to_decimal('1.96')
             self.adjusted_quote_bal -= self.quote_bal * (buffer_percentage / 100)
 
-    def __calc_vol_by_book(self, orders, quote_target_amount):
+    def __calc_slippage(self, side, predicted_price, true_price):
+        """Calculates the slippage of a trade.
+
+        The predicted price is adjusted by the taker fee in the same way as
+        the spread; see spreadcalculator.calc_fixed_spread for details.
+
+        Args:
+            side (str): The side of the trade, 'buy' or 'sell'.
+            predicted_price (Decimal): The price polled before the trade.
+            true_price (Decimal): The effective price of the trade.
+
+        Returns:
+            Decimal: The slippage, in percent.
+        """
+        # TODO: Store fee data with executed trades to take into account
+        # dynamic fee structures and better post-trade analysis.
+        if side == BUY_SIDE:
+            if self.ccxt_exchange.buy_target_includes_fee:
+                predicted_cost = predicted_price / (ONE - self.get_taker_fee())
+            else:
+                predicted_cost = predicted_price * (ONE + self.get_taker_fee())
+        else:
+            predicted_cost = predicted_price * (ONE - self.get_taker_fee())
+        return (predicted_cost / true_price - ONE) * HUNDRED
+
+    def __calc_vol_by_book(self, orderbook_index, quote_target_amount):
         """Calculates the asset volume with which to execute a trade.
 
         Uses data from the orderbook to calculate the base asset volume
         to fulfill the quote_target_amount.
 
+        The fill is answered by the book side's `OrderbookIndex`, which
+        gives the same result as walking the whole book in Decimal.  If
+        `verify_book_walk` is set, the result is cross-checked against
+        `__calc_vol_by_book_decimal`.  A `FixedPointOrderbookIndex` rounds
+        its fill once rather than at every level, so its result may differ
+        in the last digits, and is checked to within one unit of the
+        market's amount precision.
+
+        Args:
+            orderbook_index (OrderbookIndex): The index of the bids or
+                asks.
+            quote_target_amount (Decimal): Targeted amount to buy or
+                sell, in quote currency.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            Decimal: The base asset volume required to fulfill
+                target_amount via the orderbook.
+        """
+        fill = orderbook_index.fill_quote(quote_target_amount)
+        self.depth_tracker.record(fill.levels)
+
+        if self.verify_book_walk:
+            expected_volume = self.__calc_vol_by_book_decimal(
+                orderbook_index.orders, quote_target_amount)
+            tolerance = ZERO
+            if isinstance(orderbook_index, FixedPointOrderbookIndex):
+                tolerance = ONE.scaleb(-orderbook_index.amount_places)
+            if abs(expected_volume - fill.base_volume) > tolerance:
+                logging.error(
+                    "%s indexed book walk mismatch: %s, expected %s",
+                    self.exchange_name, fill.base_volume, expected_volume)
+
+        return fill.base_volume
+
+    def __calc_vol_by_book_decimal(self, orders, quote_target_amount):
+        """Calculates the asset volume with which to execute a trade.
+
+        Reference implementation of `__calc_vol_by_book`, walking the whole
+        book in Decimal.  Used to verify the indexed walk.
+
         Args:
             orders (list[list(float)]): The bids or asks in the
                 form of (price, volume).
@@ -255,25 +385,130 @@ class CCXTTrader():
             ExchangeLimitException: If asset buy amount is outside
                 exchange limits.
         """
-        symbol = "%s/%s" % (self.base, self.quote)
-        limits = self.ccxt_exchange.markets[symbol]['limits']
-
-        for measure in [ ('amount', amount), ('price', price) ]:
-            for range_limit in ['min', 'max']:
-                if (measure[1] and keys_exists(limits, measure[0],
-                                               range_limit)):
-                    limit = num_to_decimal(limits[measure[0]][range_limit])
-                    if limit:
-                        if range_limit == 'min' and limit > measure[1]:
-                            raise ExchangeLimitException(
-                            "Order %s %s %s less than exchange limit %s %s."
-                                % (measure[0], measure[1], self.base, limit,
-                                   self.base))
-                        elif range_limit == 'max' and limit < measure[1]:
-                            raise ExchangeLimitException(
-                            "Order %s %s %s more than exchange limit %s %s."
-                                % (measure[0], measure[1], self.base, limit,
-                                   self.base))
+        spec = self.market_spec
+        measures = [
+            ('amount', amount, spec.amount_min, spec.amount_max),
+            ('price', price, spec.price_min, spec.price_max)
+        ]
+
+        for measure, value, limit_min, limit_max in measures:
+            if not value:
+                continue
+            if limit_min and limit_min > value:
+                raise ExchangeLimitException(
+                    "Order %s %s %s less than exchange limit %s %s."
+                    % (measure, value, self.base, limit_min, self.base))
+            elif limit_max and limit_max < value:
+                raise ExchangeLimitException(
+                    "Order %s %s %s more than exchange limit %s %s."
+                    % (measure, value, self.base, limit_max, self.base))
+
+    def __index_book(self, orders):
+        """Indexes one side of an orderbook.
+
+        If `fixed_point` is set, the book side is indexed in scaled
+        integers at the market's price and amount precisions.  Markets of
+        arbitrary precision, and books off the market's grid, are indexed in
+        Decimal.
+
+        Args:
+            orders (list[list(float)]): The bids or asks in the form of
+                (price, volume).
+
+        Returns:
+            OrderbookIndex: The index of the book side.
+        """
+        if self.fixed_point:
+            spec = self.market_spec
+            try:
+                return FixedPointOrderbookIndex(
+                    orders, spec.price_precision, spec.amount_precision)
+            except FixedPointScaleException as e:
+                logging.debug("%s orderbook indexed in Decimal: %s",
+                              self.exchange_name, e)
+        return OrderbookIndex(orders)
+
+    def __load_slippage_stats(self, is_dry_run):
+        """Loads the slippage statistics of the exchange.
+
+        The latest snapshot of the bot's configuration is read from the
+        slippage_stats table, so a resumed bot continues its own statistics.
+        If there is none yet, the statistics are computed once from the
+        trade history of the exchange.
+
+        Args:
+            is_dry_run (bool): Whether or not the current run is a dry
+                run.
+
+        Returns:
+            SlippageStats: The slippage statistics.
+        """
+        dryrun = 1 if is_dry_run else 0
+        with transaction():
+            snapshot = execute_parametrized_query(
+                "SELECT trade_count, mean, m2 FROM {} "
+                "WHERE autotrageur_config_id = %s AND exchange = %s "
+                "AND dryrun = %s "
+                "ORDER BY trade_count DESC LIMIT 1;".format(
+                    SLIPPAGE_STATS_TABLE),
+                (self.autotrageur_config_id, self.exchange_name, dryrun))
+            if snapshot:
+                trade_count, mean, m2 = snapshot[0]
+                return SlippageStats(trade_count, mean, m2)
+
+            trades = execute_parametrized_query("""
+                SELECT
+                    t.side,
+                    t_o.{exchange_id}_buy,
+                    t_o.{exchange_id}_sell,
+                    t.true_price
+                FROM
+                    fcf_autotrageur_config AS c,
+                    trade_opportunity AS t_o,
+                    trades AS t
+                WHERE
+                    c.dryrun = %s
+                    AND c.id = t.autotrageur_config_id
+                    AND c.start_timestamp = t.autotrageur_config_start_timestamp
+                    AND t.trade_opportunity_id = t_o.id
+                    AND t.exchange = %s
+            """.format(exchange_id=self.exchange_id),
+                (dryrun, self.exchange_name))
+
+        slippage_stats = SlippageStats()
+        for side, buy_price, sell_price, true_price in trades:
+            predicted_price = buy_price if side == BUY_SIDE else sell_price
+            slippage_stats.add(
+                self.__calc_slippage(side, predicted_price, true_price))
+        return slippage_stats
+
+    def __refresh_markets(self, markets_cache):
+        """Reloads the markets from the exchange and updates the cache.
+
+        Run on a background thread after markets were installed from the
+        cache.  The markets are fetched without the exchange lock, and only
+        installed under it, so polls and orders are not held up by the
+        fetch.  On failure the cached markets stay in use.
+
+        Args:
+            markets_cache (MarketsCache): The on-disk cache of loaded
+                markets.
+        """
+        try:
+            markets = self.ccxt_exchange.fetch_markets()
+        except ccxt.BaseError as exc:
+            logging.warning("%s markets could not be revalidated: %s",
+                            self.exchange_name, exc)
+            return
+
+        with self.exchange_lock:
+            self.ccxt_exchange.set_markets(markets)
+            markets = self.ccxt_exchange.markets
+            self._market_spec = MarketSpec.from_market(
+                self.symbol, markets[self.symbol])
+        markets_cache.save(self.exchange_name, self.ccxt_exchange.urls['api'],
+                           markets)
+        logging.info("%s markets revalidated.", self.exchange_name)
 
     def __round_exchange_precision(self, market_order, asset_amount):
         """Rounds the asset amount by a precision provided by the exchange.
@@ -291,14 +526,22 @@ class CCXTTrader():
         """
         if market_order is True:
             # Rounding is required for direct ccxt call.
-            precision = self.get_amount_precision()
-
-            # In the case the exchange supports arbitrary precision.
-            if precision is not None:
-                asset_amount = round(asset_amount, precision)
+            asset_amount = self.market_spec.quantize_amount(asset_amount)
 
         return asset_amount
 
+    def attach_book_feed(self, book_feed):
+        """Switches the trader to streaming mode.
+
+        The orderbook is then read from the feed's locally maintained book
+        instead of being downloaded each poll.
+
+        Args:
+            book_feed (BookFeedClient): A started feed client for the
+                trader's market.
+        """
+        self.book_feed = book_feed
+
     def connect_test_api(self):
         """Connect to the test API of the exchange.
 
@@ -328,7 +571,6 @@ class CCXTTrader():
                 and 'id'. The 'info' includes all raw response contents
                 and result['id'] == result['info']['id']
         """
-        symbol = "%s/%s" % (self.base, self.quote)
         market_order = self.ccxt_exchange.has['createMarketOrder']
         quote_target_amount = self.quote_target_amount
         asset_amount = quote_target_amount / asset_price
@@ -339,7 +581,7 @@ class CCXTTrader():
         # the true target asset_amount and quote_target_amount. Note that all
         # exchanges MUST implement buy_target_includes_fee.
         if self.ccxt_exchange.buy_target_includes_fee is False:
-            fee_ratio = num_to_decimal(1) + self.get_taker_fee()
+            fee_ratio = ONE + self.get_taker_fee()
             asset_amount /= fee_ratio
             quote_target_amount /= fee_ratio
 
@@ -351,21 +593,24 @@ class CCXTTrader():
         # raised.
         self.__check_exchange_limits(asset_amount, asset_price)
 
-        if market_order is True:
-            result = self.executor.create_market_buy_order(
-                symbol, asset_amount, asset_price)
-        elif market_order == 'emulated':
-            # Rounding will be deferred to emulated implementation.
-            result = self.executor.create_emulated_market_buy_order(
-                symbol,
-                quote_target_amount,
-                asset_price,
-                self.slippage)
-        else:
-            raise NotImplementedError(
-                "Exchange %s has no market buy functionality." %
-                self.ccxt_exchange.id)
-
+        with self.exchange_lock:
+            if market_order is True:
+                result = self.executor.create_market_buy_order(
+                    self.symbol, asset_amount, asset_price)
+            elif market_order == 'emulated':
+                # Rounding will be deferred to emulated implementation.
+                result = self.executor.create_emulated_market_buy_order(
+                    self.symbol,
+                    quote_target_amount,
+                    asset_price,
+                    self.slippage)
+            else:
+                raise NotImplementedError(
+                    "Exchange %s has no market buy functionality." %
+                    self.ccxt_exchange.id)
+
+        # The trade may move the account into another fee tier.
+        self.fee_cache.invalidate()
         return result
 
     def execute_market_sell(self, asset_price, asset_amount):
@@ -386,7 +631,6 @@ class CCXTTrader():
                 and 'id'. The 'info' includes all raw response contents and
                 result['id'] == result['info']['id']
         """
-        symbol = "%s/%s" % (self.base, self.quote)
         market_order = self.ccxt_exchange.has['createMarketOrder']
         asset_amount = self.__round_exchange_precision(
             market_order, asset_amount)
@@ -396,22 +640,25 @@ class CCXTTrader():
         # raised.
         self.__check_exchange_limits(asset_amount, asset_price)
 
-        if market_order is True:
-            result = self.executor.create_market_sell_order(
-                symbol,
-                asset_amount,
-                asset_price)
-        elif market_order == 'emulated':
-            result = self.executor.create_emulated_market_sell_order(
-                symbol,
-                asset_price,
-                asset_amount,
-                self.slippage)
-        else:
-            raise NotImplementedError(
-                "Exchange %s has no market sell functionality." %
-                self.ccxt_exchange.id)
-
+        with self.exchange_lock:
+            if market_order is True:
+                result = self.executor.create_market_sell_order(
+                    self.symbol,
+                    asset_amount,
+                    asset_price)
+            elif market_order == 'emulated':
+                result = self.executor.create_emulated_market_sell_order(
+                    self.symbol,
+                    asset_price,
+                    asset_amount,
+                    self.slippage)
+            else:
+                raise NotImplementedError(
+                    "Exchange %s has no market sell functionality." %
+                    self.ccxt_exchange.id)
+
+        # The trade may move the account into another fee tier.
+        self.fee_cache.invalidate()
         return result
 
     def get_amount_precision(self):
@@ -423,13 +670,29 @@ class CCXTTrader():
         Returns:
             int: The precision.
         """
-        symbol = "%s/%s" % (self.base, self.quote)
-        precision = self.ccxt_exchange.markets[symbol]['precision']
+        return self.market_spec.amount_precision
 
-        if 'amount' in precision and precision['amount'] is not None:
-            return precision['amount']
-        else:
+    def get_base_from_orderbook(self, side, quote_amount):
+        """Gets the base volume a quote amount fills on the last polled
+        orderbook.
+
+        Args:
+            side (str): Which side of the orderbook is used.  One of BUY_SIDE
+                or SELL_SIDE.
+            quote_amount (Decimal): The amount to buy or sell, in quote
+                currency.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            Decimal: The base volume, or None if the side has not been
+                polled.
+        """
+        orderbook_index = self.orderbook_indexes.get(side)
+        if orderbook_index is None:
             return None
+        return orderbook_index.fill_quote(quote_amount).base_volume
 
     def get_buy_target_includes_fee(self):
         """Gets whether the exchange includes fees in its buy orders.
@@ -451,7 +714,8 @@ class CCXTTrader():
         Returns:
             dict: The full orderbook.
         """
-        return self.fetcher.get_full_orderbook(self.base, self.quote)
+        with self.exchange_lock:
+            return self.fetcher.get_full_orderbook(self.base, self.quote)
 
     def get_min_base_limit(self):
         """Retrieves the minimum base amount limit of the trader's 'base/quote'
@@ -460,9 +724,84 @@ class CCXTTrader():
         Returns:
             Decimal: The minimum base amount limit.
         """
-        symbol = "{}/{}".format(self.base, self.quote)
-        return num_to_decimal(
-            self.ccxt_exchange.markets[symbol]['limits']['amount']['min'])
+        return self.market_spec.amount_min
+
+    def get_orderbook(self):
+        """Gets the orderbook (bids and asks) to be used for a poll.
+
+        In streaming mode, the locally maintained orderbook is returned
+        without a network call.  Otherwise, only as many levels are fetched
+        as recent polls needed to fill their targets, plus a safety margin.
+        If the local book is out of sync, or no depth has been learned yet,
+        the full orderbook is fetched.
+
+        The orderbook carries the depth it was fetched with under
+        BOOK_DEPTH_LIMIT, so that `get_prices_from_book` can deepen it.  The
+        trader itself is left untouched, as orderbooks are also fetched on
+        the worker threads of a `ConcurrentBookFetcher`.
+
+        Returns:
+            dict: The orderbook, in the same form as `get_full_orderbook`.
+        """
+        if self.book_feed is not None:
+            orderbook = self.book_feed.get_orderbook()
+            if orderbook is not None:
+                orderbook[BOOK_DEPTH_LIMIT] = None
+                return orderbook
+            logging.debug("%s local orderbook out of sync, fetching snapshot.",
+                          self.exchange_name)
+
+        depth = self.depth_tracker.get_depth()
+        if depth is None:
+            orderbook = self.get_full_orderbook()
+        else:
+            with self.exchange_lock:
+                orderbook, = wrap_ccxt_retry([
+                    lambda: self.ccxt_exchange.fetch_order_book(
+                        self.symbol, depth)])
+        orderbook[BOOK_DEPTH_LIMIT] = depth
+        return orderbook
+
+    def get_prices_from_book(self, orderbook):
+        """Get market buy and sell prices from both sides of an orderbook.
+
+        If a side is not deep enough and the orderbook was fetched with a
+        depth limit, the full orderbook is fetched once and replaces both
+        sides of `orderbook`, so that both prices, and any other poll of the
+        same orderbook, come from the same snapshot.
+
+        Args:
+            orderbook (dict): The orderbook, as given by `get_orderbook`.
+
+        Raises:
+            OrderbookException: If the full orderbook is not deep enough.
+
+        Returns:
+            tuple(PricePair, PricePair): The prices of a market buy and a
+                market sell; see `get_prices_from_orderbook`.
+        """
+        prices = []
+        for side, bids_or_asks in ((BUY_SIDE, orderbook[ASKS]),
+                                   (SELL_SIDE, orderbook[BIDS])):
+            try:
+                prices.append(
+                    self.get_prices_from_orderbook(side, bids_or_asks))
+            except OrderbookException:
+                # Only a depth-limited orderbook can be deepened by
+                # re-fetching.
+                depth_limit = orderbook.get(BOOK_DEPTH_LIMIT)
+                if depth_limit is None or len(bids_or_asks) < depth_limit:
+                    raise
+                logging.info("%s orderbook depth of %s not enough, fetching "
+                             "full orderbook.", self.exchange_name,
+                             depth_limit)
+                self.depth_tracker.reset()
+                full_orderbook = self.get_full_orderbook()
+                orderbook[BIDS] = full_orderbook[BIDS]
+                orderbook[ASKS] = full_orderbook[ASKS]
+                orderbook[BOOK_DEPTH_LIMIT] = None
+                return self.get_prices_from_book(orderbook)
+        return tuple(prices)
 
     def get_prices_from_orderbook(self, side, bids_or_asks):
         """Get market buy or sell price in USD and quote currency.
@@ -475,11 +814,18 @@ class CCXTTrader():
         Input of bids will retrieve market sell price; input of asks
         will retrieve market buy price.
 
+        The book side is indexed once and kept in `orderbook_indexes`, so
+        that later questions about the same poll, e.g. through
+        `get_base_from_orderbook`, are answered without another walk.  With
+        `fixed_point` set, the index is in scaled integers where the market
+        allows.  A depth-limited orderbook is only deepened through
+        `get_prices_from_book`.
+
         Args:
             side (str): Which side of the orderbook is used.  One of BUY_SIDE
                 or SELL_SIDE.
-            bids_or_asks (list[list(float)]): The bids or asks in the
-                form of (price, volume).
+            bids_or_asks (list[list(float)] or OrderbookIndex): The bids or
+                asks in the form of (price, volume), or their index.
 
         Raises:
             OrderbookException: If the orderbook is not deep enough.
@@ -491,6 +837,9 @@ class CCXTTrader():
         target_amount = (self.quote_target_amount
             if side is BUY_SIDE
             else self.quote_rough_sell_amount)
+        if not isinstance(bids_or_asks, OrderbookIndex):
+            bids_or_asks = self.__index_book(bids_or_asks)
+        self.orderbook_indexes[side] = bids_or_asks
         asset_volume = self.__calc_vol_by_book(bids_or_asks, target_amount)
         usd_price = self.get_usd_from_quote(target_amount) / asset_volume
         quote_price = target_amount / asset_volume
@@ -499,13 +848,16 @@ class CCXTTrader():
     def get_taker_fee(self):
         """Obtains the exchange's takers fee.
 
+        The fee is cached by `fee_cache` for its TTL, and refetched after
+        each trade.
+
         Raises:
             NotImplementedError: If not accessible through ccxt.
 
         Returns:
             Decimal: The taker fee, given as a ratio.
         """
-        return self.fetcher.fetch_taker_fees()
+        return self.fee_cache.get()
 
     def get_quote_from_usd(self, usd_amount):
         """Get converted quote amount from USD amount.
@@ -567,7 +919,7 @@ class CCXTTrader():
         else:
             return quote_amount
 
-    def load_markets(self):
+    def load_markets(self, markets_cache=None):
         """Load the markets of the exchange.
 
         Allows manual calling of `load_markets` from either a ccxt Exchange
@@ -576,11 +928,62 @@ class CCXTTrader():
         Refer https://github.com/ccxt/ccxt/wiki/Manual in the Loading Markets
         section for details.
 
+        If a markets cache is given and holds fresh markets for the
+        exchange, they are installed without a network call, and reloaded
+        from the exchange on a background thread, once per exchange object.
+        Otherwise the markets are loaded from the exchange and written to
+        the cache.
+
+        Args:
+            markets_cache (MarketsCache, optional): Defaults to None. The
+                on-disk cache of loaded markets.
+        """
+        if markets_cache is not None:
+            cached = markets_cache.load(
+                self.exchange_name, self.ccxt_exchange.urls['api'])
+            if cached is not None and cached.is_fresh:
+                logging.info("%s markets loaded from cache.",
+                             self.exchange_name)
+                with self.exchange_lock:
+                    self.ccxt_exchange.set_markets(cached.markets)
+                    self._market_spec = MarketSpec.from_market(
+                        self.symbol, self.ccxt_exchange.markets[self.symbol])
+                with _registry_lock:
+                    is_refreshed = self.ccxt_exchange in _refreshed_exchanges
+                    _refreshed_exchanges.add(self.ccxt_exchange)
+                if not is_refreshed:
+                    self._markets_refresh = threading.Thread(
+                        target=self.__refresh_markets, args=(markets_cache,),
+                        daemon=True)
+                    self._markets_refresh.start()
+                return
+
+        with self.exchange_lock:
+            self.fetcher.load_markets()
+            self._market_spec = MarketSpec.from_market(
+                self.symbol, self.ccxt_exchange.markets[self.symbol])
+        if markets_cache is not None:
+            markets_cache.save(self.exchange_name,
+                               self.ccxt_exchange.urls['api'],
+                               self.ccxt_exchange.markets)
+
+    def record_slippage(self, side, predicted_price, true_price):
+        """Adds an executed trade to the slippage statistics.
+
+        NOTE: The statistics are loaded on the first balance update, which
+        must precede any trade.
+
+        Args:
+            side (str): The side of the trade, 'buy' or 'sell'.
+            predicted_price (Decimal): The price polled before the trade.
+            true_price (Decimal): The effective price of the trade.
+
         Returns:
-            dict: Information about the `markets` which have been loaded into
-                memory.
+            SlippageStats: The updated slippage statistics.
         """
-        self.fetcher.load_markets()
+        self.slippage_stats.add(
+            self.__calc_slippage(side, predicted_price, true_price))
+        return self.slippage_stats
 
     def round_exchange_precision(self, amount):
         """Rounds the amount based on an exchange's precision.
@@ -666,6 +1069,21 @@ class CCXTTrader():
         logging.debug('{} quote_rough_sell_amount updated to: {}'.format(
             self.exchange_name, self.quote_rough_sell_amount))
 
+    def share_exchange_state(self, trader):
+        """Shares the taker fee cache of another trader of the same exchange
+        object.
+
+        Taker fees are a property of the exchange account rather than of the
+        market, so the traders of several pairs on one exchange keep one
+        copy, loaded and refreshed once.  Slippage statistics are not
+        shared; each trader continues the snapshots of its own
+        configuration.
+
+        Args:
+            trader (CCXTTrader): The trader whose state is shared.
+        """
+        self.fee_cache = trader.fee_cache
+
     def update_wallet_balances(self):
         """Fetches and saves the wallet balances of the base and quote
         currencies on the exchange.
@@ -0,0 +1,59 @@
+import logging
+
+
+class ExchangePool():
+    """The ccxt exchange objects shared by the traders of one process.
+
+    Traders of different pairs on the same exchange share its exchange
+    object, so its markets are loaded, and its API rate limit accounted,
+    once for all of them.  They also share the taker fee cache of the
+    exchange's first trader.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._exchanges = {}
+        self._traders = {}
+
+    def __len__(self):
+        return len(self._exchanges)
+
+    def get(self, exchange_name):
+        """Retrieves the shared exchange object of an exchange.
+
+        Args:
+            exchange_name (str): The exchange name.
+
+        Returns:
+            ccxt.Exchange: The exchange object, or None if no trader of the
+                exchange is registered yet.
+        """
+        return self._exchanges.get(exchange_name.lower())
+
+    def register(self, trader, markets_cache=None):
+        """Registers a trader, loading the markets of its exchange once.
+
+        The first trader of an exchange shares its exchange object and taker
+        fee cache with the traders registered after it, which are expected
+        to be constructed with the exchange object.
+
+        Args:
+            trader (CCXTTrader): The trader.
+            markets_cache (MarketsCache, optional): Defaults to None. The
+                on-disk cache of loaded markets.
+
+        Raises:
+            KeyError: If the trader's market is not listed by the exchange.
+        """
+        shared = self._exchanges.setdefault(
+            trader.exchange_name, trader.ccxt_exchange)
+        first = self._traders.setdefault(trader.exchange_name, trader)
+        if first is not trader and shared is trader.ccxt_exchange:
+            trader.share_exchange_state(first)
+        if shared is trader.ccxt_exchange and shared.markets:
+            logging.info("%s markets shared with %s.", trader.exchange_name,
+                         trader.symbol)
+            # Check that the market is listed.
+            trader.market_spec
+        else:
+            trader.load_markets(markets_cache)
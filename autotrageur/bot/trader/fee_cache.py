@@ -0,0 +1,61 @@
+import logging
+import time
+
+# Seconds a fetched taker fee is reused for.
+DEFAULT_FEE_TTL = 600
+
+
+class TakerFeeCache():
+    """Caches an exchange's taker fee for a limited time.
+
+    Fees change rarely, but are read several times per poll.  The fee is
+    fetched on the first read after it expires or is invalidated, e.g. after
+    a trade which may move the account into another fee tier.
+    """
+
+    def __init__(self, fetch_fee, ttl=DEFAULT_FEE_TTL, clock=time.monotonic):
+        """Constructor.
+
+        Args:
+            fetch_fee (func): Fetches the taker fee, given as a ratio.
+            ttl (float, optional): Defaults to DEFAULT_FEE_TTL. The number of
+                seconds a fetched fee is reused for.
+            clock (func, optional): Defaults to time.monotonic. Returns the
+                current time in seconds.
+        """
+        self.fetch_fee = fetch_fee
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._fee = None
+        self._expiry = None
+
+    def get(self):
+        """Gets the taker fee, fetching it if not cached.
+
+        Returns:
+            Decimal: The taker fee, given as a ratio.
+        """
+        now = self.clock()
+        if self._fee is not None and now < self._expiry:
+            self.hits += 1
+            return self._fee
+
+        self.misses += 1
+        self._fee = self.fetch_fee()
+        self._expiry = now + self.ttl
+        return self._fee
+
+    def invalidate(self):
+        """Discards the cached fee, so that the next read fetches it."""
+        self._fee = None
+
+    def log_stats(self, name):
+        """Logs the cache hits and misses.
+
+        Args:
+            name (str): The name of the cache's exchange.
+        """
+        logging.info("%s taker fee cache: %d hits, %d misses.",
+                     name, self.hits, self.misses)
@@ -0,0 +1,229 @@
+from bisect import bisect_left
+from decimal import Decimal
+
+import numpy as np
+
+from autotrageur.bot.trader.orderbook_index import (BookFill,
+                                                    OrderbookException,
+                                                    OrderbookIndex)
+from fp_libs.constants.decimal_constants import ZERO
+
+# Scaled values at or above this are not represented exactly by a float64.
+MAX_EXACT_SCALED = 2 ** 53
+
+# The most decimal places a market scale can have; 10 ** 22 is the largest
+# power of ten represented exactly by a float64.
+MAX_PLACES = 22
+
+
+class FixedPointScaleException(Exception):
+    """Exception for values not representable at a market's scale."""
+    pass
+
+
+def get_places(precision):
+    """Gets the decimal places of a market scale from an exchange precision.
+
+    A negative precision, e.g. amounts in hundreds, is on the grid of zero
+    decimal places.
+
+    Args:
+        precision (int): The number of decimal places given by the exchange,
+            or None for arbitrary precision.
+
+    Raises:
+        FixedPointScaleException: If the precision is None, or finer than
+            MAX_PLACES.
+
+    Returns:
+        int: The decimal places.
+    """
+    if precision is None or precision > MAX_PLACES:
+        raise FixedPointScaleException(
+            "No fixed-point scale for precision {}.".format(precision))
+    return max(precision, 0)
+
+
+def to_scaled(values, places):
+    """Converts floats to integers at a decimal scale.
+
+    A float converts if its shortest decimal representation, the one
+    `num_to_decimal` gives, has at most `places` decimal places.  The check
+    is exact: the scaled integer divided back by the scale is the same float
+    if and only if they represent the same decimal.
+
+    Args:
+        values (list[float]): The values.
+        places (int): The decimal places of the scale.
+
+    Raises:
+        FixedPointScaleException: If a value is not on the scale's grid.
+
+    Returns:
+        list[int]: The values, multiplied by 10 ** places.
+    """
+    floats = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** places
+    scaled = np.rint(floats * scale)
+
+    if scaled.size and (np.abs(scaled).max() >= MAX_EXACT_SCALED or
+                        not np.array_equal(scaled / scale, floats)):
+        raise FixedPointScaleException(
+            "Values are not on the grid of {} decimal places.".format(places))
+
+    return scaled.astype(np.int64).tolist()
+
+
+def _scaled_ratio(value, places):
+    """Represents a Decimal multiplied by a scale as an exact ratio.
+
+    Args:
+        value (Decimal): The finite value.
+        places (int): The decimal places of the scale.
+
+    Returns:
+        tuple(int, int): The numerator and positive denominator of
+            value * 10 ** places.
+    """
+    numerator, denominator = value.as_integer_ratio()
+    return numerator * 10 ** places, denominator
+
+
+class FixedPointOrderbookIndex(OrderbookIndex):
+    """Prefix sums over one side of an orderbook, in scaled integers.
+
+    Prices are held as integers at the market's price scale, volumes at its
+    amount scale, and notionals at the product of both, so the prefix sums
+    and the search for the fill level are exact without floating point or
+    Decimal.  Each fill result is converted to Decimal once, by a single
+    division rounded in the current Decimal context, so it is within one
+    unit in the last place of the exact fill.  The Decimal `OrderbookIndex`
+    rounds each step instead, and finds the same fill level.
+
+    The book is converted when the index is built; a book whose values are
+    off the market's grid raises, so that the caller can fall back to the
+    Decimal index.
+    """
+
+    def __init__(self, orders, price_precision, amount_precision):
+        """Constructor.
+
+        Args:
+            orders (list[list(float)]): The bids or asks in the form of
+                (price, volume).
+            price_precision (int): The decimal places of the market's
+                prices.
+            amount_precision (int): The decimal places of the market's base
+                amounts.
+
+        Raises:
+            FixedPointScaleException: If the precisions are unknown, or a
+                price or volume is off the market's grid.
+        """
+        super().__init__(orders)
+        self.price_places = get_places(price_precision)
+        self.amount_places = get_places(amount_precision)
+
+        book = np.asarray(orders, dtype=np.float64).reshape(-1, 2)
+        self._i_prices = to_scaled(book[:, 0], self.price_places)
+        self._i_volumes = to_scaled(book[:, 1], self.amount_places)
+        self._i_cum_base = [0]
+        self._i_cum_quote = [0]
+
+    def __fill_level(self, target, cum):
+        """Finds the number of levels needed to fill a scaled amount.
+
+        The integer prefix sums are extended only as deep as the fill.
+
+        Args:
+            target (int): The positive amount to fill, rounded up to the
+                scale of the measure being filled.
+            cum (list[int]): The prefix sums of the measure being filled,
+                starting from zero.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            int: The smallest number of levels whose sum reaches the amount.
+        """
+        while cum[-1] < target and len(self._i_cum_base) <= len(self):
+            level = len(self._i_cum_base) - 1
+            price, volume = self._i_prices[level], self._i_volumes[level]
+            self._i_cum_base.append(self._i_cum_base[-1] + volume)
+            self._i_cum_quote.append(self._i_cum_quote[-1] + price * volume)
+
+        if cum[-1] < target:
+            raise OrderbookException("Order book not deep enough for trade.")
+
+        return bisect_left(cum, target)
+
+    # @Override
+    def fill_base(self, base_volume):
+        """Fills a base volume against the book side.
+
+        Args:
+            base_volume (Decimal): The base volume to buy or sell.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            BookFill: The quote amount the base volume costs or returns.
+        """
+        if not self.orders:
+            raise OrderbookException("Order book not deep enough for trade.")
+        if base_volume <= ZERO:
+            return super().fill_base(base_volume)
+
+        numerator, denominator = _scaled_ratio(base_volume, self.amount_places)
+        levels = self.__fill_level(-(-numerator // denominator),
+                                   self._i_cum_base)
+
+        # quote = cum_quote + (base_volume - cum_base) * price, at the
+        # notional scale.
+        quote_numerator = (
+            self._i_cum_quote[levels] * denominator +
+            (numerator - self._i_cum_base[levels] * denominator) *
+            self._i_prices[levels - 1])
+        quote_denominator = (
+            denominator * 10 ** (self.price_places + self.amount_places))
+        return BookFill(
+            base_volume,
+            Decimal(quote_numerator) / Decimal(quote_denominator),
+            levels)
+
+    # @Override
+    def fill_quote(self, quote_amount):
+        """Fills a quote amount against the book side.
+
+        Args:
+            quote_amount (Decimal): The quote amount to spend or receive.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            BookFill: The base volume the quote amount buys or sells.
+        """
+        if not self.orders:
+            raise OrderbookException("Order book not deep enough for trade.")
+        if quote_amount <= ZERO:
+            return super().fill_quote(quote_amount)
+
+        numerator, denominator = _scaled_ratio(
+            quote_amount, self.price_places + self.amount_places)
+        levels = self.__fill_level(-(-numerator // denominator),
+                                   self._i_cum_quote)
+
+        # base = cum_base + (quote_amount - cum_quote) / price, at the amount
+        # scale; the remainder is zero or negative.
+        price = self._i_prices[levels - 1]
+        base_numerator = (
+            self._i_cum_base[levels] * denominator * price +
+            numerator - self._i_cum_quote[levels] * denominator)
+        base_denominator = denominator * price * 10 ** self.amount_places
+        return BookFill(
+            Decimal(base_numerator) / Decimal(base_denominator),
+            quote_amount,
+            levels)
@@ -0,0 +1,75 @@
+from collections import namedtuple
+
+from fp_libs.constants.decimal_constants import ONE
+from fp_libs.utilities import num_to_decimal
+
+
+# See https://stackoverflow.com/questions/1606436/adding-docstrings-to-namedtuples
+class MarketSpec(namedtuple('MarketSpec', [
+        'symbol', 'amount_min', 'amount_max', 'price_min', 'price_max',
+        'amount_precision', 'amount_quantizer', 'price_precision'])):
+    """The trading rules of a market, converted once from the ccxt market.
+
+    Args:
+        symbol (str): The market symbol, e.g. 'ETH/USD'.
+        amount_min (Decimal): The minimum base amount of an order, or None.
+        amount_max (Decimal): The maximum base amount of an order, or None.
+        price_min (Decimal): The minimum price of an order, or None.
+        price_max (Decimal): The maximum price of an order, or None.
+        amount_precision (int): The number of decimal places of the base
+            amount, or None for arbitrary precision.
+        amount_quantizer (Decimal): The exponent base amounts are quantized
+            to, or None for arbitrary precision.
+        price_precision (int): The number of decimal places of the price,
+            or None for arbitrary precision.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_market(cls, symbol, market):
+        """Builds the spec from a market loaded by ccxt.
+
+        Missing limits are None; a limit of zero is kept, and treated as no
+        limit by the limit checks.
+
+        Args:
+            symbol (str): The market symbol.
+            market (dict): The ccxt market structure, including 'limits'
+                and 'precision'.
+
+        Raises:
+            KeyError: If the market has no 'limits' or 'precision'.
+
+        Returns:
+            MarketSpec: The market's spec.
+        """
+        limits = market['limits']
+        precision = market['precision'].get('amount')
+
+        def limit(measure, bound):
+            return num_to_decimal(limits.get(measure, {}).get(bound))
+
+        return cls(
+            symbol=symbol,
+            amount_min=limit('amount', 'min'),
+            amount_max=limit('amount', 'max'),
+            price_min=limit('price', 'min'),
+            price_max=limit('price', 'max'),
+            amount_precision=precision,
+            amount_quantizer=(None if precision is None
+                              else ONE.scaleb(-precision)),
+            price_precision=market['precision'].get('price'))
+
+    def quantize_amount(self, amount):
+        """Rounds a base amount to the market's precision.
+
+        Args:
+            amount (Decimal): The amount to round.
+
+        Returns:
+            Decimal: The rounded amount, or the amount unchanged if the
+                market supports arbitrary precision.
+        """
+        if self.amount_quantizer is None:
+            return amount
+        return amount.quantize(self.amount_quantizer)
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+import ccxt
+
+# Bump when the layout of the cache files changes.
+MARKETS_CACHE_VERSION = 1
+
+# Directory holding one cache file per exchange.
+MARKETS_CACHE_DIR = os.path.join('data', 'markets_cache')
+
+# Seconds for which cached markets may be traded on.  Fresh entries are
+# still revalidated in the background by the trader.
+MARKETS_CACHE_TTL = 24 * 60 * 60
+
+
+# Markets read from the cache, and whether they are within the TTL.
+CachedMarkets = namedtuple('CachedMarkets', ['markets', 'is_fresh'])
+
+
+class MarketsCache():
+    """On-disk cache of the market metadata loaded by ccxt.
+
+    Entries are keyed by exchange, and are discarded if they were written by
+    a different cache version or ccxt version, or against different API
+    urls (e.g. the test API).
+    """
+
+    def __init__(self, cache_dir=MARKETS_CACHE_DIR, ttl=MARKETS_CACHE_TTL,
+                 clock=time.time):
+        """Constructor.
+
+        Args:
+            cache_dir (str, optional): Defaults to MARKETS_CACHE_DIR. The
+                directory of the cache files.
+            ttl (float, optional): Defaults to MARKETS_CACHE_TTL. The number
+                of seconds cached markets remain fresh.
+            clock (func, optional): Defaults to time.time. Returns the
+                current unix timestamp.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.clock = clock
+
+    def __get_path(self, exchange_name):
+        """Gets the path of an exchange's cache file.
+
+        Args:
+            exchange_name (str): The exchange name.
+
+        Returns:
+            str: The path of the cache file.
+        """
+        return os.path.join(self.cache_dir, exchange_name + '.json')
+
+    def load(self, exchange_name, api_urls):
+        """Loads an exchange's cached markets.
+
+        Args:
+            exchange_name (str): The exchange name.
+            api_urls (str or dict): The API urls the markets must have been
+                loaded from.
+
+        Returns:
+            CachedMarkets: The cached markets, or None if there is no
+                usable entry.
+        """
+        try:
+            with open(self.__get_path(exchange_name), 'r') as cache_file:
+                entry = json.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            logging.warning("Unreadable markets cache for %s: %s",
+                            exchange_name, exc)
+            return None
+
+        if (entry.get('version') != MARKETS_CACHE_VERSION
+                or entry.get('ccxt_version') != ccxt.__version__
+                or entry.get('api_urls') != api_urls):
+            logging.info("Markets cache for %s is outdated.", exchange_name)
+            return None
+
+        age = self.clock() - entry['timestamp']
+        return CachedMarkets(entry['markets'], age < self.ttl)
+
+    def save(self, exchange_name, api_urls, markets):
+        """Saves an exchange's markets.
+
+        The entry is written to a temporary file of its own, which then
+        replaces the cache file atomically, so concurrent or interrupted
+        writes never leave a partial entry.
+
+        Args:
+            exchange_name (str): The exchange name.
+            api_urls (str or dict): The API urls the markets were loaded
+                from.
+            markets (dict): The markets, as loaded by ccxt.
+        """
+        entry = {
+            'version': MARKETS_CACHE_VERSION,
+            'ccxt_version': ccxt.__version__,
+            'api_urls': api_urls,
+            'timestamp': self.clock(),
+            'markets': markets
+        }
+        temp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'w', dir=self.cache_dir, prefix=exchange_name + '.',
+                    suffix='.tmp', delete=False) as cache_file:
+                temp_path = cache_file.name
+                json.dump(entry, cache_file)
+            os.replace(temp_path, self.__get_path(exchange_name))
+        except (OSError, TypeError, ValueError) as exc:
+            logging.warning("Could not write markets cache for %s: %s",
+                            exchange_name, exc)
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
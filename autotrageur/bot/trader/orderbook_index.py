@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+from fp_libs.constants.decimal_constants import ZERO
+from fp_libs.utilities import num_to_decimal
+
+
+# The result of filling an amount against one side of an orderbook.  `levels`
+# is the number of price levels consumed.
+BookFill = namedtuple('BookFill', ['base_volume', 'quote_amount', 'levels'])
+
+
+class OrderbookException(Exception):
+    """Exception for orderbook related errors."""
+    pass
+
+
+class OrderbookIndex():
+    """Prefix sums over one side of an orderbook.
+
+    Built once per fetched book side, the index answers any number of fill
+    queries, by quote amount or by base volume, with a binary search instead
+    of a walk of the book.
+
+    Cumulative base volume and quote notional are kept in floating point for
+    the whole side, and in Decimal for only as many levels as the deepest
+    query so far.  Floating point locates the fill level; the Decimal sums
+    give the exact result, identical to walking the book in Decimal.
+    """
+
+    def __init__(self, orders):
+        """Constructor.
+
+        The floating point sums are computed on the first query.
+
+        Args:
+            orders (list[list(float)]): The bids or asks in the form of
+                (price, volume).
+        """
+        self.orders = orders
+        self._cum_base = None
+        self._cum_quote = None
+        self._d_prices = []
+        self._d_cum_base = [ZERO]
+        self._d_cum_quote = [ZERO]
+
+    def __len__(self):
+        """The number of price levels in the book side."""
+        return len(self.orders)
+
+    def __extend(self, levels):
+        """Extends the Decimal prefix sums to cover a number of levels.
+
+        Args:
+            levels (int): The number of levels to cover.
+        """
+        for price, volume in self.orders[len(self._d_prices):levels]:
+            d_price, d_volume = num_to_decimal(price), num_to_decimal(volume)
+            self._d_prices.append(d_price)
+            self._d_cum_base.append(self._d_cum_base[-1] + d_volume)
+            self._d_cum_quote.append(
+                self._d_cum_quote[-1] + d_price * d_volume)
+
+    def __fill_level(self, amount, cum_float, cum_decimal):
+        """Finds the number of levels needed to fill an amount.
+
+        Args:
+            amount (Decimal): The positive amount to fill.
+            cum_float (numpy.ndarray): The floating point prefix sums of the
+                measure being filled.
+            cum_decimal (list[Decimal]): The Decimal prefix sums of the same
+                measure, starting from zero.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            int: The smallest number of levels whose Decimal sum reaches the
+                amount.
+        """
+        levels = min(
+            int(np.searchsorted(cum_float, float(amount))) + 1, len(self))
+        self.__extend(levels)
+
+        # Floating point error may place the fill level one short.
+        while cum_decimal[-1] < amount and len(self._d_prices) < len(self):
+            self.__extend(len(self._d_prices) + 1)
+
+        if cum_decimal[-1] < amount:
+            raise OrderbookException("Order book not deep enough for trade.")
+
+        return bisect_left(cum_decimal, amount)
+
+    def __prepare(self):
+        """Computes the floating point prefix sums, once.
+
+        Raises:
+            OrderbookException: If the book side is empty.
+        """
+        if not self.orders:
+            raise OrderbookException("Order book not deep enough for trade.")
+
+        if self._cum_base is None:
+            book = np.asarray(self.orders, dtype=np.float64)
+            self._cum_base = np.cumsum(book[:, 1])
+            self._cum_quote = np.cumsum(book[:, 0] * book[:, 1])
+
+    def fill_base(self, base_volume):
+        """Fills a base volume against the book side.
+
+        Args:
+            base_volume (Decimal): The base volume to buy or sell.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            BookFill: The quote amount the base volume costs or returns.
+        """
+        self.__prepare()
+
+        if base_volume <= ZERO:
+            return BookFill(base_volume,
+                            base_volume * num_to_decimal(self.orders[-1][0]),
+                            0)
+
+        levels = self.__fill_level(
+            base_volume, self._cum_base, self._d_cum_base)
+        remaining = base_volume - self._d_cum_base[levels]
+        quote_amount = (self._d_cum_quote[levels] +
+                        remaining * self._d_prices[levels - 1])
+        return BookFill(base_volume, quote_amount, levels)
+
+    def fill_quote(self, quote_amount):
+        """Fills a quote amount against the book side.
+
+        Args:
+            quote_amount (Decimal): The quote amount to spend or receive.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            BookFill: The base volume the quote amount buys or sells.
+        """
+        self.__prepare()
+
+        if quote_amount <= ZERO:
+            return BookFill(quote_amount / num_to_decimal(self.orders[-1][0]),
+                            quote_amount,
+                            0)
+
+        levels = self.__fill_level(
+            quote_amount, self._cum_quote, self._d_cum_quote)
+        # Zero or negative; trims the overshoot of the last level used.
+        remaining = quote_amount - self._d_cum_quote[levels]
+        base_volume = (self._d_cum_base[levels] +
+                       remaining / self._d_prices[levels - 1])
+        return BookFill(base_volume, quote_amount, levels)
+
+    def get_avg_price_for_base(self, base_volume):
+        """Gets the average fill price of a base volume.
+
+        Args:
+            base_volume (Decimal): The positive base volume to buy or sell.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            Decimal: The average price, in quote currency.
+        """
+        return self.fill_base(base_volume).quote_amount / base_volume
+
+    def get_avg_price_for_quote(self, quote_amount):
+        """Gets the average fill price of a quote amount.
+
+        Args:
+            quote_amount (Decimal): The positive quote amount to spend or
+                receive.
+
+        Raises:
+            OrderbookException: If the orderbook is not deep enough.
+
+        Returns:
+            Decimal: The average price, in quote currency.
+        """
+        return quote_amount / self.fill_quote(quote_amount).base_volume
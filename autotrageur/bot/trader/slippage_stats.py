@@ -0,0 +1,44 @@
+from fp_libs.constants.decimal_constants import ONE, ZERO
+
+
+class SlippageStats():
+    """Running mean and variance of trade slippage, in percent.
+
+    Uses Welford's algorithm, so each trade updates the statistics in
+    constant time and no trade history is needed.
+    """
+
+    def __init__(self, count=0, mean=ZERO, m2=ZERO):
+        """Constructor.
+
+        Args:
+            count (int, optional): Defaults to 0. The number of trades.
+            mean (Decimal, optional): Defaults to ZERO. The mean slippage.
+            m2 (Decimal, optional): Defaults to ZERO. The sum of squared
+                differences from the mean.
+        """
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, slippage):
+        """Adds the slippage of a trade.
+
+        Args:
+            slippage (Decimal): The slippage, in percent.
+        """
+        self.count += 1
+        delta = slippage - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (slippage - self.mean)
+
+    def get_stdev(self):
+        """Gets the sample standard deviation of the slippage.
+
+        Returns:
+            Decimal: The standard deviation, or None for less than two
+                trades.
+        """
+        if self.count < 2:
+            return None
+        return (self.m2 / (self.count - ONE)).sqrt()
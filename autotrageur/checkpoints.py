@@ -0,0 +1,102 @@
+"""Manage the checkpoints exported to the database.
+
+Lists the cataloged checkpoints, fills in the catalog of checkpoints
+exported before it, and deletes the checkpoints expired by the retention
+policy: per config, the most recent checkpoints and the last checkpoint of
+each recent day are kept.
+
+Usage:
+    checkpoints.py list DBINFOFILE [--config=ID] [--limit=N]
+    checkpoints.py backfill DBINFOFILE
+    checkpoints.py compact DBINFOFILE [--keep-latest=N] [--keep-days=DAYS] [--dry-run]
+
+Options:
+    --config=ID         Only list the checkpoints of this config.
+    --limit=N           The maximum number of checkpoints listed.
+    --keep-latest=N     The number of most recent checkpoints kept per config
+                        [default: 10].
+    --keep-days=DAYS    The number of days for which the last checkpoint of
+                        each day is kept [default: 30].
+    --dry-run           Only list the expired checkpoints.
+
+Description:
+    DBINFOFILE          Database details, including database name and user.
+"""
+import getpass
+import logging
+import time
+
+import yaml
+from docopt import docopt
+
+from autotrageur.bot.arbitrage.fcf.checkpoint_catalog import (backfill_catalog,
+                                                              compact_catalog,
+                                                              list_checkpoints)
+from autotrageur.bot.common.config_constants import (DB_BACKEND, DB_NAME,
+                                                     DB_PATH, DB_USER)
+from autotrageur.bot.common.migrations import check_schema_version
+from autotrageur.bot.common.storage import (MARIADB_BACKEND, SQLITE_BACKEND,
+                                            MariaDBBackend, SQLiteBackend,
+                                            UnknownStorageBackendError)
+from autotrageur.version import VERSION
+
+# Format of a listed checkpoint.
+ENTRY_FORMAT = "{:<36} {:<36} {:>10} {:>8} {:>6} {:>6} {:>6}"
+
+
+def _log_entries(entries):
+    """Logs catalog entries, one per line.
+
+    Args:
+        entries (list[CatalogEntry]): The entries.
+    """
+    logging.info(ENTRY_FORMAT.format(
+        'id', 'config', 'exported', 'momentum', 'target', 'last', 'trades'))
+    for entry in entries:
+        logging.info(ENTRY_FORMAT.format(*[
+            '-' if value is None else value for value in (
+                entry.id, entry.autotrageur_config_id, entry.export_timestamp,
+                entry.momentum, entry.target_index, entry.last_target_index,
+                entry.trade_count)]))
+
+
+def main():
+    """Installed entry point."""
+    args = docopt(__doc__, version=VERSION)
+    logging.basicConfig(format="%(asctime)s %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger().setLevel(logging.INFO)
+
+    with open(args['DBINFOFILE'], 'r') as db_info:
+        db_info = yaml.safe_load(db_info)
+
+    backend_name = db_info.get(DB_BACKEND) or MARIADB_BACKEND
+    if backend_name == SQLITE_BACKEND:
+        backend = SQLiteBackend(db_info[DB_PATH])
+    elif backend_name == MARIADB_BACKEND:
+        db_password = getpass.getpass('DB password:')
+        backend = MariaDBBackend(
+            db_info[DB_USER], db_password, db_info[DB_NAME])
+    else:
+        raise UnknownStorageBackendError(
+            "Unknown db_backend: {}".format(backend_name))
+    check_schema_version(backend)
+
+    if args['list']:
+        limit = int(args['--limit']) if args['--limit'] else None
+        _log_entries(list_checkpoints(backend, args['--config'], limit))
+    elif args['backfill']:
+        logging.info("Backfilled checkpoints: %d", backfill_catalog(backend))
+    else:
+        expired = compact_catalog(
+            backend, int(time.time()), int(args['--keep-latest']),
+            int(args['--keep-days']), args['--dry-run'])
+        _log_entries(expired)
+        logging.info("%s checkpoints: %d",
+                     "Expired" if args['--dry-run'] else "Deleted",
+                     len(expired))
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Migrate the database schema.
+
+Applies the schema migrations newer than the database's recorded version.
+
+Usage:
+    migrate_db.py DBINFOFILE [--target=VERSION]
+
+Options:
+    --target=VERSION    The schema version to migrate to; the latest by
+                        default.
+
+Description:
+    DBINFOFILE          Database details, including database name and user.
+"""
+import getpass
+import logging
+
+import yaml
+from docopt import docopt
+
+from autotrageur.bot.common.config_constants import (DB_BACKEND, DB_NAME,
+                                                     DB_PATH, DB_USER)
+from autotrageur.bot.common.migrations import get_schema_version, migrate
+from autotrageur.bot.common.storage import (MARIADB_BACKEND, SQLITE_BACKEND,
+                                            MariaDBBackend, SQLiteBackend,
+                                            UnknownStorageBackendError)
+from autotrageur.version import VERSION
+
+
+def main():
+    """Installed entry point."""
+    args = docopt(__doc__, version=VERSION)
+    logging.basicConfig(format="%(asctime)s %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger().setLevel(logging.INFO)
+
+    with open(args['DBINFOFILE'], 'r') as db_info:
+        db_info = yaml.safe_load(db_info)
+
+    backend_name = db_info.get(DB_BACKEND) or MARIADB_BACKEND
+    if backend_name == SQLITE_BACKEND:
+        backend = SQLiteBackend(db_info[DB_PATH])
+    elif backend_name == MARIADB_BACKEND:
+        db_password = getpass.getpass('DB password:')
+        backend = MariaDBBackend(
+            db_info[DB_USER], db_password, db_info[DB_NAME])
+    else:
+        raise UnknownStorageBackendError(
+            "Unknown db_backend: {}".format(backend_name))
+
+    target = int(args['--target']) if args['--target'] else None
+    logging.info("Schema version: %d", get_schema_version(backend))
+    logging.info("Migrated to schema version: %d", migrate(backend, target))
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,8 @@ Description:
 import getpass
 import logging
 import time
+from collections import defaultdict
+from decimal import Decimal
 
 import yaml
 from docopt import docopt
@@ -82,44 +84,34 @@ def main():
     # As is, the BIT MariaDB type will return b'\x00' or b'\x01'. We use
     # INTEGER since it's better behaved as a python int.
     market_info = execute_parametrized_query(
-        'SELECT exchange1, exchange2, exchange1_pair, exchange2_pair, CAST(use_test_api AS INTEGER) '
+        'SELECT exchange1, exchange2, exchange1_pair, exchange2_pair, CAST(use_test_api AS INTEGER), start_timestamp '
         'FROM fcf_autotrageur_config '
         'WHERE id=%s '
         'ORDER BY start_timestamp '
         'LIMIT 1',
         (config_id,))
-    e1_name, e2_name, e1_pair, e2_pair, use_test_api = market_info[0]
+    e1_name, e2_name, e1_pair, e2_pair, use_test_api, start_timestamp = market_info[0]
     e1_base, e1_quote = split_symbol(e1_pair)
     e2_base, e2_quote = split_symbol(e2_pair)
 
-    start_timestamp = execute_parametrized_query(
-        'SELECT start_timestamp '
-        'FROM fcf_autotrageur_config '
-        'WHERE id=%s '
-        'ORDER BY start_timestamp '
-        'LIMIT 1',
-        (config_id,))[0][0]
-    trade_count = execute_parametrized_query(
-        'SELECT COUNT(*) '
-        'FROM trades '
+    # The trade aggregates of the run, kept up to date with each trade.
+    rollups = execute_parametrized_query(
+        'SELECT exchange, fee_asset, trade_count, base_volume, quote_volume, fees '
+        'FROM run_rollup '
         'WHERE autotrageur_config_id=%s',
-        (config_id,))[0][0]
-    e1_base_volume, e1_quote_volume = execute_parametrized_query(
-        'SELECT SUM(pre_fee_base), SUM(post_fee_quote) '
-        'FROM trades '
-        'WHERE autotrageur_config_id=%s AND exchange=%s',
-        (config_id, e1_name))[0]
-    e2_base_volume, e2_quote_volume = execute_parametrized_query(
-        'SELECT SUM(pre_fee_base), SUM(post_fee_quote) '
-        'FROM trades '
-        'WHERE autotrageur_config_id=%s AND exchange=%s',
-        (config_id, e2_name))[0]
-    fee_data = execute_parametrized_query(
-        'SELECT fee_asset, SUM(fees) '
-        'FROM trades '
-        'WHERE autotrageur_config_id=%s '
-        'GROUP BY fee_asset',
         (config_id,))
+    trade_count = 0
+    base_volumes = defaultdict(Decimal)
+    quote_volumes = defaultdict(Decimal)
+    fees = defaultdict(Decimal)
+    for exchange, fee_asset, count, base_volume, quote_volume, fee in rollups:
+        trade_count += count
+        base_volumes[exchange] += base_volume
+        quote_volumes[exchange] += quote_volume
+        fees[fee_asset] += fee
+    e1_base_volume, e1_quote_volume = base_volumes[e1_name], quote_volumes[e1_name]
+    e2_base_volume, e2_quote_volume = base_volumes[e2_name], quote_volumes[e2_name]
+    fee_data = sorted(fees.items())
 
     if e1_quote != 'USD':
         e1_start_rate = execute_parametrized_query(
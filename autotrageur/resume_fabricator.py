@@ -13,9 +13,7 @@ Description:
     RESUME_ID               The ID of the Autotrageur state to fetch.
 """
 import copy
-import copyreg
 import getpass
-import pickle
 import sys
 import time
 import uuid
@@ -25,10 +23,10 @@ from docopt import docopt
 
 import fp_libs.db.maria_db_handler as db_handler
 from autotrageur.bot.arbitrage.autotrageur import Configuration
-from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
-from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_utils import \
-    pickle_fcf_checkpoint
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import (decode_checkpoint,
+                                                                encode_checkpoint)
 from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_ladder import as_target_ladder
 from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
 from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
 from autotrageur.bot.common.config_constants import DB_NAME, DB_USER
@@ -69,15 +67,11 @@ def _load_checkpoint(resume_id):
     # The raw result comes back as a list of tuples.  We expect only
     # one result as the `autotrageur_resume_id` is unique per
     # export.
-    return pickle.loads(raw_result[0][0])
+    return decode_checkpoint(raw_result[0][0])
 
 
 def _export_checkpoint(checkpoint, new_config):
     new_checkpoint_id = str(uuid.uuid4())
-    # Register copyreg.pickle with Checkpoint object and helper function
-    # for better backwards-compatibility in pickling.
-    # (See 'fcf_checkpoint_utils' module for more details)
-    copyreg.pickle(FCFCheckpoint, pickle_fcf_checkpoint)
 
     # The generated ID can be used as the `resume_id` to resume the bot
     # from the saved state.
@@ -85,7 +79,7 @@ def _export_checkpoint(checkpoint, new_config):
         'id': new_checkpoint_id,
         'autotrageur_config_id': new_config.id,
         'autotrageur_config_start_timestamp': new_config.start_timestamp,
-        'state': pickle.dumps(checkpoint)
+        'state': encode_checkpoint(checkpoint)
     }
     fcf_state_row_obj = InsertRowObject(
         FCF_STATE_TABLE,
@@ -136,7 +130,7 @@ def _replace_strategy_state(checkpoint, in_yaml):
             for price, vol in in_yaml[tgt_key]:
                 # Create a tuple, with casted price and vol into Decimal type.
                 new_tgts.append((num_to_decimal(price), num_to_decimal(vol)))
-            setattr(new_strategy_state, tgt_key, new_tgts)
+            setattr(new_strategy_state, tgt_key, as_target_ladder(new_tgts))
         else:
             setattr(new_strategy_state, tgt_key, getattr(old_ss, tgt_key))
 
@@ -3,11 +3,16 @@
 Executes trades based on simple arbitrage strategy
 
 Usage:
-    run_autotrageur.py KEYFILE (--resume_id=FCF_STATE_ID | CONFIGFILE) DBCONFIGFILE [--pi_mode]
+    run_autotrageur.py KEYFILE (--resume_id=FCF_STATE_ID | CONFIGFILE) DBCONFIGFILE [--pi_mode] [--log_sample=N] [--screen_polls] [--fixed_point] [--verify_book_walk] [--book_feed=FEED]...
 
 Options:
     --pi_mode                           Whether this is to be used with the raspberry pi or on a full desktop.
     --resume_id=FCF_STATE_ID            If provided, this bot run is continued from a previous run with FCF_STATE_ID.
+    --log_sample=N                      Log one in N polls in full; every poll is still recorded to the telemetry file [default: 10].
+    --screen_polls                      Skip polls whose best prices cannot reach a target, before calculating their spreads.
+    --fixed_point                       Walk the orderbooks in scaled integers at the precisions of their markets.
+    --verify_book_walk                  Cross-check every orderbook walk against a walk of the whole book in Decimal, logging mismatches.
+    --book_feed=FEED                    Stream the orderbook of a market from a feed at HOST:PORT, in the form EXCHANGE:BASE/QUOTE@HOST:PORT; polls are woken by its updates.
 
 Description:
     KEYFILE                             The encrypted Keyfile containing relevant api keys.
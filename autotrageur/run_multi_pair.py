@@ -0,0 +1,55 @@
+"""Automated arbitrageur of several pairs
+
+Executes trades based on simple arbitrage strategy, for several pairs in one
+process.  The pairs share their exchange connections and orderbook fetches.
+
+Usage:
+    run_multi_pair.py KEYFILE CONFIGFILE DBCONFIGFILE [--pi_mode] [--log_sample=N] [--screen_polls] [--fixed_point] [--verify_book_walk] [--book_feed=FEED]...
+
+Options:
+    --pi_mode                           Whether this is to be used with the raspberry pi or on a full desktop.
+    --log_sample=N                      Log one in N polls of each pair in full; every poll is still recorded to the telemetry file [default: 10].
+    --screen_polls                      Skip polls of a pair whose best prices cannot reach a target, before calculating their spreads.
+    --fixed_point                       Walk the orderbooks in scaled integers at the precisions of their markets.
+    --verify_book_walk                  Cross-check every orderbook walk against a walk of the whole book in Decimal, logging mismatches.
+    --book_feed=FEED                    Stream the orderbook of a market from a feed at HOST:PORT, in the form EXCHANGE:BASE/QUOTE@HOST:PORT; the polls of the pairs trading it are woken by its updates.
+
+Description:
+    KEYFILE                             The encrypted Keyfile containing relevant api keys.
+    CONFIGFILE                          The config file, modeled under configs/multi_pair_sample.yaml, listing the config file or resume id of each pair.
+    DBCONFIGFILE                        The config file for the database.
+"""
+from docopt import docopt
+
+from autotrageur.bot.arbitrage.multi_pair_autotrageur import \
+    MultiPairAutotrageur
+from autotrageur.version import VERSION
+from fp_libs.utilities import set_autotrageur_decimal_context
+
+
+def main():
+    """Main function after `run_multi_pair` called as entry script.
+
+    Setup:
+    Sets the decimal context to deal with decimal precision and arithmetic in
+    the bot.  Also sets up the background logger for logging on a separate
+    thread using a queue.
+
+    Run:
+    Calls the `run_autotrageur` function to start the run of every pair.
+    """
+    arguments = docopt(__doc__, version=VERSION)
+
+    try:
+        # This sets the global decimal context for the program. We aim to
+        # keep precision regardless at 28 digits until either external calls
+        # or output are required.
+        set_autotrageur_decimal_context()
+        autotrageur = MultiPairAutotrageur()
+        autotrageur.run_autotrageur(arguments)
+    finally:
+        # Must be called before exit for logs to flush.
+        autotrageur.logger.queue_listener.stop()
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,7 @@ import yaml
 from docopt import docopt
 
 from autotrageur.analytics.forex_to_db import (get_pairs, persist_to_db,
-                                               prepare_tables, start_db)
+                                               prepare_tables, start_db_pool)
 from autotrageur.version import VERSION
 
 
@@ -35,9 +35,9 @@ def main():
     db_password = getpass.getpass('DB password:')
     pairs = get_pairs(args['FOREXINFOFILE'])
 
-    start_db(db_user, db_password, db_name)
-    prepare_tables(pairs)
-    schedule.every().minute.do(persist_to_db, pairs)
+    db_pool = start_db_pool(db_user, db_password, db_name)
+    prepare_tables(db_pool, pairs)
+    schedule.every().minute.do(persist_to_db, db_pool, pairs)
 
     while True:
         schedule.run_pending()
@@ -19,10 +19,11 @@ import os
 import yaml
 from docopt import docopt
 
-import fp_libs.db.maria_db_handler as db_handler
-from autotrageur.analytics.history_to_db import (HistoryTableMetadata,
+from autotrageur.analytics.history_to_db import (MAX_WORKERS,
+                                                 HistoryTableMetadata,
                                                  make_fetchers, persist_to_db,
                                                  prepare_tables)
+from autotrageur.bot.common.db_pool import DBPool
 from autotrageur.version import VERSION
 
 
@@ -42,7 +43,7 @@ def main():
 
     # Connect to the DB.
     logging.info("DB started.")
-    db_handler.start_db(db_user, db_pw, db_name)
+    db_pool = DBPool(db_user, db_pw, db_name, max_size=MAX_WORKERS)
 
     min_filepaths = []
     for root, dirs, files in os.walk('configs/fetch_rpi'):
@@ -68,8 +69,9 @@ def main():
                     fetcher.interval
                 ])))
 
-    prepare_tables(table_metadata_list)
-    persist_to_db(hist_fetchers)
+    prepare_tables(db_pool, table_metadata_list)
+    persist_to_db(db_pool, hist_fetchers)
+    db_pool.close()
 
 
 if __name__ == "__main__":
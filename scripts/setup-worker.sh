@@ -52,6 +52,9 @@ touch encrypted-blank-secret.txt
 
 # Final step before running is to copy valid .env file into project directory.
 
+# Apply the schema migrations to the bot's database.
+migrate_db configs/staging/db_staging.yaml
+
 run_autotrageur encrypted-blank-secret.txt configs/staging/dryrun/kraken_bithumb_btc.yaml configs/staging/db_staging.yaml
 
 # Notable additional steps necessary for production
@@ -1,5 +1,7 @@
 USE fcf_trade_history_staging;
 
+DELETE FROM run_rollup;
+DELETE FROM slippage_stats;
 DELETE FROM trades;
 DELETE FROM trade_opportunity;
 DELETE FROM forex_rate;
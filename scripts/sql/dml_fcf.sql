@@ -118,3 +118,20 @@ CREATE TABLE IF NOT EXISTS fcf_state (
         ON DELETE CASCADE
         ON UPDATE CASCADE
 );
+
+CREATE TABLE IF NOT EXISTS slippage_stats (
+    trade_opportunity_id VARCHAR(36) NOT NULL,
+    side VARCHAR(4) NOT NULL,
+    exchange VARCHAR(28) NOT NULL,
+    dryrun BIT NOT NULL,
+    trade_count INT(11) UNSIGNED NOT NULL,
+    mean DECIMAL(36, 18) NOT NULL,
+    m2 DECIMAL(36, 18) NOT NULL,
+    local_timestamp INT(11) UNSIGNED NOT NULL,
+    PRIMARY KEY (trade_opportunity_id, side),
+    INDEX idx_slippage_stats_exchange (exchange, dryrun, trade_count),
+    CONSTRAINT `fk_slippage_stats_trades`
+        FOREIGN KEY (trade_opportunity_id, side) REFERENCES trades (trade_opportunity_id, side)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
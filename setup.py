@@ -163,6 +163,7 @@ setup(
         # NOTE: This is only supported with pip versions > 18.1.
         # See https://github.com/pypa/pip/issues/4187 for more details.
         'fp-libs @ git+ssh://git@github.com/ronaldlam/FirstPartyLibs.git',
+        'numpy',
         'python-dotenv',
         'setuptools-scm',
     ],  # Optional
@@ -207,10 +208,16 @@ setup(
     entry_points={  # Optional
         'console_scripts': [
             'archive_logs=autotrageur.archive_logs:main',
+            'benchmark_checkpoint=autotrageur.benchmark_checkpoint:main',
+            'benchmark_queries=autotrageur.benchmark_queries:main',
+            'benchmark_storage=autotrageur.benchmark_storage:main',
+            'checkpoints=autotrageur.checkpoints:main',
             'encrypt_file=autotrageur.encrypt_file:main',
+            'migrate_db=autotrageur.migrate_db:main',
             'post_install=autotrageur.post_install:main',
             'report=autotrageur.report:main',
             'run_autotrageur=autotrageur.run_autotrageur:main',
+            'run_multi_pair=autotrageur.run_multi_pair:main',
             'scrape_forex=autotrageur.scrape_forex:main',
             'spawn_ohlcv_minute=autotrageur.spawn_ohlcv_minute:main',
         ],
@@ -0,0 +1,202 @@
+from decimal import Decimal
+from unittest.mock import Mock
+
+import pytest
+
+from autotrageur.bot.arbitrage.fcf.checkpoint_catalog import (SECONDS_PER_DAY,
+                                                              CatalogEntry,
+                                                              backfill_catalog,
+                                                              catalog_metadata,
+                                                              compact_catalog,
+                                                              list_checkpoints,
+                                                              select_expired)
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import \
+    encode_checkpoint
+from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
+from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
+from autotrageur.bot.common.db_constants import (FCF_STATE_CATALOG_COLUMNS,
+                                                 FCF_STATE_PRIM_KEY_ID,
+                                                 FCF_STATE_TABLE)
+from autotrageur.bot.common.enums import Momentum
+from autotrageur.bot.common.migrations import migrate
+from autotrageur.bot.common.storage import SQLiteBackend
+from autotrageur.bot.trader.dry_run import DryRunExchange
+
+NOW = 1550000000 // SECONDS_PER_DAY * SECONDS_PER_DAY + 12 * 60 * 60
+
+
+@pytest.fixture()
+def backend():
+    backend = SQLiteBackend(':memory:')
+    migrate(backend)
+    yield backend
+    backend.close()
+
+
+def make_checkpoint(trade_count=7):
+    state = FCFStrategyState(True, Decimal('3'), Decimal('2'))
+    state.momentum = Momentum.TO_E1
+    state.target_tracker = FCFTargetTracker()
+    state.target_tracker._target_index = 4
+    state.target_tracker._last_target_index = 3
+    state.trade_chunker = FCFTradeChunker(Decimal('100'))
+    stat_tracker = FCFStatTracker(
+        'stat',
+        Mock(dry_run_exchange=DryRunExchange(
+            'binance', 'BTC', 'USDT', Decimal('1.5'), Decimal('1000'))),
+        Mock(dry_run_exchange=DryRunExchange(
+            'bithumb', 'BTC', 'KRW', Decimal('2'), Decimal('1200000'))))
+    stat_tracker.trade_count = trade_count
+    stat_tracker.detach_traders()
+    return FCFCheckpoint(None, state, stat_tracker)
+
+
+def make_entry(row_id, export_timestamp, config_id='config'):
+    return CatalogEntry(row_id, config_id, export_timestamp,
+                        *[None] * (len(FCF_STATE_CATALOG_COLUMNS) - 1))
+
+
+def insert_checkpoint(backend, row_id, state, config_id='config',
+                      metadata=None):
+    row = {
+        'id': row_id,
+        'autotrageur_config_id': config_id,
+        'autotrageur_config_start_timestamp': 0,
+        'state': state
+    }
+    row.update(metadata or {})
+    backend.insert_row(FCF_STATE_TABLE, row, (FCF_STATE_PRIM_KEY_ID,))
+    backend.commit()
+
+
+def test_catalog_metadata_dry_run():
+    metadata = catalog_metadata(make_checkpoint(), NOW)
+
+    assert metadata == {
+        'export_timestamp': NOW,
+        'momentum': Momentum.TO_E1.value,
+        'target_index': 4,
+        'last_target_index': 3,
+        'trade_count': 7,
+        'e1_bal_base': Decimal('1.5'),
+        'e1_bal_quote': Decimal('1000'),
+        'e2_bal_base': Decimal('2'),
+        'e2_bal_quote': Decimal('1200000')
+    }
+
+
+def test_catalog_metadata_traders():
+    checkpoint = make_checkpoint()
+    checkpoint.stat_tracker.e1 = Mock(base_bal=Decimal('1'),
+                                      quote_bal=Decimal('2'))
+    checkpoint.stat_tracker.e2 = Mock(base_bal=Decimal('3'),
+                                      quote_bal=Decimal('4'))
+
+    metadata = catalog_metadata(checkpoint, NOW)
+
+    assert [metadata['e1_bal_base'], metadata['e1_bal_quote'],
+            metadata['e2_bal_base'], metadata['e2_bal_quote']] == [
+                Decimal('1'), Decimal('2'), Decimal('3'), Decimal('4')]
+
+
+def test_catalog_metadata_empty():
+    metadata = catalog_metadata(FCFCheckpoint(), None)
+
+    assert metadata == dict(
+        dict.fromkeys(FCF_STATE_CATALOG_COLUMNS), trade_count=0)
+
+
+def test_list_checkpoints(backend):
+    insert_checkpoint(backend, 'legacy', b'')
+    insert_checkpoint(backend, 'old', b'', metadata=catalog_metadata(
+        make_checkpoint(), NOW - 10))
+    insert_checkpoint(backend, 'new', b'', metadata=catalog_metadata(
+        make_checkpoint(), NOW))
+    insert_checkpoint(backend, 'other', b'', config_id='other',
+                      metadata={'export_timestamp': NOW - 5})
+
+    assert [entry.id for entry in list_checkpoints(backend)] == [
+        'new', 'other', 'old', 'legacy']
+    assert [entry.id for entry in list_checkpoints(backend, 'config', 2)] == [
+        'new', 'old']
+    entry = list_checkpoints(backend, limit=1)[0]
+    assert entry._asdict() == dict(
+        id='new', autotrageur_config_id='config',
+        **catalog_metadata(make_checkpoint(), NOW))
+
+
+def test_backfill_catalog(backend):
+    insert_checkpoint(
+        backend, 'legacy', encode_checkpoint(make_checkpoint(trade_count=3)))
+    insert_checkpoint(
+        backend, 'untracked', encode_checkpoint(FCFCheckpoint()))
+    insert_checkpoint(backend, 'corrupt', b'not a checkpoint')
+    insert_checkpoint(backend, 'cataloged', b'', metadata=catalog_metadata(
+        make_checkpoint(), NOW))
+
+    assert backfill_catalog(backend) == 2
+
+    entries = {entry.id: entry for entry in list_checkpoints(backend)}
+    assert entries['legacy'].trade_count == 3
+    assert entries['legacy'].export_timestamp is None
+    assert entries['legacy'].e2_bal_quote == Decimal('1200000')
+    assert entries['untracked'].trade_count == 0
+    assert entries['corrupt'].trade_count is None
+    assert entries['cataloged'].export_timestamp == NOW
+    assert backfill_catalog(backend) == 0
+
+
+def test_select_expired_keep_latest():
+    entries = [make_entry(i, NOW - i) for i in range(5)]
+
+    assert select_expired(entries, NOW, keep_latest=5) == []
+    assert select_expired(entries, NOW, keep_latest=2, keep_days=0) == (
+        entries[2:])
+
+
+def test_select_expired_keep_days():
+    # Hourly checkpoints over the past 3 days, newest first.
+    entries = [make_entry(i, NOW - i * 60 * 60) for i in range(72)]
+
+    expired = select_expired(entries, NOW, keep_latest=1, keep_days=2)
+
+    kept = [entry for entry in entries if entry not in expired]
+    # The latest, then the last of each earlier day within the window.
+    assert [entry.id for entry in kept] == [0, 13, 37]
+
+
+def test_select_expired_per_config():
+    entries = [make_entry(i, NOW - i * SECONDS_PER_DAY, config)
+               for config in ('a', 'b') for i in range(3)]
+
+    expired = select_expired(entries, NOW, keep_latest=1, keep_days=1)
+
+    assert sorted((entry.autotrageur_config_id, entry.id)
+                  for entry in expired) == [('a', 2), ('b', 2)]
+
+
+def test_select_expired_unknown_time():
+    entries = [make_entry('legacy', None), make_entry('new', NOW)]
+
+    assert select_expired(entries, NOW, keep_latest=1) == [entries[0]]
+    assert select_expired(entries, NOW, keep_latest=2) == []
+
+
+@pytest.mark.parametrize('dry_run', [True, False])
+def test_compact_catalog(backend, dry_run):
+    for i in range(5):
+        insert_checkpoint(backend, str(i), b'',
+                          metadata={'export_timestamp': NOW - i})
+
+    expired = compact_catalog(
+        backend, NOW, keep_latest=2, keep_days=0, dry_run=dry_run)
+
+    assert [entry.id for entry in expired] == ['2', '3', '4']
+    remaining = [entry.id for entry in list_checkpoints(backend)]
+    if dry_run:
+        assert remaining == ['0', '1', '2', '3', '4']
+    else:
+        assert remaining == ['0', '1']
@@ -0,0 +1,197 @@
+import copyreg
+import io
+import pickle
+from decimal import Decimal
+from unittest.mock import Mock
+
+import pytest
+
+import autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec as codec
+from autotrageur.bot.arbitrage.autotrageur import Configuration
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint import FCFCheckpoint
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_codec import (CHECKPOINT_MAGIC,
+                                                                CHECKPOINT_SCHEMA_VERSION,
+                                                                CheckpointCodecError,
+                                                                decode_checkpoint,
+                                                                encode_checkpoint)
+from autotrageur.bot.arbitrage.fcf.fcf_checkpoint_utils import \
+    pickle_fcf_checkpoint
+from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
+from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
+from autotrageur.bot.common.enums import Momentum
+from autotrageur.bot.trader.dry_run import DryRunExchange
+
+FAKE_CONFIG = Configuration(
+    dryrun=True, dryrun_e1_base='1.5', dryrun_e1_quote='10000',
+    dryrun_e2_base='2', dryrun_e2_quote='12000000', email_cfg_path='email.yaml',
+    exchange1='binance', exchange1_pair='BTC/USDT', exchange2='bithumb',
+    exchange2_pair='BTC/KRW', use_test_api=False, h_to_e1_max=3.5,
+    h_to_e2_max=2, id='d3b7c9f2-1a2b-4c5d-8e9f-0a1b2c3d4e5f',
+    max_trade_size=1000, poll_wait_default=30, poll_wait_short=-1,
+    slippage=0.3, spread_min=1, start_timestamp=1550000000,
+    twilio_cfg_path='twilio.yaml', vol_min=1000)
+
+
+def make_checkpoint(momentum=Momentum.TO_E2, dryrun=True):
+    state = FCFStrategyState(True, Decimal('3.5'), Decimal('-1.25'))
+    state.momentum = momentum
+    state.e1_targets = [
+        (Decimal(i) / 7, Decimal('1000') * i) for i in range(40)]
+    state.e2_targets = [(Decimal('-0.5'), Decimal('2500.75'))]
+    state.target_tracker = FCFTargetTracker()
+    state.target_tracker._target_index = 17
+    state.target_tracker._last_target_index = 16
+    state.trade_chunker = FCFTradeChunker(Decimal('1000'))
+    state.trade_chunker._target = Decimal('2500.75')
+    state.trade_chunker._current_trade_size = Decimal('750.125')
+    state.trade_chunker.trade_completed = False
+
+    dry_run_e1 = dry_run_e2 = None
+    if dryrun:
+        dry_run_e1 = DryRunExchange(
+            'binance', 'BTC', 'USDT', Decimal('1.5'), Decimal('10000'))
+        dry_run_e1.base_fees = Decimal('0.0015')
+        dry_run_e1.trade_count = 300
+        dry_run_e2 = DryRunExchange(
+            'bithumb', 'BTC', 'KRW', Decimal('2'), Decimal('12000000'))
+    stat_tracker = FCFStatTracker(
+        'c0ffee00-1a2b-4c5d-8e9f-0a1b2c3d4e5f',
+        Mock(dry_run_exchange=dry_run_e1),
+        Mock(dry_run_exchange=dry_run_e2))
+    stat_tracker.trade_count = 600
+    stat_tracker.detach_traders()
+    return FCFCheckpoint(FAKE_CONFIG, state, stat_tracker)
+
+
+def legacy_pickle(checkpoint):
+    # As exported before the codec, without registering globally.
+    data = io.BytesIO()
+    pickler = pickle.Pickler(data)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[FCFCheckpoint] = pickle_fcf_checkpoint
+    pickler.dump(checkpoint)
+    return data.getvalue()
+
+
+def checkpoint_values(checkpoint):
+    def attrs(obj):
+        return None if obj is None else vars(obj)
+    state = checkpoint.strategy_state
+    stat_tracker = checkpoint.stat_tracker
+    return {
+        'config': checkpoint.config,
+        'state': {k: v for k, v in vars(state).items()
+                  if k not in ('target_tracker', 'trade_chunker')},
+        'target_tracker': vars(state.target_tracker),
+        'trade_chunker': vars(state.trade_chunker),
+        'stat_tracker': {k: v for k, v in vars(stat_tracker).items()
+                         if not k.startswith('dry_run')},
+        'dry_run_e1': attrs(stat_tracker.dry_run_e1),
+        'dry_run_e2': attrs(stat_tracker.dry_run_e2),
+    }
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 127, 128, -1, -32, -33, 2**40, -2**40, 2**63 - 1,
+    -2**63, 0.25, '', 'a' * 31, 'a' * 32, 'a' * 300, 'a' * 0xffff,
+    'ünïcode', Decimal('0'),
+    Decimal('-1.5E-10'), Decimal('123456789.123456789123456789'),
+    [], list(range(15)), list(range(16)), [[1, 'a'], [Decimal('2'), None]],
+])
+def test_pack_unpack(value):
+    out = bytearray()
+    codec._pack(value, out)
+    result, offset = codec._unpack(bytes(out), 0)
+    assert result == value
+    assert type(result) is type(value)
+    assert offset == len(out)
+
+
+def test_pack_unknown_type():
+    with pytest.raises(CheckpointCodecError):
+        codec._pack(object(), bytearray())
+
+
+@pytest.mark.parametrize('value', [
+    2**63, -2**63 - 1, 'a' * 0x10000, [None] * 0x10000, [[2**64]],
+])
+def test_pack_out_of_bounds(value):
+    with pytest.raises(CheckpointCodecError):
+        codec._pack(value, bytearray())
+
+
+def test_unpack_unknown_tag():
+    with pytest.raises(CheckpointCodecError):
+        codec._unpack(b'\xc1', 0)
+
+
+@pytest.mark.parametrize('momentum', [None, Momentum.NEUTRAL, Momentum.TO_E1])
+@pytest.mark.parametrize('dryrun', [True, False])
+def test_round_trip(momentum, dryrun):
+    checkpoint = make_checkpoint(momentum, dryrun)
+
+    data = encode_checkpoint(checkpoint)
+    result = decode_checkpoint(data)
+
+    assert data.startswith(CHECKPOINT_MAGIC)
+    assert isinstance(result, FCFCheckpoint)
+    assert isinstance(result.config, Configuration)
+    assert checkpoint_values(result) == checkpoint_values(checkpoint)
+    assert result.strategy_state.momentum is momentum
+    assert all(type(target) is tuple
+               for target in result.strategy_state.e1_targets)
+    assert not hasattr(result.stat_tracker, 'e1')
+
+
+def test_round_trip_empty():
+    result = decode_checkpoint(encode_checkpoint(FCFCheckpoint()))
+    assert result.config is None
+    assert result.strategy_state is None
+    assert result.stat_tracker is None
+
+
+def test_smaller_than_pickle():
+    checkpoint = make_checkpoint()
+    assert len(encode_checkpoint(checkpoint)) < len(legacy_pickle(checkpoint))
+
+
+def test_decode_legacy_pickle():
+    checkpoint = make_checkpoint()
+
+    result = decode_checkpoint(legacy_pickle(checkpoint))
+
+    assert checkpoint_values(result) == checkpoint_values(checkpoint)
+
+
+def test_decode_newer_version():
+    data = encode_checkpoint(make_checkpoint())
+    data = codec._HEADER.pack(
+        CHECKPOINT_MAGIC, CHECKPOINT_SCHEMA_VERSION + 1) + data[
+            codec._HEADER.size:]
+
+    with pytest.raises(CheckpointCodecError):
+        decode_checkpoint(data)
+
+
+def test_migration(mocker):
+    checkpoint = make_checkpoint()
+    mocker.patch.object(codec, 'CHECKPOINT_SCHEMA_VERSION', 2)
+    mocker.patch.object(codec, '_MIGRATIONS', {})
+    data = encode_checkpoint(checkpoint)
+    old_data = codec._HEADER.pack(CHECKPOINT_MAGIC, 1) + data[
+        codec._HEADER.size:]
+
+    # No migration from version 1.
+    with pytest.raises(CheckpointCodecError):
+        decode_checkpoint(old_data)
+
+    @codec.migration(1)
+    def rename_stat_tracker(fields):
+        fields[2][0] = 'migrated'
+        return fields
+
+    assert decode_checkpoint(old_data).stat_tracker.id == 'migrated'
+    assert decode_checkpoint(data).stat_tracker.id == (
+        checkpoint.stat_tracker.id)
@@ -0,0 +1,257 @@
+import os
+import pickle
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.arbitrage.fcf.state_journal import (WAL_FILE,
+                                                         StateJournal,
+                                                         apply_strategy_fields,
+                                                         capture_strategy_state,
+                                                         journal_exists,
+                                                         load_journal,
+                                                         prune_journals)
+from autotrageur.bot.arbitrage.fcf.strategy import FCFStrategyState
+from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
+from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
+from autotrageur.bot.common.enums import Momentum
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def journal_dir(tmpdir):
+    return str(tmpdir.join('journal'))
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def strategy_state():
+    state = FCFStrategyState(
+        has_started=False,
+        h_to_e1_max=Decimal('2'),
+        h_to_e2_max=Decimal('3'))
+    state.target_tracker = FCFTargetTracker()
+    state.trade_chunker = FCFTradeChunker(Decimal('100'))
+    return state
+
+
+def test_capture_apply(strategy_state):
+    fields = capture_strategy_state(strategy_state)
+
+    assert fields['h_to_e1_max'] == Decimal('2')
+    assert fields['target_tracker._target_index'] == 0
+    assert fields['trade_chunker._max_trade_size'] == Decimal('100')
+    assert 'target_tracker' not in fields
+    assert 'trade_chunker' not in fields
+
+    apply_strategy_fields(strategy_state, {
+        'momentum': Momentum.TO_E1,
+        'target_tracker._target_index': 3,
+        'trade_chunker.trade_completed': False
+    })
+
+    assert strategy_state.momentum is Momentum.TO_E1
+    assert strategy_state.target_tracker._target_index == 3
+    assert strategy_state.trade_chunker.trade_completed is False
+
+
+def test_record_changed_fields(journal_dir, clock):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(b'snapshot', {'a': 1, 'b': 2})
+
+    assert journal.record({'a': 1, 'b': 2}) is False
+    assert journal.record({'a': 1, 'b': 3}) is True
+    assert journal.record({'a': 4, 'b': 3}) is True
+    journal.close()
+
+    assert journal_exists(journal_dir)
+    assert load_journal(journal_dir) == (b'snapshot', [{'b': 3}, {'a': 4}])
+    assert journal.record_count == 2
+
+
+def test_fsync_interval(mocker, journal_dir, clock):
+    journal = StateJournal(journal_dir, fsync_interval=1.0, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    mock_fsync = mocker.spy(os, 'fsync')
+
+    journal.record({'a': 1})
+    clock.now = 0.5
+    journal.record({'a': 2})
+    mock_fsync.assert_not_called()
+
+    clock.now = 1.0
+    journal.record({'a': 3})
+    assert mock_fsync.call_count == 1
+    clock.now = 1.5
+    journal.record({'a': 4})
+    assert mock_fsync.call_count == 1
+
+    journal.sync()
+    assert mock_fsync.call_count == 2
+    journal.sync()
+    assert mock_fsync.call_count == 2
+    assert journal.fsync_count == 2
+    journal.close()
+    journal.close()
+    assert mock_fsync.call_count == 2
+
+
+def test_fsync_interval_unchanged(mocker, journal_dir, clock):
+    journal = StateJournal(journal_dir, fsync_interval=1.0, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    mock_fsync = mocker.spy(os, 'fsync')
+
+    journal.record({'a': 1})
+    clock.now = 1.0
+
+    # The pending record is synced even though nothing changed.
+    assert journal.record({'a': 1}) is False
+    assert mock_fsync.call_count == 1
+    clock.now = 2.0
+    journal.record({'a': 1})
+    assert mock_fsync.call_count == 1
+    journal.close()
+
+
+def test_prune_journals(tmpdir, clock):
+    root = str(tmpdir.join('state'))
+    for name in ('old', 'open', 'new'):
+        journal = StateJournal(os.path.join(root, name), clock=clock)
+        journal.compact(b'snapshot', {'a': 0})
+        if name == 'open':
+            open_journal = journal
+        else:
+            journal.close()
+    for name in ('old', 'open'):
+        for path in (os.path.join(root, name),
+                     os.path.join(root, name, 'snapshot'),
+                     os.path.join(root, name, WAL_FILE)):
+            os.utime(path, (0, 0))
+
+    assert prune_journals(root, retention=60) == 1
+    assert sorted(os.listdir(root)) == ['new', 'open']
+
+    # Closed, the idle journal is pruned too.
+    open_journal.close()
+    assert prune_journals(root, retention=60) == 1
+    assert os.listdir(root) == ['new']
+    assert prune_journals(str(tmpdir.join('missing'))) == 0
+
+
+def test_needs_compaction(journal_dir, clock):
+    journal = StateJournal(journal_dir, compact_every=2, clock=clock)
+    assert journal.needs_compaction()
+
+    journal.compact(b'snapshot', {'a': 0})
+    assert not journal.needs_compaction()
+    journal.record({'a': 1})
+    assert not journal.needs_compaction()
+    journal.record({'a': 2})
+    assert journal.needs_compaction()
+
+    journal.compact(b'snapshot2', {'a': 2})
+    assert not journal.needs_compaction()
+    assert os.path.getsize(os.path.join(journal_dir, WAL_FILE)) == 0
+    assert load_journal(journal_dir) == (b'snapshot2', [])
+    journal.close()
+
+
+def test_reopen(journal_dir, clock):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    journal.record({'a': 1})
+    journal.compact(b'snapshot2', {'a': 1})
+    journal.close()
+
+    # The emptied log does not restart the sequence behind the snapshot.
+    journal = StateJournal(journal_dir, clock=clock)
+    assert not journal.needs_compaction()
+    journal.record({'a': 2})
+    journal.close()
+    assert load_journal(journal_dir) == (b'snapshot2', [{'a': 2}])
+
+
+def test_torn_record(journal_dir, clock):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    journal.record({'a': 1})
+    journal.record({'a': 2})
+    journal.close()
+
+    # Simulate a crash in the middle of the last write.
+    wal_path = os.path.join(journal_dir, WAL_FILE)
+    with open(wal_path, 'r+b') as wal:
+        wal.truncate(os.path.getsize(wal_path) - 3)
+    assert load_journal(journal_dir) == (b'snapshot', [{'a': 1}])
+
+
+def test_corrupt_record(journal_dir, clock):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    journal.record({'a': 1})
+    journal.record({'a': 2})
+    journal.close()
+
+    wal_path = os.path.join(journal_dir, WAL_FILE)
+    with open(wal_path, 'r+b') as wal:
+        wal.seek(-1, os.SEEK_END)
+        wal.write(b'\xff')
+    assert load_journal(journal_dir) == (b'snapshot', [{'a': 1}])
+
+
+def test_interrupted_compaction(journal_dir, clock):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(b'snapshot', {'a': 0})
+    journal.record({'a': 1})
+    journal.record({'a': 2})
+    wal_path = os.path.join(journal_dir, WAL_FILE)
+    with open(wal_path, 'rb') as wal:
+        old_records = wal.read()
+
+    # The log was not emptied before the crash, so its records precede the
+    # new snapshot.
+    journal.compact(b'snapshot2', {'a': 2})
+    journal.close()
+    with open(wal_path, 'wb') as wal:
+        wal.write(old_records)
+    assert load_journal(journal_dir) == (b'snapshot2', [])
+
+    # A reopened journal continues the sequence.
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.record({'a': 3})
+    journal.close()
+    assert load_journal(journal_dir) == (b'snapshot2', [{'a': 3}])
+
+
+def test_replay(journal_dir, clock, strategy_state):
+    journal = StateJournal(journal_dir, clock=clock)
+    journal.compact(
+        pickle.dumps(strategy_state), capture_strategy_state(strategy_state))
+
+    strategy_state.has_started = True
+    strategy_state.momentum = Momentum.TO_E2
+    journal.record(capture_strategy_state(strategy_state))
+    strategy_state.h_to_e1_max = Decimal('2.5')
+    strategy_state.target_tracker._target_index = 2
+    strategy_state.trade_chunker.trade_completed = False
+    journal.record(capture_strategy_state(strategy_state))
+    journal.close()
+
+    snapshot, records = load_journal(journal_dir)
+    restored = pickle.loads(snapshot)
+    for fields in records:
+        apply_strategy_fields(restored, fields)
+
+    assert (capture_strategy_state(restored)
+            == capture_strategy_state(strategy_state))
@@ -6,12 +6,15 @@ import pytest
 from ccxt import NetworkError
 
 import autotrageur.bot.arbitrage.arbseeker as arbseeker
-from autotrageur.bot.arbitrage.fcf.strategy import (FCFStrategy, InsufficientCryptoBalance,
-                                        TradeMetadata)
+import autotrageur.bot.arbitrage.spreadcalculator as spreadcalculator
+from autotrageur.bot.arbitrage.fcf.strategy import (FCFStrategy, FCFStrategyState,
+                                        InsufficientCryptoBalance, TradeMetadata)
+from autotrageur.bot.arbitrage.fcf.target_ladder import TargetLadder
 from autotrageur.bot.arbitrage.fcf.target_tracker import FCFTargetTracker
 from autotrageur.bot.arbitrage.fcf.trade_chunker import FCFTradeChunker
 from autotrageur.bot.common.enums import Momentum
 from autotrageur.bot.trader.ccxt_trader import CCXTTrader, OrderbookException
+from fp_libs.constants.ccxt_constants import BUY_SIDE
 
 FAKE_CONFIG_UUID = str(uuid.uuid4())
 
@@ -280,6 +283,38 @@ def test_prepare_trade(mocker, fcf_strategy, is_momentum_change,
         min(next_quote_vol, buy_trader.adjusted_quote_bal), is_usd=False)
 
 
+@pytest.mark.parametrize('book_base, raises', [
+    (Decimal('1.8'), False),
+    (Decimal('2.1'), True),
+])
+def test_prepare_trade_book_base(mocker, fcf_strategy, book_base, raises):
+    # The chunk is priced on the polled orderbook rather than at buy_price.
+    spread_opp = mocker.Mock()
+    spread_opp.e1_buy = Decimal('1000')
+    mocker.patch.object(fcf_strategy, 'target_tracker')
+    mocker.patch.object(fcf_strategy, 'trade_chunker')
+    buy_trader = CCXTTrader('ETH', 'USD', 'kraken', 'e1', Decimal('0'))
+    sell_trader = CCXTTrader('ETH', 'USD', 'bitfinex', 'e2', Decimal('0'))
+    mocker.patch.object(fcf_strategy._manager, 'trader1', buy_trader)
+    mocker.patch.object(fcf_strategy._manager, 'trader2', sell_trader)
+    mocker.patch.object(
+        buy_trader, 'get_quote_from_usd', return_value=Decimal('2000'))
+    get_base = mocker.patch.object(
+        buy_trader, 'get_base_from_orderbook', return_value=book_base)
+    buy_trader.adjusted_quote_bal = Decimal('2000')
+    sell_trader.base_bal = Decimal('1.9')
+
+    if raises:
+        with pytest.raises(InsufficientCryptoBalance):
+            fcf_strategy._FCFStrategy__prepare_trade(
+                False, buy_trader, sell_trader, [], spread_opp)
+    else:
+        fcf_strategy._FCFStrategy__prepare_trade(
+            False, buy_trader, sell_trader, [], spread_opp)
+
+    get_base.assert_called_once_with(BUY_SIDE, Decimal('2000'))
+
+
 @pytest.mark.parametrize('is_trader1_buy', [True, False])
 def test_update_trade_targets(mocker, fcf_strategy, is_trader1_buy):
     mock_targets = ['list', 'of', 'targets']
@@ -362,6 +397,46 @@ def test_finalize_trade(mocker, fcf_strategy, chunks_complete):
         mock_tracker.increment.assert_called_once_with()
 
 
+@pytest.mark.parametrize('has_started', [True, False])
+@pytest.mark.parametrize('momentum', list(Momentum))
+@pytest.mark.parametrize('e1_spread, e2_spread, e1_target, e2_target, result', [
+    (Decimal('1'), Decimal('2'), Decimal('3'), Decimal('5'), Decimal('2')),
+    (Decimal('1'), Decimal('2'), Decimal('5'), Decimal('3'), Decimal('1')),
+    (Decimal('4'), Decimal('2'), Decimal('3'), Decimal('5'), Decimal('0')),
+    (Decimal('1'), Decimal('2'), None, Decimal('3'), Decimal('1')),
+    (Decimal('1'), Decimal('2'), None, None, None),
+])
+def test_get_target_distance(mocker, fcf_strategy, has_started, momentum,
+                             e1_spread, e2_spread, e1_target, e2_target,
+                             result):
+    spread_opp = mocker.Mock(e1_spread=e1_spread, e2_spread=e2_spread)
+    mocker.patch.object(fcf_strategy, '_last_spread_opp', spread_opp)
+    mocker.patch.object(fcf_strategy.state, 'has_started', has_started)
+    mocker.patch.object(fcf_strategy.state, 'momentum', momentum)
+    get_next_target_spread = mocker.patch.object(
+        fcf_strategy.target_tracker, 'get_next_target_spread',
+        side_effect=[e1_target, e2_target])
+
+    distance = fcf_strategy.get_target_distance()
+
+    if has_started:
+        assert distance == result
+        assert get_next_target_spread.call_args_list == [
+            mocker.call(fcf_strategy.state.e1_targets,
+                        momentum is not Momentum.TO_E1),
+            mocker.call(fcf_strategy.state.e2_targets,
+                        momentum is not Momentum.TO_E2)
+        ]
+    else:
+        assert distance is None
+        get_next_target_spread.assert_not_called()
+
+
+def test_get_target_distance_no_poll(mocker, fcf_strategy):
+    mocker.patch.object(fcf_strategy, '_last_spread_opp', None)
+    assert fcf_strategy.get_target_distance() is None
+
+
 def test_get_trade_data(mocker, fcf_strategy):
     mock_trade_data = mocker.Mock()
     mocker.patch.object(fcf_strategy, 'trade_metadata', mock_trade_data, create=True)
@@ -392,6 +467,8 @@ def test_poll_opportunity(mocker, fcf_strategy, vol_min, e1_quote_balance,
     mocker.patch.object(fcf_strategy._manager, 'balance_checker', balance_checker)
     mocker.patch.object(fcf_strategy._manager, 'checkpoint')
     mocker.patch.object(fcf_strategy._manager.checkpoint, 'strategy_state')
+    mocker.patch.object(fcf_strategy._manager, 'poll_telemetry')
+    mocker.patch.object(fcf_strategy._manager, 'spread_store')
     mocker.patch.object(fcf_strategy._manager, 'trader1', trader1)
     mocker.patch.object(fcf_strategy._manager, 'trader2', trader2)
     mocker.patch.object(
@@ -426,6 +503,12 @@ def test_poll_opportunity(mocker, fcf_strategy, vol_min, e1_quote_balance,
 
     is_opportunity_result = fcf_strategy.poll_opportunity()
 
+    arbseeker.get_spreads_by_ob.assert_called_once_with(
+        fcf_strategy._manager.trader1,
+        fcf_strategy._manager.trader2,
+        fcf_strategy._manager.book_fetcher,
+        fcf_strategy._manager.poll_telemetry.sampled,
+        orderbooks=None)
     trader1_buy_target_amount = min(max_trade_size, max(vol_min, e1_quote_balance))
     trader2_buy_target_amount = min(max_trade_size, max(vol_min, e2_quote_balance))
     fcf_strategy._manager.trader1.set_buy_target_amount.assert_called_once_with(
@@ -439,6 +522,9 @@ def test_poll_opportunity(mocker, fcf_strategy, vol_min, e1_quote_balance,
 
     if exc_type:
         assert is_opportunity_result is False
+        assert fcf_strategy._last_spread_opp is None
+        fcf_strategy._manager.poll_telemetry.record.assert_not_called()
+        fcf_strategy._manager.spread_store.append.assert_not_called()
         calc_targets.assert_not_called()
         is_trade_opportunity.assert_not_called()
     else:
@@ -461,8 +547,194 @@ def test_poll_opportunity(mocker, fcf_strategy, vol_min, e1_quote_balance,
             else:
                 is_within_limits.assert_not_called()
             assert is_opportunity_result == (is_opportunity and is_in_limits)
+        assert fcf_strategy._last_spread_opp is spread_opp
+        fcf_strategy._manager.poll_telemetry.record.assert_called_once_with(
+            spread_opp, fcf_strategy.target_tracker.get_target_index())
+        fcf_strategy._manager.spread_store.append.assert_called_once_with(
+            spread_opp)
         assert fcf_strategy.state.h_to_e1_max == max(
             h_to_e1_max, e1_spread)
         assert fcf_strategy.state.h_to_e2_max == max(
             h_to_e2_max, e2_spread)
         balance_checker.check_crypto_balances.assert_called_with(spread_opp)
+
+
+def make_screen_strategy(mocker, momentum=Momentum.NEUTRAL):
+    state = FCFStrategyState(True, Decimal('4'), Decimal('2'))
+    state.momentum = momentum
+    state.e1_targets = TargetLadder([Decimal('1'), Decimal('3')],
+                                    [Decimal('100'), Decimal('200')])
+    state.e2_targets = TargetLadder([Decimal('3')], [Decimal('100')])
+    strategy = FCFStrategy(state, mocker.MagicMock(), Decimal('200'),
+                           Decimal('1'), Decimal('100'))
+    strategy.screen_polls = True
+    strategy.target_tracker.advance_target_index(Decimal('1'),
+                                                 state.e1_targets)
+
+    # e1 trades in USD, e2 in KRW.
+    for trader, fee, includes_fee, forex in [
+            (strategy._manager.trader1, Decimal('0.0025'), False, Decimal('1')),
+            (strategy._manager.trader2, Decimal('0.0015'), True, Decimal('1100'))]:
+        trader.get_taker_fee.return_value = fee
+        trader.get_buy_target_includes_fee.return_value = includes_fee
+        trader.get_usd_from_quote.side_effect = (
+            lambda quote, forex=forex: quote / forex)
+    return strategy
+
+
+def make_book(bid, ask):
+    return {arbseeker.BIDS: [[bid, 1.0]], arbseeker.ASKS: [[ask, 1.0]]}
+
+
+def top_of_book_spread(strategy, buy_trader, sell_trader, ask, bid):
+    return spreadcalculator.calc_fixed_spread(
+        buy_trader.get_usd_from_quote(Decimal(repr(ask))),
+        sell_trader.get_usd_from_quote(Decimal(repr(bid))),
+        buy_trader.get_taker_fee(), sell_trader.get_taker_fee(),
+        buy_trader.get_buy_target_includes_fee())
+
+
+@pytest.mark.parametrize('momentum', list(Momentum))
+def test_is_screened_out(mocker, momentum):
+    strategy = make_screen_strategy(mocker, momentum)
+    trader1, trader2 = strategy._manager.trader1, strategy._manager.trader2
+    strategy._FCFStrategy__update_triggers()
+
+    # Lowest spread at which each direction changes the strategy.
+    e1_trigger = min(strategy.state.h_to_e1_max,
+                     strategy.target_tracker.get_next_target_spread(
+                         strategy.state.e1_targets,
+                         momentum is not Momentum.TO_E1))
+    e2_trigger = min(strategy.state.h_to_e2_max,
+                     strategy.target_tracker.get_next_target_spread(
+                         strategy.state.e2_targets,
+                         momentum is not Momentum.TO_E2))
+
+    for e1_price in [99.0, 100.0, 101.0, 102.0, 103.0, 104.0, 105.0]:
+        for e2_price in [108000.0, 110000.0, 112000.0, 114000.0]:
+            for spread_width in [0.0, 0.01]:
+                e1_book = make_book(e1_price, e1_price * (1 + spread_width))
+                e2_book = make_book(e2_price, e2_price * (1 + spread_width))
+                e1_spread = top_of_book_spread(
+                    strategy, trader2, trader1, e2_book[arbseeker.ASKS][0][0],
+                    e1_price)
+                e2_spread = top_of_book_spread(
+                    strategy, trader1, trader2, e1_book[arbseeker.ASKS][0][0],
+                    e2_price)
+
+                assert strategy._FCFStrategy__is_screened_out(
+                    (e1_book, e2_book)) is (
+                        e1_spread < e1_trigger and e2_spread < e2_trigger)
+
+
+def test_is_screened_out_at_trigger(mocker):
+    strategy = make_screen_strategy(mocker)
+    strategy._FCFStrategy__update_triggers()
+    ratio = spreadcalculator.calc_trigger_ratio(
+        Decimal('1'), Decimal('0.0015'), Decimal('0.0025'), True)
+
+    # The best e1 bid reaching the first TO_E1 target is never screened out.
+    e1_bid = float(ratio * Decimal('110000') / Decimal('1100'))
+    assert strategy._FCFStrategy__is_screened_out(
+        (make_book(e1_bid, 200.0), make_book(100000.0, 110000.0))) is False
+    assert strategy._FCFStrategy__is_screened_out(
+        (make_book(e1_bid * 0.999, 200.0),
+         make_book(100000.0, 110000.0))) is True
+
+
+def test_is_screened_out_stale(mocker):
+    strategy = make_screen_strategy(mocker)
+    orderbooks = (make_book(90.0, 91.0), make_book(100000.0, 110000.0))
+    assert strategy._FCFStrategy__is_screened_out(orderbooks) is False
+
+    strategy._FCFStrategy__update_triggers()
+    assert strategy._FCFStrategy__is_screened_out(orderbooks) is True
+    assert strategy._FCFStrategy__is_screened_out(
+        (make_book(90.0, 91.0), {arbseeker.BIDS: [], arbseeker.ASKS: []})
+    ) is False
+
+    # A changed fee or forex ratio invalidates the triggers.
+    strategy._manager.trader2.get_taker_fee.return_value = Decimal('0.002')
+    assert strategy._FCFStrategy__is_screened_out(orderbooks) is False
+
+
+def test_get_screened_spread_opp(mocker):
+    strategy = make_screen_strategy(mocker)
+    trader1, trader2 = strategy._manager.trader1, strategy._manager.trader2
+    orderbooks = (make_book(100.0, 101.0), make_book(110000.0, 111000.0))
+
+    spread_opp = strategy._FCFStrategy__get_screened_spread_opp(orderbooks)
+
+    assert spread_opp.e1_spread == top_of_book_spread(
+        strategy, trader2, trader1, 111000.0, 100.0)
+    assert spread_opp.e2_spread == top_of_book_spread(
+        strategy, trader1, trader2, 101.0, 110000.0)
+    assert (spread_opp.e1_buy, spread_opp.e2_buy) == (
+        Decimal('101'), Decimal('111000'))
+    assert (spread_opp.e1_sell, spread_opp.e2_sell) == (
+        Decimal('100'), Decimal('110000'))
+    assert spread_opp.e1_forex_rate_id is trader1.forex_id
+    assert spread_opp.e2_forex_rate_id is trader2.forex_id
+
+    # The bounds pace the polls like calculated spreads.
+    strategy._last_spread_opp = spread_opp
+    assert strategy.get_target_distance() is not None
+
+
+def test_update_triggers_not_screening(mocker):
+    strategy = make_screen_strategy(mocker)
+    strategy.screen_polls = False
+    strategy._FCFStrategy__update_triggers()
+    assert strategy._triggers is None
+
+    strategy.screen_polls = True
+    strategy.state.has_started = False
+    strategy._FCFStrategy__update_triggers()
+    assert strategy._triggers is None
+
+
+@pytest.mark.parametrize('screened', [True, False])
+def test_poll_opportunity_screened(mocker, screened):
+    strategy = make_screen_strategy(mocker)
+    orderbooks = (make_book(100.0, 101.0), make_book(110000.0, 111000.0))
+    for trader in [strategy._manager.trader1, strategy._manager.trader2]:
+        trader.get_adjusted_usd_balance.return_value = Decimal('500')
+    spread_opp = mocker.Mock(e1_spread=Decimal('1'), e2_spread=Decimal('1'))
+    mocker.patch.object(arbseeker, 'fetch_orderbooks', return_value=orderbooks)
+    mocker.patch.object(
+        arbseeker, 'get_spreads_by_ob', return_value=spread_opp)
+    mocker.patch.object(strategy, '_FCFStrategy__is_screened_out',
+                        return_value=screened)
+    mocker.patch.object(strategy, '_FCFStrategy__is_trade_opportunity',
+                        return_value=False)
+    screened_spread_opp = mocker.Mock()
+    mocker.patch.object(strategy, '_FCFStrategy__get_screened_spread_opp',
+                        return_value=screened_spread_opp)
+    update_triggers = mocker.patch.object(
+        strategy, '_FCFStrategy__update_triggers')
+
+    assert strategy.poll_opportunity() is False
+
+    arbseeker.fetch_orderbooks.assert_called_once_with(
+        strategy._manager.trader1, strategy._manager.trader2,
+        strategy._manager.book_fetcher)
+    strategy._FCFStrategy__is_screened_out.assert_called_once_with(orderbooks)
+    if screened:
+        arbseeker.get_spreads_by_ob.assert_not_called()
+        strategy._manager.poll_telemetry.record.assert_not_called()
+        update_triggers.assert_not_called()
+        # The best prices bound the spreads of the poll.
+        strategy._FCFStrategy__get_screened_spread_opp.assert_called_once_with(
+            orderbooks)
+        assert strategy._last_spread_opp is screened_spread_opp
+        strategy._manager.balance_checker.check_crypto_balances.assert_called_once_with(
+            screened_spread_opp)
+    else:
+        arbseeker.get_spreads_by_ob.assert_called_once_with(
+            strategy._manager.trader1,
+            strategy._manager.trader2,
+            strategy._manager.book_fetcher,
+            strategy._manager.poll_telemetry.sampled,
+            orderbooks=orderbooks)
+        strategy._manager.poll_telemetry.record.assert_called_once()
+        update_triggers.assert_called_once_with()
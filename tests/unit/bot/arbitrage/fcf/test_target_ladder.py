@@ -0,0 +1,137 @@
+import copy
+import pickle
+import random
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.arbitrage.fcf.target_ladder import (TargetLadder,
+                                                         as_target_ladder)
+
+ONE = Decimal('1')
+
+
+def reference_targets(spread, h_max, from_balance, spread_min, vol_min):
+    # The ladder as built before TargetLadder.
+    t_num = int((h_max - spread) / spread_min)
+    inc = (h_max - spread) / Decimal(str(t_num))
+    x = (from_balance / vol_min) ** (ONE / (t_num - ONE))
+    targets = []
+    for i in range(1, t_num + 1):
+        if vol_min >= from_balance:
+            position = from_balance
+        else:
+            position = vol_min * (x ** (Decimal(str(i)) - ONE))
+        targets.append((spread + Decimal(str(i)) * inc, position))
+    return targets
+
+
+def make_ladder(spread, h_max, from_balance, spread_min, vol_min):
+    t_num = int((h_max - spread) / spread_min)
+    inc = (h_max - spread) / Decimal(str(t_num))
+    return TargetLadder.geometric(spread, inc, t_num, vol_min, from_balance)
+
+
+@pytest.fixture()
+def ladder():
+    return make_ladder(Decimal('-0.75'), Decimal('4.25'), Decimal('25000'),
+                       Decimal('0.05'), Decimal('1000'))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_geometric_matches_reference(seed):
+    rand = random.Random(seed)
+    args = (
+        Decimal(rand.randint(-300, 300)) / 100,
+        Decimal(rand.randint(310, 900)) / 100,
+        Decimal(rand.randint(1, 10 ** 7)) / 100,
+        Decimal(rand.randint(1, 5)) / 100,
+        Decimal(rand.choice([10, 1000, 25000])))
+
+    assert list(make_ladder(*args)) == reference_targets(*args)
+
+
+def test_geometric_flat():
+    ladder = TargetLadder.geometric(
+        Decimal('1'), Decimal('1'), 3, Decimal('2000'), Decimal('1000'))
+
+    assert ladder == [(Decimal('2'), Decimal('1000')),
+                      (Decimal('3'), Decimal('1000')),
+                      (Decimal('4'), Decimal('1000'))]
+
+
+def test_lazy(ladder):
+    assert ladder.spread(3) == Decimal('-0.75') + 4 * Decimal('0.05')
+    assert ladder._spreads.count(None) == len(ladder) - 1
+    assert ladder._positions.count(None) == len(ladder)
+
+    assert ladder._growth is None
+
+    ladder.position(0)
+    assert ladder._positions.count(None) == len(ladder) - 1
+    assert ladder._growth is not None
+
+
+def test_sequence(ladder):
+    targets = list(ladder)
+
+    assert len(ladder) == 100
+    assert ladder[0] == targets[0]
+    assert ladder[-1] == targets[-1]
+    assert abs(ladder[-1][1] - Decimal('25000')) < Decimal('1E-20')
+    with pytest.raises(IndexError):
+        ladder[100]
+    assert ladder == targets
+    assert targets == ladder
+    assert ladder != targets[:-1]
+    assert ladder != 'targets'
+    assert 'TargetLadder(100 targets' in repr(ladder)
+    assert repr(TargetLadder([], [])) == 'TargetLadder([])'
+
+
+@pytest.mark.parametrize('index', [0, 1, 17, 98, 99, 100, 150])
+def test_advance_to(ladder, index):
+    spreads = [spread for spread, _ in ladder]
+    for spread in (spreads[0] - 1, spreads[0], spreads[40], spreads[40] + 1,
+                   spreads[-1], spreads[-1] + 1):
+        # The linear walk of FCFTargetTracker before TargetLadder.
+        expected = index
+        while expected + 1 < len(spreads) and spread >= spreads[expected + 1]:
+            expected += 1
+
+        assert ladder.advance_to(index, spread) == expected
+
+
+def test_has_hit(ladder):
+    assert ladder.has_hit(0, ladder.spread(0))
+    assert not ladder.has_hit(1, ladder.spread(0))
+    assert ladder.has_hit(99, Decimal('100'))
+    assert not ladder.has_hit(100, Decimal('100'))
+
+
+@pytest.mark.parametrize('copier', [
+    copy.deepcopy, lambda ladder: pickle.loads(pickle.dumps(ladder))])
+def test_copy(ladder, copier):
+    ladder.spread(5)
+    explicit = as_target_ladder(list(ladder))
+
+    result = copier(ladder)
+    explicit_result = copier(explicit)
+
+    assert result._geometry == ladder._geometry
+    assert result._spreads.count(None) == len(ladder)
+    assert result == ladder
+    assert explicit_result._geometry is None
+    assert explicit_result == explicit
+
+
+def test_as_target_ladder(ladder):
+    targets = [(1, 1000), (3, 1600)]
+
+    result = as_target_ladder(targets)
+
+    assert as_target_ladder(ladder) is ladder
+    assert isinstance(result, TargetLadder)
+    assert result == targets
+    assert result.spread(1) == 3
+    assert result.position(1) == 1600
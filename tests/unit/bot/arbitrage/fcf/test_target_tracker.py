@@ -45,6 +45,12 @@ def test_reset_target_index(fcf_target_tracker):
     assert fcf_target_tracker._last_target_index == 0
 
 
+@pytest.mark.parametrize('target_index', [0, 3])
+def test_get_target_index(mocker, fcf_target_tracker, target_index):
+    mocker.patch.object(fcf_target_tracker, '_target_index', target_index)
+    assert fcf_target_tracker.get_target_index() == target_index
+
+
 @pytest.mark.parametrize(
     'target_index, last_target_index, is_momentum_change, expected_result', [
         (0, 0, True, 800),
@@ -69,6 +75,26 @@ def test_get_trade_volume(
     assert result == expected_result
 
 
+@pytest.mark.parametrize(
+    'target_index, is_momentum_change, expected_result', [
+        (0, False, -1),
+        (0, True, -1),
+        (2, False, 3),
+        (2, True, -1),
+        (6, False, None),
+        (6, True, -1),
+    ])
+def test_get_next_target_spread(
+        mocker, fcf_target_tracker, targets, target_index,
+        is_momentum_change, expected_result):
+    mocker.patch.object(fcf_target_tracker, '_target_index', target_index)
+
+    result = fcf_target_tracker.get_next_target_spread(
+        targets, is_momentum_change)
+
+    assert result == expected_result
+
+
 @pytest.mark.parametrize(
     'target_index, spread, is_momentum_change, expected_result', [
         (1, 2, False, True),
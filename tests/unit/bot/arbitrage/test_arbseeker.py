@@ -2,8 +2,11 @@
 import pytest
 
 import autotrageur.bot.arbitrage.spreadcalculator as spreadcalculator
-from autotrageur.bot.arbitrage.arbseeker import (SpreadOpportunity, execute_buy,
-                                     execute_sell, get_spreads_by_ob)
+from autotrageur.bot.arbitrage.arbseeker import (SpreadMatrix, SpreadOpportunity,
+                                     SpreadRoute, execute_buy, execute_sell,
+                                     fetch_orderbooks, get_spread_matrix,
+                                     get_spreads_by_ob)
+from autotrageur.bot.arbitrage.book_fetcher import FetchedBook
 from autotrageur.bot.trader.ccxt_trader import CCXTTrader, OrderbookException, PricePair
 from fp_libs.constants.ccxt_constants import BUY_SIDE, SELL_SIDE
 from fp_libs.utilities import num_to_decimal
@@ -68,7 +71,7 @@ def test_get_spreads_by_ob(
             'get_prices_from_orderbook',
             return_value=TEST_SELL_PRICE_PAIR)
 
-    mocker.patch.object(buy_trader, 'get_full_orderbook')
+    mocker.patch.object(buy_trader, 'get_orderbook')
     mocker.patch.object(buy_trader, 'exchange_name')
     mocker.patch.object(buy_trader, 'quote_target_amount')
     mocker.patch.object(buy_trader, 'base')
@@ -77,7 +80,7 @@ def test_get_spreads_by_ob(
     mocker.patch.object(
         buy_trader, 'get_buy_target_includes_fee', return_value=False)
 
-    mocker.patch.object(sell_trader, 'get_full_orderbook')
+    mocker.patch.object(sell_trader, 'get_orderbook')
     mocker.patch.object(sell_trader, 'exchange_name')
     mocker.patch.object(sell_trader, 'quote_target_amount')
     mocker.patch.object(sell_trader, 'base')
@@ -100,8 +103,8 @@ def test_get_spreads_by_ob(
         result = get_spreads_by_ob(buy_trader, sell_trader)
 
         # Validate mocked calls
-        buy_trader.get_full_orderbook.assert_called_once()
-        sell_trader.get_full_orderbook.assert_called_once()
+        buy_trader.get_orderbook.assert_called_once()
+        sell_trader.get_orderbook.assert_called_once()
         assert(buy_trader.get_prices_from_orderbook.call_count == 2)
         assert(sell_trader.get_prices_from_orderbook.call_count == 2)
         assert(spreadcalculator.calc_fixed_spread.call_count == 2)
@@ -128,6 +131,142 @@ def test_get_spreads_by_ob(
             ]
 
 
+def test_get_spreads_by_ob_book_fetcher(mocker, buy_trader, sell_trader):
+    FAKE_ORDERBOOK = {BIDS: mocker.Mock(), ASKS: mocker.Mock()}
+    book_fetcher = mocker.Mock()
+    book_fetcher.fetch.return_value = [
+        FetchedBook(buy_trader, FAKE_ORDERBOOK, 1),
+        FetchedBook(sell_trader, FAKE_ORDERBOOK, 2)
+    ]
+    mocker.patch.object(buy_trader, 'get_orderbook')
+    mocker.patch.object(sell_trader, 'get_orderbook')
+    mocker.patch.object(
+        buy_trader, 'get_prices_from_orderbook',
+        return_value=TEST_BUY_PRICE_PAIR)
+    mocker.patch.object(
+        sell_trader, 'get_prices_from_orderbook',
+        return_value=TEST_SELL_PRICE_PAIR)
+    mocker.patch.object(
+        buy_trader, 'get_taker_fee', return_value=TEST_GEMINI_TAKER_FEE)
+    mocker.patch.object(
+        sell_trader, 'get_taker_fee', return_value=TEST_BITHUMB_TAKER_FEE)
+    mocker.patch.object(spreadcalculator, 'calc_fixed_spread',
+                        return_value=TEST_SPREAD)
+
+    result = get_spreads_by_ob(buy_trader, sell_trader, book_fetcher)
+
+    book_fetcher.fetch.assert_called_once_with(buy_trader, sell_trader)
+    buy_trader.get_orderbook.assert_not_called()
+    sell_trader.get_orderbook.assert_not_called()
+    buy_trader.get_prices_from_orderbook.assert_any_call(
+        BUY_SIDE, FAKE_ORDERBOOK[ASKS])
+    sell_trader.get_prices_from_orderbook.assert_any_call(
+        SELL_SIDE, FAKE_ORDERBOOK[BIDS])
+    assert isinstance(result, SpreadOpportunity)
+
+
+def test_get_spreads_by_ob_orderbooks(mocker, buy_trader, sell_trader):
+    FAKE_ORDERBOOK = {BIDS: mocker.Mock(), ASKS: mocker.Mock()}
+    book_fetcher = mocker.Mock()
+    mocker.patch.object(buy_trader, 'get_orderbook')
+    mocker.patch.object(sell_trader, 'get_orderbook')
+    mocker.patch.object(
+        buy_trader, 'get_prices_from_orderbook',
+        return_value=TEST_BUY_PRICE_PAIR)
+    mocker.patch.object(
+        sell_trader, 'get_prices_from_orderbook',
+        return_value=TEST_SELL_PRICE_PAIR)
+    mocker.patch.object(
+        buy_trader, 'get_taker_fee', return_value=TEST_GEMINI_TAKER_FEE)
+    mocker.patch.object(
+        sell_trader, 'get_taker_fee', return_value=TEST_BITHUMB_TAKER_FEE)
+    mocker.patch.object(
+        buy_trader, 'get_buy_target_includes_fee', return_value=False)
+    mocker.patch.object(
+        sell_trader, 'get_buy_target_includes_fee', return_value=True)
+    mocker.patch.object(spreadcalculator, 'calc_fixed_spread',
+                        return_value=TEST_SPREAD)
+
+    result = get_spreads_by_ob(
+        buy_trader, sell_trader, book_fetcher,
+        orderbooks=(FAKE_ORDERBOOK, FAKE_ORDERBOOK))
+
+    # Orderbooks already fetched are not requested again.
+    book_fetcher.fetch.assert_not_called()
+    buy_trader.get_orderbook.assert_not_called()
+    sell_trader.get_orderbook.assert_not_called()
+    buy_trader.get_prices_from_orderbook.assert_any_call(
+        BUY_SIDE, FAKE_ORDERBOOK[ASKS])
+    sell_trader.get_prices_from_orderbook.assert_any_call(
+        SELL_SIDE, FAKE_ORDERBOOK[BIDS])
+    assert result.e1_spread == TEST_SPREAD
+
+
+@pytest.mark.parametrize('use_book_fetcher', [True, False])
+def test_fetch_orderbooks(mocker, buy_trader, sell_trader, use_book_fetcher):
+    ex1_orderbook = {BIDS: mocker.Mock(), ASKS: mocker.Mock()}
+    ex2_orderbook = {BIDS: mocker.Mock(), ASKS: mocker.Mock()}
+    mocker.patch.object(
+        buy_trader, 'get_orderbook', return_value=ex1_orderbook)
+    mocker.patch.object(
+        sell_trader, 'get_orderbook', return_value=ex2_orderbook)
+    mocker.patch(
+        'autotrageur.bot.arbitrage.arbseeker.wrap_ccxt_retry',
+        side_effect=lambda methods: [method() for method in methods])
+    book_fetcher = None
+    if use_book_fetcher:
+        book_fetcher = mocker.Mock()
+        book_fetcher.fetch.return_value = [
+            FetchedBook(buy_trader, ex1_orderbook, 1),
+            FetchedBook(sell_trader, ex2_orderbook, 2)
+        ]
+
+    result = fetch_orderbooks(buy_trader, sell_trader, book_fetcher)
+
+    assert result == (ex1_orderbook, ex2_orderbook)
+    if use_book_fetcher:
+        book_fetcher.fetch.assert_called_once_with(buy_trader, sell_trader)
+        buy_trader.get_orderbook.assert_not_called()
+    else:
+        buy_trader.get_orderbook.assert_called_once_with()
+        sell_trader.get_orderbook.assert_called_once_with()
+
+
+@pytest.mark.parametrize('verbose', [True, False])
+def test_get_spreads_by_ob_verbose(mocker, buy_trader, sell_trader, verbose):
+    FAKE_ORDERBOOK = {BIDS: mocker.Mock(), ASKS: mocker.Mock()}
+    book_fetcher = mocker.Mock()
+    book_fetcher.fetch.return_value = [
+        FetchedBook(buy_trader, FAKE_ORDERBOOK, 1),
+        FetchedBook(sell_trader, FAKE_ORDERBOOK, 2)
+    ]
+    mocker.patch.object(
+        buy_trader, 'get_prices_from_orderbook',
+        return_value=TEST_BUY_PRICE_PAIR)
+    mocker.patch.object(
+        sell_trader, 'get_prices_from_orderbook',
+        return_value=TEST_SELL_PRICE_PAIR)
+    mocker.patch.object(
+        buy_trader, 'get_taker_fee', return_value=TEST_GEMINI_TAKER_FEE)
+    mocker.patch.object(
+        sell_trader, 'get_taker_fee', return_value=TEST_BITHUMB_TAKER_FEE)
+    mocker.patch.object(
+        buy_trader, 'get_buy_target_includes_fee', return_value=False)
+    mocker.patch.object(
+        sell_trader, 'get_buy_target_includes_fee', return_value=True)
+    mocker.patch.object(spreadcalculator, 'calc_fixed_spread',
+                        return_value=TEST_SPREAD)
+    mock_info = mocker.patch('logging.info')
+
+    result = get_spreads_by_ob(
+        buy_trader, sell_trader, book_fetcher, verbose=verbose)
+
+    # Four price lines and two spread lines.
+    assert mock_info.call_count == (6 if verbose else 0)
+    assert result.e1_spread == TEST_SPREAD
+    assert result.e2_spread == TEST_SPREAD
+
+
 def test_execute_buy(mocker, buy_trader):
     mocker.patch.object(buy_trader, 'execute_market_buy', return_value=TEST_FAKE_BUY_RESULT)
     result = execute_buy(buy_trader, TEST_BUY_PRICE_USD)
@@ -142,3 +281,97 @@ def test_execute_sell(mocker, buy_trader):
 
     buy_trader.execute_market_sell.assert_called_once_with(TEST_SELL_PRICE_USD, TEST_EXEC_AMOUNT)
     assert result is TEST_FAKE_SELL_RESULT
+
+
+def make_matrix_trader(mocker, exchange_name, buy_price, sell_price, fee,
+                       buy_incl_fee, base='ETH'):
+    trader = mocker.Mock(exchange_name=exchange_name, base=base)
+    trader.get_orderbook.return_value = {BIDS: SELL_SIDE, ASKS: BUY_SIDE}
+
+    def get_prices_from_orderbook(side, bids_or_asks):
+        assert side == bids_or_asks
+        price = buy_price if side == BUY_SIDE else sell_price
+        if price is None:
+            raise OrderbookException
+        return PricePair(price, price * 1000)
+    trader.get_prices_from_orderbook.side_effect = get_prices_from_orderbook
+
+    def get_prices_from_book(orderbook):
+        return (get_prices_from_orderbook(BUY_SIDE, orderbook[ASKS]),
+                get_prices_from_orderbook(SELL_SIDE, orderbook[BIDS]))
+    trader.get_prices_from_book.side_effect = get_prices_from_book
+    trader.get_taker_fee.return_value = fee
+    trader.get_buy_target_includes_fee.return_value = buy_incl_fee
+    return trader
+
+
+@pytest.fixture()
+def matrix_traders(mocker):
+    return [
+        make_matrix_trader(mocker, 'gemini', num_to_decimal('100'),
+                           num_to_decimal('99'), TEST_GEMINI_TAKER_FEE,
+                           TEST_GEMINI_BUY_INCL_FEE),
+        make_matrix_trader(mocker, 'bithumb', num_to_decimal('103'),
+                           num_to_decimal('102'), TEST_BITHUMB_TAKER_FEE,
+                           TEST_BITHUMB_BUY_INCL_FEE),
+        make_matrix_trader(mocker, 'kraken', num_to_decimal('101'), None,
+                           num_to_decimal('0.0026'), False)
+    ]
+
+
+@pytest.mark.parametrize('use_book_fetcher', [True, False])
+def test_get_spread_matrix(mocker, matrix_traders, use_book_fetcher):
+    book_fetcher = None
+    if use_book_fetcher:
+        book_fetcher = mocker.Mock()
+        book_fetcher.fetch.return_value = [
+            FetchedBook(trader, trader.get_orderbook(), 1)
+            for trader in matrix_traders]
+    mocker.patch(
+        'autotrageur.bot.arbitrage.arbseeker.wrap_ccxt_retry',
+        side_effect=lambda methods: [method() for method in methods])
+    gemini, bithumb, kraken = matrix_traders
+
+    result = get_spread_matrix(matrix_traders, book_fetcher)
+
+    if use_book_fetcher:
+        book_fetcher.fetch.assert_called_once_with(*matrix_traders)
+    assert isinstance(result, SpreadMatrix)
+    assert result.traders == matrix_traders
+    assert result.sell_prices[2] is None
+
+    # Kraken has no sell price, so no route sells on it.
+    assert [row[2] for row in result.spreads] == [None, None, None]
+    assert result.best_routes[2] is None
+    assert result.best_routes[0] == SpreadRoute(
+        kraken, gemini, result.spreads[2][0])
+    assert result.best_routes[1] == SpreadRoute(
+        gemini, bithumb, result.spreads[0][1])
+    assert result.spreads[0][1] > result.spreads[2][1]
+
+
+def test_get_spread_matrix_two_traders(mocker, matrix_traders):
+    mocker.patch(
+        'autotrageur.bot.arbitrage.arbseeker.wrap_ccxt_retry',
+        side_effect=lambda methods: [method() for method in methods])
+    gemini, bithumb = matrix_traders[:2]
+
+    matrix = get_spread_matrix([gemini, bithumb], verbose=False)
+    opportunity = get_spreads_by_ob(gemini, bithumb, verbose=False)
+
+    assert matrix.spreads[1][0] == opportunity.e1_spread
+    assert matrix.spreads[0][1] == opportunity.e2_spread
+    assert matrix.buy_prices[0].quote_price == opportunity.e1_buy
+    assert matrix.sell_prices[1].quote_price == opportunity.e2_sell
+
+
+@pytest.mark.parametrize('bases', [['ETH'], ['ETH', 'BTC']])
+def test_get_spread_matrix_invalid(mocker, bases):
+    traders = [
+        make_matrix_trader(mocker, 'gemini', TEST_BUY_PRICE_USD,
+                           TEST_SELL_PRICE_USD, TEST_GEMINI_TAKER_FEE, False,
+                           base)
+        for base in bases]
+
+    with pytest.raises(ValueError):
+        get_spread_matrix(traders)
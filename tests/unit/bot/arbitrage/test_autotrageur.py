@@ -4,15 +4,19 @@ from unittest.mock import Mock
 
 import ccxt
 import pytest
-import schedule
 import yaml
 
 import autotrageur.bot.arbitrage.autotrageur
+import autotrageur.bot.common.storage as storage
 import fp_libs.db.maria_db_handler as db_handler
-from autotrageur.bot.arbitrage.autotrageur import Autotrageur
+from autotrageur.bot.arbitrage.autotrageur import (Autotrageur,
+                                                   SharedResources)
 from autotrageur.bot.arbitrage.fcf_autotrageur import \
     AutotrageurAuthenticationError
-from autotrageur.bot.common.config_constants import DB_NAME, DB_USER
+from autotrageur.bot.common.config_constants import (DB_BACKEND, DB_NAME,
+                                                     DB_PATH, DB_USER)
+from autotrageur.bot.common.storage import (SQLITE_BACKEND, MariaDBBackend,
+                                            UnknownStorageBackendError)
 from fp_libs.utils.ccxt_utils import RetryableError
 
 OpenAndSafeLoad = namedtuple('OpenAndSafeLoad', ['open', 'safe_load'])
@@ -94,7 +98,9 @@ def test_init_db(mocker, mock_autotrageur, mock_open_yaml):
     MOCK_DB_CONFIG_PATH = 'fake/db/config/path'
     mocker.patch('getpass.getpass', return_value=MOCK_DB_PASSWORD)
     mocker.patch.object(db_handler, 'start_db')
-    mocker.spy(schedule, 'every')
+    mocker.patch.object(storage, '_backend')
+    mock_check_schema_version = mocker.patch.object(
+        autotrageur.bot.arbitrage.autotrageur, 'check_schema_version')
     mock_open_yaml.safe_load.return_value = {
         DB_USER: MOCK_DB_USER,
         DB_NAME: MOCK_DB_NAME
@@ -109,9 +115,37 @@ def test_init_db(mocker, mock_autotrageur, mock_open_yaml):
         MOCK_DB_USER,
         MOCK_DB_PASSWORD,
         MOCK_DB_NAME)
-    schedule.every.assert_called_once_with(7)           # pylint: disable=E1101
-    assert len(schedule.jobs) == 1
-    schedule.clear()
+    assert isinstance(storage._backend, MariaDBBackend)
+    mock_check_schema_version.assert_called_once_with(storage._backend)
+
+
+def test_init_db_sqlite(mocker, mock_autotrageur, mock_open_yaml):
+    MOCK_DB_PATH = 'fake/db.sqlite'
+    mocker.patch('getpass.getpass')
+    mocker.patch.object(storage, '_backend')
+    mock_backend = mocker.patch.object(
+        autotrageur.bot.arbitrage.autotrageur, 'SQLiteBackend')
+    mock_migrate = mocker.patch.object(
+        autotrageur.bot.arbitrage.autotrageur, 'migrate')
+    mock_open_yaml.safe_load.return_value = {
+        DB_BACKEND: SQLITE_BACKEND,
+        DB_PATH: MOCK_DB_PATH
+    }
+
+    mock_autotrageur._Autotrageur__init_db('fake/db/config/path')
+
+    getpass.getpass.assert_not_called()                 # pylint: disable=E1101
+    mock_backend.assert_called_once_with(MOCK_DB_PATH)
+    mock_migrate.assert_called_once_with(mock_backend.return_value)
+    assert storage._backend is mock_backend.return_value
+
+
+def test_init_db_unknown_backend(mocker, mock_autotrageur, mock_open_yaml):
+    mocker.patch.object(storage, '_backend')
+    mock_open_yaml.safe_load.return_value = {DB_BACKEND: 'postgres'}
+
+    with pytest.raises(UnknownStorageBackendError):
+        mock_autotrageur._Autotrageur__init_db('fake/db/config/path')
 
 
 def test_init_temp_logger(mocker, mock_autotrageur):
@@ -184,6 +218,22 @@ def test_setup(mocker, mock_autotrageur, env_vars_loaded):
     mock_init_logger.assert_called_once()
 
 
+def test_setup_hosted(mocker, mock_autotrageur):
+    shared = SharedResources(*[Mock() for _ in SharedResources._fields])
+    mocker.patch.object(mock_autotrageur, '_shared', shared)
+    mocker.patch.object(mock_autotrageur, 'logger', None, create=True)
+    mock_init_logger = mocker.patch.object(mock_autotrageur, '_Autotrageur__init_temp_logger')
+    mock_load_env_vars = mocker.patch.object(mock_autotrageur, '_Autotrageur__load_env_vars')
+    mock_init_db = mocker.patch.object(mock_autotrageur, '_Autotrageur__init_db')
+
+    mock_autotrageur._setup(mocker.MagicMock())
+
+    assert mock_autotrageur.logger is shared.logger
+    mock_init_logger.assert_not_called()
+    mock_load_env_vars.assert_not_called()
+    mock_init_db.assert_not_called()
+
+
 def test_wait(mocker, mock_autotrageur):
     MOCK_DEFAULT_WAIT = 5
     mocker.patch.object(mock_autotrageur._config, 'poll_wait_default', MOCK_DEFAULT_WAIT)
@@ -246,6 +296,28 @@ class TestRunAutotrageur:
         if requires_configs and not resume_or_new_args['--resume_id']:
             mock_autotrageur._load_configs.assert_called_once_with(resume_or_new_args['CONFIGFILE'])
 
+    @pytest.mark.parametrize("is_poll_logged", [True, False])
+    def test_run_autotrageur_poll_logging(self, mocker, mock_autotrageur,
+                                          is_poll_logged):
+        self._setup_mocks(mocker, mock_autotrageur)
+        mocker.patch.object(mock_autotrageur, '_poll_opportunity', side_effect=[
+            True, True, False, True, False
+        ])
+        mocker.patch.object(mock_autotrageur, '_is_poll_logged',
+                            return_value=is_poll_logged)
+        mock_fancy_log = mocker.patch(
+            'autotrageur.bot.arbitrage.autotrageur.fancy_log')
+
+        with pytest.raises(SystemExit):
+            mock_autotrageur.run_autotrageur(self.FAKE_ARGS_NEW_RUN, False)
+
+        assert mock_autotrageur._is_poll_logged.call_count == 5
+        logged = [args[0] for args, _ in mock_fancy_log.call_args_list]
+        assert logged.count("Start Trade") == 3
+        assert logged.count("End Trade") == 3
+        assert logged.count("Start Poll") == (5 if is_poll_logged else 0)
+        assert logged.count("End Poll") == (5 if is_poll_logged else 0)
+
     @pytest.mark.parametrize("dryrun", [True, False])
     def test_run_autotrageur_keyboard_interrupt(self, mocker, mock_autotrageur,
                                                 dryrun):
@@ -0,0 +1,144 @@
+import time
+
+import ccxt
+import pytest
+
+from autotrageur.bot.arbitrage.book_fetcher import (ConcurrentBookFetcher,
+                                                    FetchedBook,
+                                                    OrderbookTimeoutException,
+                                                    SharedBookFetcher)
+
+FAKE_ORDERBOOK_1 = {'bids': [[1, 1]], 'asks': [[2, 1]]}
+FAKE_ORDERBOOK_2 = {'bids': [[3, 1]], 'asks': [[4, 1]]}
+
+
+@pytest.fixture()
+def book_fetcher():
+    fetcher = ConcurrentBookFetcher(deadline=0.5)
+    yield fetcher
+    fetcher.close()
+
+
+@pytest.fixture()
+def shared_book_fetcher():
+    fetcher = SharedBookFetcher(deadline=0.5)
+    yield fetcher
+    fetcher.close()
+
+
+def make_trader(mocker, name, orderbook, delay=0, exc=None, symbol='ETH/USD',
+                depth=None):
+    def get_orderbook():
+        time.sleep(delay)
+        if exc:
+            raise exc
+        return orderbook
+
+    trader = mocker.Mock()
+    trader.exchange_name = name
+    trader.symbol = symbol
+    trader.depth_tracker.get_depth.return_value = depth
+    trader.get_orderbook.side_effect = get_orderbook
+    return trader
+
+
+def test_fetch(mocker, book_fetcher):
+    trader1 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1, delay=0.2)
+    trader2 = make_trader(mocker, 'bithumb', FAKE_ORDERBOOK_2, delay=0.2)
+
+    start = time.time()
+    result = book_fetcher.fetch(trader1, trader2)
+
+    # Both legs run at once, so the round costs one round trip.
+    assert time.time() - start < 0.4
+    assert len(result) == 2
+    assert all(isinstance(fetched, FetchedBook) for fetched in result)
+    assert result[0].trader is trader1
+    assert result[0].orderbook is FAKE_ORDERBOOK_1
+    assert result[1].trader is trader2
+    assert result[1].orderbook is FAKE_ORDERBOOK_2
+    assert result[0].receive_timestamp >= start
+    assert result[1].receive_timestamp >= start
+
+
+def test_fetch_timeout(mocker, book_fetcher):
+    trader1 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1)
+    trader2 = make_trader(mocker, 'bithumb', FAKE_ORDERBOOK_2, delay=1)
+
+    with pytest.raises(OrderbookTimeoutException) as exc_info:
+        book_fetcher.fetch(trader1, trader2)
+
+    assert isinstance(exc_info.value, ccxt.NetworkError)
+    assert exc_info.value.timed_out == [trader2]
+    assert len(exc_info.value.fetched) == 1
+    assert exc_info.value.fetched[0].orderbook is FAKE_ORDERBOOK_1
+
+
+def test_fetch_leg_error(mocker, book_fetcher):
+    trader1 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1)
+    trader2 = make_trader(
+        mocker, 'bithumb', None, exc=ccxt.ExchangeNotAvailable('down'))
+
+    with pytest.raises(ccxt.ExchangeNotAvailable):
+        book_fetcher.fetch(trader1, trader2)
+
+
+def test_shared_fetch(mocker, shared_book_fetcher):
+    # Two pairs polling the same gemini market.
+    eth1 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1, depth=20)
+    eth2 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1, depth=None)
+    krw = make_trader(mocker, 'bithumb', FAKE_ORDERBOOK_2, symbol='ETH/KRW')
+    btc = make_trader(mocker, 'bithumb', FAKE_ORDERBOOK_2, symbol='BTC/KRW')
+
+    shared_book_fetcher.prefetch([eth1, krw, eth2, btc])
+    first = shared_book_fetcher.fetch(eth1, krw)
+    second = shared_book_fetcher.fetch(eth2, btc)
+
+    # The deepest need fetches the shared orderbook.
+    eth1.get_orderbook.assert_not_called()
+    eth2.get_orderbook.assert_called_once_with()
+    assert krw.get_orderbook.call_count == 1
+    assert btc.get_orderbook.call_count == 1
+    assert [book.trader for book in first + second] == [eth1, krw, eth2, btc]
+    assert first[0].orderbook is FAKE_ORDERBOOK_1
+    assert first[0].receive_timestamp == second[0].receive_timestamp
+    assert shared_book_fetcher.fetch_count == 3
+    assert shared_book_fetcher.shared_count == 1
+
+
+def test_shared_fetch_missing(mocker, shared_book_fetcher):
+    trader1 = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1)
+    trader2 = make_trader(mocker, 'bithumb', FAKE_ORDERBOOK_2, delay=1)
+
+    shared_book_fetcher.prefetch([trader1, trader2])
+    trader2.get_orderbook.side_effect = None
+    trader2.get_orderbook.return_value = FAKE_ORDERBOOK_2
+    result = shared_book_fetcher.fetch(trader1, trader2)
+
+    # Only the leg which missed the round's deadline is fetched again.
+    assert trader1.get_orderbook.call_count == 1
+    assert trader2.get_orderbook.call_count == 2
+    assert [book.orderbook for book in result] == [
+        FAKE_ORDERBOOK_1, FAKE_ORDERBOOK_2]
+
+
+def test_shared_prefetch_error(mocker, shared_book_fetcher):
+    trader = make_trader(
+        mocker, 'gemini', None, exc=ccxt.RequestTimeout('slow'))
+
+    shared_book_fetcher.prefetch([trader])
+
+    # The poll sees the error of its own fetch.
+    with pytest.raises(ccxt.RequestTimeout):
+        shared_book_fetcher.fetch(trader)
+    assert trader.get_orderbook.call_count == 2
+
+
+def test_shared_prefetch_new_round(mocker, shared_book_fetcher):
+    trader = make_trader(mocker, 'gemini', FAKE_ORDERBOOK_1)
+
+    shared_book_fetcher.prefetch([trader])
+    shared_book_fetcher.prefetch([])
+    shared_book_fetcher.fetch(trader)
+
+    assert trader.get_orderbook.call_count == 2
@@ -0,0 +1,182 @@
+import threading
+
+import pytest
+
+import autotrageur.bot.common.storage as storage
+from autotrageur.bot.arbitrage.db_writer import DBWriteError, DBWriter, WriteOp
+
+FAKE_TRADE_OPP = {'id': 'opp', 'e1_spread': 1}
+FAKE_BUY = {'trade_opportunity_id': 'opp', 'side': 'buy'}
+FAKE_SELL = {'trade_opportunity_id': 'opp', 'side': 'sell'}
+FAKE_FOREX = {'id': 'forex', 'rate': 2}
+FAKE_ROLLUP = {'autotrageur_config_id': 'config', 'trade_count': 1}
+
+
+@pytest.fixture()
+def mock_backend(mocker):
+    backend = mocker.Mock()
+    mocker.patch.object(storage, '_backend', backend)
+    return backend
+
+
+@pytest.fixture()
+def db_writer(mock_backend):
+    writer = DBWriter(linger=0.2)
+    yield writer
+    writer.close(timeout=5)
+
+
+def test_insert_batches(mock_backend, db_writer):
+    tickets = [db_writer.insert(table, row)
+               for table, row in [('trade_opportunity', FAKE_TRADE_OPP),
+                                  ('trades', FAKE_BUY),
+                                  ('trades', FAKE_SELL),
+                                  ('forex_rate', FAKE_FOREX)]]
+
+    db_writer.barrier(*tickets, timeout=5)
+
+    # Consecutive rows of a table share a statement; order is kept.
+    assert mock_backend.execute_many.call_args_list == [
+        (("INSERT INTO trade_opportunity (id, e1_spread) "
+          "VALUES (%(id)s, %(e1_spread)s)", [FAKE_TRADE_OPP]),),
+        (("INSERT INTO trades (trade_opportunity_id, side) "
+          "VALUES (%(trade_opportunity_id)s, %(side)s)",
+          [FAKE_BUY, FAKE_SELL]),),
+        (("INSERT INTO forex_rate (id, rate) VALUES (%(id)s, %(rate)s)",
+          [FAKE_FOREX]),),
+    ]
+    mock_backend.commit.assert_called_once_with()
+    assert db_writer.commit_count == 1
+    assert db_writer.max_queue_depth >= 1
+
+
+def test_insert_max_batch(mock_backend):
+    writer = DBWriter(max_batch=2, linger=0.2)
+    for _ in range(5):
+        writer.insert('trades', FAKE_BUY)
+    writer.close(timeout=5)
+
+    assert mock_backend.commit.call_count == 3
+    assert writer.commit_count == 3
+
+
+def test_write_transaction(mock_backend):
+    writer = DBWriter(max_batch=1, linger=0.2)
+    writer.write(WriteOp('trades', FAKE_BUY, None),
+                 WriteOp('trades', FAKE_SELL, None),
+                 WriteOp('run_rollup', FAKE_ROLLUP, ('autotrageur_config_id',)),
+                 WriteOp('run_rollup', FAKE_ROLLUP, ('autotrageur_config_id',)))
+    writer.close(timeout=5)
+
+    # The rows of a write are committed together, even beyond max_batch.
+    mock_backend.execute_many.assert_called_once_with(
+        "INSERT INTO trades (trade_opportunity_id, side) "
+        "VALUES (%(trade_opportunity_id)s, %(side)s)", [FAKE_BUY, FAKE_SELL])
+    mock_backend.accumulate_rows.assert_called_once_with(
+        'run_rollup', [FAKE_ROLLUP, FAKE_ROLLUP], ('autotrageur_config_id',))
+    mock_backend.commit.assert_called_once_with()
+
+
+def test_barrier_error(mock_backend, db_writer):
+    mock_backend.execute_many.side_effect = Exception('down')
+    ticket = db_writer.insert('trades', FAKE_BUY)
+
+    with pytest.raises(DBWriteError):
+        db_writer.barrier(ticket, timeout=5)
+    mock_backend.commit.assert_not_called()
+    mock_backend.rollback.assert_called_once_with()
+    assert db_writer.dropped_count == 1
+
+    # Later writes are not failed by the earlier one.
+    mock_backend.execute_many.side_effect = None
+    db_writer.barrier(db_writer.insert('trades', FAKE_SELL), timeout=5)
+
+
+def test_barrier_unrelated_error(mock_backend):
+    def execute_many(statement, rows):
+        if rows == [FAKE_FOREX]:
+            raise Exception('bad row')
+    mock_backend.execute_many.side_effect = execute_many
+    writer = DBWriter(linger=0.2)
+
+    writer.insert('forex_rate', FAKE_FOREX)
+    trade = writer.write(WriteOp('trades', FAKE_BUY, None),
+                         WriteOp('trades', FAKE_SELL, None), isolated=True)
+    writer.insert('forex_rate', FAKE_FOREX)
+
+    # The trade is committed alone, and its barrier ignores the failed rows.
+    writer.barrier(trade, timeout=5)
+    writer.close(timeout=5)
+    assert trade.error is None
+    assert mock_backend.commit.call_count == 1
+    assert mock_backend.rollback.call_count == 2
+    assert writer.commit_count == 3
+    assert writer.dropped_count == 2
+
+
+def test_exclusive(mock_backend, db_writer):
+    release = threading.Event()
+    mock_backend.commit.side_effect = lambda: release.wait(5)
+    db_writer.insert('trades', FAKE_BUY)
+    used = []
+
+    def use_directly():
+        with db_writer.exclusive():
+            used.append(mock_backend.commit.call_count)
+
+    user = threading.Thread(target=use_directly)
+    user.start()
+    user.join(0.3)
+    assert not used
+    release.set()
+    user.join(5)
+
+    # The queued row was committed first.
+    assert used == [1]
+
+
+def test_barrier_timeout(mock_backend, db_writer):
+    release = threading.Event()
+    mock_backend.commit.side_effect = lambda: release.wait(5)
+
+    ticket = db_writer.insert('trades', FAKE_BUY)
+
+    with pytest.raises(DBWriteError):
+        db_writer.barrier(ticket, timeout=0.01)
+    release.set()
+    db_writer.barrier(ticket, timeout=5)
+
+
+def test_close(mock_backend):
+    writer = DBWriter(linger=10)
+    writer.insert('trades', FAKE_BUY)
+
+    writer.close(timeout=5)
+
+    assert not writer._thread.is_alive()
+    mock_backend.commit.assert_called_once_with()
+
+
+@pytest.mark.parametrize('dropped_count', [0, 2])
+def test_log_stats(mocker, db_writer, dropped_count):
+    mock_info = mocker.patch('logging.info')
+    mock_error = mocker.patch('logging.error')
+    db_writer.dropped_count = dropped_count
+
+    db_writer.log_stats()
+
+    mock_info.assert_called_once()
+    assert mock_error.call_count == (1 if dropped_count else 0)
+
+
+def test_ping_idle(mock_backend):
+    pinged = threading.Event()
+    mock_backend.ping.side_effect = pinged.set
+    writer = DBWriter(ping_interval=0.01)
+
+    assert pinged.wait(5)
+    writer.close(timeout=5)
+
+    assert not writer._thread.is_alive()
+    assert writer.ping_count == mock_backend.ping.call_count
+    mock_backend.commit.assert_not_called()
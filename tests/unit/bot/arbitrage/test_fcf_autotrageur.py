@@ -1,10 +1,8 @@
 # pylint: disable=E1101
 import builtins
 import copy
-import copyreg
 import getpass
 import os
-import pickle
 import time
 import traceback
 import uuid
@@ -19,18 +17,29 @@ from ccxt import ExchangeError
 
 import autotrageur.bot.arbitrage.arbseeker as arbseeker
 import autotrageur.bot.arbitrage.fcf_autotrageur
+import autotrageur.bot.common.storage as storage
 import fp_libs.db.maria_db_handler as db_handler
 from autotrageur.bot.arbitrage.arbseeker import SpreadOpportunity
+from autotrageur.bot.arbitrage.autotrageur import SharedResources
+from autotrageur.bot.arbitrage.db_writer import DBWriteError, WriteOp
 from autotrageur.bot.arbitrage.fcf.fcf_stat_tracker import FCFStatTracker
+from autotrageur.bot.arbitrage.fcf.state_journal import STATE_JOURNAL_DIR
 from autotrageur.bot.arbitrage.fcf.strategy import TradeMetadata
 from autotrageur.bot.arbitrage.fcf_autotrageur import (DEFAULT_PHONE_MESSAGE,
+                                                       FOREX_SCHEDULE_TAG,
+                                                       TAKER_FEE_REFRESH_HOURS,
+                                                       TAKER_FEE_SCHEDULE_TAG,
                                                        AutotrageurAuthenticationError,
                                                        FCFAlertError,
                                                        FCFAutotrageur,
                                                        FCFCheckpoint,
                                                        IncompleteArbitrageError,
                                                        IncorrectStateObjectTypeError,
-                                                       arbseeker)
+                                                       arbseeker,
+                                                       refresh_taker_fee,
+                                                       update_forex)
+from autotrageur.bot.arbitrage.poll_telemetry import POLL_TELEMETRY_DIR
+from autotrageur.bot.arbitrage.spread_store import SPREAD_STORE_DIR
 from autotrageur.bot.common.config_constants import (TWILIO_RECIPIENT_NUMBERS,
                                                      TWILIO_SENDER_NUMBER)
 from autotrageur.bot.common.db_constants import (FCF_AUTOTRAGEUR_CONFIG_COLUMNS,
@@ -41,17 +50,16 @@ from autotrageur.bot.common.db_constants import (FCF_AUTOTRAGEUR_CONFIG_COLUMNS,
                                                  FCF_MEASURES_TABLE,
                                                  FCF_STATE_PRIM_KEY_ID,
                                                  FCF_STATE_TABLE,
-                                                 FOREX_RATE_PRIM_KEY_ID,
                                                  FOREX_RATE_TABLE,
-                                                 TRADE_OPPORTUNITY_PRIM_KEY_ID,
+                                                 RUN_ROLLUP_PRIM_KEYS,
+                                                 RUN_ROLLUP_TABLE,
+                                                 SLIPPAGE_STATS_TABLE,
                                                  TRADE_OPPORTUNITY_TABLE,
-                                                 TRADES_PRIM_KEY_SIDE,
-                                                 TRADES_PRIM_KEY_TRADE_OPP_ID,
                                                  TRADES_TABLE)
 from autotrageur.bot.common.notification_constants import SUBJECT_LIVE_FAILURE
 from autotrageur.bot.trader.dry_run import DryRunExchange
+from autotrageur.bot.trader.markets_cache import MarketsCache
 from fp_libs.constants.ccxt_constants import API_KEY, API_SECRET, PASSWORD
-from fp_libs.db.maria_db_handler import InsertRowObject
 from fp_libs.utilities import num_to_decimal
 
 xfail = pytest.mark.xfail
@@ -127,6 +135,47 @@ def fcf_checkpoint(mocker):
     return FCFCheckpoint(FAKE_CONFIG_UUID)
 
 
+def test_attach_book_feeds(mocker, no_patch_fcf_autotrageur):
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'poll_wait_short', 2)
+    mock_old_feed = mocker.Mock()
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, 'book_feeds', [mock_old_feed])
+    mock_trader1 = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'trader1', create=True)
+    mock_trader1.exchange_name = 'gemini'
+    mock_trader1.symbol = 'ETH/USD'
+    mock_trader2 = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'trader2', create=True)
+    mock_trader2.exchange_name = 'bithumb'
+    mock_trader2.symbol = 'ETH/KRW'
+    mock_poll_scheduler = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'poll_scheduler', create=True)
+    mock_client_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.BookFeedClient')
+
+    no_patch_fcf_autotrageur._FCFAutotrageur__attach_book_feeds(
+        ['bithumb:BTC/KRW@127.0.0.1:9001', 'Gemini:ETH/USD@127.0.0.1:9002'])
+
+    mock_old_feed.stop.assert_called_once_with()
+    mock_client_constructor.assert_called_once_with(
+        '127.0.0.1', 9002, on_update=mock_poll_scheduler.wake)
+    mock_client_constructor.return_value.start.assert_called_once_with()
+    mock_trader1.attach_book_feed.assert_called_once_with(
+        mock_client_constructor.return_value)
+    mock_trader2.attach_book_feed.assert_not_called()
+    assert no_patch_fcf_autotrageur.book_feeds == [
+        mock_client_constructor.return_value]
+
+    # Woken polls are kept apart while a leg is fetched.
+    assert mock_poll_scheduler.wake_interval == 2
+
+    # Unless both legs are streamed.
+    no_patch_fcf_autotrageur._FCFAutotrageur__attach_book_feeds(
+        ['bithumb:ETH/KRW@127.0.0.1:9001', 'Gemini:ETH/USD@127.0.0.1:9002'])
+
+    assert mock_poll_scheduler.wake_interval == 0
+
+
 def test_load_twilio(mocker, no_patch_fcf_autotrageur):
     FAKE_TWILIO_CFG_PATH = 'fake/twilio/cfg/path'
     fake_open = mocker.patch('builtins.open', mocker.mock_open())
@@ -186,27 +235,30 @@ def test_parse_keyfile(mocker, no_patch_fcf_autotrageur, decrypt_success, dryrun
 
 def test_persist_config(mocker, no_patch_fcf_autotrageur):
     mocker.patch.object(db_handler, 'build_row', return_value=FAKE_CONFIG_ROW)
-    mocker.patch.object(db_handler, 'insert_row')
-    mocker.patch.object(db_handler, 'commit_all')
+    mocker.patch.object(storage, 'insert_row')
+    mocker.patch.object(storage, 'commit_all')
+    mock_db_writer = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', mocker.MagicMock())
 
     no_patch_fcf_autotrageur._FCFAutotrageur__persist_config()
 
+    mock_db_writer.exclusive.assert_called_once_with()
+
     db_handler.build_row.assert_called_once_with(
         FCF_AUTOTRAGEUR_CONFIG_COLUMNS, no_patch_fcf_autotrageur._config._asdict())
-    db_handler.insert_row.assert_called_once_with(
-        InsertRowObject(
-            FCF_AUTOTRAGEUR_CONFIG_TABLE,
-            FAKE_CONFIG_ROW,
-            (FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_ID,
-            FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_START_TS)))
-    db_handler.commit_all.assert_called_once_with()
+    storage.insert_row.assert_called_once_with(
+        FCF_AUTOTRAGEUR_CONFIG_TABLE,
+        FAKE_CONFIG_ROW,
+        (FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_ID,
+        FCF_AUTOTRAGEUR_CONFIG_PRIM_KEY_START_TS))
+    storage.commit_all.assert_called_once_with()
 
 
 def test_persist_forex(mocker, no_patch_fcf_autotrageur):
     mocker.patch.object(time, 'time', return_value=FAKE_CURR_TIME)
     mocker.patch.object(uuid, 'uuid4', return_value=FAKE_CONFIG_UUID)
-    mocker.patch.object(db_handler, 'insert_row')
-    mocker.patch.object(db_handler, 'commit_all')
+    mock_db_writer = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', create=True)
     mock_trader = mocker.Mock()
     mock_trader.quote = 'SOME_QUOTE'
     mock_trader.forex_ratio = Decimal('195766')
@@ -219,10 +271,18 @@ def test_persist_forex(mocker, no_patch_fcf_autotrageur):
         'rate': mock_trader.forex_ratio,
         'local_timestamp': int(FAKE_CURR_TIME)
     }
-    forex_row_obj = InsertRowObject(
-        FOREX_RATE_TABLE, ROW_DATA, (FOREX_RATE_PRIM_KEY_ID,))
-    db_handler.insert_row.assert_called_once_with(forex_row_obj)
-    db_handler.commit_all.assert_called_once_with()
+    mock_db_writer.insert.assert_called_once_with(FOREX_RATE_TABLE, ROW_DATA)
+    mock_db_writer.barrier.assert_not_called()
+
+
+def test_refresh_taker_fee(mocker):
+    mock_trader = mocker.Mock()
+
+    refresh_taker_fee(mock_trader)
+
+    mock_trader.fee_cache.log_stats.assert_called_once_with(
+        mock_trader.exchange_name)
+    mock_trader.fee_cache.invalidate.assert_called_once_with()
 
 
 def test_update_forex(mocker, no_patch_fcf_autotrageur):
@@ -236,14 +296,41 @@ def test_update_forex(mocker, no_patch_fcf_autotrageur):
     persist_forex.assert_called_once_with(mock_trader)
 
 
+def test_update_forex_traders(mocker):
+    mocker.patch.object(time, 'time', return_value=FAKE_CURR_TIME)
+    mocker.patch.object(uuid, 'uuid4', return_value=FAKE_CONFIG_UUID)
+    mock_db_writer = mocker.Mock()
+    traders = [mocker.Mock(quote='KRW'), mocker.Mock(quote='KRW')]
+
+    def set_forex_ratio():
+        traders[0].forex_ratio = Decimal('1100')
+    traders[0].set_forex_ratio.side_effect = set_forex_ratio
+
+    update_forex(mock_db_writer, traders)
+
+    # The ratio is fetched once, and persisted once for both traders.
+    traders[1].set_forex_ratio.assert_not_called()
+    assert traders[1].forex_ratio == Decimal('1100')
+    assert all(trader.forex_id == str(FAKE_CONFIG_UUID) for trader in traders)
+    mock_db_writer.insert.assert_called_once_with(FOREX_RATE_TABLE, {
+        'id': str(FAKE_CONFIG_UUID),
+        'quote': 'KRW',
+        'rate': Decimal('1100'),
+        'local_timestamp': int(FAKE_CURR_TIME)
+    })
+
+
 @pytest.mark.parametrize('buy_response', [
     None, FAKE_UNIFIED_RESPONSE_BUY
 ])
 @pytest.mark.parametrize('sell_response', [
     None, FAKE_UNIFIED_RESPONSE_SELL
 ])
+@pytest.mark.parametrize('dryrun', [True, False])
+@pytest.mark.parametrize('with_opportunity', [True, False])
 def test_persist_trade_data(mocker, no_patch_fcf_autotrageur,
-                            buy_response, sell_response):
+                            buy_response, sell_response, dryrun,
+                            with_opportunity):
     # Copy the response dicts, as the tested function mutates the variables.
     buy_response_copy = copy.deepcopy(buy_response)
     sell_response_copy = copy.deepcopy(sell_response)
@@ -251,61 +338,167 @@ def test_persist_trade_data(mocker, no_patch_fcf_autotrageur,
     trade_metadata = TradeMetadata(
         SpreadOpportunity(
             FAKE_SPREAD_OPP_ID, None, None, None, None, None, None, None, None),
-        None, None, None, None)
+        None, None, mocker.Mock(), mocker.Mock())
     mocker.patch.object(no_patch_fcf_autotrageur._config, 'id', FAKE_CONFIG_UUID)
     mocker.patch.object(no_patch_fcf_autotrageur._config, 'start_timestamp', FAKE_CURR_TIME)
-    mocker.patch.object(db_handler, 'insert_row')
-    mocker.patch.object(db_handler, 'commit_all')
-
-    # Number of insert calls will vary depending on number of successful trades.
-    insert_num_calls = 1
-    insert_call_args_list = [
-        mocker.call(
-            InsertRowObject(
-                TRADE_OPPORTUNITY_TABLE,
-                trade_metadata.spread_opp._asdict(),
-                (TRADE_OPPORTUNITY_PRIM_KEY_ID, )))
-    ]
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'dryrun', dryrun)
+    mock_db_writer = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', create=True)
+    record_slippage_stats = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_FCFAutotrageur__record_slippage_stats',
+        side_effect=lambda trader, response, spread_opp: ('slippage', response['side']))
+    rollup_trade = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_FCFAutotrageur__rollup_trade',
+        side_effect=lambda response: ('rollup', response['side']))
+    record_slippage_stats_call_args_list = []
+
+    # Written ops will vary depending on number of successful trades.
+    trade_ops = []
+    if with_opportunity:
+        trade_ops.append(WriteOp(
+            TRADE_OPPORTUNITY_TABLE, trade_metadata.spread_opp._asdict(), None))
+    slippage_ops = []
+    rollup_ops = []
 
     # Check that the ids are not populated until function is called.
     if buy_response_copy is not None:
+        buy_response_copy['side'] = 'buy'
         assert buy_response_copy.get('trade_opportunity_id') is None
         assert buy_response_copy.get('autotrageur_config_id') is None
         assert buy_response_copy.get('autotrageur_config_start_timestamp') is None
     if sell_response_copy is not None:
+        sell_response_copy['side'] = 'sell'
         assert sell_response_copy.get('trade_opportunity_id') is None
         assert sell_response_copy.get('autotrageur_config_id') is None
         assert sell_response_copy.get('autotrageur_config_start_timestamp') is None
     no_patch_fcf_autotrageur._FCFAutotrageur__persist_trade_data(
-        buy_response_copy, sell_response_copy, trade_metadata)
+        buy_response_copy, sell_response_copy, trade_metadata,
+        with_opportunity=with_opportunity)
 
     if buy_response_copy is not None:
-        insert_num_calls += 1
-        insert_call_args_list.append(mocker.call(
-            InsertRowObject(
-                TRADES_TABLE,
-                buy_response_copy,
-                (TRADES_PRIM_KEY_TRADE_OPP_ID, TRADES_PRIM_KEY_SIDE))
-        ))
+        trade_ops.append(WriteOp(TRADES_TABLE, buy_response_copy, None))
+        slippage_ops.append(('slippage', 'buy'))
+        rollup_ops.append(('rollup', 'buy'))
+        record_slippage_stats_call_args_list.append(mocker.call(
+            trade_metadata.buy_trader, buy_response_copy,
+            trade_metadata.spread_opp._asdict()))
         assert buy_response_copy.get('trade_opportunity_id') is FAKE_SPREAD_OPP_ID
         assert buy_response_copy.get('autotrageur_config_id') is FAKE_CONFIG_UUID
         assert buy_response_copy.get('autotrageur_config_start_timestamp') is FAKE_CURR_TIME
 
     if sell_response_copy is not None:
-        insert_num_calls += 1
-        insert_call_args_list.append(mocker.call(
-            InsertRowObject(
-                TRADES_TABLE,
-                sell_response_copy,
-                (TRADES_PRIM_KEY_TRADE_OPP_ID, TRADES_PRIM_KEY_SIDE))
-        ))
+        trade_ops.append(WriteOp(TRADES_TABLE, sell_response_copy, None))
+        slippage_ops.append(('slippage', 'sell'))
+        rollup_ops.append(('rollup', 'sell'))
+        record_slippage_stats_call_args_list.append(mocker.call(
+            trade_metadata.sell_trader, sell_response_copy,
+            trade_metadata.spread_opp._asdict()))
         assert sell_response_copy.get('trade_opportunity_id') is FAKE_SPREAD_OPP_ID
         assert sell_response_copy.get('autotrageur_config_id') is FAKE_CONFIG_UUID
         assert sell_response_copy.get('autotrageur_config_start_timestamp') is FAKE_CURR_TIME
 
-    assert db_handler.insert_row.call_count == insert_num_calls
-    assert db_handler.insert_row.call_args_list == insert_call_args_list
-    db_handler.commit_all.assert_called_once_with()
+    mock_db_writer.insert.assert_not_called()
+    assert (record_slippage_stats.call_args_list
+            == record_slippage_stats_call_args_list)
+    assert rollup_trade.call_count == len(rollup_ops)
+
+    # Nothing is written without rows.
+    if not trade_ops:
+        mock_db_writer.write.assert_not_called()
+        mock_db_writer.barrier.assert_not_called()
+        return
+
+    # Everything of the trade is written in a transaction of its own.
+    mock_db_writer.write.assert_called_once_with(
+        *trade_ops, *slippage_ops, *rollup_ops, isolated=True)
+    if dryrun:
+        mock_db_writer.barrier.assert_not_called()
+    else:
+        mock_db_writer.barrier.assert_called_once_with(
+            mock_db_writer.write.return_value)
+
+
+@pytest.mark.parametrize('side', ['buy', 'sell'])
+@pytest.mark.parametrize('dryrun', [True, False])
+def test_record_slippage_stats(mocker, no_patch_fcf_autotrageur, side, dryrun):
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'dryrun', dryrun)
+    mocker.patch.object(time, 'time', return_value=FAKE_CURR_TIME)
+    mock_trader = mocker.Mock(exchange_id='e2', exchange_name='kraken')
+    response = {'side': side, 'true_price': Decimal('100')}
+    spread_opp = {
+        'id': FAKE_SPREAD_OPP_ID,
+        'e2_buy': Decimal('101'),
+        'e2_sell': Decimal('99')
+    }
+
+    write_op = no_patch_fcf_autotrageur._FCFAutotrageur__record_slippage_stats(
+        mock_trader, response, spread_opp)
+
+    mock_trader.record_slippage.assert_called_once_with(
+        side, spread_opp['e2_' + side], Decimal('100'))
+    slippage_stats = mock_trader.record_slippage.return_value
+    assert write_op == WriteOp(SLIPPAGE_STATS_TABLE, {
+        'trade_opportunity_id': FAKE_SPREAD_OPP_ID,
+        'side': side,
+        'autotrageur_config_id': no_patch_fcf_autotrageur._config.id,
+        'exchange': 'kraken',
+        'dryrun': dryrun,
+        'trade_count': slippage_stats.count,
+        'mean': slippage_stats.mean,
+        'm2': slippage_stats.m2,
+        'local_timestamp': int(FAKE_CURR_TIME)
+    }, None)
+
+
+def test_rollup_trade(mocker, no_patch_fcf_autotrageur):
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'id', FAKE_CONFIG_UUID)
+    response = dict(FAKE_UNIFIED_RESPONSE_BUY, exchange='kraken',
+                    fee_asset='USD', fees=Decimal('0.25'))
+
+    write_op = no_patch_fcf_autotrageur._FCFAutotrageur__rollup_trade(response)
+
+    assert write_op == WriteOp(RUN_ROLLUP_TABLE, {
+        'autotrageur_config_id': FAKE_CONFIG_UUID,
+        'exchange': 'kraken',
+        'fee_asset': 'USD',
+        'trade_count': 1,
+        'base_volume': FAKE_PRE_FEE_BASE,
+        'quote_volume': FAKE_POST_FEE_QUOTE_BUY,
+        'fees': Decimal('0.25')
+    }, RUN_ROLLUP_PRIM_KEYS)
+
+
+@pytest.mark.parametrize('has_state', [True, False])
+@pytest.mark.parametrize('snapshot', [True, False])
+@pytest.mark.parametrize('needs_compaction', [True, False])
+def test_journal_state(mocker, no_patch_fcf_autotrageur, has_state, snapshot,
+                       needs_compaction):
+    mock_checkpoint = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'checkpoint', create=True)
+    if not has_state:
+        mock_checkpoint.strategy_state = None
+    mock_state_journal = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'state_journal', create=True)
+    mock_state_journal.needs_compaction.return_value = needs_compaction
+    mock_encode_checkpoint = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_FCFAutotrageur__encode_checkpoint')
+    mock_capture = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.capture_strategy_state')
+
+    no_patch_fcf_autotrageur._FCFAutotrageur__journal_state(snapshot=snapshot)
+
+    if not has_state:
+        mock_state_journal.compact.assert_not_called()
+        mock_state_journal.record.assert_not_called()
+    elif snapshot or needs_compaction:
+        mock_capture.assert_called_once_with(mock_checkpoint.strategy_state)
+        mock_state_journal.compact.assert_called_once_with(
+            mock_encode_checkpoint.return_value, mock_capture.return_value)
+        mock_state_journal.record.assert_not_called()
+    else:
+        mock_state_journal.record.assert_called_once_with(
+            mock_capture.return_value)
+        mock_state_journal.compact.assert_not_called()
 
 
 @pytest.mark.parametrize('resume_id', [None, 'abcdef'])
@@ -347,8 +540,12 @@ def test_setup_dry_run_exchanges(mocker, no_patch_fcf_autotrageur, resume_id):
         assert mock_dry_e2.quote_balance == num_to_decimal(MOCK_E2_QUOTE_BAL)
 
 
+@pytest.mark.parametrize("hosted", [True, False])
 @pytest.mark.parametrize("client_quote_usd", [True, False])
-def test_setup_forex(mocker, no_patch_fcf_autotrageur, client_quote_usd):
+def test_setup_forex(mocker, no_patch_fcf_autotrageur, client_quote_usd,
+                     hosted):
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, '_shared', mocker.Mock() if hosted else None)
     trader1 = mocker.patch.object(no_patch_fcf_autotrageur, 'trader1',
         create=True)
     trader2 = mocker.patch.object(no_patch_fcf_autotrageur, 'trader2',
@@ -370,9 +567,40 @@ def test_setup_forex(mocker, no_patch_fcf_autotrageur, client_quote_usd):
         no_patch_fcf_autotrageur._FCFAutotrageur__setup_forex()
         assert trader1.conversion_needed is True
         assert trader2.conversion_needed is True
-        assert(schedule.every.call_count == 2)          # pylint: disable=E1101
-        assert len(schedule.jobs) == 2
-        assert(mock_update_forex.call_count == 2)
+        if hosted:
+            # The host updates the forex of its bots.
+            assert(schedule.every.call_count == 0)      # pylint: disable=E1101
+            assert len(schedule.jobs) == 0
+            assert(mock_update_forex.call_count == 0)
+        else:
+            assert(schedule.every.call_count == 2)      # pylint: disable=E1101
+            assert len(schedule.jobs) == 2
+            assert(mock_update_forex.call_count == 2)
+
+    schedule.clear()
+
+
+def test_setup_forex_again(mocker, no_patch_fcf_autotrageur):
+    trader1 = mocker.patch.object(no_patch_fcf_autotrageur, 'trader1',
+        create=True)
+    trader2 = mocker.patch.object(no_patch_fcf_autotrageur, 'trader2',
+        create=True)
+    trader1.quote = 'KRW'
+    trader2.quote = 'USD'
+    mocker.patch.object(no_patch_fcf_autotrageur, '_FCFAutotrageur__update_forex')
+    mocker.patch.object(autotrageur.bot.arbitrage.fcf_autotrageur,
+                        'FIAT_SYMBOLS', ['KRW', 'USD'])
+    other_job = schedule.every().hour.do(mocker.Mock()).tag(
+        (FOREX_SCHEDULE_TAG, 'another bot'))
+
+    # A fallback re-setup replaces the bot's jobs, and keeps the others.
+    no_patch_fcf_autotrageur._FCFAutotrageur__setup_forex()
+    no_patch_fcf_autotrageur._FCFAutotrageur__setup_forex()
+
+    assert len(schedule.jobs) == 2
+    assert other_job in schedule.jobs
+    assert all(FOREX_SCHEDULE_TAG in next(iter(job.tags))
+               for job in schedule.jobs)
 
     schedule.clear()
 
@@ -394,8 +622,10 @@ def test_setup_stat_tracker(mocker, no_patch_fcf_autotrageur, resume_id, dryrun,
     mocker.patch.object(no_patch_fcf_autotrageur._config, 'use_test_api', use_test_api)
     mocker.patch.object(no_patch_fcf_autotrageur, 'trader1', FAKE_TRADER1, create=True)
     mocker.patch.object(no_patch_fcf_autotrageur, 'trader2', FAKE_TRADER2, create=True)
-    mock_insert_row = mocker.patch.object(db_handler, 'insert_row')
-    mock_commit_all = mocker.patch.object(db_handler, 'commit_all')
+    mock_insert_row = mocker.patch.object(storage, 'insert_row')
+    mock_commit_all = mocker.patch.object(storage, 'commit_all')
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', mocker.MagicMock())
     MOCK_FCF_MEASURES_ROW_DATA = {
         'id': FAKE_NEW_STAT_TRACKER_UUID,
         'autotrageur_config_id': no_patch_fcf_autotrageur._config.id,
@@ -443,10 +673,9 @@ def test_setup_stat_tracker(mocker, no_patch_fcf_autotrageur, resume_id, dryrun,
             e2_trader=FAKE_TRADER2)
         assert no_patch_fcf_autotrageur._stat_tracker == FAKE_STAT_TRACKER
         mock_insert_row.assert_called_once_with(
-            InsertRowObject(
-                FCF_MEASURES_TABLE,
-                MOCK_FCF_MEASURES_ROW_DATA,
-                (FCF_MEASURES_PRIM_KEY_ID,)))
+            FCF_MEASURES_TABLE,
+            MOCK_FCF_MEASURES_ROW_DATA,
+            (FCF_MEASURES_PRIM_KEY_ID,))
         mock_commit_all.assert_called_once_with()
 
 
@@ -486,6 +715,8 @@ def test_setup_traders(mocker, no_patch_fcf_autotrageur, dryrun, use_test_api,
         no_patch_fcf_autotrageur, '_FCFAutotrageur__setup_dry_run_exchanges')
     if dryrun:
         mock_setup_dr_exchanges.return_value = mocker.Mock(), mocker.Mock()
+    mock_exchange_pool = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'exchange_pool', create=True)
 
     # If wallet balance fetch fails, expect either ccxt.AuthenticationError or
     # ccxt.ExchangeNotAvailable to be raised.
@@ -502,8 +733,17 @@ def test_setup_traders(mocker, no_patch_fcf_autotrageur, dryrun, use_test_api,
         no_patch_fcf_autotrageur._FCFAutotrageur__setup_traders(fake_exchange_key_map, None)
         mock_trader1.update_wallet_balances.assert_called_once_with()
         mock_trader2.update_wallet_balances.assert_called_once_with()
-        assert(mock_trader1.load_markets.call_count == 1)
-        assert(mock_trader2.load_markets.call_count == 1)
+        assert mock_exchange_pool.register.call_count == 2
+        markets_cache = mock_exchange_pool.register.call_args[0][1]
+        assert isinstance(markets_cache, MarketsCache)
+        mock_exchange_pool.register.assert_has_calls([
+            mocker.call(mock_trader1, markets_cache),
+            mocker.call(mock_trader2, markets_cache)])
+
+    mock_exchange_pool.get.assert_has_calls([
+        mocker.call(placeholder), mocker.call(placeholder)])
+    for call in mock_ccxt_trader_constructor.call_args_list:
+        assert call[1]['ccxt_exchange'] is mock_exchange_pool.get.return_value
 
     if dryrun:
         assert mock_setup_dr_exchanges.call_count == 1
@@ -638,6 +878,8 @@ class TestExecuteTrade:
         mocker.patch.object(no_patch_fcf_autotrageur, '_send_email')
         mocker.patch.object(no_patch_fcf_autotrageur, '_stat_tracker', create=True)
         mocker.patch.object(no_patch_fcf_autotrageur._stat_tracker, 'trade_count', 0)
+        mocker.patch.object(
+            no_patch_fcf_autotrageur, '_FCFAutotrageur__journal_state', create=True)
         if dryrun:
             mocker.patch.object(no_patch_fcf_autotrageur._stat_tracker, 'log_balances', create=True)
 
@@ -657,8 +899,17 @@ class TestExecuteTrade:
             trade_metadata.sell_trader,
             trade_metadata.sell_price,
             FAKE_UNIFIED_RESPONSE_BUY['post_fee_base'])
-        no_patch_fcf_autotrageur._FCFAutotrageur__persist_trade_data.assert_called_once_with(
-            FAKE_UNIFIED_RESPONSE_BUY, FAKE_UNIFIED_RESPONSE_SELL, trade_metadata)
+        mock_persist_data = no_patch_fcf_autotrageur._FCFAutotrageur__persist_trade_data
+        if dryrun:
+            mock_persist_data.assert_called_once_with(
+                FAKE_UNIFIED_RESPONSE_BUY, FAKE_UNIFIED_RESPONSE_SELL,
+                trade_metadata)
+        else:
+            assert mock_persist_data.call_args_list == [
+                mocker.call(FAKE_UNIFIED_RESPONSE_BUY, None, trade_metadata),
+                mocker.call(None, FAKE_UNIFIED_RESPONSE_SELL, trade_metadata,
+                            with_opportunity=False)
+            ]
         no_patch_fcf_autotrageur._strategy.finalize_trade.assert_called_once_with(
             FAKE_UNIFIED_RESPONSE_BUY, FAKE_UNIFIED_RESPONSE_SELL)
 
@@ -668,6 +919,8 @@ class TestExecuteTrade:
         else:
             no_patch_fcf_autotrageur._send_email.assert_called_once()
         assert no_patch_fcf_autotrageur._stat_tracker.trade_count == 2
+        no_patch_fcf_autotrageur._FCFAutotrageur__journal_state.assert_called_once_with(
+            snapshot=True)
 
     @pytest.mark.parametrize('exc_type', [
         ExchangeError,
@@ -692,6 +945,8 @@ class TestExecuteTrade:
         no_patch_fcf_autotrageur._strategy.finalize_trade.assert_not_called()
         no_patch_fcf_autotrageur._send_email.assert_called_once()
         assert no_patch_fcf_autotrageur._stat_tracker.trade_count == 0
+        no_patch_fcf_autotrageur._FCFAutotrageur__journal_state.assert_called_once_with(
+            snapshot=True)
 
     @pytest.mark.parametrize('exc_type', [
         ExchangeError,
@@ -724,17 +979,48 @@ class TestExecuteTrade:
         # IncompleteArbitrageError gets raised with a populated sell_response,
         # just that the base amount doesn't match the buy_order.
         if exc_type is IncompleteArbitrageError:
-            mock_persist_data.assert_called_once_with(
-                FAKE_UNIFIED_RESPONSE_BUY,
-                FAKE_UNIFIED_RESPONSE_DIFFERENT_AMOUNT,
-                trade_metadata)
+            sell_response = FAKE_UNIFIED_RESPONSE_DIFFERENT_AMOUNT
         else:
-            mock_persist_data.assert_called_once_with(
-                FAKE_UNIFIED_RESPONSE_BUY, None, trade_metadata)
+            sell_response = None
+        assert mock_persist_data.call_args_list == [
+            mocker.call(FAKE_UNIFIED_RESPONSE_BUY, None, trade_metadata),
+            mocker.call(None, sell_response, trade_metadata,
+                        with_opportunity=False)
+        ]
         no_patch_fcf_autotrageur._strategy.restore.assert_not_called()
         no_patch_fcf_autotrageur._strategy.finalize_trade.assert_not_called()
         no_patch_fcf_autotrageur._send_email.assert_called_once()
         assert no_patch_fcf_autotrageur._stat_tracker.trade_count == 1
+        no_patch_fcf_autotrageur._FCFAutotrageur__journal_state.assert_not_called()
+
+    def test_execute_trade_buy_record_error(self, mocker, fake_ccxt_trader,
+                                            no_patch_fcf_autotrageur):
+        self._setup_mocks(mocker, fake_ccxt_trader,
+                          no_patch_fcf_autotrageur, False)
+        mocker.patch.object(
+            no_patch_fcf_autotrageur, '_FCFAutotrageur__verify_sold_amount',
+            create=True)
+        mock_persist_data = no_patch_fcf_autotrageur._FCFAutotrageur__persist_trade_data
+        mock_persist_data.side_effect = [DBWriteError, None]
+
+        with pytest.raises(DBWriteError):
+            no_patch_fcf_autotrageur._execute_trade()
+
+        # The sell still hedges the buy, and is persisted before raising.
+        trade_metadata = no_patch_fcf_autotrageur._strategy.get_trade_data.return_value
+        arbseeker.execute_sell.assert_called_once_with(
+            trade_metadata.sell_trader,
+            trade_metadata.sell_price,
+            FAKE_UNIFIED_RESPONSE_BUY['post_fee_base'])
+        assert mock_persist_data.call_args_list == [
+            mocker.call(FAKE_UNIFIED_RESPONSE_BUY, None, trade_metadata),
+            mocker.call(None, FAKE_UNIFIED_RESPONSE_SELL, trade_metadata,
+                        with_opportunity=False)
+        ]
+        no_patch_fcf_autotrageur._strategy.finalize_trade.assert_called_once_with(
+            FAKE_UNIFIED_RESPONSE_BUY, FAKE_UNIFIED_RESPONSE_SELL)
+        assert no_patch_fcf_autotrageur._stat_tracker.trade_count == 2
+        no_patch_fcf_autotrageur._FCFAutotrageur__journal_state.assert_not_called()
 
 
 def test_clean_up(mocker, no_patch_fcf_autotrageur):
@@ -746,7 +1032,11 @@ def test_clean_up(mocker, no_patch_fcf_autotrageur):
     mock_strategy.clean_up.assert_called_once_with()
 
 
-def test_export_state(mocker, no_patch_fcf_autotrageur, fcf_checkpoint):
+@pytest.mark.parametrize('hosted', [True, False])
+def test_export_state(mocker, no_patch_fcf_autotrageur, fcf_checkpoint,
+                      hosted):
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, '_shared', mocker.Mock() if hosted else None)
     mocker.patch.object(no_patch_fcf_autotrageur, 'trader1', create=True)
     mocker.patch.object(no_patch_fcf_autotrageur, 'trader2', create=True)
     FAKE_STAT_TRACKER = FCFStatTracker(
@@ -755,44 +1045,83 @@ def test_export_state(mocker, no_patch_fcf_autotrageur, fcf_checkpoint):
     mocker.patch.object(no_patch_fcf_autotrageur._config, 'start_timestamp', FAKE_CURR_TIME)
     mocker.patch.object(no_patch_fcf_autotrageur, 'checkpoint', fcf_checkpoint, create=True)
     mocker.patch.object(no_patch_fcf_autotrageur, '_stat_tracker', FAKE_STAT_TRACKER, create=True)
-    mocker.patch.object(no_patch_fcf_autotrageur._stat_tracker, 'detach_traders')
-    mocker.patch.object(no_patch_fcf_autotrageur._stat_tracker, 'attach_traders')
 
     # Need to mock out to prevent test dying on logging call.
     mocker.patch.object(
         no_patch_fcf_autotrageur.checkpoint, '_strategy_state', create=True)
 
     mocker.patch.object(uuid, 'uuid4', return_value=FAKE_NEW_STATE_UUID)
-    mocker.patch.object(db_handler, 'execute_parametrized_query')
-    mocker.patch.object(db_handler, 'insert_row')
-    mocker.patch.object(db_handler, 'commit_all')
-    mocker.patch.object(pickle, 'dumps')
-    mock_copyreg_pickle = mocker.patch.object(copyreg, 'pickle')
+    mock_db_writer = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', create=True)
+    mock_state_journal = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'state_journal', create=True)
+    mock_capture = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.capture_strategy_state')
+    mocker.patch.object(storage, 'execute_parametrized_query')
+    mocker.patch.object(storage, 'insert_row')
+    mocker.patch.object(storage, 'commit_all')
+    mock_encode_checkpoint = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.encode_checkpoint')
+    mock_catalog_metadata = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.catalog_metadata',
+        return_value={'export_timestamp': FAKE_CURR_TIME, 'trade_count': 0})
+    mocker.patch.object(time, 'time', return_value=FAKE_CURR_TIME)
 
-    fcf_state_row_obj = InsertRowObject(
+    no_patch_fcf_autotrageur._export_state()
+
+    mock_encode_checkpoint.assert_called_once_with(fcf_checkpoint)
+    assert no_patch_fcf_autotrageur.checkpoint._stat_tracker is FAKE_STAT_TRACKER
+    if hosted:
+        # The host closes the shared writer.
+        mock_db_writer.close.assert_not_called()
+    else:
+        mock_db_writer.close.assert_called_once_with()
+    mock_db_writer.exclusive.assert_called_once_with()
+    storage.insert_row.assert_called_once_with(
         FCF_STATE_TABLE,
         {
             'id': FAKE_NEW_STATE_UUID,
             'autotrageur_config_id': FAKE_CONFIG_UUID,
             'autotrageur_config_start_timestamp': FAKE_CURR_TIME,
-            'state': pickle.dumps(fcf_checkpoint)
+            'state': mock_encode_checkpoint.return_value,
+            'export_timestamp': FAKE_CURR_TIME,
+            'trade_count': 0
         },
         (FCF_STATE_PRIM_KEY_ID,))
+    storage.commit_all.assert_called_once_with()
+    mock_catalog_metadata.assert_called_once_with(
+        fcf_checkpoint, int(FAKE_CURR_TIME))
+    mock_capture.assert_called_once_with(
+        no_patch_fcf_autotrageur.checkpoint.strategy_state)
+    mock_state_journal.compact.assert_called_once_with(
+        mock_encode_checkpoint.return_value, mock_capture.return_value)
 
-    no_patch_fcf_autotrageur._export_state()
-
-    # Ensure copyreg.pickle is called appropriately for better
-    # backwards-compatibility in pickling.
-    mock_copyreg_pickle.assert_called_once_with(
-        autotrageur.bot.arbitrage.fcf.fcf_checkpoint.FCFCheckpoint,
-        autotrageur.bot.arbitrage.fcf.fcf_checkpoint_utils.pickle_fcf_checkpoint)
 
-    no_patch_fcf_autotrageur._stat_tracker.detach_traders.assert_called_once_with()
-    assert no_patch_fcf_autotrageur.checkpoint._stat_tracker is FAKE_STAT_TRACKER
-    db_handler.insert_row.assert_called_once_with(fcf_state_row_obj)
-    db_handler.commit_all.assert_called_once_with()
-    no_patch_fcf_autotrageur._stat_tracker.attach_traders.assert_called_once_with(
-        no_patch_fcf_autotrageur.trader1, no_patch_fcf_autotrageur.trader2)
+@pytest.mark.parametrize('hosted', [True, False])
+def test_final_log(mocker, no_patch_fcf_autotrageur, hosted):
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, '_shared', mocker.Mock() if hosted else None)
+    mock_poll_telemetry = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'poll_telemetry', create=True)
+    mock_spread_store = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'spread_store', create=True)
+    mock_db_writer = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', create=True)
+    mock_state_journal = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'state_journal', create=True)
+    mock_stat_tracker = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_stat_tracker', create=True)
+
+    no_patch_fcf_autotrageur._final_log()
+
+    mock_poll_telemetry.flush.assert_called_once_with()
+    mock_spread_store.flush.assert_called_once_with()
+    if hosted:
+        mock_db_writer.log_stats.assert_not_called()
+    else:
+        mock_db_writer.log_stats.assert_called_once_with()
+    mock_state_journal.log_stats.assert_called_once_with()
+    mock_stat_tracker.log_all.assert_called_once_with()
 
 
 @pytest.mark.parametrize('correct_state_obj_type', [True, False])
@@ -800,10 +1129,14 @@ def test_import_state(mocker, no_patch_fcf_autotrageur, fcf_checkpoint,
                       correct_state_obj_type):
     MOCK_RESULT = b'MOCK_RESULT'
     mocker.patch.object(no_patch_fcf_autotrageur, 'checkpoint', None, create=True)
-    mocker.patch.object(pickle, 'loads',
+    mock_decode_checkpoint = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.decode_checkpoint',
         return_value=fcf_checkpoint if correct_state_obj_type else mocker.Mock())
     mock_exec_param_query = mocker.patch.object(
-        db_handler, 'execute_parametrized_query', return_value=[(MOCK_RESULT,)])
+        storage, 'execute_parametrized_query', return_value=[(MOCK_RESULT,)])
+    mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.journal_exists',
+        return_value=False)
 
     if correct_state_obj_type:
         no_patch_fcf_autotrageur._import_state(FAKE_RESUME_UUID)
@@ -815,22 +1148,78 @@ def test_import_state(mocker, no_patch_fcf_autotrageur, fcf_checkpoint,
 
     mock_exec_param_query.assert_called_once_with(
         "SELECT state FROM fcf_state where id = %s;", (FAKE_RESUME_UUID,))
-    pickle.loads.assert_called_once_with(MOCK_RESULT)
+    mock_decode_checkpoint.assert_called_once_with(MOCK_RESULT)
+
+
+def test_import_state_journal(mocker, no_patch_fcf_autotrageur, fcf_checkpoint):
+    MOCK_SNAPSHOT = b'MOCK_SNAPSHOT'
+    FAKE_RECORDS = [{'has_started': True}, {'momentum': 1}]
+    mocker.patch.object(no_patch_fcf_autotrageur, 'checkpoint', None, create=True)
+    mock_decode_checkpoint = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.decode_checkpoint',
+        return_value=fcf_checkpoint)
+    mock_exec_param_query = mocker.patch.object(
+        storage, 'execute_parametrized_query')
+    mock_journal_exists = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.journal_exists',
+        return_value=True)
+    mock_load_journal = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.load_journal',
+        return_value=(MOCK_SNAPSHOT, FAKE_RECORDS))
+    mock_apply = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.apply_strategy_fields')
+
+    no_patch_fcf_autotrageur._import_state(FAKE_RESUME_UUID)
+
+    journal_dir = os.path.join(STATE_JOURNAL_DIR, FAKE_RESUME_UUID)
+    mock_journal_exists.assert_called_once_with(journal_dir)
+    mock_load_journal.assert_called_once_with(journal_dir)
+    mock_decode_checkpoint.assert_called_once_with(MOCK_SNAPSHOT)
+    assert mock_apply.call_args_list == [
+        mocker.call(fcf_checkpoint.strategy_state, fields)
+        for fields in FAKE_RECORDS]
+    mock_exec_param_query.assert_not_called()
+    assert no_patch_fcf_autotrageur.checkpoint is fcf_checkpoint
+
+
+@pytest.mark.parametrize('sampled', [True, False])
+def test_is_poll_logged(mocker, no_patch_fcf_autotrageur, sampled):
+    mock_poll_telemetry = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'poll_telemetry', create=True)
+    mock_poll_telemetry.sample.return_value = sampled
+
+    assert no_patch_fcf_autotrageur._is_poll_logged() is sampled
+    mock_poll_telemetry.sample.assert_called_once_with()
 
 
 def test_poll_opportunity(mocker, no_patch_fcf_autotrageur):
     mock_strategy = mocker.patch.object(
         no_patch_fcf_autotrageur, '_strategy', create=True)
-    no_patch_fcf_autotrageur._poll_opportunity()
+    mock_journal_state = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_FCFAutotrageur__journal_state', create=True)
+
+    result = no_patch_fcf_autotrageur._poll_opportunity()
+
+    assert result is mock_strategy.poll_opportunity.return_value
     mock_strategy.poll_opportunity.assert_called_once_with()
+    mock_journal_state.assert_called_once_with()
 
 
+@pytest.mark.parametrize('fixed_point', [True, False])
+@pytest.mark.parametrize('fallback', [True, False])
+@pytest.mark.parametrize('hosted', [True, False])
 @pytest.mark.parametrize('resume_id', [None, 'abcdef'])
-def test_post_setup(mocker, no_patch_fcf_autotrageur, resume_id):
+def test_post_setup(mocker, no_patch_fcf_autotrageur, resume_id, hosted,
+                    fallback, fixed_point):
     arguments = {
         'KEYFILE': mocker.Mock(),
         '--resume_id': resume_id,
-        '--pi_mode': mocker.Mock()
+        '--pi_mode': mocker.Mock(),
+        '--log_sample': '5',
+        '--screen_polls': True,
+        '--fixed_point': fixed_point,
+        '--verify_book_walk': not fixed_point,
+        '--book_feed': ['gemini:ETH/USD@127.0.0.1:9001']
     }
     FAKE_BALANCE_CHECKER = mocker.Mock()
     MOCK_EXCHANGE_KEY_MAP = mocker.Mock()
@@ -847,25 +1236,106 @@ def test_post_setup(mocker, no_patch_fcf_autotrageur, resume_id):
         no_patch_fcf_autotrageur, '_FCFAutotrageur__load_twilio')
     mock_setup_forex = mocker.patch.object(
         no_patch_fcf_autotrageur, '_FCFAutotrageur__setup_forex')
+    mock_attach_book_feeds = mocker.patch.object(
+        no_patch_fcf_autotrageur, '_FCFAutotrageur__attach_book_feeds')
     mock_persist_config = mocker.patch.object(
         no_patch_fcf_autotrageur, '_FCFAutotrageur__persist_config')
     mock_setup_stat_tracker = mocker.patch.object(
         no_patch_fcf_autotrageur, '_FCFAutotrageur__setup_stat_tracker')
     mocker.patch.object(no_patch_fcf_autotrageur, '_stat_tracker')
+    mocker.patch.object(no_patch_fcf_autotrageur, '_strategy', create=True)
     mock_attach_traders = mocker.patch.object(no_patch_fcf_autotrageur._stat_tracker, 'attach_traders')
     mock_balance_checker_constructor = mocker.patch(
         'autotrageur.bot.arbitrage.fcf_autotrageur.FCFBalanceChecker',
         return_value=FAKE_BALANCE_CHECKER)
+    FAKE_POLL_SCHEDULER = mocker.Mock()
+    mock_poll_scheduler_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.PollScheduler',
+        return_value=FAKE_POLL_SCHEDULER)
+    FAKE_BOOK_FETCHER = mocker.Mock()
+    mock_book_fetcher_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.ConcurrentBookFetcher',
+        return_value=FAKE_BOOK_FETCHER)
+    FAKE_DB_WRITER = mocker.Mock()
+    mock_db_writer_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.DBWriter',
+        return_value=FAKE_DB_WRITER)
+    RUNNING_DB_WRITER = mocker.Mock() if fallback else None
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, 'db_writer', RUNNING_DB_WRITER)
+    FAKE_POLL_TELEMETRY = mocker.Mock()
+    mock_poll_telemetry_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.PollTelemetry',
+        return_value=FAKE_POLL_TELEMETRY)
+    FAKE_SPREAD_STORE = mocker.Mock()
+    mock_spread_store_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.SpreadStore',
+        return_value=FAKE_SPREAD_STORE)
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'exchange1', 'gemini')
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'exchange1_pair', 'ETH/USD')
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'exchange2', 'bithumb')
+    mocker.patch.object(no_patch_fcf_autotrageur._config, 'exchange2_pair', 'ETH/KRW')
+    FAKE_STATE_JOURNAL = mocker.Mock()
+    mock_state_journal_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.StateJournal',
+        return_value=FAKE_STATE_JOURNAL)
+    mock_prune_journals = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.prune_journals')
+    LIVE_STATE_JOURNAL = mocker.Mock() if fallback else None
+    mocker.patch.object(
+        no_patch_fcf_autotrageur, 'state_journal', LIVE_STATE_JOURNAL)
+    mocker.patch.object(uuid, 'uuid4', return_value=FAKE_NEW_STATE_UUID)
+    mock_every = mocker.patch.object(schedule, 'every')
+    mock_clear = mocker.patch.object(schedule, 'clear')
+    FAKE_EXCHANGE_POOL = mocker.Mock()
+    mock_exchange_pool_constructor = mocker.patch(
+        'autotrageur.bot.arbitrage.fcf_autotrageur.ExchangePool',
+        return_value=FAKE_EXCHANGE_POOL)
+    shared = None
+    if hosted:
+        shared = SharedResources(
+            book_fetcher=FAKE_BOOK_FETCHER,
+            db_writer=mocker.Mock(),
+            exchange_key_map=MOCK_EXCHANGE_KEY_MAP,
+            exchange_pool=FAKE_EXCHANGE_POOL,
+            logger=mocker.Mock(),
+            twilio_client=mocker.Mock(),
+            twilio_config=mocker.Mock())
+    mocker.patch.object(no_patch_fcf_autotrageur, '_shared', shared)
 
     no_patch_fcf_autotrageur._post_setup(arguments)
 
     parent_super.return_value._post_setup.assert_called_once_with(arguments)
-    mock_parse_keyfile.assert_called_once_with(arguments['KEYFILE'], arguments['--pi_mode'])
     mock_setup_traders.assert_called_once_with(MOCK_EXCHANGE_KEY_MAP, arguments['--resume_id'])
-    mock_load_twilio.assert_called_once_with(
-        no_patch_fcf_autotrageur._config.twilio_cfg_path)
+    for trader in (no_patch_fcf_autotrageur.trader1,
+                   no_patch_fcf_autotrageur.trader2):
+        assert trader.fixed_point is fixed_point
+        assert trader.verify_book_walk is (not fixed_point)
+    assert no_patch_fcf_autotrageur.exchange_pool is FAKE_EXCHANGE_POOL
+    if hosted:
+        mock_parse_keyfile.assert_not_called()
+        mock_exchange_pool_constructor.assert_not_called()
+        mock_book_fetcher_constructor.assert_not_called()
+        mock_load_twilio.assert_not_called()
+        assert no_patch_fcf_autotrageur.twilio_client is shared.twilio_client
+        assert no_patch_fcf_autotrageur.twilio_config is shared.twilio_config
+    else:
+        mock_parse_keyfile.assert_called_once_with(arguments['KEYFILE'], arguments['--pi_mode'])
+        mock_exchange_pool_constructor.assert_called_once_with()
+        mock_book_fetcher_constructor.assert_called_once_with()
+        mock_load_twilio.assert_called_once_with(
+            no_patch_fcf_autotrageur._config.twilio_cfg_path)
     mock_setup_forex.assert_called_once_with()
     mock_persist_config.assert_called_once_with()
+    if hosted:
+        mock_db_writer_constructor.assert_not_called()
+        assert no_patch_fcf_autotrageur.db_writer is shared.db_writer
+    elif fallback:
+        mock_db_writer_constructor.assert_not_called()
+        assert no_patch_fcf_autotrageur.db_writer is RUNNING_DB_WRITER
+    else:
+        mock_db_writer_constructor.assert_called_once_with()
+        assert no_patch_fcf_autotrageur.db_writer is FAKE_DB_WRITER
     mock_setup_stat_tracker.assert_called_once_with(arguments['--resume_id'])
     if resume_id:
         mock_attach_traders.assert_called_once_with(
@@ -877,6 +1347,40 @@ def test_post_setup(mocker, no_patch_fcf_autotrageur, resume_id):
         no_patch_fcf_autotrageur.trader2,
         mock_send_email)
     assert no_patch_fcf_autotrageur.balance_checker == FAKE_BALANCE_CHECKER
+    assert no_patch_fcf_autotrageur.book_fetcher == FAKE_BOOK_FETCHER
+    taker_fee_tag = (TAKER_FEE_SCHEDULE_TAG, id(no_patch_fcf_autotrageur))
+    mock_clear.assert_called_once_with(taker_fee_tag)
+    if hosted:
+        # The host refreshes the taker fees of its bots.
+        mock_every.assert_not_called()
+    else:
+        mock_every.assert_called_with(TAKER_FEE_REFRESH_HOURS)
+        mock_every.return_value.hours.do.assert_has_calls([
+            mocker.call(refresh_taker_fee, no_patch_fcf_autotrageur.trader1),
+            mocker.call(refresh_taker_fee, no_patch_fcf_autotrageur.trader2)],
+            any_order=True)
+        mock_every.return_value.hours.do.return_value.tag.assert_called_with(
+            taker_fee_tag)
+    mock_poll_scheduler_constructor.assert_called_once_with(
+        no_patch_fcf_autotrageur._config.poll_wait_short,
+        no_patch_fcf_autotrageur._config.poll_wait_default)
+    assert no_patch_fcf_autotrageur.poll_scheduler == FAKE_POLL_SCHEDULER
+    mock_attach_book_feeds.assert_called_once_with(arguments['--book_feed'])
+    mock_poll_telemetry_constructor.assert_called_once_with(
+        os.path.join(POLL_TELEMETRY_DIR, '{}.bin'.format(
+            no_patch_fcf_autotrageur._stat_tracker.id)),
+        log_sample_rate=5)
+    assert no_patch_fcf_autotrageur.poll_telemetry == FAKE_POLL_TELEMETRY
+    assert no_patch_fcf_autotrageur._strategy.screen_polls is True
+    mock_spread_store_constructor.assert_called_once_with(os.path.join(
+        SPREAD_STORE_DIR, 'gemini_ETH-USD_bithumb_ETH-KRW'))
+    assert no_patch_fcf_autotrageur.spread_store == FAKE_SPREAD_STORE
+    mock_state_journal_constructor.assert_called_once_with(
+        os.path.join(STATE_JOURNAL_DIR, FAKE_NEW_STATE_UUID))
+    assert no_patch_fcf_autotrageur.state_journal == FAKE_STATE_JOURNAL
+    mock_prune_journals.assert_called_once_with()
+    if fallback:
+        LIVE_STATE_JOURNAL.close.assert_called_once_with()
 
 
 def test_send_email(mocker, no_patch_fcf_autotrageur):
@@ -972,8 +1476,8 @@ def test_alert(mocker, no_patch_fcf_autotrageur, is_dry_run, is_test_run,
 @pytest.mark.parametrize('trade_completed', [True, False])
 def test_wait(mocker, no_patch_fcf_autotrageur, trade_completed):
     MOCK_POLL_WAIT_SHORT = 2
-    mock_super = mocker.patch.object(builtins, 'super')
-    mock_sleep = mocker.patch.object(time, 'sleep')
+    poll_scheduler = mocker.patch.object(
+        no_patch_fcf_autotrageur, 'poll_scheduler', create=True)
     strategy = mocker.patch.object(
         no_patch_fcf_autotrageur, '_strategy', create=True)
     strategy.trade_chunker.trade_completed = trade_completed
@@ -983,6 +1487,10 @@ def test_wait(mocker, no_patch_fcf_autotrageur, trade_completed):
     no_patch_fcf_autotrageur._wait()
 
     if trade_completed:
-        mock_super.return_value._wait.assert_called_once_with()
+        poll_scheduler.get_wait.assert_called_once_with(
+            strategy.get_target_distance.return_value, strategy.spread_min)
+        poll_scheduler.wait.assert_called_once_with(
+            poll_scheduler.get_wait.return_value)
     else:
-        mock_sleep.assert_called_once_with(MOCK_POLL_WAIT_SHORT)
+        poll_scheduler.get_wait.assert_not_called()
+        poll_scheduler.wait.assert_called_once_with(MOCK_POLL_WAIT_SHORT)
@@ -0,0 +1,344 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+import schedule
+import yaml
+
+import autotrageur.bot.arbitrage.multi_pair_autotrageur as multi_pair_autotrageur
+from autotrageur.bot.arbitrage.autotrageur import (Autotrageur,
+                                                   SharedResources)
+from autotrageur.bot.arbitrage.fcf_autotrageur import (FOREX_SCHEDULE_TAG,
+                                                       TAKER_FEE_SCHEDULE_TAG)
+from autotrageur.bot.arbitrage.multi_pair_autotrageur import (PAIR_CONFIG,
+                                                              PAIR_RESUME_ID,
+                                                              MultiPairAutotrageur,
+                                                              MultiPairConfiguration,
+                                                              MultiPairConfigurationError)
+
+FAKE_ARGUMENTS = {
+    'KEYFILE': 'path/to/keyfile',
+    'CONFIGFILE': 'path/to/config',
+    'DBCONFIGFILE': 'path/to/db_config',
+    '--pi_mode': False,
+    '--log_sample': '10',
+    '--screen_polls': False,
+    '--fixed_point': False,
+    '--verify_book_walk': False,
+    '--book_feed': []
+}
+
+
+def make_config(pairs, dryrun=True, use_test_api=False):
+    return MultiPairConfiguration(
+        dryrun=dryrun, id='id', pairs=pairs, start_timestamp=0,
+        twilio_cfg_path='path/to/twilio', use_test_api=use_test_api)
+
+
+def make_pair(symbol='ETH', dryrun=True, use_test_api=False, wait=5):
+    pair = Mock()
+    pair._config.exchange1 = 'gemini'
+    pair._config.exchange1_pair = '{}/USD'.format(symbol)
+    pair._config.exchange2 = 'bithumb'
+    pair._config.exchange2_pair = '{}/KRW'.format(symbol)
+    pair._config.dryrun = dryrun
+    pair.trader1.exchange_name = 'gemini'
+    pair.trader1.quote = 'USD'
+    pair.trader1.conversion_needed = False
+    pair.trader2.exchange_name = 'bithumb'
+    pair.trader2.quote = 'KRW'
+    pair.trader2.conversion_needed = True
+    pair._config.use_test_api = use_test_api
+    pair._get_poll_wait.return_value = wait
+    pair.poll_scheduler.consume_wake.return_value = False
+    pair.poll_scheduler.get_wake_time.return_value = None
+    return pair
+
+
+@pytest.fixture()
+def multi_pair():
+    result = MultiPairAutotrageur()
+    result.resources = SharedResources(
+        *[Mock() for _ in SharedResources._fields])
+    return result
+
+
+@pytest.fixture()
+def mock_post_setup(mocker):
+    mocker.patch.object(Autotrageur, '_post_setup')
+    mocker.patch.object(
+        multi_pair_autotrageur, 'load_twilio', return_value=(Mock(), Mock()))
+    mocker.patch.object(multi_pair_autotrageur, 'parse_keyfile')
+    mocker.patch.object(multi_pair_autotrageur, 'SharedBookFetcher')
+    mocker.patch.object(multi_pair_autotrageur, 'DBWriter')
+    mocker.patch.object(multi_pair_autotrageur, 'schedule')
+    mocker.patch.object(multi_pair_autotrageur, 'update_forex')
+    return mocker.patch.object(multi_pair_autotrageur, 'FCFAutotrageur')
+
+
+def test_load_configs(mocker, multi_pair):
+    pairs = [{PAIR_CONFIG: 'path/to/eth'}, {PAIR_RESUME_ID: 'abc'}]
+    mocker.patch('builtins.open', mocker.mock_open())
+    mocker.patch.object(yaml, 'safe_load', return_value={
+        'dryrun': True,
+        'pairs': pairs,
+        'twilio_cfg_path': 'path/to/twilio',
+        'use_test_api': False
+    })
+
+    multi_pair._load_configs('path/to/config')
+
+    assert multi_pair._config.pairs == pairs
+    assert multi_pair._config.dryrun is True
+    assert multi_pair._config.id is not None
+
+
+@pytest.mark.parametrize('pairs', [[], None, [{PAIR_CONFIG: None}], [{}]])
+def test_load_configs_invalid(mocker, multi_pair, pairs):
+    mocker.patch('builtins.open', mocker.mock_open())
+    mocker.patch.object(yaml, 'safe_load', return_value={
+        'dryrun': True,
+        'pairs': pairs,
+        'twilio_cfg_path': 'path/to/twilio',
+        'use_test_api': False
+    })
+
+    with pytest.raises(MultiPairConfigurationError):
+        multi_pair._load_configs('path/to/config')
+
+
+@pytest.mark.parametrize('fallback', [True, False])
+def test_post_setup(mocker, multi_pair, mock_post_setup, fallback):
+    eth, btc = make_pair('ETH'), make_pair('BTC')
+    mock_post_setup.side_effect = [eth, btc]
+    multi_pair._config = make_config(
+        [{PAIR_CONFIG: 'path/to/eth'}, {PAIR_RESUME_ID: 'abc'}])
+    mocker.patch.object(multi_pair, 'logger', create=True)
+    running_db_writer = multi_pair.resources.db_writer
+    if not fallback:
+        multi_pair.resources = None
+
+    multi_pair._post_setup(FAKE_ARGUMENTS)
+
+    multi_pair_autotrageur.parse_keyfile.assert_called_once_with(
+        'path/to/keyfile', False, True)
+    multi_pair_autotrageur.load_twilio.assert_called_once_with(
+        'path/to/twilio', multi_pair.logger)
+    assert multi_pair.resources.logger is multi_pair.logger
+    if fallback:
+        # The writer of the live run is kept.
+        multi_pair_autotrageur.DBWriter.assert_not_called()
+        assert multi_pair.resources.db_writer is running_db_writer
+    else:
+        multi_pair_autotrageur.DBWriter.assert_called_once_with()
+        assert (multi_pair.resources.db_writer
+                is multi_pair_autotrageur.DBWriter.return_value)
+    mock_post_setup.assert_has_calls([
+        mocker.call(multi_pair.resources), mocker.call(multi_pair.resources)])
+    assert multi_pair.pairs == [eth, btc]
+    assert multi_pair._due == [eth, btc]
+    assert eth.poll_scheduler.on_wake == multi_pair._wakeup.set
+    assert btc.poll_scheduler.on_wake == multi_pair._wakeup.set
+
+    eth._load_configs.assert_called_once_with('path/to/eth')
+    btc._load_configs.assert_not_called()
+    eth_arguments = dict(FAKE_ARGUMENTS, **{'--resume_id': None})
+    btc_arguments = dict(FAKE_ARGUMENTS, **{'--resume_id': 'abc'})
+    eth._setup.assert_called_once_with(eth_arguments)
+    eth._post_setup.assert_called_once_with(eth_arguments)
+    btc._setup.assert_called_once_with(btc_arguments)
+    btc._post_setup.assert_called_once_with(btc_arguments)
+
+
+@pytest.mark.parametrize('dryrun, use_test_api', [
+    (False, False), (True, True)])
+def test_post_setup_mismatch(mocker, multi_pair, mock_post_setup, dryrun,
+                             use_test_api):
+    pair = make_pair(dryrun=dryrun, use_test_api=use_test_api)
+    mock_post_setup.return_value = pair
+    multi_pair._config = make_config([{PAIR_CONFIG: 'path/to/eth'}])
+    mocker.patch.object(multi_pair, 'logger', create=True)
+
+    with pytest.raises(MultiPairConfigurationError):
+        multi_pair._post_setup(FAKE_ARGUMENTS)
+
+    pair._post_setup.assert_not_called()
+
+
+def test_post_setup_duplicate(mocker, multi_pair, mock_post_setup):
+    mock_post_setup.side_effect = [make_pair('ETH'), make_pair('ETH')]
+    multi_pair._config = make_config(
+        [{PAIR_CONFIG: 'path/to/eth'}, {PAIR_CONFIG: 'path/to/eth'}])
+    mocker.patch.object(multi_pair, 'logger', create=True)
+
+    with pytest.raises(MultiPairConfigurationError):
+        multi_pair._post_setup(FAKE_ARGUMENTS)
+
+
+@pytest.mark.parametrize('opportunities', [
+    [False, False], [True, False], [True, True]])
+def test_poll_opportunity(multi_pair, opportunities):
+    pairs = [make_pair('ETH'), make_pair('BTC'), make_pair('XRP')]
+    for pair, is_opportunity in zip(pairs, opportunities):
+        pair._poll_opportunity.return_value = is_opportunity
+    multi_pair.pairs = pairs
+    multi_pair._due = pairs[:2]
+
+    result = multi_pair._poll_opportunity()
+
+    multi_pair.resources.book_fetcher.prefetch.assert_called_once_with([
+        pairs[0].trader1, pairs[0].trader2,
+        pairs[1].trader1, pairs[1].trader2])
+    pairs[2]._poll_opportunity.assert_not_called()
+    assert result is any(opportunities)
+    assert multi_pair._opportunities == [
+        pair for pair, is_opportunity in zip(pairs, opportunities)
+        if is_opportunity]
+
+
+def test_execute_trade(multi_pair):
+    pairs = [make_pair('ETH'), make_pair('BTC')]
+    multi_pair.pairs = pairs
+    multi_pair._opportunities = pairs[1:]
+
+    multi_pair._execute_trade()
+
+    pairs[0]._execute_trade.assert_not_called()
+    pairs[1]._execute_trade.assert_called_once_with()
+
+
+def test_clean_up_and_is_poll_logged(multi_pair):
+    pairs = [make_pair('ETH'), make_pair('BTC'), make_pair('XRP')]
+    pairs[0]._is_poll_logged.return_value = False
+    pairs[1]._is_poll_logged.return_value = True
+    multi_pair.pairs = pairs
+    multi_pair._due = pairs[:2]
+
+    multi_pair._clean_up()
+    result = multi_pair._is_poll_logged()
+
+    assert result is True
+    for pair in pairs[:2]:
+        pair._clean_up.assert_called_once_with()
+        pair._is_poll_logged.assert_called_once_with()
+    pairs[2]._clean_up.assert_not_called()
+    pairs[2]._is_poll_logged.assert_not_called()
+
+
+def test_setup_refreshes(mocker, multi_pair):
+    mock_update_forex = mocker.patch.object(
+        multi_pair_autotrageur, 'update_forex')
+    eth, btc = make_pair('ETH'), make_pair('BTC')
+    multi_pair.pairs = [eth, btc]
+    other_job = schedule.every().hour.do(mocker.Mock()).tag(
+        (FOREX_SCHEDULE_TAG, 'another bot'))
+
+    # A fallback re-setup replaces the host's jobs, and keeps the others.
+    multi_pair._MultiPairAutotrageur__setup_refreshes()
+    multi_pair._MultiPairAutotrageur__setup_refreshes()
+
+    # One taker fee refresh per exchange, one forex refresh per quote.
+    taker_fee_jobs = [job for job in schedule.jobs
+                      if (TAKER_FEE_SCHEDULE_TAG, id(multi_pair)) in job.tags]
+    forex_jobs = [job for job in schedule.jobs
+                  if (FOREX_SCHEDULE_TAG, id(multi_pair)) in job.tags]
+    assert [job.job_func.args for job in taker_fee_jobs] == [
+        (eth.trader1,), (eth.trader2,)]
+    krw_traders = [eth.trader2, btc.trader2]
+    assert [job.job_func.args for job in forex_jobs] == [
+        (multi_pair.resources.db_writer, krw_traders)]
+    assert other_job in schedule.jobs
+    assert len(schedule.jobs) == 4
+    mock_update_forex.assert_called_with(
+        multi_pair.resources.db_writer, krw_traders)
+    assert mock_update_forex.call_count == 2
+
+    schedule.clear()
+
+
+def test_export_state_and_final_log(mocker, multi_pair):
+    pairs = [make_pair('ETH'), make_pair('BTC')]
+    multi_pair.pairs = pairs
+    db_writer = multi_pair.resources.db_writer
+    db_writer.close.side_effect = lambda: [
+        pair._export_state.assert_called_once_with() for pair in pairs]
+
+    multi_pair._export_state()
+    multi_pair._final_log()
+
+    # The shared writer is closed after every pair exported.
+    db_writer.close.assert_called_once_with()
+    db_writer.log_stats.assert_called_once_with()
+    for pair in pairs:
+        pair._export_state.assert_called_once_with()
+        pair._final_log.assert_called_once_with()
+
+
+def test_alert(multi_pair):
+    multi_pair.pairs = [make_pair('ETH'), make_pair('BTC')]
+
+    multi_pair._alert('subject')
+
+    multi_pair.pairs[0]._alert.assert_called_once_with('subject')
+    multi_pair.pairs[1]._alert.assert_not_called()
+
+
+def test_wait(mocker, multi_pair):
+    eth, btc = make_pair('ETH', wait=4), make_pair('BTC', wait=2)
+    multi_pair.pairs = [eth, btc]
+    multi_pair._due = [eth, btc]
+    now = [100]
+    mocker.patch.object(time, 'time', side_effect=lambda: now[0])
+    mock_wait = mocker.patch.object(
+        multi_pair._wakeup, 'wait',
+        side_effect=lambda seconds: now.append(now.pop() + seconds))
+
+    # BTC is due first.
+    multi_pair._wait()
+
+    mock_wait.assert_called_once_with(2)
+    assert multi_pair._due == [btc]
+
+    # Then both are due at once.
+    multi_pair._wait()
+
+    mock_wait.assert_called_with(2)
+    assert multi_pair._due == [eth, btc]
+    assert now == [104]
+
+
+def test_wait_woken(mocker, multi_pair):
+    eth, btc = make_pair('ETH', wait=4), make_pair('BTC', wait=2)
+    multi_pair.pairs = [eth, btc]
+    multi_pair._due = [eth, btc]
+    now = [100]
+    mocker.patch.object(time, 'time', side_effect=lambda: now[0])
+    eth.poll_scheduler.consume_wake.return_value = True
+
+    # A feed update of ETH ends the wait early.
+    multi_pair._wakeup.set()
+    multi_pair._wait()
+
+    assert multi_pair._due == [eth]
+    assert not multi_pair._wakeup.is_set()
+    eth.poll_scheduler.start_poll.assert_called_once_with()
+    btc.poll_scheduler.start_poll.assert_not_called()
+
+
+def test_wait_woken_interval(mocker, multi_pair):
+    eth, btc = make_pair('ETH', wait=4), make_pair('BTC', wait=2)
+    multi_pair.pairs = [eth, btc]
+    multi_pair._due = [eth, btc]
+    now = [100]
+    mocker.patch.object(time, 'time', side_effect=lambda: now[0])
+    mock_wait = mocker.patch.object(
+        multi_pair._wakeup, 'wait',
+        side_effect=lambda seconds: now.append(now.pop() + seconds))
+    eth.poll_scheduler.get_wake_time.return_value = 101
+    eth.poll_scheduler.consume_wake.side_effect = lambda: now[0] >= 101
+
+    # ETH was woken within its wake interval, so is polled at its end.
+    multi_pair._wait()
+
+    mock_wait.assert_called_once_with(1)
+    assert multi_pair._due == [eth]
@@ -0,0 +1,103 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.arbitrage.poll_scheduler import PollScheduler
+
+MIN_WAIT = 2
+MAX_WAIT = 10
+
+
+@pytest.fixture()
+def poll_scheduler():
+    return PollScheduler(MIN_WAIT, MAX_WAIT)
+
+
+@pytest.mark.parametrize('target_distance, spread_min, result', [
+    (None, Decimal('1'), MAX_WAIT),
+    (Decimal('0'), Decimal('1'), MIN_WAIT),
+    (Decimal('1'), Decimal('1'), MIN_WAIT),
+    (Decimal('3'), Decimal('1'), 6),
+    (Decimal('0.3'), Decimal('0.1'), 6),
+    (Decimal('5'), Decimal('1'), MAX_WAIT),
+    (Decimal('50'), Decimal('1'), MAX_WAIT),
+])
+def test_get_wait(poll_scheduler, target_distance, spread_min, result):
+    assert poll_scheduler.get_wait(
+        target_distance, spread_min) == pytest.approx(result)
+
+
+def test_wait_timeout(poll_scheduler):
+    start = time.time()
+    assert poll_scheduler.wait(0.1) is False
+    assert time.time() - start >= 0.1
+
+
+def test_wake(poll_scheduler):
+    timer = threading.Timer(0.1, poll_scheduler.wake)
+    timer.start()
+    start = time.time()
+    assert poll_scheduler.wait(5) is True
+    assert time.time() - start < 5
+
+    # The wakeup is consumed by the wait.
+    assert poll_scheduler.wait(0) is False
+
+
+def test_wake_interval():
+    poll_scheduler = PollScheduler(MIN_WAIT, MAX_WAIT, wake_interval=0.2)
+    poll_scheduler.start_poll()
+    start = time.time()
+
+    # A wakeup soon after a poll is held until the interval has passed.
+    poll_scheduler.wake()
+    assert poll_scheduler.wait(5) is True
+    assert 0.2 <= time.time() - start < 5
+
+    # The wait never exceeds its timeout.
+    poll_scheduler.wake()
+    start = time.time()
+    assert poll_scheduler.wait(0.05) is True
+    assert time.time() - start < 0.2
+
+
+def test_wake_on_wake(mocker):
+    mock_on_wake = mocker.Mock()
+    poll_scheduler = PollScheduler(MIN_WAIT, MAX_WAIT, on_wake=mock_on_wake)
+
+    poll_scheduler.wake()
+
+    mock_on_wake.assert_called_once_with()
+
+
+def test_consume_wake(poll_scheduler):
+    assert poll_scheduler.consume_wake() is False
+
+    poll_scheduler.wake()
+
+    assert poll_scheduler.consume_wake() is True
+    assert poll_scheduler.consume_wake() is False
+    assert poll_scheduler.wait(0) is False
+
+
+def test_consume_wake_interval(mocker):
+    mocker.patch.object(time, 'time', return_value=100)
+    poll_scheduler = PollScheduler(MIN_WAIT, MAX_WAIT, wake_interval=1)
+    assert poll_scheduler.get_wake_time() is None
+
+    poll_scheduler.start_poll()
+    poll_scheduler.wake()
+
+    # The wakeup is kept until the interval has passed.
+    assert poll_scheduler.get_wake_time() == 101
+    assert poll_scheduler.consume_wake() is False
+    time.time.return_value = 101
+    assert poll_scheduler.consume_wake() is True
+    assert poll_scheduler.get_wake_time() is None
+
+    # A poll covers a pending wakeup.
+    poll_scheduler.wake()
+    poll_scheduler.start_poll()
+    assert poll_scheduler.get_wake_time() is None
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from autotrageur.bot.arbitrage.arbseeker import SpreadOpportunity
+from autotrageur.bot.arbitrage.poll_telemetry import (POLL_RECORD_DTYPE,
+                                                      PollTelemetry,
+                                                      read_poll_records)
+
+
+def make_spread_opp(i):
+    return SpreadOpportunity(
+        'id', Decimal(i) / 4, -Decimal(i) / 4, Decimal('100.25') + i,
+        Decimal('101.5') + i, Decimal('99.75') + i, Decimal('100') + i,
+        None, None)
+
+
+@pytest.fixture()
+def telemetry_path(tmpdir):
+    return str(tmpdir.join('telemetry', 'run.bin'))
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'capacity': 0},
+    {'log_sample_rate': 0},
+    {'batch_size': 0},
+    {'capacity': 4, 'batch_size': 5},
+])
+def test_init_invalid(telemetry_path, kwargs):
+    with pytest.raises(ValueError):
+        PollTelemetry(telemetry_path, **kwargs)
+
+
+def test_record(telemetry_path):
+    telemetry = PollTelemetry(telemetry_path, capacity=8, batch_size=4)
+
+    telemetry.record(make_spread_opp(1), 2, timestamp=1000.5)
+
+    records = telemetry.get_recent()
+    assert records.dtype == POLL_RECORD_DTYPE
+    assert len(records) == 1
+    assert records[0]['timestamp'] == 1000.5
+    assert records[0]['e1_buy'] == 101.25
+    assert records[0]['e2_buy'] == 102.5
+    assert records[0]['e1_sell'] == 100.75
+    assert records[0]['e2_sell'] == 101
+    assert records[0]['e1_spread'] == 0.25
+    assert records[0]['e2_spread'] == -0.25
+    assert records[0]['target_index'] == 2
+
+
+def test_record_batches(telemetry_path):
+    telemetry = PollTelemetry(telemetry_path, capacity=4, batch_size=3)
+
+    for i in range(2):
+        telemetry.record(make_spread_opp(i), i, timestamp=i)
+    with pytest.raises(FileNotFoundError):
+        read_poll_records(telemetry_path)
+
+    # The third record fills the batch; later ones wrap around the ring.
+    for i in range(2, 7):
+        telemetry.record(make_spread_opp(i), i, timestamp=i)
+    assert list(read_poll_records(telemetry_path)['timestamp']) == [
+        0, 1, 2, 3, 4, 5]
+    assert list(telemetry.get_recent()['timestamp']) == [3, 4, 5, 6]
+
+    telemetry.flush()
+    telemetry.flush()
+    records = read_poll_records(telemetry_path)
+    assert list(records['timestamp']) == list(range(7))
+    assert list(records['target_index']) == list(range(7))
+
+
+def test_flush_appends(telemetry_path):
+    for start in (0, 3):
+        telemetry = PollTelemetry(telemetry_path, capacity=4, batch_size=4)
+        for i in range(start, start + 3):
+            telemetry.record(make_spread_opp(i), 0, timestamp=i)
+        telemetry.flush()
+
+    assert list(read_poll_records(telemetry_path)['timestamp']) == list(
+        range(6))
+
+
+def test_flush_unwritable(mocker, tmpdir):
+    blocker = tmpdir.join('blocker')
+    blocker.write('')
+    mock_warning = mocker.patch('logging.warning')
+    telemetry = PollTelemetry(str(blocker.join('run.bin')), batch_size=1)
+
+    telemetry.record(make_spread_opp(0), 0)
+
+    mock_warning.assert_called_once()
+    assert len(telemetry.get_recent()) == 1
+
+
+@pytest.mark.parametrize('log_sample_rate, expected', [
+    (1, [True] * 6),
+    (3, [True, False, False, True, False, False]),
+])
+def test_sample(telemetry_path, log_sample_rate, expected):
+    telemetry = PollTelemetry(telemetry_path, log_sample_rate=log_sample_rate)
+
+    result = []
+    for _ in expected:
+        result.append(telemetry.sample())
+        assert telemetry.sampled is result[-1]
+
+    assert result == expected
+    assert telemetry.poll_count == len(expected)
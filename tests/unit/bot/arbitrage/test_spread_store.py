@@ -0,0 +1,100 @@
+import os
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from autotrageur.bot.arbitrage.arbseeker import SpreadOpportunity
+from autotrageur.bot.arbitrage.spread_store import (SPREAD_COLUMNS_DTYPE,
+                                                    SpreadStore)
+
+
+def make_spread_opp(i, forex_id=None):
+    return SpreadOpportunity(
+        'opp-{}'.format(i), Decimal(i) / 4, -Decimal(i) / 4,
+        Decimal('100.25') + i, Decimal('101.5') + i, Decimal('99.75') + i,
+        Decimal('100') + i, forex_id, 'e2-forex')
+
+
+@pytest.fixture()
+def store_root(tmpdir):
+    return str(tmpdir.join('spreads'))
+
+
+def fill(store, timestamps):
+    for ts in timestamps:
+        store.append(make_spread_opp(int(ts)), timestamp=ts)
+    store.flush()
+
+
+def test_append_read(store_root):
+    store = SpreadStore(store_root, batch_size=4)
+
+    store.append(make_spread_opp(1, 'e1-forex'), timestamp=1000.5)
+    assert store.read()['timestamp'].size == 0
+    store.flush()
+
+    result = store.read()
+    assert set(result) == set(SPREAD_COLUMNS_DTYPE.names)
+    assert list(result['timestamp']) == [1000.5]
+    assert list(result['id']) == [b'opp-1']
+    assert list(result['e1_spread']) == [0.25]
+    assert list(result['e2_spread']) == [-0.25]
+    assert list(result['e1_buy']) == [101.25]
+    assert list(result['e2_buy']) == [102.5]
+    assert list(result['e1_sell']) == [100.75]
+    assert list(result['e2_sell']) == [101]
+    assert list(result['e1_forex_rate_id']) == [b'e1-forex']
+    assert list(result['e2_forex_rate_id']) == [b'e2-forex']
+
+
+def test_rotation(store_root):
+    store = SpreadStore(store_root, segment_size=3, batch_size=2)
+
+    fill(store, range(100, 108))
+
+    assert sorted(os.listdir(store_root)) == [
+        '000000000100000', '000000000103000', '000000000106000']
+    assert list(store.read()['timestamp']) == list(range(100, 108))
+
+    # A new writer starts a new segment.
+    fill(SpreadStore(store_root, segment_size=3), [108])
+    assert len(os.listdir(store_root)) == 4
+    assert list(store.read()['timestamp']) == list(range(100, 109))
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (None, None, list(range(100, 110))),
+    (102, None, list(range(102, 110))),
+    (None, 105, list(range(100, 105))),
+    (103.5, 106, [104, 105]),
+    (106, 106, []),
+    (50, 60, []),
+    (200, None, []),
+])
+def test_read_range(store_root, start, end, expected):
+    store = SpreadStore(store_root, segment_size=3, batch_size=4)
+    fill(store, range(100, 110))
+
+    result = store.read(start, end, columns=['e1_spread'])
+
+    assert list(result) == ['e1_spread']
+    assert result['e1_spread'].dtype == np.float64
+    assert list(result['e1_spread']) == [ts / 4 for ts in expected]
+
+
+def test_read_uneven_columns(store_root):
+    store = SpreadStore(store_root)
+    fill(store, [100, 101])
+
+    # Simulate a write interrupted after the first column.
+    segment = os.path.join(store_root, os.listdir(store_root)[0])
+    with open(os.path.join(segment, 'timestamp.bin'), 'ab') as f:
+        f.write(np.array([102], dtype='<f8').tobytes())
+
+    assert list(store.read()['timestamp']) == [100, 101]
+
+
+def test_read_empty(store_root):
+    result = SpreadStore(store_root).read()
+    assert all(values.size == 0 for values in result.values())
@@ -138,3 +138,76 @@ class TestCalcSpread:
     def test_calc_fixed_spread_exceptions(self, buy_price, sell_price, buy_fee, sell_fee):
         with pytest.raises(TypeError, message='mixed float and decimal arithmetic'):
             spreadcalculator.calc_fixed_spread(buy_price, sell_price, buy_fee, sell_fee, False)
+
+
+# Prices and fees of four exchanges, the third without a buy price.
+matrix_buy_prices = [
+    Decimal('100000.12345678'), Decimal('1.05'), None, Decimal('101000.5')]
+matrix_sell_prices = [
+    Decimal('105000.12963069'), Decimal('1.00'), Decimal('99999.9'),
+    Decimal('100500.25')]
+matrix_buy_fees = [
+    Decimal('0.0095238'), Decimal('0.01'), Decimal('0.0015'), Decimal('0')]
+matrix_sell_fees = [
+    Decimal('0.01'), Decimal('0.0095238'), Decimal('0.0025'), Decimal('0')]
+matrix_buy_incl_fees = [True, False, True, False]
+
+
+def test_calc_fixed_spread_matrix():
+    result = spreadcalculator.calc_fixed_spread_matrix(
+        matrix_buy_prices, matrix_sell_prices, matrix_buy_fees,
+        matrix_sell_fees, matrix_buy_incl_fees)
+
+    assert result.shape == (4, 4)
+    for i in range(4):
+        for j in range(4):
+            if i == j or matrix_buy_prices[i] is None:
+                assert result[i][j] is None
+            else:
+                # Same digits as the pairwise calculation.
+                assert result[i][j] == spreadcalculator.calc_fixed_spread(
+                    matrix_buy_prices[i], matrix_sell_prices[j],
+                    matrix_buy_fees[i], matrix_sell_fees[j],
+                    matrix_buy_incl_fees[i])
+                assert str(result[i][j]) == str(
+                    spreadcalculator.calc_fixed_spread(
+                        matrix_buy_prices[i], matrix_sell_prices[j],
+                        matrix_buy_fees[i], matrix_sell_fees[j],
+                        matrix_buy_incl_fees[i]))
+
+
+@pytest.mark.parametrize('buy_prices, sell_prices', [
+    ([None, None], [Decimal('1'), Decimal('1')]),
+    ([Decimal('1'), Decimal('1')], [Decimal('0'), Decimal('-1')]),
+])
+def test_calc_fixed_spread_matrix_invalid(buy_prices, sell_prices):
+    result = spreadcalculator.calc_fixed_spread_matrix(
+        buy_prices, sell_prices, [Decimal('0.01')] * 2, [Decimal('0.01')] * 2,
+        [False] * 2)
+
+    assert result.tolist() == [[None, None], [None, None]]
+
+
+def test_calc_fixed_spread_matrix_exceptions():
+    with pytest.raises(TypeError):
+        spreadcalculator.calc_fixed_spread_matrix(
+            [Decimal('100.00'), Decimal('100.00')], [100.00, 100.00],
+            [Decimal('0.10')] * 2, [0.01] * 2, [False] * 2)
+
+
+@pytest.mark.parametrize('spread', [
+    Decimal('-1.5'), Decimal('0'), Decimal('0.25'), Decimal('3')])
+@pytest.mark.parametrize('buy_fee, sell_fee', [
+    (Decimal('0'), Decimal('0')),
+    (Decimal('0.0015'), Decimal('0.0025')),
+    (Decimal('0.01'), Decimal('0.0095238'))])
+@pytest.mark.parametrize('buy_incl_fee', [True, False])
+def test_calc_trigger_ratio(spread, buy_fee, sell_fee, buy_incl_fee):
+    ratio = spreadcalculator.calc_trigger_ratio(
+        spread, buy_fee, sell_fee, buy_incl_fee)
+    buy_price = Decimal('1234.5678')
+
+    # Selling at the ratio of the buy price gives back the spread.
+    result = spreadcalculator.calc_fixed_spread(
+        buy_price, buy_price * ratio, buy_fee, sell_fee, buy_incl_fee)
+    assert abs(result - spread) < Decimal('1e-20')
@@ -0,0 +1,157 @@
+import threading
+import time
+
+import MySQLdb
+import pytest
+
+from autotrageur.bot.common.db_pool import (DEFAULT_PING_INTERVAL,
+                                            DEFAULT_POOL_SIZE, DBPool,
+                                            DBPoolTimeoutError)
+
+FAKE_USER = 'user'
+FAKE_PASSWORD = 'password'
+FAKE_NAME = 'fcf_trade_history'
+
+
+@pytest.fixture()
+def clock(mocker):
+    return mocker.Mock(return_value=0)
+
+
+@pytest.fixture()
+def connect(mocker):
+    return mocker.Mock(side_effect=lambda **kwargs: mocker.Mock())
+
+
+@pytest.fixture()
+def db_pool(connect, clock):
+    return DBPool(FAKE_USER, FAKE_PASSWORD, FAKE_NAME, max_size=2,
+                  ping_interval=60, connect=connect, clock=clock)
+
+
+def test_init(connect):
+    db_pool = DBPool(FAKE_USER, FAKE_PASSWORD, FAKE_NAME, connect=connect)
+    assert db_pool.max_size == DEFAULT_POOL_SIZE
+    assert db_pool.ping_interval == DEFAULT_PING_INTERVAL
+    assert db_pool.created_count == 0
+    connect.assert_not_called()
+
+
+def test_init_error(connect):
+    with pytest.raises(ValueError):
+        DBPool(FAKE_USER, FAKE_PASSWORD, FAKE_NAME, max_size=0,
+               connect=connect)
+
+
+def test_connection_reused(db_pool, connect):
+    with db_pool.connection() as conn:
+        pass
+    with db_pool.connection() as conn_again:
+        pass
+
+    assert conn_again is conn
+    connect.assert_called_once_with(
+        user=FAKE_USER, passwd=FAKE_PASSWORD, db=FAKE_NAME)
+    assert db_pool.created_count == 1
+    assert db_pool.checkout_count == 2
+    conn.ping.assert_not_called()
+
+
+def test_connection_per_thread(db_pool):
+    with db_pool.connection() as conn1:
+        with db_pool.connection() as conn2:
+            assert conn1 is not conn2
+            assert db_pool.max_in_use == 2
+
+
+def test_connection_wait(db_pool):
+    results = []
+
+    def checkout():
+        with db_pool.connection() as conn:
+            results.append(conn)
+
+    with db_pool.connection():
+        with db_pool.connection() as conn2:
+            thread = threading.Thread(target=checkout)
+            thread.start()
+            time.sleep(0.1)
+            assert not results
+        thread.join(5)
+
+    assert results == [conn2]
+    assert db_pool.wait_count == 1
+    assert db_pool.created_count == 2
+
+
+def test_connection_timeout(db_pool):
+    with db_pool.connection(), db_pool.connection():
+        with pytest.raises(DBPoolTimeoutError):
+            with db_pool.connection(timeout=0.01):
+                pass
+
+
+@pytest.mark.parametrize('ping_error', [None, MySQLdb.OperationalError])
+def test_connection_health_check(db_pool, connect, clock, ping_error):
+    with db_pool.connection() as conn:
+        pass
+    conn.ping.side_effect = ping_error
+    clock.return_value = 60
+
+    with db_pool.connection() as checked:
+        pass
+
+    conn.ping.assert_called_once_with()
+    if ping_error is None:
+        assert checked is conn
+        assert db_pool.failed_check_count == 0
+    else:
+        assert checked is not conn
+        conn.close.assert_called_once_with()
+        assert connect.call_count == 2
+        assert db_pool.failed_check_count == 1
+
+
+@pytest.mark.parametrize('error, reused', [
+    (ValueError, True),
+    (MySQLdb.OperationalError, False)
+])
+def test_connection_error(db_pool, connect, error, reused):
+    with pytest.raises(error):
+        with db_pool.connection() as conn:
+            raise error()
+
+    conn.rollback.assert_called_once_with() if reused else \
+        conn.close.assert_called_once_with()
+    with db_pool.connection() as conn_again:
+        assert (conn_again is conn) == reused
+
+
+def test_close(db_pool):
+    with db_pool.connection() as conn:
+        pass
+
+    db_pool.close()
+
+    conn.close.assert_called_once_with()
+    with db_pool.connection() as conn_again:
+        assert conn_again is not conn
+
+
+def test_close_in_use(db_pool):
+    with db_pool.connection() as conn:
+        db_pool.close()
+        conn.close.assert_not_called()
+
+    # Released after the close, the connection is not pooled.
+    conn.close.assert_called_once_with()
+    with db_pool.connection() as conn_again:
+        assert conn_again is not conn
+    with db_pool.connection() as conn_last:
+        assert conn_last is conn_again
+
+
+def test_log_stats(mocker, db_pool):
+    mock_info = mocker.patch('logging.info')
+    db_pool.log_stats()
+    mock_info.assert_called_once()
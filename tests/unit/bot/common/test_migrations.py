@@ -0,0 +1,187 @@
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.common.migrations import (MIGRATIONS, Migration,
+                                               SchemaVersionError,
+                                               check_schema_version,
+                                               get_schema_version, migrate)
+from autotrageur.bot.common.storage import SQLiteBackend
+
+FAKE_MIGRATIONS = [
+    Migration(1, 'Add first index', [
+        "CREATE INDEX idx_first ON forex_rate (quote);"]),
+    Migration(2, 'Add second index', [
+        "CREATE INDEX idx_second ON trades (exchange);"]),
+]
+
+FAKE_TRADE = {
+    'trade_opportunity_id': 'opp',
+    'side': 'buy',
+    'autotrageur_config_id': 'config',
+    'autotrageur_config_start_timestamp': 0,
+    'exchange': 'kraken',
+    'base': 'BTC',
+    'quote': 'USD',
+    'pre_fee_base': Decimal('0.1'),
+    'pre_fee_quote': Decimal('700'),
+    'post_fee_base': Decimal('0.1'),
+    'post_fee_quote': Decimal('699.3'),
+    'fees': Decimal('0.7'),
+    'fee_asset': 'USD',
+    'price': Decimal('7000'),
+    'true_price': Decimal('7000'),
+    'type': 'limit',
+    'order_id': 'order',
+    'exchange_timestamp': 0,
+    'local_timestamp': 0,
+    'extra_info': None
+}
+
+
+@pytest.fixture()
+def backend():
+    backend = SQLiteBackend(':memory:')
+    yield backend
+    backend.close()
+
+
+@pytest.fixture()
+def fake_migrations(mocker):
+    mocker.patch(
+        'autotrageur.bot.common.migrations.MIGRATIONS', FAKE_MIGRATIONS)
+
+
+def get_indexes(backend):
+    return {name for (name,) in backend.execute_parametrized_query(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND name LIKE 'idx_%';", ())}
+
+
+def test_migrate_latest(backend):
+    assert get_schema_version(backend) == 0
+
+    assert migrate(backend) == MIGRATIONS[-1].version
+    assert get_schema_version(backend) == MIGRATIONS[-1].version
+    assert {'idx_trades_config_exchange',
+            'idx_forex_rate_quote_timestamp',
+            'idx_fcf_state_catalog'} <= get_indexes(backend)
+
+
+@pytest.mark.usefixtures('fake_migrations')
+def test_migrate_target(backend):
+    assert migrate(backend, 1) == 1
+    assert get_indexes(backend) == {'idx_slippage_stats_exchange',
+                                    'idx_first'}
+
+    assert migrate(backend) == 2
+    assert get_indexes(backend) == {'idx_slippage_stats_exchange',
+                                    'idx_first', 'idx_second'}
+    assert backend.execute_parametrized_query(
+        "SELECT version, description FROM schema_version "
+        "ORDER BY version;", ()) == [
+            (1, 'Add first index'), (2, 'Add second index')]
+
+
+@pytest.mark.usefixtures('fake_migrations')
+def test_migrate_applied(backend):
+    migrate(backend)
+
+    # Applied migrations are not run again.
+    assert migrate(backend) == 2
+    assert migrate(backend, 2) == 2
+
+
+@pytest.mark.usefixtures('fake_migrations')
+@pytest.mark.parametrize('target', [-1, 3])
+def test_migrate_unknown_target(backend, target):
+    with pytest.raises(SchemaVersionError):
+        migrate(backend, target)
+
+
+@pytest.mark.usefixtures('fake_migrations')
+def test_migrate_backwards(backend):
+    migrate(backend)
+
+    with pytest.raises(SchemaVersionError):
+        migrate(backend, 1)
+
+
+def test_migrate_backfill_run_rollup(backend):
+    for side in ('buy', 'sell'):
+        backend.insert_row(
+            'trades', dict(FAKE_TRADE, side=side),
+            ('trade_opportunity_id', 'side'))
+    backend.insert_row(
+        'trades', dict(FAKE_TRADE, trade_opportunity_id='opp2', fees=0,
+                       fee_asset='BNB'), ('trade_opportunity_id', 'side'))
+
+    migrate(backend)
+
+    assert backend.execute_parametrized_query(
+        "SELECT exchange, fee_asset, trade_count, base_volume, quote_volume, "
+        "fees FROM run_rollup WHERE autotrageur_config_id = %s "
+        "ORDER BY fee_asset;", ('config',)) == [
+            ('kraken', 'BNB', 1, Decimal('0.1'), Decimal('699.3'),
+             Decimal('0')),
+            ('kraken', 'USD', 2, Decimal('0.2'), Decimal('1398.6'),
+             Decimal('1.4'))]
+
+
+def test_migrate_add_slippage_stats(backend):
+    # Databases created before the snapshots have no slippage_stats table.
+    backend.execute_parametrized_query("DROP TABLE slippage_stats;", ())
+
+    migrate(backend)
+
+    backend.insert_row('slippage_stats', {
+        'trade_opportunity_id': 'opp',
+        'side': 'buy',
+        'exchange': 'kraken',
+        'dryrun': 1,
+        'trade_count': 1,
+        'mean': Decimal('0.000000000000000001'),
+        'm2': Decimal('0'),
+        'local_timestamp': 0,
+        'autotrageur_config_id': 'config'
+    }, ('trade_opportunity_id', 'side'))
+    assert backend.execute_parametrized_query(
+        "SELECT mean, autotrageur_config_id FROM slippage_stats;", ()) == [
+            (Decimal('0.000000000000000001'), 'config')]
+    assert {'idx_slippage_stats_exchange',
+            'idx_slippage_stats_config'} <= get_indexes(backend)
+
+
+def test_migrate_key_slippage_stats(backend):
+    backend.insert_row(
+        'trades', FAKE_TRADE, ('trade_opportunity_id', 'side'))
+    for opp_id in ('opp', 'orphan'):
+        backend.insert_row('slippage_stats', {
+            'trade_opportunity_id': opp_id,
+            'side': 'buy',
+            'exchange': 'kraken',
+            'dryrun': 1,
+            'trade_count': 1,
+            'mean': Decimal('0'),
+            'm2': Decimal('0'),
+            'local_timestamp': 0
+        }, ('trade_opportunity_id', 'side'))
+
+    migrate(backend)
+
+    # Snapshots take the configuration of their trade.
+    assert backend.execute_parametrized_query(
+        "SELECT trade_opportunity_id, autotrageur_config_id "
+        "FROM slippage_stats ORDER BY trade_opportunity_id;", ()) == [
+            ('opp', 'config'), ('orphan', None)]
+    assert 'idx_slippage_stats_config' in get_indexes(backend)
+
+
+@pytest.mark.usefixtures('fake_migrations')
+def test_check_schema_version(backend):
+    migrate(backend, 1)
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(backend)
+
+    migrate(backend)
+    check_schema_version(backend)
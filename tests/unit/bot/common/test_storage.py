@@ -0,0 +1,166 @@
+import threading
+from decimal import Decimal
+
+import pytest
+
+import autotrageur.bot.common.storage as storage
+import fp_libs.db.maria_db_handler as db_handler
+from autotrageur.bot.common.storage import (MariaDBBackend, SQLiteBackend,
+                                            StorageNotStartedError)
+
+FAKE_FOREX = {
+    'id': 'forex',
+    'quote': 'KRW',
+    'rate': Decimal('1123.45678901'),
+    'local_timestamp': 1500000000
+}
+
+
+@pytest.fixture()
+def sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'fcf.db'))
+    yield backend
+    backend.close()
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT a FROM t WHERE b = %s AND c = %s",
+     "SELECT a FROM t WHERE b = ? AND c = ?"),
+    ("INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)",
+     "INSERT INTO t (a, b) VALUES (:a, :b)"),
+])
+def test_to_sqlite_params(query, expected):
+    assert storage._to_sqlite_params(query) == expected
+
+
+def test_not_started(mocker):
+    mocker.patch.object(storage, '_backend', None)
+    with pytest.raises(StorageNotStartedError):
+        storage.commit_all()
+
+
+def test_start_storage(mocker):
+    mocker.patch.object(storage, '_backend', None)
+    backend = mocker.Mock()
+
+    storage.start_storage(backend)
+    storage.insert_row('forex_rate', FAKE_FOREX, ('id',))
+    storage.commit_all()
+
+    backend.insert_row.assert_called_once_with(
+        'forex_rate', FAKE_FOREX, ('id',))
+    backend.commit.assert_called_once_with()
+
+
+def test_mariadb_backend(mocker):
+    mocker.patch.object(db_handler, 'start_db')
+    mocker.patch.object(db_handler, 'insert_row')
+    mock_insert_row_object = mocker.patch.object(storage, 'InsertRowObject')
+
+    backend = MariaDBBackend('user', 'password', 'fcf_trade_history')
+    backend.insert_row('forex_rate', FAKE_FOREX, ('id',))
+
+    db_handler.start_db.assert_called_once_with(
+        'user', 'password', 'fcf_trade_history')
+    mock_insert_row_object.assert_called_once_with(
+        'forex_rate', FAKE_FOREX, ('id',))
+    db_handler.insert_row.assert_called_once_with(
+        mock_insert_row_object.return_value)
+
+
+def test_mariadb_backend_lock(mocker):
+    mocker.patch.object(db_handler, 'start_db')
+    backend = MariaDBBackend('user', 'password', 'fcf_trade_history')
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_query(*args):
+        started.set()
+        release.wait(5)
+    mocker.patch.object(
+        db_handler, 'execute_parametrized_query', side_effect=slow_query)
+    mocker.patch.object(db_handler, 'commit_all')
+    querier = threading.Thread(
+        target=backend.execute_parametrized_query, args=("SELECT 1;", ()))
+    committer = threading.Thread(target=backend.commit)
+
+    querier.start()
+    assert started.wait(5)
+    committer.start()
+    committer.join(0.1)
+
+    # The commit waits for the query on the shared connection.
+    db_handler.commit_all.assert_not_called()
+    release.set()
+    querier.join(5)
+    committer.join(5)
+    db_handler.commit_all.assert_called_once_with()
+
+
+def test_sqlite_wal(sqlite_backend):
+    assert sqlite_backend.execute_parametrized_query(
+        "PRAGMA journal_mode", ()) == [('wal',)]
+
+
+def test_sqlite_insert_row(sqlite_backend):
+    sqlite_backend.insert_row('forex_rate', FAKE_FOREX, ('id',))
+    sqlite_backend.insert_row(
+        'forex_rate', dict(FAKE_FOREX, rate=Decimal('1200')), ('id',))
+    sqlite_backend.commit()
+
+    # The row is replaced, and Decimals are read back exactly.
+    assert sqlite_backend.execute_parametrized_query(
+        "SELECT rate, local_timestamp FROM forex_rate WHERE id = %s;",
+        ('forex',)) == [(Decimal('1200'), 1500000000)]
+
+
+def test_sqlite_execute_many(sqlite_backend):
+    rows = [dict(FAKE_FOREX, id=str(i)) for i in range(3)]
+    sqlite_backend.execute_many(
+        "INSERT INTO forex_rate (id, quote, rate, local_timestamp) "
+        "VALUES (%(id)s, %(quote)s, %(rate)s, %(local_timestamp)s)", rows)
+    sqlite_backend.commit()
+
+    assert sqlite_backend.execute_parametrized_query(
+        "UPDATE forex_rate SET quote = %s WHERE rate = %s;",
+        ('USD', FAKE_FOREX['rate'])) == 3
+
+
+def test_sqlite_rollback(sqlite_backend):
+    sqlite_backend.insert_row('forex_rate', FAKE_FOREX, ('id',))
+    sqlite_backend.rollback()
+
+    assert sqlite_backend.execute_parametrized_query(
+        "SELECT id FROM forex_rate;", ()) == []
+
+
+def test_sqlite_accumulate_rows(sqlite_backend):
+    sqlite_backend.execute_parametrized_query(
+        "CREATE TABLE totals (id VARCHAR(8) NOT NULL, count INTEGER NOT NULL, "
+        "amount DECTEXT NOT NULL, PRIMARY KEY (id));", ())
+    rows = [{'id': 'a', 'count': 1, 'amount': Decimal('0.1')},
+            {'id': 'b', 'count': 1, 'amount': Decimal('5')}]
+
+    sqlite_backend.accumulate_rows('totals', rows, ('id',))
+    sqlite_backend.accumulate_rows('totals', rows[:1] * 2, ('id',))
+    sqlite_backend.commit()
+
+    # Sums are exact; the decimals are not added as floats.
+    assert sqlite_backend.execute_parametrized_query(
+        "SELECT id, count, amount FROM totals ORDER BY id;", ()) == [
+            ('a', 3, Decimal('0.3')), ('b', 1, Decimal('5'))]
+
+
+def test_mariadb_accumulate_rows(mocker):
+    mocker.patch.object(db_handler, 'start_db')
+    backend = MariaDBBackend('user', 'password', 'fcf_trade_history')
+    mock_execute_many = mocker.patch.object(backend, 'execute_many')
+    rows = [{'id': 'a', 'count': 1, 'amount': Decimal('0.1')}]
+
+    backend.accumulate_rows('totals', rows, ('id',))
+
+    mock_execute_many.assert_called_once_with(
+        "INSERT INTO totals (id, count, amount) "
+        "VALUES (%(id)s, %(count)s, %(amount)s) "
+        "ON DUPLICATE KEY UPDATE count = count + VALUES(count), "
+        "amount = amount + VALUES(amount)", rows)
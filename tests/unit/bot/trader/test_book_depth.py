@@ -0,0 +1,39 @@
+import pytest
+
+from autotrageur.bot.trader.book_depth import BOOK_DEPTH_LIMITS, BookDepthTracker
+
+
+@pytest.fixture()
+def depth_tracker():
+    return BookDepthTracker(history=3, safety_factor=2)
+
+
+def test_get_depth_no_history(depth_tracker):
+    assert depth_tracker.get_depth() is None
+
+
+@pytest.mark.parametrize('levels_used, result', [
+    ([1], 5),
+    ([3], 10),
+    ([3, 8, 2], 20),
+    ([10, 30], 100),
+    ([499], 1000),
+    ([501], None),
+])
+def test_get_depth(depth_tracker, levels_used, result):
+    for levels in levels_used:
+        depth_tracker.record(levels)
+    assert depth_tracker.get_depth() == result
+
+
+def test_get_depth_history(depth_tracker):
+    # The deep walk falls out of the history after three shallower ones.
+    for levels in [40, 1, 1, 1]:
+        depth_tracker.record(levels)
+    assert depth_tracker.get_depth() == BOOK_DEPTH_LIMITS[0]
+
+
+def test_reset(depth_tracker):
+    depth_tracker.record(3)
+    depth_tracker.reset()
+    assert depth_tracker.get_depth() is None
@@ -0,0 +1,120 @@
+import pytest
+
+from autotrageur.bot.trader.book_feed import (ASKS, BIDS, BookFeedClient,
+                                              BookFeedSpec, BookFeedSpecError,
+                                              LocalOrderbook,
+                                              OrderbookSequenceException,
+                                              parse_book_feed)
+from autotrageur.bot.trader.book_feed_server import LocalBookFeedServer
+
+FAKE_BIDS = [[100.0, 1.0], [99.0, 2.0]]
+FAKE_ASKS = [[101.0, 1.5], [102.0, 3.0]]
+WAIT_TIMEOUT = 5
+
+
+@pytest.fixture()
+def local_orderbook():
+    book = LocalOrderbook()
+    book.apply_snapshot(5, FAKE_BIDS, FAKE_ASKS)
+    return book
+
+
+@pytest.fixture()
+def feed():
+    server = LocalBookFeedServer()
+    server.publish(FAKE_BIDS, FAKE_ASKS)
+    server.start()
+    client = BookFeedClient(*server.address)
+    client.start()
+    yield server, client
+    client.stop()
+    server.stop()
+
+
+def wait_for_sequence(client, sequence):
+    """Waits until the client's book reaches the sequence number."""
+    while client.book.sequence != sequence:
+        assert client.wait_for_update(WAIT_TIMEOUT)
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('bithumb:ETH/KRW@127.0.0.1:9001',
+     BookFeedSpec('bithumb', 'ETH/KRW', '127.0.0.1', 9001)),
+    ('Gemini:ETH/USD@feeds.local:80',
+     BookFeedSpec('gemini', 'ETH/USD', 'feeds.local', 80)),
+])
+def test_parse_book_feed(spec, expected):
+    assert parse_book_feed(spec) == expected
+
+
+@pytest.mark.parametrize('spec', [
+    'bithumb:ETH/KRW',
+    'bithumb:ETH/KRW@127.0.0.1',
+    'bithumb:ETH/KRW@127.0.0.1:port',
+    'ETH/KRW@127.0.0.1:9001',
+    ':ETH/KRW@127.0.0.1:9001',
+    'bithumb:ETHKRW@127.0.0.1:9001',
+    'bithumb:ETH/KRW@:9001',
+])
+def test_parse_book_feed_malformed(spec):
+    with pytest.raises(BookFeedSpecError):
+        parse_book_feed(spec)
+
+
+class TestLocalOrderbook:
+    def test_init(self):
+        book = LocalOrderbook()
+        assert book.is_synced is False
+        assert book.to_orderbook()[BIDS] == []
+        assert book.to_orderbook()[ASKS] == []
+
+    def test_apply_snapshot(self, local_orderbook):
+        orderbook = local_orderbook.to_orderbook()
+        assert local_orderbook.is_synced is True
+        assert orderbook[BIDS] == FAKE_BIDS
+        assert orderbook[ASKS] == FAKE_ASKS
+        assert orderbook['nonce'] == 5
+
+    def test_apply_diff(self, local_orderbook):
+        local_orderbook.apply_diff(
+            6, [[100.5, 4.0], [99.0, 0]], [[101.0, 0.5]])
+        orderbook = local_orderbook.to_orderbook()
+        assert orderbook[BIDS] == [[100.5, 4.0], [100.0, 1.0]]
+        assert orderbook[ASKS] == [[101.0, 0.5], [102.0, 3.0]]
+        assert local_orderbook.sequence == 6
+
+    @pytest.mark.parametrize('sequence', [5, 7])
+    def test_apply_diff_out_of_sequence(self, local_orderbook, sequence):
+        with pytest.raises(OrderbookSequenceException):
+            local_orderbook.apply_diff(sequence, [], [])
+        assert local_orderbook.is_synced is False
+
+    def test_apply_diff_not_synced(self):
+        with pytest.raises(OrderbookSequenceException):
+            LocalOrderbook().apply_diff(1, [], [])
+
+
+class TestBookFeedClient:
+    def test_snapshot_on_connect(self, feed):
+        server, client = feed
+        wait_for_sequence(client, 1)
+        orderbook = client.get_orderbook()
+        assert orderbook[BIDS] == FAKE_BIDS
+        assert orderbook[ASKS] == FAKE_ASKS
+
+    def test_diffs(self, feed):
+        server, client = feed
+        wait_for_sequence(client, 1)
+        server.publish([[100.0, 0]], [[100.5, 2.0]])
+        wait_for_sequence(client, 2)
+        assert client.get_orderbook()[BIDS] == [[99.0, 2.0]]
+        assert client.get_orderbook()[ASKS] == [
+            [100.5, 2.0], [101.0, 1.5], [102.0, 3.0]]
+
+    def test_resync_on_gap(self, feed):
+        server, client = feed
+        wait_for_sequence(client, 1)
+        server.publish([[98.0, 1.0]], [], skip_sequence=True)
+        wait_for_sequence(client, 3)
+        assert client.resync_count == 1
+        assert client.get_orderbook()[BIDS] == server.book.to_orderbook()[BIDS]
@@ -1,3 +1,5 @@
+import copy
+import weakref
 from decimal import Decimal
 from enum import Enum
 
@@ -5,6 +7,12 @@ import ccxt
 import pytest
 
 import autotrageur.bot.trader.ccxt_trader as ccxt_trader
+from autotrageur.bot.common.migrations import migrate
+from autotrageur.bot.common.storage import SQLiteBackend
+from autotrageur.bot.trader.fixed_point import FixedPointOrderbookIndex
+from autotrageur.bot.trader.market_spec import MarketSpec
+from autotrageur.bot.trader.markets_cache import CachedMarkets
+from autotrageur.bot.trader.orderbook_index import OrderbookIndex
 from fp_libs.constants.ccxt_constants import BUY_SIDE, SELL_SIDE
 from fp_libs.fiat_symbols import FIAT_SYMBOLS
 from fp_libs.trade.executor.ccxt_executor import CCXTExecutor
@@ -27,11 +35,21 @@ class OrderType(Enum):
 
 # Test constants.
 BTC_USD = 'BTC/USD'
+FAKE_MARKETS = {BTC_USD: {'limits': {}, 'precision': {'amount': 8}}}
 FAKE_FOREX_RATIO = num_to_decimal(1000)
 BAD_FOREX_RATIOS = [None, Decimal('0'), Decimal('-0.1'), Decimal('-999')]
+WALKERS = ['_CCXTTrader__calc_vol_by_book',
+           '_CCXTTrader__calc_vol_by_book_decimal']
 set_autotrageur_decimal_context()
 
 
+def walk_book(trader, walker, bids_or_asks, quote_target_amount):
+    """Calls a book walker with the orders in the form it takes."""
+    if walker == '_CCXTTrader__calc_vol_by_book':
+        bids_or_asks = OrderbookIndex(bids_or_asks)
+    return getattr(trader, walker)(bids_or_asks, quote_target_amount)
+
+
 class TestCCXTTraderInit:
     ext_exchanges = ['gemini', 'bithumb']
 
@@ -83,43 +101,154 @@ class TestCCXTTraderInit:
         assert trader.base_bal is None
         assert trader.quote_bal is None
         assert trader.adjusted_quote_bal is None
+        assert trader.book_feed is None
+        assert trader.orderbook_indexes == {}
+        assert trader.symbol == '{}/{}'.format(base, quote)
+        assert trader._market_spec is None
+        assert trader.slippage_stats is None
 
         if dry_run:
             assert trader.executor is fake_dryrun_executor
         else:
             assert trader.executor is fake_ccxt_executor
 
+    def test_init_shared_exchange(self, mocker):
+        mock_fetcher_constructor = mocker.patch(
+            'autotrageur.bot.trader.ccxt_trader.CCXTFetcher')
+        mock_executor_constructor = mocker.patch(
+            'autotrageur.bot.trader.ccxt_trader.CCXTExecutor')
+        mock_gemini = mocker.patch.object(ccxt_trader.ccxt_extensions, 'ext_gemini')
+        shared_exchange = mocker.Mock()
+
+        trader = CCXTTrader('ETH', 'USD', 'gemini', 'e1', Decimal('5.0'),
+                            ccxt_exchange=shared_exchange)
+
+        mock_gemini.assert_not_called()
+        assert trader.ccxt_exchange is shared_exchange
+        mock_fetcher_constructor.assert_called_once_with(shared_exchange)
+        mock_executor_constructor.assert_called_once_with(shared_exchange)
+
 
 @pytest.mark.parametrize('is_dry_run', [True, False])
 @pytest.mark.parametrize('exchange_id', ['e1', 'e2'])
 @pytest.mark.parametrize('exchange', ['bithumb', 'kraken', 'bitfinex'])
-@pytest.mark.parametrize('buy_target_includes_fee, buy_op_result', [
-    (True, 'buy / CAST'),
-    (False, 'buy * CAST')
-])
-@pytest.mark.parametrize('trade_predict_ratios, result_quote_bal', [
-    ([(Decimal('1'),), (Decimal('1'),), (Decimal('1'),)], Decimal('1000')),
-    ([(Decimal('1.1'),), (Decimal('0.9'),), (Decimal('1.1'),), (Decimal('0.9'),)], Decimal('773.6786944776667003124136781'))
+@pytest.mark.parametrize('buy_target_includes_fee', [True, False])
+@pytest.mark.parametrize('trades, result_quote_bal', [
+    ([('buy', Decimal('1'), Decimal('2'), Decimal('1')), ('sell', Decimal('2'), Decimal('1'), Decimal('1')), ('buy', Decimal('1'), Decimal('2'), Decimal('1'))], Decimal('1000')),
+    ([('buy', Decimal('1.1'), Decimal('2'), Decimal('1')), ('sell', Decimal('2'), Decimal('0.9'), Decimal('1')), ('sell', Decimal('2'), Decimal('1.1'), Decimal('1')), ('buy', Decimal('0.9'), Decimal('2'), Decimal('1'))], Decimal('773.6786944776667003124136781'))
 ])
 def test_adjust_working_balance(mocker, fake_ccxt_trader, is_dry_run,
                                 exchange_id, exchange,
-                                buy_target_includes_fee, buy_op_result,
-                                trade_predict_ratios, result_quote_bal):
+                                buy_target_includes_fee, trades,
+                                result_quote_bal):
     mocker.patch.object(fake_ccxt_trader, 'quote_bal', Decimal('1000'))
     mocker.patch.object(fake_ccxt_trader, 'get_taker_fee', return_value=Decimal('0'))
     mocker.patch.object(fake_ccxt_trader, 'exchange_id', exchange_id)
     mocker.patch.object(fake_ccxt_trader, 'exchange_name', exchange)
+    mocker.patch.object(fake_ccxt_trader, 'slippage_stats', None)
     mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'buy_target_includes_fee', buy_target_includes_fee, create=True)
-    execute_query = mocker.patch.object(ccxt_trader, 'execute_parametrized_query', return_value=trade_predict_ratios)
+    execute_query = mocker.patch.object(
+        ccxt_trader, 'execute_parametrized_query', side_effect=[[], trades])
 
     fake_ccxt_trader._CCXTTrader__adjust_working_balance(is_dry_run)
 
-    query = execute_query.call_args[0][0]
-    assert buy_op_result in query
-    assert exchange_id in query
+    # The snapshot is missing, so the statistics are seeded from the trades.
+    assert execute_query.call_count == 2
+    snapshot_query, snapshot_params = execute_query.call_args_list[0][0]
+    assert 'slippage_stats' in snapshot_query
+    assert snapshot_params == (
+        fake_ccxt_trader.autotrageur_config_id, exchange,
+        1 if is_dry_run else 0)
+    trades_query, trades_params = execute_query.call_args_list[1][0]
+    assert exchange_id in trades_query
+    assert trades_params == (1 if is_dry_run else 0, exchange)
+    assert fake_ccxt_trader.slippage_stats.count == len(trades)
     assert fake_ccxt_trader.quote_bal == Decimal('1000')
     assert fake_ccxt_trader.adjusted_quote_bal == result_quote_bal
 
+    # Later updates reuse the loaded statistics.
+    fake_ccxt_trader._CCXTTrader__adjust_working_balance(is_dry_run)
+    assert execute_query.call_count == 2
+    assert fake_ccxt_trader.adjusted_quote_bal == result_quote_bal
+
+
+@pytest.mark.parametrize('snapshot, result_quote_bal', [
+    ([(1, Decimal('10'), Decimal('0'))], Decimal('1000')),
+    ([(4, Decimal('0'), Decimal('400'))], Decimal('773.6786944776667003124136781'))
+])
+def test_adjust_working_balance_snapshot(mocker, fake_ccxt_trader, snapshot,
+                                         result_quote_bal):
+    mocker.patch.object(fake_ccxt_trader, 'quote_bal', Decimal('1000'))
+    mocker.patch.object(fake_ccxt_trader, 'slippage_stats', None)
+    execute_query = mocker.patch.object(
+        ccxt_trader, 'execute_parametrized_query', return_value=snapshot)
+
+    fake_ccxt_trader._CCXTTrader__adjust_working_balance(False)
+
+    execute_query.assert_called_once()
+    assert fake_ccxt_trader.slippage_stats.count == snapshot[0][0]
+    assert fake_ccxt_trader.adjusted_quote_bal == result_quote_bal
+
+    # Switching to a dry run loads the dry run statistics.
+    fake_ccxt_trader._CCXTTrader__adjust_working_balance(True)
+    assert execute_query.call_count == 2
+    assert execute_query.call_args[0][1][2] == 1
+
+
+def test_load_slippage_stats_sqlite(mocker, fake_ccxt_trader):
+    backend = SQLiteBackend(':memory:')
+    migrate(backend)
+    mocker.patch.object(ccxt_trader, 'execute_parametrized_query',
+                        backend.execute_parametrized_query)
+    mocker.patch.object(fake_ccxt_trader, 'autotrageur_config_id', 'config')
+    mocker.patch.object(fake_ccxt_trader, 'get_taker_fee', return_value=Decimal('0'))
+    mocker.patch.object(fake_ccxt_trader, 'exchange_id', 'e1')
+    mocker.patch.object(fake_ccxt_trader, 'exchange_name', 'kraken')
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'buy_target_includes_fee', False, create=True)
+    backend.execute_parametrized_query(
+        "INSERT INTO fcf_autotrageur_config (id, start_timestamp, dryrun, "
+        "dryrun_e1_base, dryrun_e1_quote, dryrun_e2_base, dryrun_e2_quote, "
+        "exchange1, exchange1_pair, exchange2, exchange2_pair, h_to_e1_max, "
+        "h_to_e2_max, max_trade_size, spread_min, vol_min, slippage) "
+        "VALUES ('config', 1, 1, 0, 0, 0, 0, 'kraken', 'ETH/USD', 'bithumb', "
+        "'ETH/KRW', 0, 0, 0, 0, 0, 0);", ())
+    for opp_id, side, predicted in [('a', 'buy', '1.1'), ('b', 'sell', '0.9')]:
+        backend.execute_parametrized_query(
+            "INSERT INTO trade_opportunity (id, e1_spread, e2_spread, e1_buy, "
+            "e1_sell, e2_buy, e2_sell) VALUES (%s, 0, 0, %s, %s, 0, 0);",
+            (opp_id, Decimal(predicted), Decimal(predicted)))
+        backend.execute_parametrized_query(
+            "INSERT INTO trades (trade_opportunity_id, side, "
+            "autotrageur_config_id, autotrageur_config_start_timestamp, "
+            "exchange, base, quote, pre_fee_base, pre_fee_quote, "
+            "post_fee_base, post_fee_quote, fees, fee_asset, price, "
+            "true_price, type, order_id, exchange_timestamp, local_timestamp) "
+            "VALUES (%s, %s, 'config', 1, 'kraken', 'ETH', 'USD', 0, 0, 0, 0, "
+            "0, 'USD', 1, %s, 'market', 'order', 1, 1);",
+            (opp_id, side, Decimal('1')))
+
+    slippage_stats = fake_ccxt_trader._CCXTTrader__load_slippage_stats(True)
+
+    assert slippage_stats.count == 2
+    assert slippage_stats.mean == Decimal('0')
+    assert slippage_stats.m2 == Decimal('200')
+
+    # A snapshot of the bot takes precedence over the trades; snapshots of
+    # other bots are ignored.
+    for opp_id, config_id, trade_count in [('b', 'config', 3),
+                                           ('c', 'other', 9)]:
+        backend.execute_parametrized_query(
+            "INSERT INTO slippage_stats (trade_opportunity_id, side, "
+            "exchange, dryrun, trade_count, mean, m2, local_timestamp, "
+            "autotrageur_config_id) VALUES (%s, 'sell', 'kraken', 1, %s, %s, "
+            "%s, 1, %s);", (opp_id, trade_count, Decimal('1.5'),
+                            Decimal('2.5'), config_id))
+    slippage_stats = fake_ccxt_trader._CCXTTrader__load_slippage_stats(True)
+    assert (slippage_stats.count, slippage_stats.mean, slippage_stats.m2) == (
+        3, Decimal('1.5'), Decimal('2.5'))
+    assert fake_ccxt_trader._CCXTTrader__load_slippage_stats(False).count == 0
+
+
 class TestCalcVolByBook:
     """For tests regarding ccxt_trader::_CCXTTrader__calc_vol_by_book."""
 
@@ -198,8 +327,9 @@ class TestCalcVolByBook:
             [766.46, 0.15]
         ], Decimal('20000.0'), Decimal('26.39024321295778364116094987'))
     ])
-    def test_calc_vol_by_book(self, mocker, fake_ccxt_trader, bids_or_asks, quote_target_amount, final_volume):
-        volume = fake_ccxt_trader._CCXTTrader__calc_vol_by_book(bids_or_asks, quote_target_amount)
+    @pytest.mark.parametrize('walker', WALKERS)
+    def test_calc_vol_by_book(self, mocker, fake_ccxt_trader, bids_or_asks, quote_target_amount, final_volume, walker):
+        volume = walk_book(fake_ccxt_trader, walker, bids_or_asks, quote_target_amount)
         assert volume == final_volume
 
     @pytest.mark.parametrize('bids_or_asks, quote_target_amount', [
@@ -220,9 +350,80 @@ class TestCalcVolByBook:
             [10000.0, 500.5]
         ], Decimal('1000000000.12345678'))
     ])
-    def test_calc_vol_by_book_exception(self, mocker, fake_ccxt_trader, bids_or_asks, quote_target_amount):
+    @pytest.mark.parametrize('walker', WALKERS)
+    def test_calc_vol_by_book_exception(self, mocker, fake_ccxt_trader, bids_or_asks, quote_target_amount, walker):
         with pytest.raises(ccxt_trader.OrderbookException):
-            fake_ccxt_trader._CCXTTrader__calc_vol_by_book(bids_or_asks, quote_target_amount)
+            walk_book(fake_ccxt_trader, walker, bids_or_asks, quote_target_amount)
+
+    @pytest.mark.parametrize('quote_target_amount, levels_used', [
+        # Targets landing exactly on a level boundary, where floating point
+        # error may misplace the fill level.
+        (Decimal('0.3'), 1),
+        (Decimal('0.6'), 2),
+        (Decimal('0.7'), 3),
+        (Decimal('0.9'), 3),
+    ])
+    def test_calc_vol_by_book_boundary(self, mocker, fake_ccxt_trader,
+                                       quote_target_amount, levels_used):
+        bids_or_asks = [[0.1, 3.0], [0.3, 1.0], [0.1, 3.0]]
+        record = mocker.patch.object(fake_ccxt_trader.depth_tracker, 'record')
+        volume = fake_ccxt_trader._CCXTTrader__calc_vol_by_book(
+            OrderbookIndex(bids_or_asks), quote_target_amount)
+        assert volume == fake_ccxt_trader._CCXTTrader__calc_vol_by_book_decimal(
+            bids_or_asks, quote_target_amount)
+        record.assert_called_once_with(levels_used)
+
+    @pytest.mark.parametrize('expected_volume, is_mismatch', [
+        (Decimal('2.0'), False),
+        (Decimal('2.1'), True),
+    ])
+    def test_calc_vol_by_book_verify(self, mocker, fake_ccxt_trader,
+                                     expected_volume, is_mismatch):
+        mocker.patch.object(fake_ccxt_trader, 'verify_book_walk', True)
+        calc_decimal = mocker.patch.object(
+            fake_ccxt_trader, '_CCXTTrader__calc_vol_by_book_decimal',
+            return_value=expected_volume)
+        mock_logging = mocker.patch.object(ccxt_trader, 'logging')
+
+        volume = fake_ccxt_trader._CCXTTrader__calc_vol_by_book(
+            OrderbookIndex([[10000.0, 2.0]]), Decimal('20000.0'))
+
+        assert volume == Decimal('2.0')
+        calc_decimal.assert_called_once_with([[10000.0, 2.0]], Decimal('20000.0'))
+        assert mock_logging.error.called is is_mismatch
+
+    @pytest.mark.parametrize('expected_offset, is_mismatch', [
+        (Decimal('0'), False),
+        (Decimal('0.0009'), False),
+        (Decimal('0.0011'), True),
+    ])
+    def test_calc_vol_by_book_verify_fixed_point(
+            self, mocker, fake_ccxt_trader, expected_offset, is_mismatch):
+        # The fixed-point fill rounds once, and differs from the Decimal walk
+        # in the last digit on this book.
+        orders = [[591.56, 0.512], [318.11, 0.113]]
+        quote_target_amount = Decimal('220.08')
+        mocker.patch.object(fake_ccxt_trader, 'fixed_point', True)
+        mocker.patch.object(fake_ccxt_trader, 'verify_book_walk', True)
+        mocker.patch.object(
+            fake_ccxt_trader, '_market_spec', MarketSpec.from_market(
+                BTC_USD, {'limits': {}, 'precision': {'amount': 3, 'price': 2}}))
+        mocker.patch.object(fake_ccxt_trader, 'quote_target_amount',
+                            quote_target_amount)
+        decimal_volume = fake_ccxt_trader._CCXTTrader__calc_vol_by_book_decimal(
+            orders, quote_target_amount)
+        mocker.patch.object(
+            fake_ccxt_trader, '_CCXTTrader__calc_vol_by_book_decimal',
+            return_value=decimal_volume + expected_offset)
+        mock_logging = mocker.patch.object(ccxt_trader, 'logging')
+
+        fake_ccxt_trader.get_prices_from_orderbook(BUY_SIDE, orders)
+
+        assert type(fake_ccxt_trader.orderbook_indexes[BUY_SIDE]) is (
+            FixedPointOrderbookIndex)
+        assert fake_ccxt_trader.orderbook_indexes[BUY_SIDE].fill_quote(
+            quote_target_amount).base_volume != decimal_volume
+        assert mock_logging.error.called is is_mismatch
 
 class TestCheckExchangeLimits:
     """For tests regarding ccxt_trader::_CCXTTrader__check_exchange_limits."""
@@ -246,6 +447,7 @@ class TestCheckExchangeLimits:
     @pytest.mark.parametrize('markets', [
         ({
             BTC_USD: {
+                'precision': {},
                 'limits': {
                     'amount': {
                         'min': 0,
@@ -260,6 +462,7 @@ class TestCheckExchangeLimits:
         }),
         ({
             BTC_USD: {
+                'precision': {},
                 'limits': {
                     'amount': {
                         'min': 0.00000000,
@@ -284,6 +487,7 @@ class TestCheckExchangeLimits:
     @pytest.mark.parametrize('markets', [
         ({
             BTC_USD: {
+                'precision': {},
                 'limits': {
                     'amount': {
                         'min': 10000000.00000000,
@@ -315,6 +519,7 @@ class TestCheckExchangeLimits:
     @pytest.mark.parametrize('markets', [
         ({
             BTC_USD: {
+                'precision': {},
                 'limits': {
                     'amount': {
                         'min': 10000000.00000000,
@@ -356,7 +561,7 @@ class TestRoundExchangePrecisionPrivate:
 
     @pytest.mark.parametrize('precision, asset_amount, rounded_amount', [
         # Good, but 0 amount.
-        (8, 0, 0),
+        (8, Decimal('0'), Decimal('0')),
         # Good, 8 precision.
         (8, Decimal('1.123456789'), Decimal('1.12345678')),
         # Good, 8 precision, large number.
@@ -374,7 +579,8 @@ class TestRoundExchangePrecisionPrivate:
     def test_round_exchange_precision_private(self, mocker, fake_ccxt_trader, precision,
                                               market_order, asset_amount, rounded_amount):
         mocker.patch.object(
-            fake_ccxt_trader, 'get_amount_precision', return_value=precision)
+            fake_ccxt_trader, '_market_spec', MarketSpec.from_market(
+                BTC_USD, {'limits': {}, 'precision': {'amount': precision}}))
         result = fake_ccxt_trader._CCXTTrader__round_exchange_precision(
             market_order, asset_amount)
 
@@ -438,6 +644,7 @@ class TestExecuteMarketOrder:
             *round_exchange_precision_params)
         fake_ccxt_trader._CCXTTrader__check_exchange_limits.assert_called_with(
             *check_exchange_limits_params)
+        fake_ccxt_trader.fee_cache.invalidate.assert_called_once_with()
 
         if create_market_order == self.fake_normal_market_order:
             getattr(fake_ccxt_trader.executor, executor_function).assert_called_with(
@@ -467,6 +674,7 @@ class TestExecuteMarketOrder:
         mocker.patch.object(fake_ccxt_trader, '_CCXTTrader__round_exchange_precision',
             return_value=self.fake_rounded_amount)
         mocker.patch.object(fake_ccxt_trader, '_CCXTTrader__check_exchange_limits')
+        mocker.patch.object(fake_ccxt_trader.fee_cache, 'invalidate')
 
         if order_type is OrderType.BUY:
             mocked_executor_function = (
@@ -551,6 +759,88 @@ def test_get_full_orderbook(mocker, fake_ccxt_trader, symbols):
     fake_ccxt_trader.fetcher.get_full_orderbook.assert_called_with(symbols['bitcoin'], symbols['usd'])
 
 
+@pytest.mark.parametrize('local_orderbook', [None, {'bids': [], 'asks': []}])
+@pytest.mark.parametrize('depth', [None, 20])
+def test_get_orderbook(mocker, fake_ccxt_trader, symbols, local_orderbook,
+                       depth):
+    book_feed = mocker.Mock()
+    book_feed.get_orderbook.return_value = local_orderbook
+    get_full_orderbook = mocker.patch.object(
+        fake_ccxt_trader, 'get_full_orderbook', return_value={})
+    mocker.patch.object(
+        fake_ccxt_trader.depth_tracker, 'get_depth', return_value=depth)
+    fetch_order_book = mocker.patch.object(
+        fake_ccxt_trader.ccxt_exchange, 'fetch_order_book', create=True,
+        return_value={})
+    wrap_ccxt_retry = mocker.patch.object(
+        ccxt_trader, 'wrap_ccxt_retry',
+        side_effect=lambda methods: [method() for method in methods])
+    fake_ccxt_trader.attach_book_feed(book_feed)
+
+    result = fake_ccxt_trader.get_orderbook()
+
+    book_feed.get_orderbook.assert_called_once_with()
+    if local_orderbook is not None:
+        get_full_orderbook.assert_not_called()
+        fetch_order_book.assert_not_called()
+        assert result is local_orderbook
+        assert result[ccxt_trader.BOOK_DEPTH_LIMIT] is None
+    elif depth is None:
+        get_full_orderbook.assert_called_once_with()
+        fetch_order_book.assert_not_called()
+        assert result is get_full_orderbook.return_value
+        assert result[ccxt_trader.BOOK_DEPTH_LIMIT] is None
+    else:
+        get_full_orderbook.assert_not_called()
+        wrap_ccxt_retry.assert_called_once()
+        fetch_order_book.assert_called_once_with(
+            '{}/{}'.format(symbols['bitcoin'], symbols['usd']), depth)
+        assert result is fetch_order_book.return_value
+        assert result[ccxt_trader.BOOK_DEPTH_LIMIT] == depth
+
+
+@pytest.mark.parametrize('shallow_side', [BUY_SIDE, SELL_SIDE])
+@pytest.mark.parametrize('book_depth_limit, refetched', [
+    (None, False),
+    (1, True),
+    (5, False),
+])
+def test_get_prices_from_book(mocker, fake_ccxt_trader, shallow_side,
+                              book_depth_limit, refetched):
+    shallow_book = [[10000.0, 2.0]]
+    deep_book = [[10000.0, 2.0], [10000.0, 2.0]]
+    full_bids = [[8000.0, 2.0], [8000.0, 2.0]]
+    full_asks = [[12000.0, 1.0], [12000.0, 1.0]]
+    orderbook = {
+        'bids': shallow_book if shallow_side is SELL_SIDE else deep_book,
+        'asks': shallow_book if shallow_side is BUY_SIDE else deep_book,
+        ccxt_trader.BOOK_DEPTH_LIMIT: book_depth_limit
+    }
+    mocker.patch.object(fake_ccxt_trader, 'quote_target_amount', Decimal('24000'))
+    mocker.patch.object(fake_ccxt_trader, 'quote_rough_sell_amount', Decimal('24000'))
+    mocker.patch.object(fake_ccxt_trader, 'get_full_orderbook', return_value={
+        'bids': full_bids, 'asks': full_asks})
+    reset = mocker.patch.object(fake_ccxt_trader.depth_tracker, 'reset')
+
+    if refetched:
+        buy_prices, sell_prices = fake_ccxt_trader.get_prices_from_book(
+            orderbook)
+        fake_ccxt_trader.get_full_orderbook.assert_called_once_with()
+        reset.assert_called_once_with()
+        # Both sides are priced from the full orderbook.
+        assert buy_prices.quote_price == Decimal('12000')
+        assert sell_prices.quote_price == Decimal('8000')
+        assert orderbook == {
+            'bids': full_bids,
+            'asks': full_asks,
+            ccxt_trader.BOOK_DEPTH_LIMIT: None
+        }
+    else:
+        with pytest.raises(ccxt_trader.OrderbookException):
+            fake_ccxt_trader.get_prices_from_book(orderbook)
+        fake_ccxt_trader.get_full_orderbook.assert_not_called()
+
+
 @pytest.mark.parametrize('limit, expected_result', [
     (0.02, Decimal('0.02')),
     (0, Decimal('0')),
@@ -561,6 +851,7 @@ def test_get_full_orderbook(mocker, fake_ccxt_trader, symbols):
 def test_get_min_base_limit(mocker, fake_ccxt_trader, limit, expected_result):
     fake_markets = {
         '{}/{}'.format(fake_ccxt_trader.base, fake_ccxt_trader.quote): {
+            'precision': {},
             'limits': {
                 'amount': {
                     "min": limit
@@ -606,16 +897,19 @@ class TestGetPricesFromOrderbook:
             side,
             self.fake_bids_or_asks)
 
+        orderbook_index = fake_ccxt_trader.orderbook_indexes[side]
+        assert isinstance(orderbook_index, OrderbookIndex)
+        assert orderbook_index.orders is self.fake_bids_or_asks
         if side is BUY_SIDE:
             fake_ccxt_trader.get_usd_from_quote.assert_called_once_with(
                 quote_target_amount)
             calc_vol.assert_called_once_with(
-                self.fake_bids_or_asks, quote_target_amount)
+                orderbook_index, quote_target_amount)
         else:
             fake_ccxt_trader.get_usd_from_quote.assert_called_once_with(
                 quote_rough_sell_amount)
             calc_vol.assert_called_once_with(
-                self.fake_bids_or_asks, quote_rough_sell_amount)
+                orderbook_index, quote_rough_sell_amount)
         assert usd_price == result_usd_price
         assert quote_price == result_quote_price
 
@@ -643,11 +937,145 @@ class TestGetPricesFromOrderbook:
                     self.fake_bids_or_asks)
 
 
+    def test_get_prices_from_orderbook_index(self, mocker, fake_ccxt_trader):
+        orderbook_index = OrderbookIndex([[10000.0, 2.0]])
+        mocker.patch.object(fake_ccxt_trader, 'quote_target_amount',
+                            Decimal('10000'))
+
+        usd_price, quote_price = fake_ccxt_trader.get_prices_from_orderbook(
+            BUY_SIDE, orderbook_index)
+
+        assert quote_price == Decimal('10000')
+        assert fake_ccxt_trader.orderbook_indexes[BUY_SIDE] is orderbook_index
+
+    @pytest.mark.parametrize('fixed_point, precision, orders, index_type', [
+        (False, {'amount': 8, 'price': 2}, [[10000.5, 2.0]], OrderbookIndex),
+        (True, {'amount': 8, 'price': 2}, [[10000.5, 2.0]],
+         FixedPointOrderbookIndex),
+        (True, {'amount': 8, 'price': 0}, [[10000.5, 2.0]], OrderbookIndex),
+        (True, {'amount': 8}, [[10000.5, 2.0]], OrderbookIndex),
+    ])
+    def test_get_prices_from_orderbook_fixed_point(
+            self, mocker, fake_ccxt_trader, fixed_point, precision, orders,
+            index_type):
+        mocker.patch.object(fake_ccxt_trader, 'fixed_point', fixed_point)
+        mocker.patch.object(
+            fake_ccxt_trader, '_market_spec', MarketSpec.from_market(
+                BTC_USD, {'limits': {}, 'precision': precision}))
+        mocker.patch.object(fake_ccxt_trader, 'quote_target_amount',
+                            Decimal('10000.5'))
+
+        usd_price, quote_price = fake_ccxt_trader.get_prices_from_orderbook(
+            BUY_SIDE, orders)
+
+        assert quote_price == Decimal('10000.5')
+        assert type(fake_ccxt_trader.orderbook_indexes[BUY_SIDE]) is index_type
+
+
+@pytest.mark.parametrize('side, quote_amount, result', [
+    (BUY_SIDE, Decimal('15000'), Decimal('1.5')),
+    (SELL_SIDE, Decimal('15000'), None),
+])
+def test_get_base_from_orderbook(fake_ccxt_trader, side, quote_amount,
+                                 result):
+    fake_ccxt_trader.orderbook_indexes[BUY_SIDE] = OrderbookIndex(
+        [[10000.0, 1.0], [10000.0, 1.0]])
+    assert fake_ccxt_trader.get_base_from_orderbook(
+        side, quote_amount) == result
+
+
 def test_load_markets(mocker, fake_ccxt_trader):
     mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'load_markets')
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'markets', {
+        BTC_USD: {'limits': {}, 'precision': {'amount': 8}}})
     fake_ccxt_trader.load_markets()
     assert fake_ccxt_trader.ccxt_exchange.load_markets.call_count == 1
     fake_ccxt_trader.ccxt_exchange.load_markets.assert_called_with()
+    assert fake_ccxt_trader.market_spec.symbol == BTC_USD
+    assert fake_ccxt_trader.get_amount_precision() == 8
+
+
+@pytest.mark.parametrize('cached', [
+    None,
+    CachedMarkets(FAKE_MARKETS, False),
+    CachedMarkets(FAKE_MARKETS, True),
+])
+def test_load_markets_cache(mocker, fake_ccxt_trader, cached):
+    markets_cache = mocker.Mock()
+    markets_cache.load.return_value = cached
+    mocker.patch.object(fake_ccxt_trader.fetcher, 'load_markets')
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'markets', FAKE_MARKETS)
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'set_markets')
+    mocker.patch.object(ccxt_trader, '_refreshed_exchanges', weakref.WeakSet())
+    mock_thread = mocker.patch.object(ccxt_trader.threading, 'Thread')
+    api_urls = fake_ccxt_trader.ccxt_exchange.urls['api']
+
+    fake_ccxt_trader.load_markets(markets_cache)
+
+    markets_cache.load.assert_called_once_with(
+        fake_ccxt_trader.exchange_name, api_urls)
+    assert fake_ccxt_trader.get_amount_precision() == 8
+    if cached is not None and cached.is_fresh:
+        fake_ccxt_trader.ccxt_exchange.set_markets.assert_called_once_with(
+            FAKE_MARKETS)
+        fake_ccxt_trader.fetcher.load_markets.assert_not_called()
+        mock_thread.assert_called_once_with(
+            target=fake_ccxt_trader._CCXTTrader__refresh_markets,
+            args=(markets_cache,), daemon=True)
+        mock_thread.return_value.start.assert_called_once_with()
+        markets_cache.save.assert_not_called()
+    else:
+        fake_ccxt_trader.fetcher.load_markets.assert_called_once_with()
+        mock_thread.assert_not_called()
+        markets_cache.save.assert_called_once_with(
+            fake_ccxt_trader.exchange_name, api_urls, FAKE_MARKETS)
+
+
+def test_load_markets_cache_shared(mocker, fake_ccxt_trader):
+    markets_cache = mocker.Mock()
+    markets_cache.load.return_value = CachedMarkets(FAKE_MARKETS, True)
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'markets', FAKE_MARKETS)
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'set_markets')
+    mocker.patch.object(ccxt_trader, '_refreshed_exchanges', weakref.WeakSet())
+    mock_thread = mocker.patch.object(ccxt_trader.threading, 'Thread')
+    other_trader = CCXTTrader(
+        'BTC', 'USD', 'binance', Decimal('3.0'), Decimal('20000.0'),
+        ccxt_exchange=fake_ccxt_trader.ccxt_exchange)
+
+    fake_ccxt_trader.load_markets(markets_cache)
+    other_trader.load_markets(markets_cache)
+
+    assert other_trader.exchange_lock is fake_ccxt_trader.exchange_lock
+    mock_thread.assert_called_once_with(
+        target=fake_ccxt_trader._CCXTTrader__refresh_markets,
+        args=(markets_cache,), daemon=True)
+
+
+@pytest.mark.parametrize('success', [True, False])
+def test_refresh_markets(mocker, fake_ccxt_trader, success):
+    markets_cache = mocker.Mock()
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'markets', FAKE_MARKETS)
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'fetch_markets',
+                        return_value=FAKE_MARKETS)
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'set_markets')
+    if not success:
+        fake_ccxt_trader.ccxt_exchange.fetch_markets.side_effect = (
+            ccxt.ExchangeNotAvailable)
+
+    fake_ccxt_trader._CCXTTrader__refresh_markets(markets_cache)
+
+    fake_ccxt_trader.ccxt_exchange.fetch_markets.assert_called_once_with()
+    if success:
+        fake_ccxt_trader.ccxt_exchange.set_markets.assert_called_once_with(
+            FAKE_MARKETS)
+        assert fake_ccxt_trader._market_spec.amount_precision == 8
+        markets_cache.save.assert_called_once_with(
+            fake_ccxt_trader.exchange_name,
+            fake_ccxt_trader.ccxt_exchange.urls['api'], FAKE_MARKETS)
+    else:
+        fake_ccxt_trader.ccxt_exchange.set_markets.assert_not_called()
+        assert fake_ccxt_trader._market_spec is None
+        markets_cache.save.assert_not_called()
 
 
 def test_get_taker_fee(mocker, fake_ccxt_trader):
@@ -656,6 +1084,16 @@ def test_get_taker_fee(mocker, fake_ccxt_trader):
     fake_ccxt_trader.fetcher.fetch_taker_fees.assert_called_with()
 
 
+def test_get_taker_fee_cached(mocker, fake_ccxt_trader):
+    mocker.patch.object(fake_ccxt_trader.fetcher, 'fetch_taker_fees',
+                        return_value=Decimal('0.001'))
+    assert fake_ccxt_trader.get_taker_fee() == Decimal('0.001')
+    assert fake_ccxt_trader.get_taker_fee() == Decimal('0.001')
+    assert fake_ccxt_trader.fetcher.fetch_taker_fees.call_count == 1
+    assert fake_ccxt_trader.fee_cache.hits == 1
+    assert fake_ccxt_trader.fee_cache.misses == 1
+
+
 class TestGetAmountPrecision:
     @pytest.mark.parametrize('precision, expected_result', [
         ({'amount': 5}, 5),
@@ -667,6 +1105,7 @@ class TestGetAmountPrecision:
     def test_get_amount_precision(self, mocker, fake_ccxt_trader, precision, expected_result):
         fake_markets = {
             'BTC/USD': {
+                'limits': {},
                 'precision': precision
             }
         }
@@ -789,6 +1228,25 @@ def test_get_usd_from_quote_error(mocker, fake_ccxt_trader):
         fake_ccxt_trader.get_usd_from_quote(fake_amount)
 
 
+@pytest.mark.parametrize('side, buy_target_includes_fee, true_price, slippage', [
+    (BUY_SIDE, True, Decimal('99.9'), Decimal('0.200300400500600700800901000')),
+    (BUY_SIDE, False, Decimal('100'), Decimal('0.1000')),
+    (SELL_SIDE, True, Decimal('100'), Decimal('-0.1000')),
+    (SELL_SIDE, False, Decimal('99.9'), Decimal('0')),
+])
+def test_record_slippage(mocker, fake_ccxt_trader, side,
+                         buy_target_includes_fee, true_price, slippage):
+    mocker.patch.object(fake_ccxt_trader, 'get_taker_fee', return_value=Decimal('0.001'))
+    mocker.patch.object(fake_ccxt_trader.ccxt_exchange, 'buy_target_includes_fee', buy_target_includes_fee, create=True)
+    mocker.patch.object(fake_ccxt_trader, 'slippage_stats', ccxt_trader.SlippageStats())
+
+    result = fake_ccxt_trader.record_slippage(side, Decimal('100'), true_price)
+
+    assert result is fake_ccxt_trader.slippage_stats
+    assert result.count == 1
+    assert result.mean == slippage
+
+
 def test_round_exchange_precision_public(mocker, fake_ccxt_trader):
     FAKE_AMOUNT_TO_ROUND = num_to_decimal(9999.99)
     mocker.patch.object(fake_ccxt_trader, '_CCXTTrader__round_exchange_precision')
@@ -908,6 +1366,28 @@ class TestSetRoughSellAmount:
             assert fake_ccxt_trader.quote_rough_sell_amount == self.fake_target_amount
 
 
+def test_share_exchange_state(mocker, fake_ccxt_trader):
+    owner = copy.copy(fake_ccxt_trader)
+    mocker.patch.object(owner, 'quote_bal', Decimal('1000'))
+    mocker.patch.object(owner, 'fee_cache', mocker.Mock())
+    mocker.patch.object(owner, 'slippage_stats', None)
+    mocker.patch.object(fake_ccxt_trader, 'quote_bal', Decimal('1000'))
+    mocker.patch.object(fake_ccxt_trader, 'slippage_stats', None)
+    execute_query = mocker.patch.object(
+        ccxt_trader, 'execute_parametrized_query',
+        return_value=[(4, Decimal('0'), Decimal('400'))])
+
+    fake_ccxt_trader.share_exchange_state(owner)
+    assert fake_ccxt_trader.fee_cache is owner.fee_cache
+
+    # The statistics are loaded by each trader, for its own configuration.
+    fake_ccxt_trader._CCXTTrader__adjust_working_balance(False)
+    owner._CCXTTrader__adjust_working_balance(False)
+    assert execute_query.call_count == 2
+    assert fake_ccxt_trader.slippage_stats is not owner.slippage_stats
+    assert fake_ccxt_trader.slippage_stats.count == 4
+
+
 @pytest.mark.parametrize('live_balances, dryrun_balances, is_dry_run', [
     ((Decimal('1'), Decimal('1000')), (Decimal('2'), Decimal('2000')), True),
     ((Decimal('1'), Decimal('1000')), (Decimal('2'), Decimal('2000')), False),
@@ -0,0 +1,63 @@
+from unittest.mock import Mock
+
+import pytest
+
+from autotrageur.bot.trader.exchange_pool import ExchangePool
+
+
+def make_trader(exchange_name, ccxt_exchange):
+    trader = Mock(exchange_name=exchange_name, symbol='ETH/USD')
+    trader.ccxt_exchange = ccxt_exchange
+
+    def load_markets(markets_cache=None):
+        ccxt_exchange.markets = {trader.symbol: {}}
+    trader.load_markets.side_effect = load_markets
+    return trader
+
+
+def test_register_shares_markets():
+    pool = ExchangePool()
+    gemini = Mock(markets=None)
+    markets_cache = Mock()
+    trader1 = make_trader('gemini', gemini)
+
+    assert pool.get('Gemini') is None
+    pool.register(trader1, markets_cache)
+    assert pool.get('Gemini') is gemini
+
+    trader2 = make_trader('gemini', pool.get('gemini'))
+    pool.register(trader2, markets_cache)
+
+    trader1.load_markets.assert_called_once_with(markets_cache)
+    trader2.load_markets.assert_not_called()
+    trader1.share_exchange_state.assert_not_called()
+    trader2.share_exchange_state.assert_called_once_with(trader1)
+    assert len(pool) == 1
+
+
+def test_register_unlisted_market():
+    pool = ExchangePool()
+    gemini = Mock(markets=None)
+    pool.register(make_trader('gemini', gemini))
+    trader = make_trader('gemini', gemini)
+    type(trader).market_spec = property(
+        lambda self: gemini.markets['BTC/USD'])
+
+    with pytest.raises(KeyError):
+        pool.register(trader)
+
+
+def test_register_exchanges():
+    pool = ExchangePool()
+    gemini = Mock(markets=None)
+    bithumb = Mock(markets=None)
+    traders = [make_trader('gemini', gemini), make_trader('bithumb', bithumb)]
+
+    for trader in traders:
+        pool.register(trader)
+
+    assert pool.get('gemini') is gemini
+    assert pool.get('bithumb') is bithumb
+    for trader in traders:
+        trader.load_markets.assert_called_once_with(None)
+        trader.share_exchange_state.assert_not_called()
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.trader.fee_cache import DEFAULT_FEE_TTL, TakerFeeCache
+
+FAKE_FEE = Decimal('0.0025')
+
+
+@pytest.fixture()
+def fee_cache(mocker):
+    fetch_fee = mocker.Mock(return_value=FAKE_FEE)
+    clock = mocker.Mock(return_value=0)
+    return TakerFeeCache(fetch_fee, clock=clock)
+
+
+def test_init(mocker):
+    fetch_fee = mocker.Mock()
+    fee_cache = TakerFeeCache(fetch_fee)
+    assert fee_cache.fetch_fee is fetch_fee
+    assert fee_cache.ttl == DEFAULT_FEE_TTL
+    assert fee_cache.hits == 0
+    assert fee_cache.misses == 0
+
+
+@pytest.mark.parametrize('elapsed, refetched', [
+    (0, False),
+    (DEFAULT_FEE_TTL - 1, False),
+    (DEFAULT_FEE_TTL, True),
+])
+def test_get(fee_cache, elapsed, refetched):
+    assert fee_cache.get() == FAKE_FEE
+    fee_cache.clock.return_value = elapsed
+    assert fee_cache.get() == FAKE_FEE
+
+    assert fee_cache.fetch_fee.call_count == (2 if refetched else 1)
+    assert fee_cache.hits == (0 if refetched else 1)
+    assert fee_cache.misses == (2 if refetched else 1)
+
+
+def test_invalidate(fee_cache):
+    fee_cache.get()
+    fee_cache.invalidate()
+    fee_cache.get()
+    assert fee_cache.fetch_fee.call_count == 2
+    assert fee_cache.misses == 2
+
+
+def test_log_stats(mocker, fee_cache):
+    mock_logging = mocker.patch('autotrageur.bot.trader.fee_cache.logging')
+    fee_cache.get()
+    fee_cache.log_stats('kraken')
+    mock_logging.info.assert_called_once_with(
+        "%s taker fee cache: %d hits, %d misses.", 'kraken', 0, 1)
@@ -0,0 +1,189 @@
+import random
+from decimal import Decimal, getcontext
+from fractions import Fraction
+
+import pytest
+
+from autotrageur.bot.trader.fixed_point import (MAX_PLACES,
+                                                FixedPointOrderbookIndex,
+                                                FixedPointScaleException,
+                                                get_places, to_scaled)
+from autotrageur.bot.trader.orderbook_index import (BookFill,
+                                                    OrderbookException,
+                                                    OrderbookIndex)
+from fp_libs.utilities import num_to_decimal, set_autotrageur_decimal_context
+
+FAKE_ASKS = [[100.0, 1.0], [110.0, 2.0], [120.0, 3.0]]
+PROPERTY_SEEDS = range(200)
+set_autotrageur_decimal_context()
+
+
+def ulp(value):
+    """The unit in the last place of a Decimal, in the current context."""
+    return Decimal(1).scaleb(value.adjusted() - getcontext().prec + 1)
+
+
+def make_book(rng):
+    """Makes a random book side, and the precisions it is on the grid of."""
+    price_places = rng.randint(0, 8)
+    amount_places = rng.randint(0, 8)
+    price = rng.randint(1, 10 ** 7)
+    orders = []
+    for _ in range(rng.randint(1, 50)):
+        price += rng.randint(0, 10 ** 4)
+        volume = rng.randint(1, 10 ** 9)
+        orders.append([float(Decimal(price).scaleb(-price_places)),
+                       float(Decimal(volume).scaleb(-amount_places))])
+    return orders, price_places, amount_places
+
+
+def exact_fill(orders, amount, by_quote):
+    """Fills an amount against a book side in exact rational arithmetic.
+
+    Returns:
+        Fraction: The base volume of a quote amount if by_quote, else the
+            quote amount of a base volume.
+    """
+    amount = Fraction(amount)
+    cum_base = cum_quote = Fraction(0)
+    for price, volume in orders:
+        price = Fraction(num_to_decimal(price))
+        volume = Fraction(num_to_decimal(volume))
+        cum_base += volume
+        cum_quote += price * volume
+        if by_quote and cum_quote >= amount:
+            return cum_base + (amount - cum_quote) / price
+        if not by_quote and cum_base >= amount:
+            return cum_quote + (amount - cum_base) * price
+
+
+def assert_within_ulp(result, exact):
+    """The fixed-point result is the exact fill, rounded once.
+
+    The Decimal result rounds each step, and may lose a few digits to the
+    cancellation of the partially filled level, so it is compared by its
+    fill level only.
+    """
+    assert abs(Fraction(result) - exact) < Fraction(ulp(result))
+
+
+@pytest.fixture()
+def orderbook_index():
+    return FixedPointOrderbookIndex(FAKE_ASKS, 2, 8)
+
+
+@pytest.mark.parametrize('precision, places', [(8, 8), (0, 0), (-2, 0)])
+def test_get_places(precision, places):
+    assert get_places(precision) == places
+
+
+@pytest.mark.parametrize('precision', [None, MAX_PLACES + 1])
+def test_get_places_bad(precision):
+    with pytest.raises(FixedPointScaleException):
+        get_places(precision)
+
+
+@pytest.mark.parametrize('values, places, scaled', [
+    ([0.1, 2.0, 100000.12], 2, [10, 200, 10000012]),
+    ([0.00000001, 1234.5678], 8, [1, 123456780000]),
+    ([], 8, []),
+])
+def test_to_scaled(values, places, scaled):
+    assert to_scaled(values, places) == scaled
+
+
+@pytest.mark.parametrize('values, places', [
+    ([0.123], 2),
+    ([1.000000001], 8),
+    ([1e16], 2),
+])
+def test_to_scaled_off_grid(values, places):
+    with pytest.raises(FixedPointScaleException):
+        to_scaled(values, places)
+
+
+def test_init_off_grid():
+    with pytest.raises(FixedPointScaleException):
+        FixedPointOrderbookIndex([[100.005, 1.0]], 2, 8)
+    with pytest.raises(FixedPointScaleException):
+        FixedPointOrderbookIndex(FAKE_ASKS, None, 8)
+
+
+@pytest.mark.parametrize('quote_amount, base_volume, levels', [
+    (Decimal('50'), Decimal('0.5'), 1),
+    (Decimal('100'), Decimal('1'), 1),
+    (Decimal('210'), Decimal('2'), 2),
+    (Decimal('680'), Decimal('6'), 3),
+    (Decimal('0'), Decimal('0'), 0),
+])
+def test_fill_quote(orderbook_index, quote_amount, base_volume, levels):
+    assert orderbook_index.fill_quote(quote_amount) == BookFill(
+        base_volume, quote_amount, levels)
+
+
+@pytest.mark.parametrize('base_volume, quote_amount, levels', [
+    (Decimal('0.5'), Decimal('50'), 1),
+    (Decimal('2'), Decimal('210'), 2),
+    (Decimal('6'), Decimal('680'), 3),
+    (Decimal('0'), Decimal('0'), 0),
+])
+def test_fill_base(orderbook_index, base_volume, quote_amount, levels):
+    assert orderbook_index.fill_base(base_volume) == BookFill(
+        base_volume, quote_amount, levels)
+
+
+@pytest.mark.parametrize('orders', [[], FAKE_ASKS])
+def test_fill_not_deep_enough(orders):
+    with pytest.raises(OrderbookException):
+        FixedPointOrderbookIndex(orders, 2, 8).fill_quote(Decimal('681'))
+    with pytest.raises(OrderbookException):
+        FixedPointOrderbookIndex(orders, 2, 8).fill_base(Decimal('6.1'))
+
+
+def test_get_avg_price(orderbook_index):
+    assert orderbook_index.get_avg_price_for_quote(Decimal('210')) == Decimal('105')
+    assert orderbook_index.get_avg_price_for_base(Decimal('2')) == Decimal('105')
+
+
+@pytest.mark.parametrize('seed', PROPERTY_SEEDS)
+def test_fill_quote_property(seed):
+    rng = random.Random(seed)
+    orders, price_places, amount_places = make_book(rng)
+    decimal_index = OrderbookIndex(orders)
+    fixed_index = FixedPointOrderbookIndex(orders, price_places, amount_places)
+    depth = sum(num_to_decimal(price) * num_to_decimal(volume)
+                for price, volume in orders)
+
+    # Random amounts within the book, and the exact level boundaries.
+    amounts = [depth * Decimal(rng.random()) for _ in range(5)]
+    amounts += [decimal_index.fill_base(
+        num_to_decimal(orders[0][1])).quote_amount, depth]
+    for quote_amount in amounts:
+        expected = decimal_index.fill_quote(quote_amount)
+        result = fixed_index.fill_quote(quote_amount)
+        assert result.levels == expected.levels
+        assert result.quote_amount == expected.quote_amount
+        assert_within_ulp(result.base_volume,
+                          exact_fill(orders, quote_amount, True))
+
+    with pytest.raises(OrderbookException):
+        fixed_index.fill_quote(depth + ulp(depth))
+
+
+@pytest.mark.parametrize('seed', PROPERTY_SEEDS)
+def test_fill_base_property(seed):
+    rng = random.Random(seed)
+    orders, price_places, amount_places = make_book(rng)
+    decimal_index = OrderbookIndex(orders)
+    fixed_index = FixedPointOrderbookIndex(orders, price_places, amount_places)
+    depth = sum(num_to_decimal(volume) for _, volume in orders)
+
+    amounts = [depth * Decimal(rng.random()) for _ in range(5)]
+    amounts += [num_to_decimal(orders[0][1]), depth]
+    for base_volume in amounts:
+        expected = decimal_index.fill_base(base_volume)
+        result = fixed_index.fill_base(base_volume)
+        assert result.levels == expected.levels
+        assert result.base_volume == expected.base_volume
+        assert_within_ulp(result.quote_amount,
+                          exact_fill(orders, base_volume, False))
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.trader.market_spec import MarketSpec
+from fp_libs.utilities import set_autotrageur_decimal_context
+
+FAKE_SYMBOL = 'ETH/USD'
+set_autotrageur_decimal_context()
+
+
+@pytest.mark.parametrize('market, expected_spec', [
+    ({
+        'limits': {
+            'amount': {'min': 0.001, 'max': 1000},
+            'price': {'min': 0, 'max': None}
+        },
+        'precision': {'amount': 8, 'price': 2}
+    }, MarketSpec(FAKE_SYMBOL, Decimal('0.001'), Decimal('1000'), Decimal('0'),
+                  None, 8, Decimal('1E-8'), 2)),
+    ({
+        'limits': {'amount': {'min': 0.02}},
+        'precision': {'amount': -2}
+    }, MarketSpec(FAKE_SYMBOL, Decimal('0.02'), None, None, None, -2,
+                  Decimal('1E+2'), None)),
+    ({
+        'limits': {},
+        'precision': {}
+    }, MarketSpec(FAKE_SYMBOL, None, None, None, None, None, None, None)),
+])
+def test_from_market(market, expected_spec):
+    assert MarketSpec.from_market(FAKE_SYMBOL, market) == expected_spec
+
+
+@pytest.mark.parametrize('market', [
+    {'precision': {}},
+    {'limits': {}},
+])
+def test_from_market_bad(market):
+    with pytest.raises(KeyError):
+        MarketSpec.from_market(FAKE_SYMBOL, market)
+
+
+@pytest.mark.parametrize('precision, amount, rounded_amount', [
+    (8, Decimal('1.123456789'), Decimal('1.12345678')),
+    (0, Decimal('1234567.89'), Decimal('1234567')),
+    (-2, Decimal('1234567.89'), Decimal('1234500')),
+    (None, Decimal('1.123456789'), Decimal('1.123456789')),
+])
+def test_quantize_amount(precision, amount, rounded_amount):
+    spec = MarketSpec.from_market(
+        FAKE_SYMBOL, {'limits': {}, 'precision': {'amount': precision}})
+    result = spec.quantize_amount(amount)
+    assert result == rounded_amount
+    if precision is not None:
+        assert result == round(amount, precision)
@@ -0,0 +1,100 @@
+import json
+import os
+
+import ccxt
+import pytest
+
+from autotrageur.bot.trader.markets_cache import (MARKETS_CACHE_TTL,
+                                                  MARKETS_CACHE_VERSION,
+                                                  CachedMarkets, MarketsCache)
+
+FAKE_API_URLS = {'public': 'https://api.fake.com'}
+FAKE_MARKETS = {
+    'ETH/USD': {
+        'symbol': 'ETH/USD',
+        'limits': {'amount': {'min': 0.001, 'max': None}},
+        'precision': {'amount': 8}
+    }
+}
+
+
+@pytest.fixture()
+def markets_cache(mocker, tmpdir):
+    return MarketsCache(str(tmpdir), clock=mocker.Mock(return_value=1000))
+
+
+def test_load_missing(markets_cache):
+    assert markets_cache.load('kraken', FAKE_API_URLS) is None
+
+
+@pytest.mark.parametrize('elapsed, is_fresh', [
+    (0, True),
+    (MARKETS_CACHE_TTL - 1, True),
+    (MARKETS_CACHE_TTL, False),
+])
+def test_save_load(markets_cache, elapsed, is_fresh):
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+    markets_cache.clock.return_value += elapsed
+
+    assert markets_cache.load('kraken', FAKE_API_URLS) == CachedMarkets(
+        FAKE_MARKETS, is_fresh)
+    assert markets_cache.load('bithumb', FAKE_API_URLS) is None
+
+
+@pytest.mark.parametrize('field, value', [
+    ('version', MARKETS_CACHE_VERSION + 1),
+    ('ccxt_version', '0.0.1'),
+    ('api_urls', {'public': 'https://test.fake.com'}),
+])
+def test_load_outdated(markets_cache, field, value):
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+    path = os.path.join(markets_cache.cache_dir, 'kraken.json')
+    with open(path) as cache_file:
+        entry = json.load(cache_file)
+    entry[field] = value
+    with open(path, 'w') as cache_file:
+        json.dump(entry, cache_file)
+
+    assert markets_cache.load('kraken', FAKE_API_URLS) is None
+
+
+def test_load_corrupt(markets_cache):
+    with open(os.path.join(markets_cache.cache_dir, 'kraken.json'), 'w') as f:
+        f.write('{"version": ')
+
+    assert markets_cache.load('kraken', FAKE_API_URLS) is None
+
+
+def test_save_entry(markets_cache):
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+
+    with open(os.path.join(markets_cache.cache_dir, 'kraken.json')) as f:
+        entry = json.load(f)
+    assert entry == {
+        'version': MARKETS_CACHE_VERSION,
+        'ccxt_version': ccxt.__version__,
+        'api_urls': FAKE_API_URLS,
+        'timestamp': 1000,
+        'markets': FAKE_MARKETS
+    }
+    assert os.listdir(markets_cache.cache_dir) == ['kraken.json']
+
+
+def test_save_unique_temp_file(mocker, markets_cache):
+    replace = mocker.patch.object(os, 'replace', side_effect=os.replace)
+
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+
+    first, second = [args[0] for args, _ in replace.call_args_list]
+    assert first != second
+    assert os.path.dirname(first) == markets_cache.cache_dir
+    assert os.listdir(markets_cache.cache_dir) == ['kraken.json']
+
+
+def test_save_failed_removes_temp_file(mocker, markets_cache):
+    mocker.patch.object(os, 'replace', side_effect=OSError)
+
+    markets_cache.save('kraken', FAKE_API_URLS, FAKE_MARKETS)
+
+    assert os.listdir(markets_cache.cache_dir) == []
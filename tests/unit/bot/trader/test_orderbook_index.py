@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.trader.orderbook_index import (BookFill,
+                                                    OrderbookException,
+                                                    OrderbookIndex)
+from fp_libs.utilities import set_autotrageur_decimal_context
+
+FAKE_ASKS = [[100.0, 1.0], [110.0, 2.0], [120.0, 3.0]]
+set_autotrageur_decimal_context()
+
+
+@pytest.fixture()
+def orderbook_index():
+    return OrderbookIndex(FAKE_ASKS)
+
+
+def test_init(orderbook_index):
+    assert orderbook_index.orders is FAKE_ASKS
+    assert len(orderbook_index) == 3
+
+
+@pytest.mark.parametrize('quote_amount, base_volume, levels', [
+    (Decimal('50'), Decimal('0.5'), 1),
+    (Decimal('100'), Decimal('1'), 1),
+    (Decimal('210'), Decimal('2'), 2),
+    (Decimal('680'), Decimal('6'), 3),
+    (Decimal('0'), Decimal('0'), 0),
+])
+def test_fill_quote(orderbook_index, quote_amount, base_volume, levels):
+    assert orderbook_index.fill_quote(quote_amount) == BookFill(
+        base_volume, quote_amount, levels)
+
+
+@pytest.mark.parametrize('base_volume, quote_amount, levels', [
+    (Decimal('0.5'), Decimal('50'), 1),
+    (Decimal('2'), Decimal('210'), 2),
+    (Decimal('6'), Decimal('680'), 3),
+    (Decimal('0'), Decimal('0'), 0),
+])
+def test_fill_base(orderbook_index, base_volume, quote_amount, levels):
+    assert orderbook_index.fill_base(base_volume) == BookFill(
+        base_volume, quote_amount, levels)
+
+
+def test_fill_many_queries(orderbook_index):
+    # Deeper queries extend the index; shallower ones reuse it.
+    assert orderbook_index.fill_quote(Decimal('680')).levels == 3
+    assert orderbook_index.fill_quote(Decimal('100')).levels == 1
+    assert orderbook_index.fill_base(Decimal('3')).quote_amount == Decimal('320')
+
+
+@pytest.mark.parametrize('orders', [[], FAKE_ASKS])
+def test_fill_not_deep_enough(orders):
+    with pytest.raises(OrderbookException):
+        OrderbookIndex(orders).fill_quote(Decimal('681'))
+    with pytest.raises(OrderbookException):
+        OrderbookIndex(orders).fill_base(Decimal('6.1'))
+
+
+def test_get_avg_price(orderbook_index):
+    assert orderbook_index.get_avg_price_for_quote(Decimal('210')) == Decimal('105')
+    assert orderbook_index.get_avg_price_for_base(Decimal('2')) == Decimal('105')
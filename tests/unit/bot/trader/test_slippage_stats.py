@@ -0,0 +1,51 @@
+import statistics
+from decimal import Decimal
+
+import pytest
+
+from autotrageur.bot.trader.slippage_stats import SlippageStats
+
+
+def test_init():
+    slippage_stats = SlippageStats()
+    assert slippage_stats.count == 0
+    assert slippage_stats.mean == Decimal('0')
+    assert slippage_stats.m2 == Decimal('0')
+    assert slippage_stats.get_stdev() is None
+
+
+@pytest.mark.parametrize('slippages', [
+    [Decimal('10')],
+    [Decimal('10'), Decimal('-10')],
+    [Decimal('10'), Decimal('-10'), Decimal('10'), Decimal('-10')],
+    [Decimal('0.12'), Decimal('-0.05'), Decimal('0.3'), Decimal('0.01'),
+     Decimal('-0.2')],
+])
+def test_add(slippages):
+    slippage_stats = SlippageStats()
+    for slippage in slippages:
+        slippage_stats.add(slippage)
+
+    assert slippage_stats.count == len(slippages)
+    assert slippage_stats.mean == pytest.approx(statistics.mean(slippages))
+    if len(slippages) < 2:
+        assert slippage_stats.get_stdev() is None
+    else:
+        assert slippage_stats.get_stdev() == pytest.approx(
+            statistics.stdev(slippages))
+
+
+def test_add_resumed():
+    slippages = [Decimal('0.12'), Decimal('-0.05'), Decimal('0.3')]
+    slippage_stats = SlippageStats()
+    for slippage in slippages[:2]:
+        slippage_stats.add(slippage)
+
+    resumed = SlippageStats(
+        slippage_stats.count, slippage_stats.mean, slippage_stats.m2)
+    resumed.add(slippages[2])
+    slippage_stats.add(slippages[2])
+
+    assert resumed.count == slippage_stats.count
+    assert resumed.mean == slippage_stats.mean
+    assert resumed.m2 == slippage_stats.m2